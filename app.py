@@ -1,6 +1,7 @@
 import os
 import boto3
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, has_request_context, Response, g
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 from flask_swagger_ui import get_swaggerui_blueprint
@@ -8,14 +9,43 @@ import uuid
 from datetime import datetime
 import logging
 import botocore.exceptions
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
 import hashlib
+import hmac
+import base64
 import time
 import json
+import copy
+import errno
 import subprocess
 import tempfile
 import re
+import shutil
+import math
+import random
+import sqlite3
+import threading
+import functools
+import contextvars
+import io
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
 from io import BytesIO
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+try:
+    import orjson
+except ImportError:  # opcional: sem ele as respostas usam o json da biblioteca padrão
+    orjson = None
+
+import digests
+import media_probe
+import metrics
+import sniffing
+import storage
+import tracing
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -53,6 +83,107 @@ except ValueError:
 
 app.config['MAX_CONTENT_LENGTH'] = max_content_length_mb * 1024 * 1024
 
+TRUTHY_VALUES = {'1', 'true', 'sim', 'yes', 'on'}
+
+def _env_int(name: str, default: int, minimo: int = 1) -> int:
+    """Lê um inteiro de variável de ambiente, usando o padrão se ausente ou inválido"""
+    valor_env = os.environ.get(name)
+    if valor_env is None:
+        return default
+    try:
+        valor = int(valor_env)
+        if valor < minimo:
+            raise ValueError
+        return valor
+    except ValueError:
+        print(f"⚠️ Valor inválido para {name} ('{valor_env}'). Usando padrão de {default}.")
+        logger.warning("%s inválido fornecido. Utilizando valor padrão de %s", name, default)
+        return default
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    """Lê um booleano de variável de ambiente (1, true, sim, yes, on)"""
+    valor_env = os.environ.get(name)
+    if valor_env is None or not valor_env.strip():
+        return default
+    return valor_env.strip().lower() in TRUTHY_VALUES
+
+# Upload em streaming: o corpo é lido uma única vez, em blocos grandes, e cada bloco
+# alimenta ao mesmo tempo o hash MD5, o contador de tamanho, o spool do ffprobe e as partes multipart
+UPLOAD_STREAMING = _env_bool("UPLOAD_STREAMING", False)
+STREAM_READ_CHUNK_BYTES = _env_int("STREAM_READ_CHUNK_KB", 1024) * 1024
+# Memória das partes multipart em voo, somada entre todas as requisições em streaming do worker
+# (0 = sem limite, só TRANSFER_MAX_CONCURRENCY partes por requisição)
+STREAM_MEMORY_BUDGET_BYTES = _env_int("STREAM_MEMORY_BUDGET_MB", 256, minimo=0) * 1024 * 1024
+
+# Limite de tamanho por categoria de arquivo (MB), nunca acima de MAX_CONTENT_LENGTH_MB
+CATEGORY_MAX_SIZE_MB = {
+    categoria: min(_env_int(f"MAX_SIZE_MB_{categoria.upper()}", max_content_length_mb), max_content_length_mb)
+    for categoria in ("video", "imagem", "documento", "outro")
+}
+# Portão de pré-validação do POST /upload: lê só o início do corpo (até o cabeçalho da parte
+# 'file') e recusa extensão, nome ou Content-Length inválidos antes do parsing completo
+PREPARSE_GATE_ENABLED = _env_bool("PREPARSE_GATE_ENABLED", True)
+PREPARSE_PEEK_BYTES = _env_int("PREPARSE_PEEK_KB", 64) * 1024
+# Folga para o envelope multipart (boundaries, cabeçalhos e campos) ao comparar o Content-Length
+PREPARSE_ENVELOPE_BYTES = _env_int("PREPARSE_ENVELOPE_KB", 64, minimo=0) * 1024
+
+# Tipo real do arquivo pelos primeiros bytes (sniffing.py):
+#   on     - corrige content type e categoria pelo conteúdo e recusa executáveis
+#   strict - também recusa conteúdo não reconhecido ou que não corresponde à extensão
+#   off    - confia na extensão e no content type declarados
+CONTENT_SNIFFING_MODES = {'on', 'strict', 'off'}
+CONTENT_SNIFFING = (os.environ.get("CONTENT_SNIFFING") or "on").strip().lower()
+if CONTENT_SNIFFING not in CONTENT_SNIFFING_MODES:
+    print(f"⚠️ Valor inválido para CONTENT_SNIFFING ('{CONTENT_SNIFFING}'). Usando padrão 'on'.")
+    logger.warning("CONTENT_SNIFFING inválido fornecido. Utilizando valor padrão 'on'")
+    CONTENT_SNIFFING = "on"
+
+# Deduplicação por conteúdo (SHA-256 + tamanho, calculados pelo servidor sobre o corpo recebido):
+#   off   - sempre transfere o arquivo (padrão: compartilhar conteúdo entre clientes é opt-in)
+#   copy  - copia o objeto existente no próprio bucket para a nova chave (sem transferência nem ffprobe)
+#   reuse - retorna o objeto existente sem criar um novo
+DEDUP_MODES = {'off', 'copy', 'reuse'}
+DEDUP_MODE = (os.environ.get("DEDUP_MODE") or "off").strip().lower()
+if DEDUP_MODE not in DEDUP_MODES:
+    print(f"⚠️ Valor inválido para DEDUP_MODE ('{DEDUP_MODE}'). Usando padrão 'off'.")
+    logger.warning("DEDUP_MODE inválido fornecido. Utilizando valor padrão 'off'")
+    DEDUP_MODE = "off"
+
+# Cache dos metadados do ffprobe por SHA-256 + tamanho do conteúdo
+MEDIA_CACHE_SIZE = _env_int("MEDIA_CACHE_SIZE", 512)
+MEDIA_CACHE_DISK = _env_bool("MEDIA_CACHE_DISK", True)
+MEDIA_CACHE_DISK_MAX_ENTRIES = _env_int("MEDIA_CACHE_DISK_MAX_ENTRIES", 20000)
+
+# Digests calculados na mesma passagem sobre o arquivo (md5 sempre incluído: dedup, ETag e resposta)
+HASH_ALGORITHMS, _hash_ignorados = digests.parse_algorithms(os.environ.get("HASH_ALGORITHMS", "md5"))
+if _hash_ignorados:
+    print(f"⚠️ HASH_ALGORITHMS: algoritmos indisponíveis ignorados ({', '.join(_hash_ignorados)})")
+    logger.warning(f"HASH_ALGORITHMS: algoritmos indisponíveis ignorados ({', '.join(_hash_ignorados)}); crc32c requer google-crc32c")
+# Digest enviado ao armazenamento nos PUTs únicos para verificação de integridade:
+#   md5 (Content-MD5), sha256 / crc32c (x-amz-checksum-*) ou off
+STORAGE_CHECKSUM = (os.environ.get("STORAGE_CHECKSUM") or "md5").strip().lower()
+if STORAGE_CHECKSUM != "off" and STORAGE_CHECKSUM not in digests.available():
+    print(f"⚠️ Valor inválido ou indisponível para STORAGE_CHECKSUM ('{STORAGE_CHECKSUM}'). Usando padrão 'md5'.")
+    logger.warning("STORAGE_CHECKSUM inválido ou indisponível. Utilizando valor padrão 'md5'")
+    STORAGE_CHECKSUM = "md5"
+if STORAGE_CHECKSUM != "off" and STORAGE_CHECKSUM not in HASH_ALGORITHMS:
+    HASH_ALGORITHMS.append(STORAGE_CHECKSUM)
+# O índice de deduplicação e o cache de metadados usam o SHA-256 (o MD5 não resiste a colisões fabricadas)
+if (DEDUP_MODE != "off" or MEDIA_CACHE_SIZE or MEDIA_CACHE_DISK) and "sha256" not in HASH_ALGORITHMS:
+    HASH_ALGORITHMS.append("sha256")
+# Com mais de um algoritmo, cada bloco é processado em paralelo (o hashlib libera o GIL);
+# por padrão, uma thread por algoritmo extra para cada thread de requisição do worker
+HASH_THREADS = _env_int("HASH_THREADS", _env_int("THREADS", 4) * max(len(HASH_ALGORITHMS) - 1, 1))
+hash_executor = ThreadPoolExecutor(max_workers=HASH_THREADS, thread_name_prefix="hash") if len(HASH_ALGORITHMS) > 1 else None
+
+# Motor de transferência: threshold, tamanho de parte e concorrência por categoria de arquivo
+TRANSFER_ADAPTIVE = _env_bool("TRANSFER_ADAPTIVE", True)
+TRANSFER_MAX_CONCURRENCY = _env_int("TRANSFER_MAX_CONCURRENCY", 8)
+TRANSFER_TARGET_PART_SECONDS = _env_int("TRANSFER_TARGET_PART_SECONDS", 2)
+# O S3 exige partes de no mínimo 5MB (exceto a última) e no máximo 10.000 partes
+TRANSFER_MIN_PART_SIZE_BYTES = max(_env_int("TRANSFER_MIN_PART_SIZE_MB", 5), 5) * 1024 * 1024
+TRANSFER_MAX_PART_SIZE_BYTES = max(_env_int("TRANSFER_MAX_PART_SIZE_MB", 64) * 1024 * 1024, TRANSFER_MIN_PART_SIZE_BYTES)
+
 # Configurações do Spaces (todas via variáveis de ambiente)
 SPACES_REGION = os.environ.get("SPACES_REGION")
 SPACES_ENDPOINT = os.environ.get("SPACES_ENDPOINT")
@@ -60,21 +191,55 @@ SPACES_BUCKET = os.environ.get("SPACES_BUCKET")
 SPACES_KEY = os.environ.get("SPACES_KEY")
 SPACES_SECRET = os.environ.get("SPACES_SECRET")
 
+# Backend de armazenamento: s3 (Spaces ou outro serviço compatível) ou local (diretório
+# servido pela própria API em /storage/<chave>); o caminho das requisições não muda
+STORAGE_BACKEND = (os.getenv("STORAGE_BACKEND") or "s3").strip().lower()
+if STORAGE_BACKEND not in ("s3", "local"):
+    print(f"⚠️ Valor inválido para STORAGE_BACKEND ('{STORAGE_BACKEND}'). Usando padrão 's3'.")
+    logger.warning("STORAGE_BACKEND inválido fornecido. Utilizando valor padrão 's3'")
+    STORAGE_BACKEND = "s3"
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR") or os.path.join(tempfile.gettempdir(), "upload_cdn_storage")
+LOCAL_STORAGE_FSYNC = _env_bool("LOCAL_STORAGE_FSYNC", False)
+# Prefixo das URLs públicas (CDN na frente do bucket ou do diretório local)
+STORAGE_PUBLIC_BASE_URL = (os.getenv("STORAGE_PUBLIC_BASE_URL") or "").rstrip('/')
+
 # Configuração de diretório padrão para uploads
 DEFAULT_UPLOAD_DIR = os.environ.get("DEFAULT_UPLOAD_DIR")
 
+# Sessões de upload em partes: tokens assinados com HMAC, válidos em qualquer worker/réplica
+UPLOAD_TOKEN_SECRET = os.environ.get("UPLOAD_TOKEN_SECRET") or SPACES_SECRET or ""
+UPLOAD_SESSION_TTL_HOURS = _env_int("UPLOAD_SESSION_TTL_HOURS", 24)
+# Validade das URLs assinadas para upload direto ao bucket
+PRESIGN_EXPIRES_SECONDS = _env_int("PRESIGN_EXPIRES_SECONDS", 3600)
+# Upload em lote: arquivos por requisição e transferências simultâneas
+BATCH_MAX_FILES = _env_int("BATCH_MAX_FILES", 100)
+BATCH_CONCURRENCY = _env_int("BATCH_CONCURRENCY", 4)
+
+# Política de retentativa do cliente S3 (modo standard do botocore: backoff exponencial com jitter)
+STORAGE_MAX_ATTEMPTS = _env_int("STORAGE_MAX_ATTEMPTS", 3)
+STORAGE_CONNECT_TIMEOUT_SECONDS = _env_int("STORAGE_CONNECT_TIMEOUT_SECONDS", 5)
+STORAGE_READ_TIMEOUT_SECONDS = _env_int("STORAGE_READ_TIMEOUT_SECONDS", 60)
+
+# Circuit breaker do Spaces: com o circuito aberto os uploads falham na hora (503 + Retry-After)
+STORAGE_BREAKER_ENABLED = _env_bool("STORAGE_BREAKER_ENABLED", True)
+STORAGE_BREAKER_FAILURES = _env_int("STORAGE_BREAKER_FAILURES", 5)
+STORAGE_BREAKER_OPEN_SECONDS = _env_int("STORAGE_BREAKER_OPEN_SECONDS", 15)
+STORAGE_BREAKER_MAX_OPEN_SECONDS = max(_env_int("STORAGE_BREAKER_MAX_OPEN_SECONDS", 120), STORAGE_BREAKER_OPEN_SECONDS)
+STORAGE_BREAKER_HALF_OPEN_REQUESTS = _env_int("STORAGE_BREAKER_HALF_OPEN_REQUESTS", 1)
+
 # Validar configurações obrigatórias
 missing_configs = []
-if not SPACES_REGION:
-    missing_configs.append("SPACES_REGION")
-if not SPACES_ENDPOINT:
-    missing_configs.append("SPACES_ENDPOINT")
-if not SPACES_BUCKET:
-    missing_configs.append("SPACES_BUCKET")
-if not SPACES_KEY:
-    missing_configs.append("SPACES_KEY")
-if not SPACES_SECRET:
-    missing_configs.append("SPACES_SECRET")
+if STORAGE_BACKEND == "s3":
+    if not SPACES_REGION:
+        missing_configs.append("SPACES_REGION")
+    if not SPACES_ENDPOINT:
+        missing_configs.append("SPACES_ENDPOINT")
+    if not SPACES_BUCKET:
+        missing_configs.append("SPACES_BUCKET")
+    if not SPACES_KEY:
+        missing_configs.append("SPACES_KEY")
+    if not SPACES_SECRET:
+        missing_configs.append("SPACES_SECRET")
 if not DEFAULT_UPLOAD_DIR:
     missing_configs.append("DEFAULT_UPLOAD_DIR")
 
@@ -84,28 +249,191 @@ if missing_configs:
     print("   Configure essas variáveis antes de iniciar a aplicação.")
     logger.error("Aplicação não pode iniciar sem essas configurações")
 
+if STORAGE_BACKEND == "local" and not UPLOAD_TOKEN_SECRET:
+    print("⚠️ STORAGE_BACKEND=local sem UPLOAD_TOKEN_SECRET: sessões e URLs assinadas ficam indisponíveis")
+    logger.warning("STORAGE_BACKEND=local sem UPLOAD_TOKEN_SECRET; sessões e URLs assinadas indisponíveis")
+
 print(f"🔧 Configurações carregadas:")
+print(f"   - STORAGE_BACKEND: {STORAGE_BACKEND}" + (f" ({LOCAL_STORAGE_DIR})" if STORAGE_BACKEND == "local" else ""))
 print(f"   - SPACES_REGION: {SPACES_REGION or '❌ Não definida'}")
 print(f"   - SPACES_ENDPOINT: {SPACES_ENDPOINT or '❌ Não definida'}")
 print(f"   - SPACES_BUCKET: {SPACES_BUCKET or '❌ Não definida'}")
 print(f"   - SPACES_KEY: {'✅ Definida' if SPACES_KEY else '❌ Não definida'}")
 print(f"   - SPACES_SECRET: {'✅ Definida' if SPACES_SECRET else '❌ Não definida'}")
 print(f"   - DEFAULT_UPLOAD_DIR: {DEFAULT_UPLOAD_DIR or '❌ Não definida'}")
+print(f"   - UPLOAD_STREAMING: {'✅ Ativado' if UPLOAD_STREAMING else 'Desativado (use ?stream=true)'}")
+print(f"   - DEDUP_MODE: {DEDUP_MODE}")
 
+logger.info(f"STORAGE_BACKEND: {STORAGE_BACKEND}")
 logger.info(f"SPACES_REGION: {SPACES_REGION}")
 logger.info(f"SPACES_ENDPOINT: {SPACES_ENDPOINT}")
 logger.info(f"SPACES_BUCKET: {SPACES_BUCKET}")
 logger.info(f"SPACES_KEY definida: {bool(SPACES_KEY)}")
 logger.info(f"SPACES_SECRET definida: {bool(SPACES_SECRET)}")
 logger.info(f"DEFAULT_UPLOAD_DIR: {DEFAULT_UPLOAD_DIR}")
+logger.info(f"UPLOAD_STREAMING: {UPLOAD_STREAMING}")
+logger.info(f"DEDUP_MODE: {DEDUP_MODE}")
 
 # Cliente S3 será inicializado apenas quando necessário
 s3 = None
 
+class StorageCircuitBreaker:
+    """Circuit breaker das chamadas ao Spaces (por worker).
+    
+    Cada tentativa HTTP do cliente S3 é registrada pelo evento needs-retry do botocore:
+    falhas de conexão, timeouts e respostas 5xx contam como falha; qualquer outra resposta
+    (inclusive 4xx) fecha a sequência. Após STORAGE_BREAKER_FAILURES falhas seguidas o
+    circuito abre e as rotas de upload respondem 503 antes de ler o corpo. Passado o tempo
+    de espera (com backoff exponencial e jitter a cada reabertura), o circuito fica
+    semiaberto e deixa passar STORAGE_BREAKER_HALF_OPEN_REQUESTS requisições de teste.
+    """
+    
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    SEMIABERTO = "semiaberto"
+    
+    def __init__(self, enabled: bool, failure_threshold: int, open_seconds: int, max_open_seconds: int, half_open_requests: int):
+        self.enabled = enabled
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_requests = half_open_requests
+        self._lock = threading.Lock()
+        self._state = self.FECHADO
+        self._failures = 0
+        self._openings = 0
+        self._retry_at = 0.0
+        self._probes = 0
+        self.total_aberturas = 0
+        self.rejeitadas = 0
+        self.ultimo_erro: Optional[str] = None
+    
+    def _open(self, now: float) -> None:
+        # Backoff exponencial a cada reabertura seguida, com jitter para não sincronizar réplicas
+        self._openings += 1
+        teto = min(self.max_open_seconds, self.open_seconds * 2 ** (self._openings - 1))
+        espera = teto / 2 + random.uniform(0, teto / 2)
+        self._state = self.ABERTO
+        self._retry_at = now + espera
+        self._probes = 0
+        self.total_aberturas += 1
+        print(f"🔌 Circuit breaker do Spaces ABERTO por {espera:.1f}s ({self._failures} falha(s) seguidas)")
+        logger.warning(f"Circuit breaker do Spaces aberto por {espera:.1f}s após {self._failures} falha(s): {self.ultimo_erro}")
+    
+    def allow(self) -> Optional[float]:
+        """None se a requisição pode seguir; senão, segundos até a próxima tentativa"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._state == self.FECHADO:
+                return None
+            now = time.monotonic()
+            if self._state == self.ABERTO:
+                if now < self._retry_at:
+                    self.rejeitadas += 1
+                    return self._retry_at - now
+                self._state = self.SEMIABERTO
+                self._probes = 0
+                self._retry_at = now + self.open_seconds
+                print("🔌 Circuit breaker do Spaces SEMIABERTO: liberando requisições de teste")
+                logger.info("Circuit breaker do Spaces semiaberto")
+            # Semiaberto: libera poucas requisições de teste; sem resultado até _retry_at, libera outras
+            if now >= self._retry_at:
+                self._probes = 0
+                self._retry_at = now + self.open_seconds
+            if self._probes < self.half_open_requests:
+                self._probes += 1
+                return None
+            self.rejeitadas += 1
+            return self._retry_at - now
+    
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._state != self.FECHADO:
+                self._state = self.FECHADO
+                self._openings = 0
+                print("✅ Circuit breaker do Spaces FECHADO: armazenamento respondendo")
+                logger.info("Circuit breaker do Spaces fechado")
+    
+    def record_failure(self, erro: str) -> None:
+        with self._lock:
+            self._failures += 1
+            self.ultimo_erro = erro
+            if not self.enabled:
+                return
+            if self._state == self.SEMIABERTO or (self._state == self.FECHADO and self._failures >= self.failure_threshold):
+                self._open(time.monotonic())
+    
+    def on_attempt(self, response=None, caught_exception=None, **kwargs) -> None:
+        """Handler do evento needs-retry.s3 (cada tentativa HTTP, antes da decisão de retentar)"""
+        if caught_exception is not None:
+            self.record_failure(f"{type(caught_exception).__name__}: {caught_exception}")
+        elif response is not None:
+            status_code = response[0].status_code
+            if status_code >= 500:
+                self.record_failure(f"HTTP {status_code}")
+            else:
+                self.record_success()
+    
+    def attach(self, client) -> None:
+        """Registra o breaker nos eventos de um cliente S3 (botocore ou aiobotocore)"""
+        client.meta.events.register('needs-retry.s3', self.on_attempt)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "ativo": self.enabled,
+                "estado": self._state,
+                "falhas_consecutivas": self._failures,
+                "limite_falhas": self.failure_threshold,
+                "total_aberturas": self.total_aberturas,
+                "rejeitadas": self.rejeitadas,
+                "ultimo_erro": self.ultimo_erro,
+            }
+            if self._state != self.FECHADO:
+                stats["proxima_tentativa_segundos"] = round(max(self._retry_at - time.monotonic(), 0), 1)
+            return stats
+
+storage_breaker = StorageCircuitBreaker(
+    STORAGE_BREAKER_ENABLED, STORAGE_BREAKER_FAILURES, STORAGE_BREAKER_OPEN_SECONDS,
+    STORAGE_BREAKER_MAX_OPEN_SECONDS, STORAGE_BREAKER_HALF_OPEN_REQUESTS
+)
+
+def storage_client_config(config_class=Config, **kwargs) -> Config:
+    """Timeouts e retentativas (modo standard: backoff exponencial com jitter) dos clientes S3"""
+    return config_class(
+        connect_timeout=STORAGE_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=STORAGE_READ_TIMEOUT_SECONDS,
+        retries={'max_attempts': STORAGE_MAX_ATTEMPTS, 'mode': 'standard'},
+        **kwargs
+    )
+
+def circuit_open_response(retry_after: float) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+    """Resposta 503 imediata enquanto o circuito do Spaces está aberto"""
+    segundos = max(1, math.ceil(retry_after))
+    return {
+        "success": False,
+        "error": "Serviço de armazenamento temporariamente indisponível",
+        "detail": f"O DigitalOcean Spaces está falhando; o upload foi recusado antes do envio. Tente novamente em {segundos} segundo(s).",
+        "retry_after_segundos": segundos
+    }, 503, {"Retry-After": str(segundos)}
+
+_s3_lock = threading.Lock()
+_s3_pid = None
+
 def get_s3_client():
-    """Inicializa o cliente S3 apenas quando necessário"""
-    global s3
-    if s3 is None:
+    """Cliente S3 do processo atual, criado uma única vez mesmo com threads concorrentes.
+    
+    Com --preload o módulo é importado no master do Gunicorn; um cliente criado antes do
+    fork não é reaproveitado pelo worker (o pool de conexões não pode ser compartilhado).
+    """
+    global s3, _s3_pid
+    if s3 is not None and _s3_pid == os.getpid():
+        return s3
+    with _s3_lock:
+        if s3 is not None and _s3_pid == os.getpid():
+            return s3
         try:
             print("🔗 Inicializando cliente S3...")
             logger.info("Inicializando cliente S3")
@@ -113,15 +441,22 @@ def get_s3_client():
             if not SPACES_KEY or not SPACES_SECRET:
                 raise ValueError("Credenciais do Spaces não configuradas")
             
-            s3 = boto3.client('s3',
+            client = boto3.client('s3',
                 region_name=SPACES_REGION,
                 endpoint_url=SPACES_ENDPOINT,
                 aws_access_key_id=SPACES_KEY,
-                aws_secret_access_key=SPACES_SECRET
+                aws_secret_access_key=SPACES_SECRET,
+                config=storage_client_config(
+                    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                )
             )
+            storage_breaker.attach(client)
+            tracer.attach(client)
+            s3, _s3_pid = client, os.getpid()
             
-            print("✅ Cliente S3 inicializado com sucesso")
-            logger.info("Cliente S3 inicializado com sucesso")
+            print(f"✅ Cliente S3 inicializado com sucesso (pool de {S3_MAX_POOL_CONNECTIONS} conexões)")
+            logger.info(f"Cliente S3 inicializado com sucesso (pid {_s3_pid}, pool de {S3_MAX_POOL_CONNECTIONS} conexões)")
             
         except Exception as e:
             print(f"❌ Erro ao inicializar cliente S3: {e}")
@@ -130,6 +465,326 @@ def get_s3_client():
     
     return s3
 
+def warm_up_worker() -> Dict[str, Any]:
+    """Prepara o worker logo após o fork (hook post_fork em gunicorn.conf.py).
+    
+    Cria o cliente S3 do processo e abre S3_PREWARM_CONNECTIONS conexões keep-alive com o
+    SPACES_ENDPOINT (head_bucket simultâneos: cada um ocupa uma conexão distinta, que volta
+    ao pool já com DNS, TCP e TLS resolvidos). Assim o primeiro upload após cada reciclagem
+    do worker (--max-requests) tem a latência do regime estável.
+    """
+    inicio = time.perf_counter()
+    resultado = {"pid": os.getpid(), "conexoes": 0, "erros": 0}
+    try:
+        client = get_s3_client() if STORAGE_BACKEND == "s3" else None
+        if client is not None and S3_PREWARM_CONNECTIONS and SPACES_BUCKET:
+            def abrir_conexao(_):
+                client.head_bucket(Bucket=SPACES_BUCKET)
+            
+            with ThreadPoolExecutor(max_workers=S3_PREWARM_CONNECTIONS, thread_name_prefix="s3-prewarm") as executor:
+                futures = [executor.submit(abrir_conexao, i) for i in range(S3_PREWARM_CONNECTIONS)]
+                for future in futures:
+                    try:
+                        future.result()
+                        resultado["conexoes"] += 1
+                    except Exception as e:
+                        resultado["erros"] += 1
+                        logger.warning(f"Erro ao pré-aquecer conexão com o Spaces: {e}")
+        # Primeira verificação de prontidão já feita: /health responde da memória desde o início
+        storage_health.snapshot()
+    except Exception as e:
+        resultado["erros"] += 1
+        logger.error(f"Erro ao preparar worker: {e}")
+    
+    resultado["tempo_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    print(f"🔥 Worker {resultado['pid']} pronto: {resultado['conexoes']} conexão(ões) com o Spaces em {resultado['tempo_ms']} ms")
+    logger.info(f"Worker {resultado['pid']} pré-aquecido: {resultado}")
+    return resultado
+
+# Estado compartilhado entre os workers do Gunicorn (SQLite em modo WAL no disco local)
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH") or os.path.join(tempfile.gettempdir(), "upload_cdn_state.db")
+
+STATE_DB_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS dedup_content (
+        hash_sha256 TEXT NOT NULL,
+        tamanho INTEGER NOT NULL,
+        s3_key TEXT NOT NULL,
+        content_type TEXT,
+        midia TEXT,
+        criado_em REAL NOT NULL,
+        ultimo_hit_em REAL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hash_sha256, tamanho)
+    )""",
+    """CREATE TABLE IF NOT EXISTS media_cache (
+        chave TEXT PRIMARY KEY,
+        midia TEXT NOT NULL,
+        criado_em REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_media_cache_criado_em ON media_cache (criado_em)",
+    """CREATE TABLE IF NOT EXISTS media_jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        s3_key TEXT NOT NULL,
+        callback_key TEXT,
+        midia TEXT,
+        erro TEXT,
+        criado_em REAL NOT NULL,
+        atualizado_em REAL NOT NULL
+    )""",
+    # Catálogo de uploads: uma linha por upload concluído (seq = ordem de chegada, usada no cursor)
+    """CREATE TABLE IF NOT EXISTS upload_catalog (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        arquivo_id TEXT NOT NULL,
+        s3_key TEXT NOT NULL,
+        diretorio TEXT NOT NULL,
+        nome_original TEXT,
+        hash_md5 TEXT,
+        tamanho INTEGER NOT NULL,
+        content_type TEXT,
+        categoria TEXT,
+        ip_cliente TEXT,
+        url TEXT,
+        callback_url TEXT,
+        deduplicado INTEGER NOT NULL DEFAULT 0,
+        resposta TEXT NOT NULL,
+        criado_em REAL NOT NULL,
+        atualizado_em REAL NOT NULL
+    )""",
+    # Índices de uma coluna já incluem o rowid (seq): filtro + ORDER BY seq sem ordenação extra
+    "CREATE INDEX IF NOT EXISTS idx_upload_catalog_arquivo_id ON upload_catalog (arquivo_id)",
+    "CREATE INDEX IF NOT EXISTS idx_upload_catalog_diretorio ON upload_catalog (diretorio)",
+    "CREATE INDEX IF NOT EXISTS idx_upload_catalog_hash ON upload_catalog (hash_md5)",
+    "CREATE INDEX IF NOT EXISTS idx_upload_catalog_categoria ON upload_catalog (categoria)",
+    "CREATE INDEX IF NOT EXISTS idx_upload_catalog_ip ON upload_catalog (ip_cliente)",
+    "CREATE INDEX IF NOT EXISTS idx_upload_catalog_criado_em ON upload_catalog (criado_em)",
+    # Idempotency-Key: resposta NULL = tentativa em andamento (reservada por 'dono' até expira_em)
+    """CREATE TABLE IF NOT EXISTS idempotency_records (
+        chave TEXT PRIMARY KEY,
+        impressao TEXT NOT NULL,
+        dono TEXT NOT NULL,
+        status_http INTEGER,
+        resposta TEXT,
+        criado_em REAL NOT NULL,
+        expira_em REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_idempotency_records_expira_em ON idempotency_records (expira_em)",
+    # Finalizações de /upload/finalize e das sessões, por objeto: resposta NULL = em andamento
+    # (reservada por 'dono' até expira_em); concluídas valem enquanto o token for válido
+    """CREATE TABLE IF NOT EXISTS upload_finalizations (
+        s3_key TEXT PRIMARY KEY,
+        dono TEXT NOT NULL,
+        resposta TEXT,
+        criado_em REAL NOT NULL,
+        expira_em REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_upload_finalizations_expira_em ON upload_finalizations (expira_em)",
+]
+
+# Catálogo de uploads (GET /files), no mesmo SQLite do estado compartilhado
+CATALOG_ENABLED = _env_bool("CATALOG_ENABLED", True)
+CATALOG_PAGE_SIZE = _env_int("CATALOG_PAGE_SIZE", 50)
+CATALOG_PAGE_MAX = max(_env_int("CATALOG_PAGE_MAX", 500), CATALOG_PAGE_SIZE)
+
+# Motor de metadados: leitura nativa dos cabeçalhos (media_probe) com fallback para o ffprobe
+MEDIA_PROBE_ENGINE = os.getenv("MEDIA_PROBE_ENGINE", "auto").strip().lower()
+if MEDIA_PROBE_ENGINE not in ("auto", "native", "ffprobe"):
+    print(f"⚠️ MEDIA_PROBE_ENGINE inválido ({MEDIA_PROBE_ENGINE}); usando auto")
+    logger.warning(f"MEDIA_PROBE_ENGINE inválido ({MEDIA_PROBE_ENGINE}); usando auto")
+    MEDIA_PROBE_ENGINE = "auto"
+MEDIA_PROBE_HEAD_BYTES = _env_int("MEDIA_PROBE_HEAD_KB", 1024) * 1024
+MEDIA_PROBE_TAIL_BYTES = _env_int("MEDIA_PROBE_TAIL_KB", 4096) * 1024
+FFPROBE_AVAILABLE = shutil.which("ffprobe") is not None
+logger.info(f"MEDIA_PROBE_ENGINE: {MEDIA_PROBE_ENGINE} (ffprobe disponível: {FFPROBE_AVAILABLE})")
+if MEDIA_PROBE_ENGINE == "ffprobe" and not FFPROBE_AVAILABLE:
+    print("⚠️ MEDIA_PROBE_ENGINE=ffprobe, mas o ffprobe não está instalado")
+    logger.warning("MEDIA_PROBE_ENGINE=ffprobe, mas o ffprobe não está instalado; metadados de mídia indisponíveis")
+
+# Extração de metadados em segundo plano (GET /jobs/<id>)
+MEDIA_METADATA_ASYNC = _env_bool("MEDIA_METADATA_ASYNC", False)
+MEDIA_JOB_WORKERS = _env_int("MEDIA_JOB_WORKERS", 2)
+MEDIA_JOB_QUEUE_MAX = _env_int("MEDIA_JOB_QUEUE_MAX", 32)
+
+# Callback JSON gravado ao lado do arquivo:
+#   sync  - gravado antes da resposta (padrão): a callback_url já existe quando o cliente a recebe
+#   async - opt-in; gravado em segundo plano depois da resposta (fila limitada, retentativas).
+#           A callback_url pode dar 404 por alguns milissegundos, e callbacks ainda na fila se
+#           perdem se o worker morrer sem passar pelo worker_exit
+#   off   - não gravado (resposta sem callback_url)
+CALLBACK_JSON_MODES = {'async', 'sync', 'off'}
+CALLBACK_JSON_MODE = (os.environ.get("CALLBACK_JSON_MODE") or "sync").strip().lower()
+if CALLBACK_JSON_MODE not in CALLBACK_JSON_MODES:
+    print(f"⚠️ Valor inválido para CALLBACK_JSON_MODE ('{CALLBACK_JSON_MODE}'). Usando padrão 'sync'.")
+    logger.warning("CALLBACK_JSON_MODE inválido fornecido. Utilizando valor padrão 'sync'")
+    CALLBACK_JSON_MODE = "sync"
+CALLBACK_JSON_WORKERS = _env_int("CALLBACK_JSON_WORKERS", 4)
+CALLBACK_JSON_QUEUE_MAX = _env_int("CALLBACK_JSON_QUEUE_MAX", 1000)
+CALLBACK_JSON_MAX_ATTEMPTS = _env_int("CALLBACK_JSON_MAX_ATTEMPTS", 3)
+print(f"   - CALLBACK_JSON_MODE: {CALLBACK_JSON_MODE}")
+
+# Recorte da resposta de upload (?fields= ou ?profile=); o callback JSON continua completo
+RESPONSE_PROFILES: Dict[str, Optional[Tuple[str, ...]]] = {
+    "full": None,
+    "compact": (
+        "arquivo.id",
+        "arquivo.url_publica",
+        "arquivo.caminho_completo",
+        "arquivo.hash_md5",
+        "arquivo.tamanho.bytes",
+        "arquivo.tipo_mime",
+        "arquivo.categoria.categoria",
+        "arquivo.etag",
+        "arquivo.midia",
+        "upload.deduplicacao",
+        "callback_url",
+        "midia_job",
+    ),
+}
+RESPONSE_PROFILE = (os.environ.get("RESPONSE_PROFILE") or "full").strip().lower()
+if RESPONSE_PROFILE not in RESPONSE_PROFILES:
+    print(f"⚠️ Valor inválido para RESPONSE_PROFILE ('{RESPONSE_PROFILE}'). Usando padrão 'full'.")
+    logger.warning("RESPONSE_PROFILE inválido fornecido. Utilizando valor padrão 'full'")
+    RESPONSE_PROFILE = "full"
+
+# Serializador JSON das respostas e do callback: auto (orjson quando instalado), orjson ou std
+JSON_ENCODERS = {'auto', 'orjson', 'std'}
+JSON_ENCODER = (os.environ.get("JSON_ENCODER") or "auto").strip().lower()
+if JSON_ENCODER not in JSON_ENCODERS:
+    print(f"⚠️ Valor inválido para JSON_ENCODER ('{JSON_ENCODER}'). Usando padrão 'auto'.")
+    logger.warning("JSON_ENCODER inválido fornecido. Utilizando valor padrão 'auto'")
+    JSON_ENCODER = "auto"
+if JSON_ENCODER == "orjson" and orjson is None:
+    print("⚠️ JSON_ENCODER=orjson, mas o pacote orjson não está instalado. Usando o json da biblioteca padrão.")
+    logger.warning("JSON_ENCODER=orjson sem o pacote orjson; usando json da biblioteca padrão")
+USE_ORJSON = orjson is not None and JSON_ENCODER != "std"
+print(f"   - RESPONSE_PROFILE: {RESPONSE_PROFILE}")
+print(f"   - JSON_ENCODER: {'orjson' if USE_ORJSON else 'std'}")
+
+# Prontidão (readiness): conectividade com o Spaces verificada em segundo plano e servida da memória
+HEALTH_CHECK_INTERVAL_SECONDS = _env_int("HEALTH_CHECK_INTERVAL_SECONDS", 15)
+HEALTH_CHECK_TTL_SECONDS = _env_int("HEALTH_CHECK_TTL_SECONDS", 60)
+HEALTH_CHECK_TIMEOUT_SECONDS = _env_int("HEALTH_CHECK_TIMEOUT_SECONDS", 5)
+
+# Pool de conexões do cliente S3 por worker: cada thread do Gunicorn (ou item de lote) pode
+# transferir TRANSFER_MAX_CONCURRENCY partes ao mesmo tempo, além dos jobs de metadados
+WORKER_THREADS = _env_int("THREADS", 4)
+S3_MAX_POOL_CONNECTIONS = _env_int(
+    "S3_MAX_POOL_CONNECTIONS",
+    max(WORKER_THREADS, BATCH_CONCURRENCY) * TRANSFER_MAX_CONCURRENCY + MEDIA_JOB_WORKERS
+    + (CALLBACK_JSON_WORKERS if CALLBACK_JSON_MODE == "async" else 0)
+)
+# Conexões keep-alive abertas com o Spaces logo após o fork de cada worker (0 desativa)
+S3_PREWARM_CONNECTIONS = min(_env_int("S3_PREWARM_CONNECTIONS", 2, minimo=0), S3_MAX_POOL_CONNECTIONS)
+
+# Identidade do cliente (escopo do Idempotency-Key e controle de admissão): cabeçalho definido por um gateway que autentica
+# a requisição e sobrescreve o valor enviado pelo cliente (vazio = não usar; a API não o verifica)
+CLIENT_ID_HEADER = os.environ.get("CLIENT_ID_HEADER", "").strip()
+# Proxies confiáveis na frente da API: sem o cabeçalho, o IP do cliente é o registrado pelo proxy
+# mais externo no X-Forwarded-For (0 = endereço da conexão)
+TRUSTED_PROXY_COUNT = _env_int("TRUSTED_PROXY_COUNT", 0, minimo=0)
+
+# Controle de admissão dos uploads (por worker, antes de ler o corpo): 429 + Retry-After.
+# Desativado por padrão; cliente = client_identity (CLIENT_ID_HEADER ou IP); 0 desativa cada limite
+ADMISSION_ENABLED = _env_bool("ADMISSION_ENABLED", False)
+# Uploads simultâneos por cliente (0 = sem limite)
+ADMISSION_MAX_CONCURRENT_PER_CLIENT = _env_int("ADMISSION_MAX_CONCURRENT_PER_CLIENT", 0, minimo=0)
+# Token bucket por cliente: uploads por minuto e rajada
+ADMISSION_RATE_PER_MINUTE = _env_int("ADMISSION_RATE_PER_MINUTE", 0, minimo=0)
+ADMISSION_BURST = _env_int("ADMISSION_BURST", max(ADMISSION_RATE_PER_MINUTE // 6, 1))
+# Orçamento de bytes em andamento no worker (pelo Content-Length declarado)
+ADMISSION_MAX_INFLIGHT_MB = _env_int("ADMISSION_MAX_INFLIGHT_MB", 0, minimo=0)
+
+# Idempotency-Key em POST /upload e /upload/batch: a resposta da primeira tentativa concluída é
+# repetida nas retentativas (SQLite do estado compartilhado, vale para todos os workers)
+IDEMPOTENCY_ENABLED = _env_bool("IDEMPOTENCY_ENABLED", True)
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_SECONDS = _env_int("IDEMPOTENCY_TTL_SECONDS", 24 * 3600)
+# Reserva de uma tentativa em andamento; expira se o worker morrer no meio (padrão: 2x o timeout)
+IDEMPOTENCY_LOCK_SECONDS = _env_int("IDEMPOTENCY_LOCK_SECONDS", _env_int("TIMEOUT", 180) * 2)
+# Quanto a retentativa espera a primeira tentativa terminar antes de responder 409 (0 = não espera)
+IDEMPOTENCY_WAIT_SECONDS = _env_int("IDEMPOTENCY_WAIT_SECONDS", 10, minimo=0)
+IDEMPOTENCY_POLL_SECONDS = 0.2
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# Delimitadores multipart aceitos ao conferir o tamanho com outro boundary: um por arquivo ou campo, mais o final
+IDEMPOTENCY_MAX_DELIMITERS = BATCH_MAX_FILES + 16
+
+# Rastreamento por requisição (header X-Trace-Id): spans das etapas, metadados e chamadas ao Spaces
+TRACE_ENABLED = _env_bool("TRACE_ENABLED", True)
+TRACE_SAMPLE_PERCENT = min(_env_int("TRACE_SAMPLE_PERCENT", 10, minimo=0), 100)
+TRACE_EXPORTER = (os.getenv("TRACE_EXPORTER") or "off").strip().lower()
+if TRACE_EXPORTER not in ("off", "jsonl", "otlp"):
+    logger.warning(f"TRACE_EXPORTER inválido ({TRACE_EXPORTER}); usando 'off'")
+    TRACE_EXPORTER = "off"
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH") or os.path.join(tempfile.gettempdir(), "upload_cdn_traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT") or "http://localhost:4318/v1/traces"
+TRACE_EXPORT_QUEUE_MAX = _env_int("TRACE_EXPORT_QUEUE_MAX", 1000)
+# Requisições mais lentas que isso têm a árvore de spans registrada no log (0 desativa)
+TRACE_SLOW_UPLOAD_MS = _env_int("TRACE_SLOW_UPLOAD_MS", 10000, minimo=0)
+# Rotas de infraestrutura (probes, scraping, documentação) não geram trace
+TRACE_IGNORED_PREFIXES = ('/health', '/metrics', '/docs', '/swagger.json')
+
+if TRACE_EXPORTER == "jsonl":
+    trace_exporter = tracing.JsonlExporter(TRACE_JSONL_PATH, max_queue=TRACE_EXPORT_QUEUE_MAX)
+elif TRACE_EXPORTER == "otlp":
+    trace_exporter = tracing.OtlpHttpExporter(TRACE_OTLP_ENDPOINT, "upload-cdn-api", max_queue=TRACE_EXPORT_QUEUE_MAX)
+else:
+    trace_exporter = None
+tracer = tracing.Tracer(TRACE_SAMPLE_PERCENT, trace_exporter, TRACE_SLOW_UPLOAD_MS)
+
+def create_health_check_client():
+    """Cliente dedicado da prontidão: timeouts curtos e sem retentativas, sem disputar o pool dos uploads"""
+    return boto3.client('s3',
+        region_name=SPACES_REGION,
+        endpoint_url=SPACES_ENDPOINT,
+        aws_access_key_id=SPACES_KEY,
+        aws_secret_access_key=SPACES_SECRET,
+        config=Config(
+            connect_timeout=HEALTH_CHECK_TIMEOUT_SECONDS,
+            read_timeout=HEALTH_CHECK_TIMEOUT_SECONDS,
+            retries={'max_attempts': 1},
+        )
+    )
+
+if STORAGE_BACKEND == "local":
+    storage_backend: storage.StorageBackend = storage.LocalStorageBackend(
+        LOCAL_STORAGE_DIR,
+        public_base_url=STORAGE_PUBLIC_BASE_URL,
+        signing_secret=UPLOAD_TOKEN_SECRET,
+        fsync=LOCAL_STORAGE_FSYNC,
+        buffer_size=STREAM_READ_CHUNK_BYTES,
+    )
+else:
+    storage_backend = storage.S3StorageBackend(
+        SPACES_BUCKET,
+        get_s3_client,
+        create_health_check_client,
+        STORAGE_PUBLIC_BASE_URL or f"https://{SPACES_BUCKET}.{SPACES_REGION}.digitaloceanspaces.com",
+    )
+
+def get_storage() -> storage.StorageBackend:
+    """Backend de armazenamento do processo; no S3 inicializa o cliente (ValueError sem credenciais)"""
+    if STORAGE_BACKEND == "s3":
+        get_s3_client()
+    return storage_backend
+
+_state_db_local = threading.local()
+
+def get_state_db() -> sqlite3.Connection:
+    """Conexão SQLite da thread atual com o estado compartilhado entre workers"""
+    conn = getattr(_state_db_local, 'conn', None)
+    # Conexões não podem atravessar o fork dos workers
+    if conn is None or getattr(_state_db_local, 'pid', None) != os.getpid():
+        conn = sqlite3.connect(STATE_DB_PATH, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in STATE_DB_SCHEMA:
+            conn.execute(statement)
+        _state_db_local.conn = conn
+        _state_db_local.pid = os.getpid()
+    return conn
+
 # Tipos de arquivo permitidos
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm', 'jpg', 'jpeg', 'png', 'gif', 'pdf', 'doc', 'docx'}
 
@@ -191,27 +846,54 @@ def format_duration_human(seconds: float) -> Dict[str, Any]:
             "descricao_humana": f"{int(mins)} minutos e {int(secs)} segundos"
         }
 
-def calculate_hash(file_obj) -> str:
-    """Calcula hash MD5 do arquivo"""
-    file_obj.seek(0)
-    hash_md5 = hashlib.md5()
-    for chunk in iter(lambda: file_obj.read(4096), b""):
-        hash_md5.update(chunk)
-    file_obj.seek(0)
-    return hash_md5.hexdigest()
-
-def get_client_info() -> Dict[str, Any]:
-    """Extrai informações do cliente da requisição"""
-    ip = request.remote_addr
-    forwarded_for = request.headers.get('X-Forwarded-For', '')
-    real_ip = request.headers.get('X-Real-IP', '')
+def calculate_digests(file_obj) -> digests.MultiDigest:
+    """Calcula os digests de HASH_ALGORITHMS em uma única leitura do arquivo"""
+    return digests.hash_fileobj(file_obj, HASH_ALGORITHMS, STREAM_READ_CHUNK_BYTES, hash_executor)
+
+def storage_checksums(digest: digests.MultiDigest) -> Optional[Dict[str, str]]:
+    """Digest (base64) enviado ao armazenamento para verificar a integridade do PUT (STORAGE_CHECKSUM)"""
+    if STORAGE_CHECKSUM == "off":
+        return None
+    return {STORAGE_CHECKSUM: digest.b64digest(STORAGE_CHECKSUM)}
+
+def part_checksums(part) -> Optional[Dict[str, str]]:
+    """Content-MD5 de uma parte multipart (bytes ou MultiDigest já alimentado com a parte).
+    
+    Nas partes vai sempre o MD5: checksums SHA-256/CRC32C por parte exigiriam declarar o
+    algoritmo ao criar o multipart e repeti-los na conclusão.
+    """
+    if STORAGE_CHECKSUM == "off" or part is None:
+        return None
+    digest = part
+    if not isinstance(part, digests.MultiDigest):
+        digest = digests.MultiDigest(['md5'])
+        digest.update(part)
+    return {"md5": digest.b64digest('md5')}
+
+def content_sha256(digest: digests.MultiDigest) -> Optional[str]:
+    """SHA-256 do conteúdo, quando calculado (chave do cache de metadados)"""
+    return digest.hexdigest('sha256') if 'sha256' in digest.hashers else None
+
+def extra_hashes(digest: digests.MultiDigest) -> Dict[str, str]:
+    """Digests além do MD5, como campos hash_<algoritmo> da resposta"""
+    return {f"hash_{name}": value for name, value in digest.hexdigests().items() if name != 'md5'}
+
+def get_client_info(headers=None, remote_addr: Optional[str] = None) -> Dict[str, Any]:
+    """Extrai informações do cliente da requisição (ou dos cabeçalhos informados, no modo ASGI)"""
+    if headers is None:
+        headers = request.headers
+        remote_addr = request.remote_addr
+    
+    ip = remote_addr
+    forwarded_for = headers.get('X-Forwarded-For', '')
+    real_ip = headers.get('X-Real-IP', '')
     
     # Usar IP real se disponível (atrás de proxy)
     client_ip = forwarded_for.split(',')[0].strip() if forwarded_for else (real_ip if real_ip else ip)
     
-    user_agent = request.headers.get('User-Agent', 'Desconhecido')
-    referer = request.headers.get('Referer', '')
-    accept_language = request.headers.get('Accept-Language', '')
+    user_agent = headers.get('User-Agent', 'Desconhecido')
+    referer = headers.get('Referer', '')
+    accept_language = headers.get('Accept-Language', '')
     
     return {
         "ip": client_ip,
@@ -222,43 +904,178 @@ def get_client_info() -> Dict[str, Any]:
         "headers": {
             "x_forwarded_for": forwarded_for,
             "x_real_ip": real_ip,
-            "host": request.headers.get('Host', ''),
-            "content_type": request.content_type
+            "host": headers.get('Host', ''),
+            "content_type": headers.get('Content-Type')
         }
     }
 
-def get_file_category(content_type: str, extension: str) -> Dict[str, Any]:
-    """Categoriza o arquivo por tipo"""
+FILE_CATEGORIES = {
+    "video": {"categoria_descricao": "Vídeo", "tipo_midia": "Áudio e Vídeo"},
+    "imagem": {"categoria_descricao": "Imagem", "tipo_midia": "Imagem"},
+    "documento": {"categoria_descricao": "Documento", "tipo_midia": "Documento"},
+    "outro": {"categoria_descricao": "Outro", "tipo_midia": "Outro"},
+}
+
+def get_file_category(content_type: str, extension: str, detectada: Optional[str] = None) -> Dict[str, Any]:
+    """Categoriza o arquivo por tipo (a categoria detectada pelo conteúdo tem precedência)"""
     video_extensions = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
     image_extensions = {'jpg', 'jpeg', 'png', 'gif'}
     document_extensions = {'pdf', 'doc', 'docx'}
     
     extension_lower = extension.lower()
     
-    if extension_lower in video_extensions or 'video' in content_type.lower():
+    if detectada in FILE_CATEGORIES:
+        categoria = detectada
+    elif extension_lower in video_extensions or 'video' in content_type.lower():
         categoria = "video"
-        categoria_desc = "Vídeo"
-        tipo_midia = "Áudio e Vídeo"
     elif extension_lower in image_extensions or 'image' in content_type.lower():
         categoria = "imagem"
-        categoria_desc = "Imagem"
-        tipo_midia = "Imagem"
     elif extension_lower in document_extensions or 'application' in content_type.lower():
         categoria = "documento"
-        categoria_desc = "Documento"
-        tipo_midia = "Documento"
     else:
         categoria = "outro"
-        categoria_desc = "Outro"
-        tipo_midia = "Outro"
     
     return {
         "categoria": categoria,
-        "categoria_descricao": categoria_desc,
-        "tipo_midia": tipo_midia,
+        **FILE_CATEGORIES[categoria],
         "extensao": extension_lower
     }
 
+def sniff_content_type(head: bytes, content_type: Optional[str], extension: str) -> Tuple[str, Optional[str], Optional[Tuple[Dict[str, Any], int]]]:
+    """Confere o início do arquivo com a tabela de assinaturas (CONTENT_SNIFFING).
+    
+    Retorna (content type efetivo, categoria detectada ou None, resposta de erro ou None).
+    O content type declarado é mantido quando já é da mesma categoria do conteúdo.
+    """
+    content_type = content_type or ''
+    if CONTENT_SNIFFING == "off" or not head:
+        return content_type, None, None
+    
+    detected = sniffing.sniff(head)
+    if detected is None:
+        if CONTENT_SNIFFING == "strict":
+            return content_type, None, ({
+                "success": False,
+                "error": "Conteúdo do arquivo não reconhecido",
+                "detail": f"O conteúdo do arquivo não corresponde a nenhum dos tipos aceitos: {', '.join(sorted(ALLOWED_EXTENSIONS))}."
+            }, 400)
+        return content_type, None, None
+    
+    if detected["categoria"] is None or (CONTENT_SNIFFING == "strict" and extension.lower() not in detected["extensoes"]):
+        return content_type, None, ({
+            "success": False,
+            "error": "Conteúdo do arquivo não corresponde ao tipo declarado",
+            "detail": f"O conteúdo do arquivo foi identificado como '{detected['mime']}', que não é aceito com a extensão '.{extension.lower()}'."
+        }, 400)
+    
+    declared_category = get_file_category(content_type, '')["categoria"] if content_type else None
+    if content_type.lower() in ('', 'application/octet-stream') or declared_category != detected["categoria"]:
+        if content_type and content_type != detected["mime"]:
+            print(f"🔎 Tipo corrigido pelo conteúdo: {content_type} -> {detected['mime']}")
+            logger.info(f"Tipo corrigido pelo conteúdo: {content_type} -> {detected['mime']}")
+        content_type = detected["mime"]
+    return content_type, detected["categoria"], None
+
+def category_size_error(categoria: str, size: int, estimado: bool = False) -> Optional[Tuple[Dict[str, Any], int]]:
+    """Resposta 413 se o tamanho passa do limite da categoria (CATEGORY_MAX_SIZE_MB)"""
+    limite_mb = CATEGORY_MAX_SIZE_MB.get(categoria, max_content_length_mb)
+    # Content-Length (estimado) inclui o envelope multipart
+    folga = PREPARSE_ENVELOPE_BYTES if estimado else 0
+    if size - folga <= limite_mb * 1024 * 1024:
+        return None
+    return {
+        "success": False,
+        "error": "Arquivo muito grande",
+        "detail": f"O tamanho do arquivo excede o limite máximo permitido para a categoria '{categoria}'. Tamanho máximo configurado: {limite_mb}MB. Tamanho {'declarado' if estimado else 'do arquivo enviado'}: {size / 1024 / 1024:.2f}MB"
+    }, 413
+
+# Perfis base de transferência por categoria (ver get_file_category)
+TRANSFER_PROFILES = {
+    # Imagens são pequenas: um único PUT, sem threads nem overhead de multipart
+    "imagem": {"multipart_threshold": 32 * 1024 * 1024, "part_size": 8 * 1024 * 1024, "max_concurrency": 1},
+    "documento": {"multipart_threshold": 16 * 1024 * 1024, "part_size": 8 * 1024 * 1024, "max_concurrency": 4},
+    # Vídeos grandes: partes maiores e mais conexões paralelas para saturar o uplink
+    "video": {"multipart_threshold": 8 * 1024 * 1024, "part_size": 16 * 1024 * 1024, "max_concurrency": 8},
+    "outro": {"multipart_threshold": 8 * 1024 * 1024, "part_size": 8 * 1024 * 1024, "max_concurrency": 4},
+}
+
+S3_MAX_PARTS = 10000
+
+class TransferEngine:
+    """Escolhe threshold, tamanho de parte e concorrência do multipart por arquivo.
+    
+    Parte do perfil da categoria e, quando TRANSFER_ADAPTIVE está ativo, ajusta o tamanho da
+    parte pela vazão recente medida em upload_file, para que cada parte leve cerca de
+    TRANSFER_TARGET_PART_SECONDS segundos.
+    """
+    
+    # Uploads menores que isso não representam a vazão do link
+    MIN_SAMPLE_BYTES = 1024 * 1024
+    
+    def __init__(self, profiles: Dict[str, Dict[str, int]], window: int = 20):
+        self.profiles = profiles
+        self._samples = {categoria: deque(maxlen=window) for categoria in profiles}
+        self._lock = threading.Lock()
+    
+    def record_throughput(self, categoria: str, size: int, bytes_per_second: float) -> None:
+        """Registra a vazão observada em um upload concluído"""
+        if size < self.MIN_SAMPLE_BYTES or bytes_per_second <= 0 or categoria not in self._samples:
+            return
+        with self._lock:
+            self._samples[categoria].append(bytes_per_second)
+    
+    def recent_throughput(self, categoria: str) -> Optional[float]:
+        """Mediana da vazão recente da categoria (bytes por segundo)"""
+        with self._lock:
+            samples = sorted(self._samples.get(categoria, ()))
+        if not samples:
+            return None
+        return samples[len(samples) // 2]
+    
+    def plan(self, categoria: str, size: Optional[int]) -> Dict[str, Any]:
+        """Define os parâmetros de transferência para um arquivo (size pode ser estimado ou None)"""
+        profile = self.profiles.get(categoria, self.profiles["outro"])
+        part_size = profile["part_size"]
+        max_concurrency = min(profile["max_concurrency"], TRANSFER_MAX_CONCURRENCY)
+        
+        throughput = self.recent_throughput(categoria) if TRANSFER_ADAPTIVE else None
+        if throughput and max_concurrency > 1:
+            part_size = int(throughput * TRANSFER_TARGET_PART_SECONDS)
+        
+        if size:
+            # Dividir o arquivo entre todas as conexões e respeitar o limite de partes do S3
+            part_size = min(part_size, math.ceil(size / max_concurrency))
+            part_size = max(part_size, math.ceil(size / S3_MAX_PARTS))
+        
+        # Arredondar para MB e respeitar os limites configurados
+        part_size = math.ceil(part_size / (1024 * 1024)) * 1024 * 1024
+        part_size = min(max(part_size, TRANSFER_MIN_PART_SIZE_BYTES), TRANSFER_MAX_PART_SIZE_BYTES)
+        multipart_threshold = max(profile["multipart_threshold"], TRANSFER_MIN_PART_SIZE_BYTES)
+        
+        if size:
+            max_concurrency = max(1, min(max_concurrency, math.ceil(size / part_size)))
+        
+        return {
+            "categoria": categoria,
+            "multipart": size is None or size >= multipart_threshold,
+            "multipart_threshold": multipart_threshold,
+            "tamanho_parte_bytes": part_size,
+            "concorrencia": max_concurrency,
+            "vazao_referencia_bytes_por_segundo": round(throughput, 2) if throughput else None,
+        }
+    
+    @staticmethod
+    def transfer_config(plan: Dict[str, Any]) -> TransferConfig:
+        """Converte um plano em TransferConfig para upload_fileobj"""
+        return TransferConfig(
+            multipart_threshold=plan["multipart_threshold"],
+            multipart_chunksize=plan["tamanho_parte_bytes"],
+            max_concurrency=plan["concorrencia"],
+            use_threads=plan["concorrencia"] > 1,
+        )
+
+transfer_engine = TransferEngine(TRANSFER_PROFILES)
+
 def validate_and_sanitize_folder(folder: Optional[str]) -> str:
     """Valida e sanitiza o nome do diretório, prevenindo path traversal"""
     # Garantir que folder seja string ou None
@@ -300,12 +1117,45 @@ def validate_and_sanitize_folder(folder: Optional[str]) -> str:
     
     return folder if folder else (DEFAULT_UPLOAD_DIR if DEFAULT_UPLOAD_DIR else "uploads")
 
-def extract_media_metadata(file_path: str, content_type: str) -> Optional[Dict[str, Any]]:
-    """Extrai metadados de mídia usando ffprobe"""
+def is_media_content_type(content_type: str) -> bool:
+    """Indica se o content type é de vídeo ou áudio (únicos tipos analisados pelo ffprobe)"""
+    return bool(content_type) and ('video' in content_type.lower() or 'audio' in content_type.lower())
+
+def extract_media_metadata(source, content_type: str, ffprobe_source=None) -> Optional[Dict[str, Any]]:
+    """Extrai metadados de mídia lendo os cabeçalhos do contêiner, com o ffprobe como fallback.
+    
+    source pode ser caminho, URL, objeto de arquivo com seek ou janelas do streaming
+    (media_probe). ffprobe_source é o caminho/URL (ou função que o produz) usado no
+    fallback quando source não serve ao ffprobe.
+    """
     # Só tentar extrair metadados para vídeos e áudios
-    if not content_type or ('video' not in content_type.lower() and 'audio' not in content_type.lower()):
+    if not is_media_content_type(content_type):
         return None
     
+    with metrics.stage("metadados"):
+        return _extract_media_metadata(source, ffprobe_source)
+
+def _extract_media_metadata(source, ffprobe_source) -> Optional[Dict[str, Any]]:
+    if MEDIA_PROBE_ENGINE != "ffprobe":
+        with tracing.span("media_probe"):
+            data = media_probe.probe(source)
+        if data:
+            return summarize_media_probe(data)
+        if MEDIA_PROBE_ENGINE == "native":
+            return None
+    
+    if not FFPROBE_AVAILABLE:
+        return None
+    target = source if isinstance(source, str) else ffprobe_source
+    if callable(target):
+        target = target()
+    if not target:
+        return None
+    with tracing.span("ffprobe"):
+        return run_ffprobe(target)
+
+def run_ffprobe(file_path: str) -> Optional[Dict[str, Any]]:
+    """Extrai metadados de mídia usando ffprobe"""
     try:
         # Comando ffprobe para extrair metadados em JSON
         cmd = [
@@ -323,102 +1173,7 @@ def extract_media_metadata(file_path: str, content_type: str) -> Optional[Dict[s
             logger.warning(f"ffprobe retornou código {result.returncode}: {result.stderr}")
             return None
         
-        data = json.loads(result.stdout)
-        
-        # Extrair informações dos streams
-        video_stream = None
-        audio_stream = None
-        
-        for stream in data.get('streams', []):
-            if stream.get('codec_type') == 'video' and not video_stream:
-                video_stream = stream
-            elif stream.get('codec_type') == 'audio' and not audio_stream:
-                audio_stream = stream
-        
-        # Extrair informações do formato
-        format_info = data.get('format', {})
-        duration = float(format_info.get('duration', 0))
-        bitrate = int(format_info.get('bit_rate', 0))
-        size = int(format_info.get('size', 0))
-        
-        # Processar informações de vídeo
-        video_info = {}
-        if video_stream:
-            width = int(video_stream.get('width', 0))
-            height = int(video_stream.get('height', 0))
-            codec = video_stream.get('codec_name', 'unknown')
-            fps_str = video_stream.get('r_frame_rate', '0/1')
-            
-            # Calcular FPS
-            fps = 0
-            if '/' in fps_str:
-                num, den = map(int, fps_str.split('/'))
-                fps = num / den if den > 0 else 0
-            
-            # Estimar número de frames
-            frames_estimated = int(duration * fps) if fps > 0 else 0
-            
-            video_info = {
-                "codec_video": codec,
-                "resolucao": f"{width}x{height}",
-                "largura": width,
-                "altura": height,
-                "fps": round(fps, 2),
-                "frames_estimados": frames_estimated,
-                "proporcao_aspecto": video_stream.get('display_aspect_ratio', ''),
-                "pixel_format": video_stream.get('pix_fmt', '')
-            }
-        
-        # Processar informações de áudio
-        audio_info = {}
-        if audio_stream:
-            audio_info = {
-                "codec_audio": audio_stream.get('codec_name', 'unknown'),
-                "sample_rate": int(audio_stream.get('sample_rate', 0)),
-                "canais": int(audio_stream.get('channels', 0)),
-                "bitrate_audio": int(audio_stream.get('bit_rate', 0))
-            }
-        
-        # Formatar duração
-        hours = int(duration // 3600)
-        minutes = int((duration % 3600) // 60)
-        seconds = int(duration % 60)
-        milliseconds = int((duration % 1) * 1000)
-        duracao_formatada = f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
-        
-        # Determinar tipo de compressão (CBR/VBR)
-        compressao = "VBR"  # Padrão VBR
-        if bitrate > 0:
-            # Tentar determinar se é CBR verificando variação de bitrate
-            compressao = "CBR"  # Simplificado, pode ser melhorado
-        
-        # Calcular bitrate em Mbps
-        bitrate_mbps = (bitrate / 1000000) if bitrate > 0 else 0
-        
-        # Montar descrição humana
-        desc_parts = []
-        if video_info:
-            desc_parts.append(f"Vídeo {video_info.get('resolucao', '')} em {video_info.get('codec_video', '')}")
-        if audio_info:
-            desc_parts.append(f"áudio {audio_info.get('codec_audio', '')}")
-        if duration > 0:
-            desc_parts.append(f"{duracao_formatada}")
-        if bitrate_mbps > 0:
-            desc_parts.append(f"{bitrate_mbps:.2f} Mbps")
-        
-        descricao_humana = ", ".join(desc_parts) if desc_parts else "Metadados de mídia disponíveis"
-        
-        return {
-            "duracao_segundos": round(duration, 3),
-            "duracao_formatada": duracao_formatada,
-            "bitrate_total_bps": bitrate,
-            "bitrate_total_mbps": round(bitrate_mbps, 2),
-            "compressao": compressao,
-            "tamanho_bytes": size,
-            **video_info,
-            **audio_info,
-            "descricao_humana": descricao_humana
-        }
+        return summarize_media_probe(json.loads(result.stdout))
         
     except subprocess.TimeoutExpired:
         logger.warning("Timeout ao extrair metadados com ffprobe")
@@ -430,427 +1185,3648 @@ def extract_media_metadata(file_path: str, content_type: str) -> Optional[Dict[s
         logger.warning(f"Erro ao extrair metadados: {e}")
         return None
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Endpoint para verificar se a API está funcionando"""
-    try:
-        # Verificar se as credenciais estão configuradas
-        if not SPACES_KEY or not SPACES_SECRET or not SPACES_BUCKET or not SPACES_REGION or not SPACES_ENDPOINT:
-            return jsonify({
-                "status": "unhealthy",
-                "timestamp": datetime.now().isoformat(),
-                "service": "upload-cdn-api",
-                "error": "Configurações do Spaces não completas"
-            }), 503
+def summarize_media_probe(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normaliza a saída do ffprobe (ou do media_probe, no mesmo formato) nos campos da API"""
+    # Extrair informações dos streams
+    video_stream = None
+    audio_stream = None
+    
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') == 'video' and not video_stream:
+            video_stream = stream
+        elif stream.get('codec_type') == 'audio' and not audio_stream:
+            audio_stream = stream
+    
+    # Extrair informações do formato
+    format_info = data.get('format', {})
+    duration = float(format_info.get('duration', 0))
+    bitrate = int(format_info.get('bit_rate', 0))
+    size = int(format_info.get('size', 0))
+    
+    # Processar informações de vídeo
+    video_info = {}
+    if video_stream:
+        width = int(video_stream.get('width', 0))
+        height = int(video_stream.get('height', 0))
+        codec = video_stream.get('codec_name', 'unknown')
+        fps_str = video_stream.get('r_frame_rate', '0/1')
         
-        # Tentar inicializar o cliente S3 para verificar conectividade
-        try:
-            test_client = get_s3_client()
-            # Fazer uma operação simples para verificar conectividade
-            # Usar head_bucket apenas se bucket estiver configurado como string
-            if isinstance(SPACES_BUCKET, str) and SPACES_BUCKET:
-                test_client.head_bucket(Bucket=SPACES_BUCKET)
-        except Exception as e:
-            logger.warning(f"Erro ao verificar conectividade com Spaces: {e}")
-            return jsonify({
-                "status": "unhealthy",
-                "timestamp": datetime.now().isoformat(),
-                "service": "upload-cdn-api",
-                "error": "Não foi possível conectar ao serviço de armazenamento",
-                "detail": str(e)
-            }), 503
+        # Calcular FPS
+        fps = 0
+        if '/' in fps_str:
+            num, den = map(int, fps_str.split('/'))
+            fps = num / den if den > 0 else 0
         
-        return jsonify({
-            "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
-            "service": "upload-cdn-api"
-        })
-    except Exception as e:
-        logger.error(f"Erro no health check: {e}")
-        return jsonify({
-            "status": "unhealthy",
-            "timestamp": datetime.now().isoformat(),
-            "service": "upload-cdn-api",
-            "error": "Erro interno no health check",
-            "detail": str(e)
-        }), 503
+        # Estimar número de frames
+        frames_estimated = int(duration * fps) if fps > 0 else 0
+        
+        video_info = {
+            "codec_video": codec,
+            "resolucao": f"{width}x{height}",
+            "largura": width,
+            "altura": height,
+            "fps": round(fps, 2),
+            "frames_estimados": frames_estimated,
+            "proporcao_aspecto": video_stream.get('display_aspect_ratio', ''),
+            "pixel_format": video_stream.get('pix_fmt', '')
+        }
+    
+    # Processar informações de áudio
+    audio_info = {}
+    if audio_stream:
+        audio_info = {
+            "codec_audio": audio_stream.get('codec_name', 'unknown'),
+            "sample_rate": int(audio_stream.get('sample_rate', 0)),
+            "canais": int(audio_stream.get('channels', 0)),
+            "bitrate_audio": int(audio_stream.get('bit_rate', 0))
+        }
+    
+    # Formatar duração
+    hours = int(duration // 3600)
+    minutes = int((duration % 3600) // 60)
+    seconds = int(duration % 60)
+    milliseconds = int((duration % 1) * 1000)
+    duracao_formatada = f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+    
+    # Determinar tipo de compressão (CBR/VBR)
+    compressao = "VBR"  # Padrão VBR
+    if bitrate > 0:
+        # Tentar determinar se é CBR verificando variação de bitrate
+        compressao = "CBR"  # Simplificado, pode ser melhorado
+    
+    # Calcular bitrate em Mbps
+    bitrate_mbps = (bitrate / 1000000) if bitrate > 0 else 0
+    
+    # Montar descrição humana
+    desc_parts = []
+    if video_info:
+        desc_parts.append(f"Vídeo {video_info.get('resolucao', '')} em {video_info.get('codec_video', '')}")
+    if audio_info:
+        desc_parts.append(f"áudio {audio_info.get('codec_audio', '')}")
+    if duration > 0:
+        desc_parts.append(f"{duracao_formatada}")
+    if bitrate_mbps > 0:
+        desc_parts.append(f"{bitrate_mbps:.2f} Mbps")
+    
+    descricao_humana = ", ".join(desc_parts) if desc_parts else "Metadados de mídia disponíveis"
+    
+    return {
+        "duracao_segundos": round(duration, 3),
+        "duracao_formatada": duracao_formatada,
+        "bitrate_total_bps": bitrate,
+        "bitrate_total_mbps": round(bitrate_mbps, 2),
+        "compressao": compressao,
+        "tamanho_bytes": size,
+        **video_info,
+        **audio_info,
+        "descricao_humana": descricao_humana
+    }
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
-    """Endpoint principal para upload de arquivos"""
-    # Timestamp de início da requisição
-    timestamp_inicio = datetime.now()
-    timestamp_inicio_iso = timestamp_inicio.isoformat()
-    timestamp_inicio_unix = time.time()
+class MediaMetadataCache:
+    """Cache dos metadados do ffprobe por conteúdo (SHA-256 calculado pelo servidor + tamanho).
     
-    try:
-        print("📤 Recebendo requisição de upload")
-        print(f"🔍 Content-Type: {request.content_type}")
-        print(f"🔍 Files keys: {list(request.files.keys())}")
-        logger.info("Recebendo requisição de upload")
-        
-        # Coletar informações da sessão/cliente
-        client_info = get_client_info()
-        
-        # Verificar se arquivo foi enviado
-        if 'file' not in request.files:
-            print("❌ Nenhum arquivo fornecido")
-            print(f"   Files disponíveis: {list(request.files.keys())}")
-            logger.warning("Tentativa de upload sem arquivo")
-            return jsonify({
-                "success": False,
-                "error": "Nenhum arquivo fornecido",
-                "detail": "É necessário enviar um arquivo no campo 'file' usando multipart/form-data"
-            }), 400
+    Camada em memória (LRU, por worker) e camada opcional em disco no banco de estado
+    compartilhado, que sobrevive à reciclagem dos workers (--max-requests).
+    """
+    
+    DISK_EVICT_EVERY = 100
+    
+    def __init__(self, max_entries: int, disk_enabled: bool, disk_max_entries: int):
+        self.max_entries = max_entries
+        self.disk_enabled = disk_enabled
+        self.disk_max_entries = disk_max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self._disk_inserts = 0
+    
+    @staticmethod
+    def key_for(content_hash: str, size: int) -> str:
+        return f"sha256:{content_hash}:{size}"
+    
+    def get(self, content_hash: Optional[str], size: int) -> Optional[Dict[str, Any]]:
+        """Retorna os metadados em cache ou None (contabilizando hit/miss)"""
+        if not content_hash:
+            return None
+        key = self.key_for(content_hash, size)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits_memoria += 1
+                return value
         
-        file = request.files['file']
+        if self.disk_enabled:
+            try:
+                row = get_state_db().execute("SELECT midia FROM media_cache WHERE chave = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao consultar cache de metadados em disco: {e}")
+                row = None
+            if row is not None:
+                value = json.loads(row["midia"])
+                with self._lock:
+                    self.hits_disco += 1
+                self._remember(key, value)
+                return value
         
-        # Verificar se arquivo tem nome
-        if not file or file.filename == '':
-            print("❌ Arquivo sem nome ou vazio")
-            logger.warning("Tentativa de upload com arquivo sem nome ou vazio")
-            return jsonify({
-                "success": False,
-                "error": "Arquivo sem nome ou vazio",
-                "detail": "O arquivo enviado não possui nome ou está vazio. Verifique se o arquivo foi selecionado corretamente."
-            }), 400
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def put(self, content_hash: Optional[str], size: int, value: Optional[Dict[str, Any]]) -> None:
+        """Guarda metadados extraídos com sucesso (falhas não são cacheadas)"""
+        if not content_hash or not value:
+            return
+        key = self.key_for(content_hash, size)
+        self._remember(key, value)
+        if self.disk_enabled:
+            try:
+                db = get_state_db()
+                db.execute(
+                    "INSERT OR REPLACE INTO media_cache (chave, midia, criado_em) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), time.time())
+                )
+                with self._lock:
+                    self._disk_inserts += 1
+                    evict = self._disk_inserts % self.DISK_EVICT_EVERY == 0
+                # Manter a camada em disco limitada, descartando as entradas mais antigas em lote
+                # (a cada DISK_EVICT_EVERY inserções do worker, não a cada uma)
+                if evict:
+                    db.execute(
+                        "DELETE FROM media_cache WHERE chave IN (SELECT chave FROM media_cache ORDER BY criado_em DESC LIMIT -1 OFFSET ?)",
+                        (self.disk_max_entries,)
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao gravar cache de metadados em disco: {e}")
+    
+    def _remember(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Contadores do cache (por worker)"""
+        with self._lock:
+            total = self.hits_memoria + self.hits_disco + self.misses
+            return {
+                "entradas_memoria": len(self._entries),
+                "hits_memoria": self.hits_memoria,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "taxa_acerto": round((self.hits_memoria + self.hits_disco) / total, 4) if total else None,
+                "disco_ativo": self.disk_enabled,
+            }
+
+media_metadata_cache = MediaMetadataCache(MEDIA_CACHE_SIZE, MEDIA_CACHE_DISK, MEDIA_CACHE_DISK_MAX_ENTRIES)
+
+# Raiz do host (ex.: http://localhost:5000) para threads sem contexto da requisição (itens do lote)
+_host_root: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("upload_cdn_host_root", default=None)
+
+def request_host_root() -> Optional[str]:
+    """Raiz do host da requisição atual (ou a informada à thread por process_file_upload)"""
+    if has_request_context():
+        return request.host_url.rstrip('/')
+    return _host_root.get()
+
+def absolute_url(url: str) -> str:
+    """Completa URLs relativas do backend local com o host da requisição atual"""
+    if url.startswith('/'):
+        host_root = request_host_root()
+        if host_root:
+            return host_root + url
+    return url
+
+def build_public_url(s3_key: str) -> str:
+    """Monta a URL pública de um objeto (STORAGE_PUBLIC_BASE_URL ou padrão do backend)"""
+    return absolute_url(storage_backend.public_url(s3_key))
+
+def s3_client_error_response(e: Exception) -> Tuple[Dict[str, Any], int]:
+    """Converte falhas de inicialização do cliente S3 em resposta de erro"""
+    metrics.set_error_code("ClienteS3Indisponivel")
+    if isinstance(e, ValueError):
+        # Credenciais não configuradas
+        print(f"❌ Erro de configuração: {e}")
+        logger.error(f"Credenciais não configuradas: {e}")
+        return {
+            "success": False,
+            "error": "Credenciais do Spaces não configuradas",
+            "detail": "As variáveis de ambiente SPACES_KEY e SPACES_SECRET não estão configuradas corretamente."
+        }, 503
+    # Outros erros de inicialização
+    print(f"❌ Erro ao inicializar cliente S3: {e}")
+    logger.error(f"Erro ao inicializar cliente S3: {e}")
+    return {
+        "success": False,
+        "error": "Erro ao conectar ao serviço de armazenamento",
+        "detail": "Não foi possível inicializar a conexão com o DigitalOcean Spaces. Verifique as configurações."
+    }, 503
+
+def storage_error_response(e: Exception) -> Tuple[Dict[str, Any], int]:
+    """Converte erros do upload para o Spaces em resposta de erro"""
+    if isinstance(e, botocore.exceptions.ClientError):
+        # Erros específicos do boto3/S3
+        error_code = e.response.get('Error', {}).get('Code', 'Unknown')
+        metrics.set_error_code(error_code)
+        print(f"❌ Erro no upload para Spaces: {error_code} - {e}")
+        logger.error(f"Erro no upload para Spaces: {error_code} - {e}")
         
-        # Verificar se tipo de arquivo é permitido
-        if not allowed_file(file.filename):
-            print(f"❌ Tipo de arquivo não permitido: {file.filename}")
-            logger.warning(f"Tentativa de upload com tipo não permitido: {file.filename}")
-            return jsonify({
+        if error_code in ['NoSuchBucket', 'AccessDenied', 'InvalidAccessKeyId']:
+            return {
                 "success": False,
-                "error": f"Tipo de arquivo não permitido. Tipos aceitos: {', '.join(sorted(ALLOWED_EXTENSIONS))}",
-                "detail": "O arquivo enviado não está em um formato suportado. Use apenas os tipos listados."
-            }), 400
-        
-        print(f"✅ Arquivo válido: {file.filename}")
-        
-        # Capturar o tamanho real do arquivo
-        file.stream.seek(0, 2)  # Ir até o final do arquivo
-        size = file.stream.tell()
-        file.stream.seek(0)     # Voltar para o começo
-        
-        # Verificar tamanho do arquivo manualmente (backup caso o Flask não capture)
-        max_size_bytes = max_content_length_mb * 1024 * 1024
-        if size > max_size_bytes:
-            print(f"❌ Arquivo muito grande: {size} bytes (limite: {max_size_bytes} bytes)")
-            logger.warning(f"Arquivo excede tamanho máximo: {size} bytes")
-            return jsonify({
+                "error": "Erro de configuração do serviço de armazenamento",
+                "detail": f"Não foi possível acessar o bucket. Verifique as credenciais e configurações. Código do erro: {error_code}"
+            }, 503
+        if error_code in ['BadDigest', 'InvalidDigest', 'XAmzContentSHA256Mismatch']:
+            # O armazenamento recusou o PUT: o conteúdo recebido não confere com o digest enviado
+            return {
                 "success": False,
-                "error": "Arquivo muito grande",
-                "detail": f"O tamanho do arquivo excede o limite máximo permitido. Tamanho máximo configurado: {max_content_length_mb}MB. Tamanho do arquivo enviado: {size / 1024 / 1024:.2f}MB"
-            }), 413
-        
-        # Capturar parâmetro de diretório (opcional)
-        folder_param = request.form.get('folder') or request.args.get('folder')
+                "error": "Falha na verificação de integridade do armazenamento",
+                "detail": f"O conteúdo gravado não confere com o checksum calculado pela API; nada foi publicado. Tente novamente. Código do erro: {error_code}"
+            }, 503
+        return {
+            "success": False,
+            "error": "Erro ao fazer upload para o serviço de armazenamento",
+            "detail": f"Ocorreu um erro ao tentar fazer upload do arquivo. Tente novamente em alguns instantes. Código do erro: {error_code}"
+        }, 503
+    if isinstance(e, (storage.StorageError, OSError)):
+        # Backend local: disco cheio, sem permissão, parte inválida...
+        error_code = e.code if isinstance(e, storage.StorageError) else errno.errorcode.get(e.errno, type(e).__name__)
+        metrics.set_error_code(error_code)
+        print(f"❌ Erro no armazenamento: {error_code} - {e}")
+        logger.error(f"Erro no armazenamento: {error_code} - {e}")
+        return {
+            "success": False,
+            "error": "Erro ao gravar no serviço de armazenamento",
+            "detail": f"Não foi possível gravar o arquivo. Tente novamente em alguns instantes. Código do erro: {error_code}"
+        }, 503
+    metrics.set_error_code(type(e).__name__)
+    if isinstance(e, botocore.exceptions.EndpointConnectionError):
+        # Erro de conexão com o endpoint
+        print(f"❌ Erro de conexão com Spaces: {e}")
+        logger.error(f"Erro de conexão com Spaces: {e}")
+        return {
+            "success": False,
+            "error": "Serviço de armazenamento temporariamente indisponível",
+            "detail": "Não foi possível conectar ao DigitalOcean Spaces. Tente novamente em alguns instantes."
+        }, 503
+    # Outros erros de upload
+    print(f"❌ Erro inesperado no upload: {e}")
+    logger.error(f"Erro inesperado no upload: {e}")
+    return {
+        "success": False,
+        "error": "Erro ao fazer upload do arquivo",
+        "detail": f"Ocorreu um erro inesperado durante o upload. Tente novamente ou entre em contato com o suporte se o problema persistir."
+    }, 500
+
+def build_upload_response(
+    unique_filename: str,
+    original_filename: str,
+    file_hash: Optional[str],
+    size: int,
+    content_type: Optional[str],
+    file_extension: str,
+    file_category: Dict[str, Any],
+    target_folder: str,
+    s3_key: str,
+    media_metadata: Optional[Dict[str, Any]],
+    client_info: Dict[str, Any],
+    timestamp_inicio_iso: str,
+    timestamp_inicio_unix: float,
+    timestamp_upload_inicio: float,
+    timestamp_upload_fim: float,
+    transfer_plan: Optional[Dict[str, Any]] = None,
+    hashes: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Monta a resposta enriquecida de um upload concluído (também usada como callback JSON).
+    
+    hashes: digests além do MD5 ({"hash_sha256": ...}), incluídos ao lado de hash_md5.
+    """
+    timestamp_fim_iso = datetime.now().isoformat()
+    
+    # Calcular duração total e do upload
+    duracao_total_segundos = timestamp_upload_fim - timestamp_inicio_unix
+    duracao_upload_segundos = timestamp_upload_fim - timestamp_upload_inicio
+    
+    # Calcular velocidade de upload (bytes por segundo e Mbps)
+    velocidade_bytes_por_segundo = size / duracao_upload_segundos if duracao_upload_segundos > 0 else 0
+    velocidade_mbps = (velocidade_bytes_por_segundo * 8) / (1024 * 1024)  # Converter para Mbps
+    
+    # Formatação de durações
+    duracao_total_info = format_duration_human(duracao_total_segundos)
+    duracao_upload_info = format_duration_human(duracao_upload_segundos)
+    
+    size_info = format_size_human(size)
+    
+    # URL pública do arquivo
+    file_url = build_public_url(s3_key)
+    
+    upload_data = {
+        "timestamp_inicio": timestamp_inicio_iso,
+        "timestamp_inicio_unix": timestamp_inicio_unix,
+        "timestamp_fim": timestamp_fim_iso,
+        "timestamp_fim_unix": timestamp_upload_fim,
+        "duracao_total": duracao_total_info,
+        "duracao_upload": duracao_upload_info,
+        "velocidade_bytes_por_segundo": round(velocidade_bytes_por_segundo, 2),
+        "velocidade_mbps": round(velocidade_mbps, 2),
+        "velocidade_formatted": f"{round(velocidade_mbps, 2)} Mbps",
+        "status": "concluido",
+        "armazenamento": STORAGE_BACKEND,
+        "bucket": SPACES_BUCKET,
+        "regiao": SPACES_REGION,
+        "endpoint": SPACES_ENDPOINT,
+        "descricao_humana": f"Upload concluído em {duracao_upload_info['descricao_humana']} com velocidade média de {round(velocidade_mbps, 2)} Mbps"
+    }
+    
+    # Parâmetros do multipart usados na transferência
+    if transfer_plan:
+        upload_data["transferencia"] = transfer_plan
+    
+    # Montar resposta enriquecida
+    arquivo_data = {
+        "id": unique_filename,
+        "nome_original": original_filename,
+        "nome_armazenado": unique_filename,
+        "hash_md5": file_hash,
+        **(hashes or {}),
+        "tamanho": size_info,
+        "tipo_mime": content_type or 'application/octet-stream',
+        "extensao": file_extension,
+        "categoria": file_category,
+        "diretorio": target_folder,
+        "caminho_completo": s3_key,
+        "url_publica": file_url,
+        "url_cdn": file_url,
+        "descricao_humana": f"Arquivo {file_category['categoria_descricao'].lower()} '{original_filename}' ({size_info['descricao_humana']})"
+    }
+    
+    # Adicionar metadados de mídia se disponíveis
+    if media_metadata:
+        arquivo_data["midia"] = media_metadata
+    
+    return {
+        "success": True,
+        "arquivo": arquivo_data,
+        "sessao": {
+            "id_sessao": str(uuid.uuid4()),
+            "ip_cliente": client_info["ip"],
+            "ip_original": client_info["ip_original"],
+            "user_agent": client_info["user_agent"],
+            "referer": client_info["referer"],
+            "idioma_preferido": client_info["accept_language"],
+            "headers": client_info["headers"],
+            "descricao_humana": f"Requisição de {client_info['ip']} via {client_info['user_agent'][:50]}..."
+        },
+        "upload": upload_data,
+        "analytics": {
+            "id_transacao": str(uuid.uuid4()),
+            "timestamp_processamento": datetime.now().isoformat(),
+            "tamanho_bytes": size,
+            "tamanho_mb": round(size_info["megabytes"], 4),
+            "duracao_segundos": round(duracao_total_segundos, 3),
+            "velocidade_mbps": round(velocidade_mbps, 4),
+            "categoria_arquivo": file_category["categoria"],
+            "tipo_midia": file_category["tipo_midia"],
+            "hash_arquivo": file_hash,
+            "ip_cliente": client_info["ip"],
+            "diretorio": target_folder,
+            "metrica_performance": {
+                "tempo_processamento_ms": round(duracao_total_segundos * 1000, 2),
+                "tempo_upload_ms": round(duracao_upload_segundos * 1000, 2),
+                "throughput_bytes_per_sec": round(velocidade_bytes_por_segundo, 2),
+                "throughput_mbps": round(velocidade_mbps, 4)
+            }
+        },
+        # Campos legados para compatibilidade
+        "url": file_url,
+        "filename": unique_filename,
+        "original_filename": original_filename,
+        "size": size,
+        "content_type": content_type
+    }
+
+def callback_json_key_for(target_folder: str, unique_filename: str) -> str:
+    """Chave do callback JSON: mesmo diretório e mesmo nome base do arquivo"""
+    return f"{target_folder}/{unique_filename.rsplit('.', 1)[0]}.json" if target_folder else f"{unique_filename.rsplit('.', 1)[0]}.json"
+
+def dumps_json(payload: Any) -> bytes:
+    """JSON compacto em UTF-8: orjson quando ativo (JSON_ENCODER), senão o json da biblioteca padrão"""
+    if USE_ORJSON:
+        try:
+            return orjson.dumps(payload)
+        except TypeError:
+            # Tipos que o orjson não serializa (ex.: inteiros acima de 64 bits)
+            pass
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """jsonify com orjson: corpo compacto, sem ordenar as chaves nem escapar caracteres não ASCII"""
+
+    def response(self, *args, **kwargs) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_json(obj), mimetype=self.mimetype)
+
+if USE_ORJSON:
+    app.json = OrjsonJSONProvider(app)
+
+def serialize_callback_json(response_data: Dict[str, Any]) -> bytes:
+    """Corpo do callback JSON gravado ao lado do arquivo (compacto, sem indentação)"""
+    return dumps_json(response_data)
+
+def response_fields_requested(fields_param: Optional[str] = None, profile_param: Optional[str] = None) -> Optional[Tuple[str, ...]]:
+    """Campos pedidos para a resposta de upload: ?fields= (caminhos separados por vírgula,
+    ex.: arquivo.url_publica,callback_url) ou ?profile= (RESPONSE_PROFILES).
+    
+    None significa resposta completa. Perfil desconhecido levanta ValueError.
+    """
+    if has_request_context():
+        if fields_param is None:
+            fields_param = request.args.get('fields')
+        if profile_param is None:
+            profile_param = request.args.get('profile')
+    if fields_param:
+        return tuple(field.strip() for field in fields_param.split(',') if field.strip()) or None
+    profile = (profile_param or RESPONSE_PROFILE).strip().lower()
+    if profile not in RESPONSE_PROFILES:
+        raise ValueError(f"Perfis disponíveis: {', '.join(sorted(RESPONSE_PROFILES))}")
+    return RESPONSE_PROFILES[profile]
+
+def response_profile_error(profile_param: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], int]]:
+    """Valida ?profile= antes de ler o corpo da requisição"""
+    try:
+        response_fields_requested(profile_param=profile_param)
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": "Perfil de resposta inválido",
+            "detail": str(e)
+        }, 400
+    return None
+
+def select_response_fields(payload: Dict[str, Any], fields: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    """Recorte da resposta: só os caminhos pedidos, mantendo o aninhamento, mais 'success'.
+    
+    Respostas de erro saem completas; caminhos inexistentes são ignorados.
+    """
+    if fields is None or not payload.get("success"):
+        return payload
+    selected: Dict[str, Any] = {"success": payload["success"]}
+    for path in fields:
+        *parents, leaf = path.split('.')
+        source = payload
+        for part in parents:
+            source = source.get(part) if isinstance(source, dict) else None
+        if not isinstance(source, dict) or leaf not in source:
+            continue
+        target = selected
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = source[leaf]
+    return selected
+
+def upload_json_response(payload: Dict[str, Any], status_code: int = 200):
+    """Resposta de upload com o recorte pedido (métricas e callback JSON usam a resposta completa)"""
+    observation = metrics.current_upload()
+    if observation is not None:
+        observation.finish(status_code, payload)
+    return jsonify(select_response_fields(payload, response_fields_requested())), status_code
+
+class CallbackJsonWriter:
+    """Gravação do callback JSON em segundo plano (CALLBACK_JSON_MODE=async), por worker.
+    
+    Até CALLBACK_JSON_QUEUE_MAX gravações aguardam CALLBACK_JSON_WORKERS threads, com
+    retentativas e backoff com jitter. Gravações da mesma chave são serializadas e agrupadas:
+    se o job de metadados regrava o callback antes de a primeira versão sair, só a mais
+    recente é enviada. Com a fila cheia a requisição grava o callback ela mesma.
+    """
+    
+    def __init__(self, workers: int, queue_max: int, max_attempts: int):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[storage.StorageBackend, bytes]] = {}
+        self._in_flight = set()
+        self._executor = None
+        self._pid = None
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Threads não atravessam o fork: cada worker cria o seu pool (chamado com o lock)
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="callback-json")
+            self._pid = os.getpid()
+            self._pending = {}
+            self._in_flight = set()
+        return self._executor
+    
+    def submit(self, backend: storage.StorageBackend, key: str, body: bytes) -> bool:
+        """Agenda a gravação; False com a fila cheia (o chamador grava de forma síncrona)"""
+        with self._lock:
+            executor = self._get_executor()
+            if key in self._pending:
+                self._pending[key] = (backend, body)
+                metrics.record_callback_write("agrupado")
+                return True
+            if len(self._pending) >= self.queue_max:
+                return False
+            self._pending[key] = (backend, body)
+            metrics.CALLBACK_JSON_PENDING.inc()
+            if key in self._in_flight:
+                # A thread que está gravando esta chave envia a versão nova em seguida
+                return True
+            self._in_flight.add(key)
+        executor.submit(self._drain, key)
+        return True
+    
+    def _drain(self, key: str) -> None:
+        while True:
+            with self._lock:
+                item = self._pending.pop(key, None)
+                if item is None:
+                    self._in_flight.discard(key)
+                    return
+            metrics.CALLBACK_JSON_PENDING.dec()
+            self._write(key, *item)
+    
+    def _write(self, key: str, backend: storage.StorageBackend, body: bytes) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with metrics.stage("callback_json"):
+                    backend.put_object(key, body, 'application/json')
+                metrics.record_callback_write("sucesso")
+                logger.info(f"Callback JSON salvo em segundo plano: {key}")
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    metrics.record_callback_write("erro")
+                    print(f"⚠️ Aviso: Não foi possível salvar callback JSON {key}: {e}")
+                    logger.error(f"Erro ao salvar callback JSON {key} após {attempt} tentativa(s): {e}")
+                    return
+                logger.warning(f"Erro ao salvar callback JSON {key} (tentativa {attempt}): {e}")
+                time.sleep(random.uniform(0, min(5.0, 0.2 * 2 ** attempt)))
+    
+    def flush(self, timeout: float = 10) -> bool:
+        """Espera as gravações pendentes terminarem (encerramento do worker)"""
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            with self._lock:
+                if not self._in_flight or self._pid != os.getpid():
+                    return True
+            time.sleep(0.05)
+        logger.warning(f"Callbacks JSON ainda pendentes após {timeout}s: {len(self._in_flight)}")
+        return False
+
+callback_json_writer = CallbackJsonWriter(CALLBACK_JSON_WORKERS, CALLBACK_JSON_QUEUE_MAX, CALLBACK_JSON_MAX_ATTEMPTS)
+
+def save_callback_json(backend: storage.StorageBackend, response_data: Dict[str, Any], target_folder: str, unique_filename: str) -> None:
+    """Salva o callback JSON no mesmo diretório do arquivo e adiciona callback_url na resposta.
+    
+    No modo async a URL (determinística) é devolvida antes de o objeto existir no armazenamento.
+    """
+    if CALLBACK_JSON_MODE == 'off':
+        return
+    callback_json_key = callback_json_key_for(target_folder, unique_filename)
+    callback_json_url = build_public_url(callback_json_key)
+    
+    try:
+        body = serialize_callback_json(response_data)
+        if CALLBACK_JSON_MODE == 'async' and callback_json_writer.submit(backend, callback_json_key, body):
+            response_data["callback_url"] = callback_json_url
+            return
+        if CALLBACK_JSON_MODE == 'async':
+            metrics.record_callback_write("sincrono_fila_cheia")
+        
+        # Upload do JSON (poucos KB: um único PUT)
+        with metrics.stage("callback_json"):
+            backend.put_object(callback_json_key, body, 'application/json')
+        
+        print(f"✅ Callback JSON salvo: {callback_json_url}")
+        logger.info(f"Callback JSON salvo: {callback_json_url}")
+        
+        # Adicionar URL do callback na resposta
+        response_data["callback_url"] = callback_json_url
+        
+    except Exception as e:
+        logger.warning(f"Erro ao salvar callback JSON: {e}")
+        print(f"⚠️ Aviso: Não foi possível salvar callback JSON: {e}")
+        # Continuar mesmo se falhar o salvamento do JSON
+
+def dedup_requested(param: Optional[str] = None) -> bool:
+    """Decide se a deduplicação vale para a requisição (DEDUP_MODE e opt-out via ?dedup=false)"""
+    if DEDUP_MODE == 'off':
+        return False
+    if param is None and has_request_context():
+        param = request.args.get('dedup')
+    return param is None or param.strip().lower() in TRUTHY_VALUES
+
+def response_content_hash(response_data: Dict[str, Any]) -> Optional[str]:
+    """SHA-256 calculado pelo servidor sobre o corpo recebido (chave da deduplicação e do cache de metadados)"""
+    return response_data["arquivo"].get("hash_sha256")
+
+def dedup_lookup(content_hash: str, size: int) -> Optional[Dict[str, Any]]:
+    """Procura um objeto já enviado com o mesmo conteúdo"""
+    try:
+        row = get_state_db().execute(
+            "SELECT * FROM dedup_content WHERE hash_sha256 = ? AND tamanho = ?",
+            (content_hash, size)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao consultar índice de deduplicação: {e}")
+        return None
+    if row is None:
+        return None
+    entry = dict(row)
+    entry["midia"] = json.loads(entry["midia"]) if entry["midia"] else None
+    return entry
+
+def dedup_register(content_hash: Optional[str], size: int, s3_key: str, content_type: Optional[str], media_metadata: Optional[Dict[str, Any]]) -> None:
+    """Registra um objeto recém-enviado no índice de deduplicação (mantém o primeiro)"""
+    if DEDUP_MODE == 'off' or not content_hash:
+        return
+    try:
+        get_state_db().execute(
+            "INSERT OR IGNORE INTO dedup_content (hash_sha256, tamanho, s3_key, content_type, midia, criado_em) VALUES (?, ?, ?, ?, ?, ?)",
+            (content_hash, size, s3_key, content_type, json.dumps(media_metadata, ensure_ascii=False) if media_metadata else None, time.time())
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao registrar no índice de deduplicação: {e}")
+
+def dedup_update_media(content_hash: Optional[str], size: int, media_metadata: Optional[Dict[str, Any]]) -> None:
+    """Completa os metadados de mídia de uma entrada registrada antes da extração"""
+    if DEDUP_MODE == 'off' or not content_hash or not media_metadata:
+        return
+    try:
+        get_state_db().execute(
+            "UPDATE dedup_content SET midia = ? WHERE hash_sha256 = ? AND tamanho = ? AND midia IS NULL",
+            (json.dumps(media_metadata, ensure_ascii=False), content_hash, size)
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao atualizar índice de deduplicação: {e}")
+
+def dedup_forget(content_hash: str, size: int) -> None:
+    """Remove do índice uma entrada cujo objeto não existe mais"""
+    try:
+        get_state_db().execute("DELETE FROM dedup_content WHERE hash_sha256 = ? AND tamanho = ?", (content_hash, size))
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao remover entrada do índice de deduplicação: {e}")
+
+def catalog_register(response_data: Dict[str, Any]) -> None:
+    """Grava (ou atualiza, após o job de metadados) o upload no catálogo consultado por GET /files"""
+    if not CATALOG_ENABLED:
+        return
+    arquivo = response_data["arquivo"]
+    now = time.time()
+    try:
+        get_state_db().execute(
+            """INSERT INTO upload_catalog (
+                id, arquivo_id, s3_key, diretorio, nome_original, hash_md5, tamanho, content_type, categoria,
+                ip_cliente, url, callback_url, deduplicado, resposta, criado_em, atualizado_em
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                callback_url = excluded.callback_url, resposta = excluded.resposta, atualizado_em = excluded.atualizado_em""",
+            (
+                response_data["analytics"]["id_transacao"],
+                arquivo["id"],
+                arquivo["caminho_completo"],
+                arquivo["diretorio"],
+                arquivo["nome_original"],
+                arquivo["hash_md5"],
+                arquivo["tamanho"]["bytes"],
+                arquivo["tipo_mime"],
+                arquivo["categoria"]["categoria"],
+                response_data["sessao"]["ip_cliente"],
+                arquivo["url_publica"],
+                response_data.get("callback_url"),
+                1 if response_data["upload"].get("deduplicacao") else 0,
+                dumps_json(response_data).decode('utf-8'),
+                now,
+                now,
+            )
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao registrar upload no catálogo: {e}")
+
+def catalog_entry(row: sqlite3.Row) -> Dict[str, Any]:
+    """Resumo de um upload do catálogo (itens de GET /files)"""
+    return {
+        "id": row["id"],
+        "arquivo_id": row["arquivo_id"],
+        "nome_original": row["nome_original"],
+        "diretorio": row["diretorio"],
+        "caminho_completo": row["s3_key"],
+        "url_publica": row["url"],
+        "callback_url": row["callback_url"],
+        "hash_md5": row["hash_md5"],
+        "tamanho_bytes": row["tamanho"],
+        "tipo_mime": row["content_type"],
+        "categoria": row["categoria"],
+        "ip_cliente": row["ip_cliente"],
+        "deduplicado": bool(row["deduplicado"]),
+        "criado_em": datetime.fromtimestamp(row["criado_em"]).isoformat(),
+    }
+
+def _parse_catalog_time(value: Optional[str]) -> Optional[float]:
+    """Timestamp Unix ou data ISO 8601 (ex.: 2024-05-01 ou 2024-05-01T12:00:00)"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def serve_dedup_hit(
+    backend: storage.StorageBackend,
+    file_hash: str,
+    content_hash: str,
+    size: int,
+    target: Dict[str, Any],
+    file_category: Dict[str, Any],
+    client_info: Dict[str, Any],
+    timestamp_inicio_iso: str,
+    timestamp_inicio_unix: float,
+    hashes: Optional[Dict[str, str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Atende o upload a partir de um objeto idêntico já existente, sem transferência nem ffprobe.
+    
+    content_hash é o SHA-256 calculado pelo servidor sobre o corpo recebido (nunca um valor
+    declarado pelo cliente: quem só conhece o hash não obtém o conteúdo de outro upload).
+    Retorna a resposta enriquecida ou None se não houver objeto válido no índice.
+    """
+    entry = dedup_lookup(content_hash, size)
+    if entry is None:
+        return None
+    
+    # Confirmar que o objeto ainda existe antes de apontar para ele
+    try:
+        backend.head(entry["s3_key"])
+    except storage.NotFoundError:
+        dedup_forget(content_hash, size)
+        return None
+    
+    timestamp_upload_inicio = time.time()
+    if DEDUP_MODE == 'reuse':
+        s3_key = entry["s3_key"]
+        unique_filename = s3_key.rsplit('/', 1)[-1]
+        target_folder = s3_key.rsplit('/', 1)[0] if '/' in s3_key else ''
+    else:
+        s3_key = target["s3_key"]
+        unique_filename = target["unique_filename"]
+        target_folder = target["target_folder"]
+        # Cópia feita dentro do armazenamento: nenhum byte passa pelo worker
+        backend.copy(entry["s3_key"], s3_key, target["content_type"] or entry["content_type"] or 'application/octet-stream')
+    
+    try:
+        get_state_db().execute(
+            "UPDATE dedup_content SET hits = hits + 1, ultimo_hit_em = ? WHERE hash_sha256 = ? AND tamanho = ?",
+            (time.time(), content_hash, size)
+        )
+    except sqlite3.Error as e:
+        # O objeto já foi copiado/reaproveitado: só a estatística de hits fica sem atualizar
+        logger.warning(f"Erro ao contabilizar hit no índice de deduplicação: {e}")
+    
+    response_data = build_upload_response(
+        unique_filename=unique_filename,
+        original_filename=target["original_filename"],
+        file_hash=file_hash,
+        size=size,
+        content_type=target["content_type"],
+        file_extension=target["file_extension"],
+        file_category=file_category,
+        target_folder=target_folder,
+        s3_key=s3_key,
+        media_metadata=entry["midia"],
+        client_info=client_info,
+        timestamp_inicio_iso=timestamp_inicio_iso,
+        timestamp_inicio_unix=timestamp_inicio_unix,
+        timestamp_upload_inicio=timestamp_upload_inicio,
+        timestamp_upload_fim=time.time(),
+        hashes=hashes,
+    )
+    response_data["upload"]["deduplicacao"] = {
+        "hit": True,
+        "modo": DEDUP_MODE,
+        "objeto_original": entry["s3_key"],
+        "descricao_humana": "Conteúdo idêntico já armazenado; transferência e extração de metadados ignoradas"
+    }
+    
+    if DEDUP_MODE == 'reuse':
+        # Callback próprio, com o nome reservado para este upload: o do objeto original traz a
+        # sessão e o IP de outro cliente
+        save_callback_json(backend, response_data, target["target_folder"], target["unique_filename"])
+    else:
+        save_callback_json(backend, response_data, target_folder, unique_filename)
+    catalog_register(response_data)
+    
+    print(f"♻️ Upload deduplicado ({DEDUP_MODE}): {entry['s3_key']} -> {s3_key}")
+    logger.info(f"Upload deduplicado ({DEDUP_MODE}): {entry['s3_key']} -> {s3_key}")
+    return response_data
+
+_media_job_executor = None
+_media_job_executor_pid = None
+_media_job_executor_lock = threading.Lock()
+_media_job_slots = threading.BoundedSemaphore(MEDIA_JOB_QUEUE_MAX)
+
+def async_metadata_requested(param: Optional[str] = None) -> bool:
+    """Decide se os metadados de mídia serão extraídos em segundo plano (?async_metadata=)"""
+    if param is None and has_request_context():
+        param = request.args.get('async_metadata')
+    if param is None:
+        return MEDIA_METADATA_ASYNC
+    return param.strip().lower() in TRUTHY_VALUES
+
+def _get_media_job_executor() -> ThreadPoolExecutor:
+    # Threads não atravessam o fork: cada worker cria o seu pool, mesmo que o processo
+    # mestre (--preload) já tenha criado um antes de fazer o fork
+    global _media_job_executor, _media_job_executor_pid
+    with _media_job_executor_lock:
+        if _media_job_executor is None or _media_job_executor_pid != os.getpid():
+            _media_job_executor = ThreadPoolExecutor(max_workers=MEDIA_JOB_WORKERS, thread_name_prefix="media-job")
+            _media_job_executor_pid = os.getpid()
+        return _media_job_executor
+
+def _update_media_job(job_id: str, status: str, midia: Optional[Dict[str, Any]] = None, erro: Optional[str] = None) -> None:
+    try:
+        get_state_db().execute(
+            "UPDATE media_jobs SET status = ?, midia = ?, erro = ?, atualizado_em = ? WHERE id = ?",
+            (status, json.dumps(midia, ensure_ascii=False) if midia else None, erro, time.time(), job_id)
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao atualizar job de metadados {job_id}: {e}")
+
+def reserve_media_job(response_data: Dict[str, Any], target_folder: str, unique_filename: str, s3_key: str) -> Optional[str]:
+    """Reserva uma vaga na fila e registra o job como pendente, anotando midia_job na resposta.
+    
+    Retorna None quando a fila está cheia; nesse caso o chamador extrai de forma síncrona.
+    O job só é iniciado por start_media_job, depois que o callback JSON inicial foi gravado,
+    para que a regravação com o bloco midia nunca seja sobrescrita pela versão inicial.
+    """
+    if not _media_job_slots.acquire(blocking=False):
+        logger.warning("Fila de jobs de metadados cheia; extraindo de forma síncrona")
+        return None
+    
+    job_id = str(uuid.uuid4())
+    now = time.time()
+    try:
+        get_state_db().execute(
+            "INSERT INTO media_jobs (id, status, s3_key, callback_key, criado_em, atualizado_em) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, "pendente", s3_key, callback_json_key_for(target_folder, unique_filename) if CALLBACK_JSON_MODE != 'off' else None, now, now)
+        )
+    except sqlite3.Error as e:
+        _media_job_slots.release()
+        logger.warning(f"Erro ao registrar job de metadados: {e}")
+        return None
+    
+    response_data["midia_job"] = {"id": job_id, "status": "pendente", "status_url": f"/jobs/{job_id}"}
+    return job_id
+
+def start_media_job(
+    job_id: str,
+    backend: storage.StorageBackend,
+    response_data: Dict[str, Any],
+    target_folder: str,
+    unique_filename: str,
+    s3_key: str,
+    content_type: str,
+    size: int,
+    source=None,
+) -> None:
+    """Inicia no pool em segundo plano um job reservado por reserve_media_job.
+    
+    source pode ser o spool local (o job assume a posse e o remove ao terminar) ou as
+    janelas de cabeçalho do streaming; sem source, os cabeçalhos são lidos do bucket.
+    """
+    try:
+        # O job trabalha sobre uma cópia para não alterar a resposta HTTP em serialização
+        _get_media_job_executor().submit(
+            _run_media_job, job_id, backend, copy.deepcopy(response_data), target_folder, unique_filename,
+            s3_key, content_type, size, source
+        )
+    except Exception as e:
+        logger.error(f"Erro ao iniciar job de metadados {job_id}: {e}")
+        _update_media_job(job_id, "erro", erro=str(e))
+        if isinstance(source, str) and os.path.exists(source):
+            os.unlink(source)
+        _media_job_slots.release()
+        return
+    
+    print(f"🕒 Job de metadados agendado: {job_id} ({s3_key})")
+    logger.info(f"Job de metadados agendado: {job_id} ({s3_key})")
+
+def local_media_job_source(stream, size: int, file_extension: str):
+    """Fonte local do job de metadados no upload tradicional, como no streaming: janelas de
+    início/fim lidas do arquivo recebido ou, com MEDIA_PROBE_ENGINE=ffprobe, uma cópia em
+    arquivo temporário (o job assume a posse). Evita baixar de volta o objeto recém-enviado.
+    """
+    if MEDIA_PROBE_ENGINE == "ffprobe":
+        temp_fd, temp_file_path = tempfile.mkstemp(suffix=f".{file_extension}")
+        try:
+            with os.fdopen(temp_fd, 'wb') as temp_file:
+                stream.seek(0)
+                shutil.copyfileobj(stream, temp_file, STREAM_READ_CHUNK_BYTES)
+        except Exception:
+            os.unlink(temp_file_path)
+            raise
+        return temp_file_path
+    stream.seek(0)
+    head = stream.read(MEDIA_PROBE_HEAD_BYTES)
+    stream.seek(max(size - MEDIA_PROBE_TAIL_BYTES, 0))
+    tail = stream.read(MEDIA_PROBE_TAIL_BYTES)
+    return media_probe.WindowSource(head, tail, size)
+
+def _run_media_job(job_id, backend, response_data, target_folder, unique_filename, s3_key, content_type, size, source) -> None:
+    """Extrai os metadados em segundo plano e regrava o callback JSON com o bloco midia"""
+    try:
+        _update_media_job(job_id, "processando")
+        
+        # Sem fonte local, os cabeçalhos (ou o ffprobe) são lidos do armazenamento (URL assinada no S3)
+        object_url = lambda: backend.read_url(s3_key)
+        media_metadata = extract_media_metadata(source or object_url(), content_type, ffprobe_source=object_url)
+        status = "concluido" if media_metadata else "sem_metadados"
+        
+        if media_metadata:
+            media_metadata_cache.put(response_content_hash(response_data), size, media_metadata)
+            dedup_update_media(response_content_hash(response_data), size, media_metadata)
+            response_data["arquivo"]["midia"] = media_metadata
+        response_data["midia_job"]["status"] = status
+        save_callback_json(backend, response_data, target_folder, unique_filename)
+        catalog_register(response_data)
+        
+        _update_media_job(job_id, status, midia=media_metadata)
+        print(f"✅ Job de metadados {job_id}: {status}")
+        logger.info(f"Job de metadados {job_id}: {status}")
+    except Exception as e:
+        logger.error(f"Erro no job de metadados {job_id}: {e}")
+        _update_media_job(job_id, "erro", erro=str(e))
+    finally:
+        if isinstance(source, str) and os.path.exists(source):
+            try:
+                os.unlink(source)
+            except Exception as e:
+                logger.warning(f"Erro ao remover arquivo temporário: {e}")
+        _media_job_slots.release()
+
+class UploadValidationError(Exception):
+    """Erro de validação de um upload, convertido em resposta HTTP"""
+    
+    def __init__(self, status_code: int, error: str, detail: str):
+        super().__init__(error)
+        self.status_code = status_code
+        self.error = error
+        self.detail = detail
+    
+    def to_response(self) -> Tuple[Dict[str, Any], int]:
+        return {"success": False, "error": self.error, "detail": self.detail}, self.status_code
+
+class MemoryBudget:
+    """Orçamento de bytes das partes em voo no worker, compartilhado pelas requisições.
+    
+    Uma parte espera até caber no orçamento; sem nenhuma parte em voo ela sempre é liberada,
+    para que uma parte maior que o orçamento não trave o upload. limit 0 desativa.
+    """
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+    
+    def acquire(self, size: int, blocking: bool = True) -> bool:
+        if not self.limit:
+            return True
+        with self._condition:
+            while self.in_use and self.in_use + size > self.limit:
+                if not blocking:
+                    return False
+                self._condition.wait()
+            self.in_use += size
+            return True
+    
+    def release(self, size: int) -> None:
+        if not self.limit:
+            return
+        with self._condition:
+            self.in_use = max(0, self.in_use - size)
+            self._condition.notify_all()
+
+stream_memory = MemoryBudget(STREAM_MEMORY_BUDGET_BYTES)
+
+class StreamingUploadPipeline:
+    """Distribui cada bloco do corpo da requisição para hash, contador, spool e partes multipart.
+    
+    A memória por requisição fica limitada pelo plano de transferência (threshold do PUT simples
+    ou uma parte em montagem) mais as partes em voo, que no worker inteiro não passam de
+    STREAM_MEMORY_BUDGET_MB. Arquivos abaixo do threshold são enviados com um único PUT; acima
+    dele as partes sobem em paralelo.
+    """
+    
+    def __init__(self, backend, s3_key: str, content_type: str, transfer_plan: Dict[str, Any], spool_suffix: Optional[str] = None, probe_windows: bool = False, max_size_bytes: Optional[int] = None):
+        self.backend = backend
+        self.s3_key = s3_key
+        self.content_type = content_type
+        self.part_size = transfer_plan["tamanho_parte_bytes"]
+        self.multipart_threshold = transfer_plan["multipart_threshold"]
+        self.max_concurrency = transfer_plan["concorrencia"]
+        # Limite da categoria do arquivo (CATEGORY_MAX_SIZE_MB) ou o global
+        self.max_size_bytes = max_size_bytes or max_content_length_mb * 1024 * 1024
+        self.digest = digests.MultiDigest(HASH_ALGORITHMS, hash_executor)
+        self.size = 0
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+        self.spool_path = None
+        self._spool = None
+        self._executor = None
+        self._pending = set()
+        self._next_part_number = 1
+        # MD5 de cada parte (Content-MD5), calculado na mesma passagem do hash do arquivo a partir
+        # da decisão pelo multipart: partes completas aguardando envio e a parte em formação
+        self._part_digests: Optional[deque] = None
+        self._part_digest = None
+        self._part_filled = 0
+        # Tempo gasto no hash e no spool, reportado como etapas em /metrics
+        self.hash_seconds = 0.0
+        self.spool_seconds = 0.0
+        
+        # Início e fim do arquivo em memória para a leitura nativa dos cabeçalhos
+        self.probe_windows = probe_windows
+        self.probe_head = bytearray()
+        self.probe_tail = bytearray()
+        
+        # Spool em disco apenas quando o ffprobe vai precisar do arquivo
+        if spool_suffix:
+            spool_fd, self.spool_path = tempfile.mkstemp(suffix=spool_suffix)
+            self._spool = os.fdopen(spool_fd, 'wb')
+    
+    def write(self, data: bytes) -> None:
+        """Consome um bloco do arquivo, alimentando todos os destinos na mesma passagem"""
+        if not self._consume(data):
+            return
+        while len(self.buffer) >= self.part_size:
+            self._submit_part(self.part_size)
+    
+    def _consume(self, data: bytes) -> bool:
+        """Atualiza tamanho, hash, spool, janelas e buffer; retorna True se há partes a enviar"""
+        self.size += len(data)
+        if self.size > self.max_size_bytes:
+            raise UploadValidationError(
+                413,
+                "Arquivo muito grande",
+                f"O tamanho do arquivo excede o limite máximo permitido. Tamanho máximo configurado: {self.max_size_bytes // (1024 * 1024)}MB"
+            )
+        
+        inicio = time.perf_counter()
+        if self._part_digests is not None and hash_executor is not None and len(data) >= digests.PARALLEL_MIN_BYTES:
+            # MD5 da parte no pool, em paralelo com os digests do arquivo
+            future = hash_executor.submit(self._hash_parts, data)
+            self.digest.update(data)
+            future.result()
+        else:
+            self.digest.update(data)
+            if self._part_digests is not None:
+                self._hash_parts(data)
+        self.hash_seconds += time.perf_counter() - inicio
+        if self._spool is not None:
+            inicio = time.perf_counter()
+            self._spool.write(data)
+            self.spool_seconds += time.perf_counter() - inicio
+        if self.probe_windows:
+            if len(self.probe_head) < MEDIA_PROBE_HEAD_BYTES:
+                self.probe_head += data[:MEDIA_PROBE_HEAD_BYTES - len(self.probe_head)]
+            self.probe_tail += data
+            if len(self.probe_tail) > MEDIA_PROBE_TAIL_BYTES:
+                del self.probe_tail[:len(self.probe_tail) - MEDIA_PROBE_TAIL_BYTES]
+        
+        self.buffer += data
+        multipart = self.upload_id is not None or len(self.buffer) >= self.multipart_threshold
+        if multipart and self._part_digests is None and STORAGE_CHECKSUM != 'off':
+            # Multipart decidido agora: o buffer (nenhuma parte enviada ainda) é hasheado uma vez
+            self._part_digests = deque()
+            self._part_digest = digests.MultiDigest(['md5'])
+            inicio = time.perf_counter()
+            self._hash_parts(memoryview(self.buffer))
+            self.hash_seconds += time.perf_counter() - inicio
+        return multipart
+    
+    def _hash_parts(self, data) -> None:
+        """Alimenta o MD5 das partes, fechando uma a cada part_size bytes do arquivo"""
+        view = memoryview(data)
+        while view:
+            segment = view[:self.part_size - self._part_filled]
+            self._part_digest.update(segment)
+            self._part_filled += len(segment)
+            view = view[len(segment):]
+            if self._part_filled == self.part_size:
+                self._part_digests.append(self._part_digest)
+                self._part_digest = digests.MultiDigest(['md5'])
+                self._part_filled = 0
+    
+    def _take_part(self, length: int) -> Tuple[int, bytes, Optional[Dict[str, str]]]:
+        """Retira do buffer o corpo da próxima parte, reserva seu número e devolve seus checksums"""
+        part_number = self._next_part_number
+        self._next_part_number += 1
+        body = bytes(self.buffer[:length])
+        del self.buffer[:length]
+        checksums = None
+        if self._part_digests is not None:
+            # Partes são cortadas a cada part_size bytes; só a última, menor, usa a parte em formação
+            checksums = part_checksums(self._part_digests.popleft() if self._part_digests else self._part_digest)
+        return part_number, body, checksums
+    
+    def _submit_part(self, length: int) -> None:
+        if self.upload_id is None:
+            self.upload_id = self.backend.create_multipart(self.s3_key, self.content_type)
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        
+        # Limitar partes em voo da requisição e do worker para manter a memória constante
+        while len(self._pending) >= self.max_concurrency:
+            self._collect(return_when=FIRST_COMPLETED)
+        while not stream_memory.acquire(length, blocking=not self._pending):
+            self._collect(return_when=FIRST_COMPLETED)
+        
+        part_number, body, checksums = self._take_part(length)
+        # Contexto copiado para que a chamada ao Spaces entre no trace da requisição
+        future = self._executor.submit(contextvars.copy_context().run, self._upload_part, part_number, body, checksums)
+        # Liberado ao concluir, falhar ou ser cancelado pelo abort
+        future.add_done_callback(lambda _future: stream_memory.release(length))
+        self._pending.add(future)
+    
+    def _upload_part(self, part_number: int, body: bytes, checksums: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        etag = self.backend.upload_part(self.s3_key, self.upload_id, part_number, body, checksums=checksums)
+        return {"ETag": etag, "PartNumber": part_number}
+    
+    def _collect(self, return_when=FIRST_COMPLETED) -> None:
+        done, self._pending = wait(self._pending, return_when=return_when)
+        for future in done:
+            # Propaga o erro da primeira parte que falhou
+            self.parts.append(future.result())
+    
+    def finish(self) -> None:
+        """Envia o restante do buffer e conclui o objeto no armazenamento"""
+        self._close_spool()
+        
+        if self.upload_id is None:
+            # Arquivo abaixo do threshold: um PUT simples evita o overhead do multipart;
+            # o digest já calculado vai junto para o armazenamento verificar a integridade
+            self.backend.put_object(self.s3_key, bytes(self.buffer), self.content_type, checksums=storage_checksums(self.digest))
+        else:
+            while self.buffer:
+                self._submit_part(min(self.part_size, len(self.buffer)))
+            self._collect(return_when=ALL_COMPLETED)
+            self._shutdown_executor()
+            self.backend.complete_multipart(self.s3_key, self.upload_id, sorted(self.parts, key=lambda part: part["PartNumber"]))
+        self.buffer = bytearray()
+    
+    def abort(self) -> None:
+        """Cancela o multipart pendente para não deixar partes órfãs no armazenamento"""
+        self._shutdown_executor()
+        if self.upload_id is not None:
+            try:
+                self.backend.abort_multipart(self.s3_key, self.upload_id)
+            except Exception as e:
+                logger.warning(f"Erro ao abortar multipart upload {self.upload_id}: {e}")
+        self.cleanup()
+    
+    def _shutdown_executor(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._pending = set()
+    
+    def _close_spool(self) -> None:
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+    
+    def record_stage_metrics(self) -> None:
+        """Registra hash e spool acumulados durante a passagem única"""
+        metrics.observe_stage("hash", self.hash_seconds)
+        if self.spool_path:
+            metrics.observe_stage("arquivo_temporario", self.spool_seconds)
+    
+    def probe_source(self):
+        """Fonte para a extração de metadados: spool em disco ou janelas de início/fim"""
+        if self.spool_path:
+            return self.spool_path
+        if self.probe_windows:
+            return media_probe.WindowSource(self.probe_head, self.probe_tail, self.size)
+        return None
+    
+    def cleanup(self) -> None:
+        """Remove o spool temporário, se existir"""
+        self._close_spool()
+        if self.spool_path and os.path.exists(self.spool_path):
+            try:
+                os.unlink(self.spool_path)
+            except Exception as e:
+                logger.warning(f"Erro ao remover arquivo temporário: {e}")
+        self.spool_path = None
+
+def streaming_requested() -> bool:
+    """Decide se a requisição usa o modo streaming (parâmetro ?stream= ou UPLOAD_STREAMING)"""
+    stream_param = request.args.get('stream')
+    if stream_param is None:
+        return UPLOAD_STREAMING
+    return stream_param.strip().lower() in TRUTHY_VALUES
+
+class PeekedInput(io.RawIOBase):
+    """wsgi.input com o início já lido pelo portão de pré-validação recolocado na frente"""
+    
+    def __init__(self, head: bytes, stream):
+        self._head = memoryview(head)
+        self._stream = stream
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        if self._head:
+            n = min(len(buffer), len(self._head))
+            buffer[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+class MultipartPeek:
+    """Decodifica só o início de um corpo multipart: campos de texto anteriores à parte 'file',
+    o cabeçalho dela e os primeiros bytes do arquivo (sniffing), até `limit` bytes do corpo.
+    
+    Alimentado aos pedaços pelo wsgi.input (peek_multipart_file) ou pelas mensagens do ASGI.
+    """
+    
+    def __init__(self, boundary: str, limit: int):
+        self.decoder = MultipartDecoder(boundary.encode('latin-1'))
+        self.limit = limit
+        self.lido = 0
+        self.campos: Dict[str, str] = {}
+        self.evento: Optional[File] = None
+        self.inicio = bytearray()
+        self.concluido = False
+        self._field_name = None
+        self._field_value = bytearray()
+        self._file_done = False
+    
+    def feed(self, chunk: bytes) -> bool:
+        """Processa mais bytes do corpo; retorna True quando não precisa de mais nenhum"""
+        self.lido += len(chunk)
+        self.decoder.receive_data(chunk)
+        try:
+            event = self.decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)) and not self._file_done:
+                if isinstance(event, File) and event.name == 'file' and self.evento is None:
+                    self.evento = event
+                elif isinstance(event, Field) and self.evento is None:
+                    self._field_name = event.name
+                    self._field_value = bytearray()
+                elif isinstance(event, Data) and self.evento is not None:
+                    self.inicio += event.data
+                    self._file_done = not event.more_data
+                elif isinstance(event, Data) and self._field_name is not None:
+                    self._field_value += event.data
+                    if not event.more_data:
+                        self.campos[self._field_name] = self._field_value.decode('utf-8', 'replace')
+                        self._field_name = None
+                event = self.decoder.next_event()
+            fim = isinstance(event, Epilogue)
+        except ValueError:
+            # Corpo malformado: deixar o parsing normal responder
+            fim = True
+        file_ready = self.evento is not None and (self._file_done or len(self.inicio) >= sniffing.SNIFF_BYTES)
+        self.concluido = fim or file_ready or self.lido >= self.limit
+        return self.concluido
+    
+    def result(self) -> Dict[str, Any]:
+        return {"evento": self.evento, "inicio": bytes(self.inicio), "campos": self.campos}
+
+def peek_multipart_file() -> Optional[Dict[str, Any]]:
+    """Lê do corpo só até o cabeçalho e os primeiros bytes da parte 'file' (sniffing; no máximo
+    PREPARSE_PEEK_KB no total) e devolve os bytes lidos ao wsgi.input, para o parsing normal do Werkzeug.
+    
+    Retorna {"evento": File ou None se a parte estiver fora da janela, "inicio": primeiros bytes do
+    arquivo, "campos": campos de texto anteriores à parte} ou None se o corpo não for multipart com
+    Content-Length. Uma leitura por requisição (resultado guardado em g); precisa rodar antes do
+    primeiro acesso a request.stream/request.files.
+    """
+    if 'multipart_peek' in g:
+        return g.multipart_peek
+    g.multipart_peek = None
+    content_length = request.content_length
+    boundary = request.mimetype_params.get('boundary')
+    if not content_length or request.mimetype != 'multipart/form-data' or not boundary:
+        return None
+    if content_length > app.config['MAX_CONTENT_LENGTH']:
+        # O 413 global do Werkzeug sai sem ler o corpo
+        return None
+    
+    stream = request.environ['wsgi.input']
+    peek = MultipartPeek(boundary, min(PREPARSE_PEEK_BYTES, content_length))
+    head = bytearray()
+    while len(head) < content_length:
+        chunk = stream.read(min(8192, content_length - len(head)))
+        if not chunk:
+            break
+        head += chunk
+        if peek.feed(chunk):
+            break
+    request.environ['wsgi.input'] = PeekedInput(bytes(head), stream)
+    g.multipart_peek = peek.result()
+    return g.multipart_peek
+
+def preparse_upload_gate() -> Optional[Tuple[Dict[str, Any], int]]:
+    """Valida nome, extensão, conteúdo e limite da categoria a partir do início da parte 'file'.
+    
+    O corpo é lido só até esse ponto (peek_multipart_file). Retorna a resposta de erro ou None.
+    """
+    if not PREPARSE_GATE_ENABLED:
+        return None
+    peek = peek_multipart_file()
+    # Parte 'file' fora da janela (ex.: campos grandes antes dela): validação após o parsing
+    if peek is None or peek["evento"] is None:
+        return None
+    file_event = peek["evento"]
+    file_head = peek["inicio"]
+    content_length = request.content_length
+    
+    if not file_event.filename:
+        return {
+            "success": False,
+            "error": "Arquivo sem nome ou vazio",
+            "detail": "O arquivo enviado não possui nome ou está vazio. Verifique se o arquivo foi selecionado corretamente."
+        }, 400
+    if not allowed_file(file_event.filename):
+        return {
+            "success": False,
+            "error": f"Tipo de arquivo não permitido. Tipos aceitos: {', '.join(sorted(ALLOWED_EXTENSIONS))}",
+            "detail": "O arquivo enviado não está em um formato suportado. Use apenas os tipos listados."
+        }, 400
+    
+    file_extension = secure_filename(file_event.filename).rsplit('.', 1)[-1].lower()
+    content_type, detected_category, error = sniff_content_type(bytes(file_head), file_event.headers.get('Content-Type', ''), file_extension)
+    if error:
+        return error
+    file_category = get_file_category(content_type, file_extension, detected_category)
+    metrics.set_category(file_category["categoria"])
+    return category_size_error(file_category["categoria"], content_length, estimado=True)
+
+class StorageHealthMonitor:
+    """Estado da conectividade com o Spaces, atualizado por uma thread em segundo plano.
+    
+    As sondas de prontidão leem apenas o último resultado em memória; o head_bucket roda
+    a cada HEALTH_CHECK_INTERVAL_SECONDS com timeout curto e cliente próprio. A réplica só
+    deixa de estar pronta quando não há verificação bem-sucedida há mais de
+    HEALTH_CHECK_TTL_SECONDS, então uma lentidão passageira do Spaces não derruba réplicas saudáveis.
+    """
+    
+    def __init__(self, interval: int, ttl: int):
+        self.interval = interval
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._status: Optional[Dict[str, Any]] = None
+    
+    def check(self) -> Dict[str, Any]:
+        """Verifica o backend (head_bucket no S3) e registra resultado, latência e horário"""
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            storage_backend.check()
+        except Exception as e:
+            erro = str(e)
+        latencia_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        agora = time.time()
+        
+        with self._lock:
+            anterior = self._status or {}
+            status = {
+                "ok": erro is None,
+                "verificado_em": agora,
+                "latencia_ms": latencia_ms,
+                "erro": erro,
+                "ultimo_sucesso": agora if erro is None else anterior.get("ultimo_sucesso"),
+                "falhas_consecutivas": 0 if erro is None else anterior.get("falhas_consecutivas", 0) + 1,
+            }
+            self._status = status
+        
+        if erro is not None:
+            logger.warning(f"Erro ao verificar conectividade com Spaces: {erro} (falhas consecutivas: {status['falhas_consecutivas']})")
+        elif anterior and not anterior.get("ok"):
+            print("✅ Conectividade com o Spaces restabelecida")
+            logger.info("Conectividade com o Spaces restabelecida")
+        return status
+    
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Erro na verificação de saúde em segundo plano: {e}")
+    
+    def ensure_started(self) -> None:
+        """Inicia a thread no processo atual (após o fork do Gunicorn com --preload)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._status = None
+            self._thread = threading.Thread(target=self._loop, name="storage-health", daemon=True)
+            self._thread.start()
+        print("🩺 Verificação de conectividade com o Spaces em segundo plano iniciada")
+        logger.info(f"Verificação de saúde em segundo plano iniciada (intervalo {self.interval}s, TTL {self.ttl}s)")
+    
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Último resultado conhecido; a primeira chamada do processo faz a verificação inicial"""
+        self.ensure_started()
+        with self._lock:
+            status = self._status
+        if status is None:
+            status = self.check()
+        return status
+    
+    def readiness(self) -> Tuple[Dict[str, Any], int]:
+        """Payload e código HTTP da sonda de prontidão, sem I/O após a primeira verificação"""
+        base = {
+            "timestamp": datetime.now().isoformat(),
+            "service": "upload-cdn-api",
+        }
+        if STORAGE_BACKEND == "s3" and (not SPACES_KEY or not SPACES_SECRET or not SPACES_BUCKET or not SPACES_REGION or not SPACES_ENDPOINT):
+            return {
+                "status": "unhealthy",
+                **base,
+                "error": "Configurações do Spaces não completas"
+            }, 503
+        
+        status = self.snapshot()
+        agora = time.time()
+        ultimo_sucesso = status.get("ultimo_sucesso")
+        pronto = ultimo_sucesso is not None and agora - ultimo_sucesso <= self.ttl
+        armazenamento = {
+            "backend": STORAGE_BACKEND,
+            "conectado": status["ok"],
+            "latencia_ms": status["latencia_ms"],
+            "idade_segundos": round(agora - status["verificado_em"], 3),
+            "verificado_em": datetime.fromtimestamp(status["verificado_em"]).isoformat(),
+            "ultimo_sucesso": datetime.fromtimestamp(ultimo_sucesso).isoformat() if ultimo_sucesso else None,
+            "falhas_consecutivas": status["falhas_consecutivas"],
+            "intervalo_segundos": self.interval,
+            "ttl_segundos": self.ttl,
+        }
+        if status["erro"]:
+            armazenamento["erro"] = status["erro"]
+        
+        if not pronto:
+            return {
+                "status": "unhealthy",
+                **base,
+                "error": "Não foi possível conectar ao serviço de armazenamento",
+                "detail": status["erro"],
+                "armazenamento": armazenamento,
+                "circuit_breaker": storage_breaker.stats(),
+            }, 503
+        
+        return {
+            "status": "healthy",
+            **base,
+            "armazenamento": armazenamento,
+            "cache_metadados": media_metadata_cache.stats(),
+            "circuit_breaker": storage_breaker.stats(),
+            "admissao": admission.stats(),
+        }, 200
+
+storage_health = StorageHealthMonitor(HEALTH_CHECK_INTERVAL_SECONDS, HEALTH_CHECK_TTL_SECONDS)
+
+def liveness_payload() -> Dict[str, Any]:
+    """Sonda de vida: o processo responde, sem depender do Spaces"""
+    return {
+        "status": "alive",
+        "timestamp": datetime.now().isoformat(),
+        "service": "upload-cdn-api",
+        "pid": os.getpid(),
+    }
+
+@app.before_request
+def start_request_trace():
+    """Abre o trace da requisição (registrado antes dos demais hooks para cobrir recusas)"""
+    if not TRACE_ENABLED or request.path.startswith(TRACE_IGNORED_PREFIXES):
+        return None
+    trace, tokens = tracer.start_trace(
+        f"{request.method} {request.path}",
+        request.headers,
+        {"http.method": request.method, "http.path": request.path, "http.endpoint": request.endpoint or ""},
+    )
+    g.trace, g.trace_tokens = trace, tokens
+    return None
+
+@app.after_request
+def add_trace_header(response):
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers['X-Trace-Id'] = trace.trace_id
+        g.trace_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        tracer.finish_trace(trace, g.pop('trace_tokens'), g.pop('trace_status', None), error)
+
+class AdmissionController:
+    """Controle de admissão dos uploads (por worker), aplicado antes de ler o corpo.
+    
+    Por cliente (client_identity): limite de uploads simultâneos e
+    token bucket de uploads por minuto. No worker: orçamento de bytes em andamento, pelo
+    Content-Length declarado (sem ele, pelo tamanho máximo permitido); um upload sozinho
+    sempre é admitido. Clientes ociosos são descartados quando passam de max_clients.
+    """
+    
+    def __init__(self, enabled: bool, max_concurrent_per_client: int, rate_per_minute: int, burst: int, max_inflight_bytes: int, max_clients: int = 10000):
+        self.enabled = enabled
+        self.max_concurrent_per_client = max_concurrent_per_client
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._clients: Dict[str, Dict[str, float]] = {}
+        self._inflight_bytes = 0
+        self._inflight_uploads = 0
+        self.rejeitadas: Dict[str, int] = {"concorrencia": 0, "taxa": 0, "bytes_em_andamento": 0}
+    
+    def _client_state(self, client_key: str, now: float) -> Dict[str, float]:
+        state = self._clients.get(client_key)
+        if state is None:
+            if len(self._clients) >= self.max_clients:
+                self._prune(now)
+            state = self._clients[client_key] = {"tokens": float(self.burst), "atualizado": now, "ativos": 0}
+        elif self.rate_per_second:
+            state["tokens"] = min(self.burst, state["tokens"] + (now - state["atualizado"]) * self.rate_per_second)
+            state["atualizado"] = now
+        return state
+    
+    def _prune(self, now: float) -> None:
+        # Sem uploads ativos e com o balde cheio, o estado do cliente equivale ao de um novo
+        for client_key, state in list(self._clients.items()):
+            tokens = state["tokens"] + (now - state["atualizado"]) * self.rate_per_second
+            if not state["ativos"] and (not self.rate_per_second or tokens >= self.burst):
+                del self._clients[client_key]
+    
+    def acquire(self, client_key: str, content_length: int) -> Tuple[Optional[Tuple[str, int]], Optional[Tuple[str, float]]]:
+        """(ticket, None) se o upload pode seguir; senão (None, (motivo, segundos para tentar de novo))"""
+        if not self.enabled:
+            return None, None
+        with self._lock:
+            now = time.monotonic()
+            state = self._client_state(client_key, now)
+            rejection = None
+            if self.max_concurrent_per_client and state["ativos"] >= self.max_concurrent_per_client:
+                rejection = ("concorrencia", 1.0)
+            elif self.rate_per_second and state["tokens"] < 1:
+                rejection = ("taxa", (1 - state["tokens"]) / self.rate_per_second)
+            elif self.max_inflight_bytes and self._inflight_uploads and self._inflight_bytes + content_length > self.max_inflight_bytes:
+                rejection = ("bytes_em_andamento", 1.0)
+            if rejection:
+                self.rejeitadas[rejection[0]] += 1
+                return None, rejection
+            if self.rate_per_second:
+                state["tokens"] -= 1
+            state["ativos"] += 1
+            self._inflight_bytes += content_length
+            self._inflight_uploads += 1
+            return (client_key, content_length), None
+    
+    def release(self, ticket: Optional[Tuple[str, int]]) -> None:
+        if ticket is None:
+            return
+        client_key, content_length = ticket
+        with self._lock:
+            state = self._clients.get(client_key)
+            if state is not None:
+                state["ativos"] = max(0, state["ativos"] - 1)
+            self._inflight_bytes = max(0, self._inflight_bytes - content_length)
+            self._inflight_uploads = max(0, self._inflight_uploads - 1)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ativo": self.enabled,
+                "uploads_em_andamento": self._inflight_uploads,
+                "bytes_em_andamento": self._inflight_bytes,
+                "clientes": len(self._clients),
+                "rejeitadas": dict(self.rejeitadas),
+            }
+
+admission = AdmissionController(
+    ADMISSION_ENABLED, ADMISSION_MAX_CONCURRENT_PER_CLIENT, ADMISSION_RATE_PER_MINUTE,
+    ADMISSION_BURST, ADMISSION_MAX_INFLIGHT_MB * 1024 * 1024
+)
+
+ADMISSION_ERROR_CODES = {"concorrencia": "LimiteConcorrencia", "taxa": "LimiteTaxa", "bytes_em_andamento": "LimiteBytes"}
+
+def trusted_client_ip(client_info: Dict[str, Any]) -> str:
+    """IP do cliente só de fontes confiáveis: o endereço da conexão ou, atrás de TRUSTED_PROXY_COUNT
+    proxies, a entrada do X-Forwarded-For acrescentada pelo mais externo (as anteriores vêm do cliente)
+    """
+    if TRUSTED_PROXY_COUNT:
+        enderecos = [valor.strip() for valor in client_info["headers"]["x_forwarded_for"].split(',') if valor.strip()]
+        if len(enderecos) >= TRUSTED_PROXY_COUNT:
+            return enderecos[-TRUSTED_PROXY_COUNT]
+    return client_info["ip_original"] or "desconhecido"
+
+def client_identity(headers, client_info: Dict[str, Any]) -> str:
+    """Identidade verificada do cliente: CLIENT_ID_HEADER (do gateway), senão trusted_client_ip"""
+    if CLIENT_ID_HEADER:
+        valor = headers.get(CLIENT_ID_HEADER)
+        if valor:
+            # O valor em si não fica gravado nem nos logs
+            return "cliente:" + hashlib.sha256(valor.encode('utf-8')).hexdigest()[:32]
+    return f"ip:{trusted_client_ip(client_info)}"
+
+def admission_rejected_response(motivo: str, retry_after: float) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+    """Resposta 429 do controle de admissão, com Retry-After"""
+    segundos = max(1, math.ceil(retry_after))
+    detalhes = {
+        "concorrencia": f"Limite de {ADMISSION_MAX_CONCURRENT_PER_CLIENT} upload(s) simultâneo(s) por cliente atingido.",
+        "taxa": f"Limite de {ADMISSION_RATE_PER_MINUTE} upload(s) por minuto por cliente atingido.",
+        "bytes_em_andamento": "O servidor já está recebendo o volume máximo de dados permitido.",
+    }
+    return {
+        "success": False,
+        "error": "Muitas requisições",
+        "detail": f"{detalhes[motivo]} Tente novamente em {segundos} segundo(s).",
+        "motivo": motivo,
+        "retry_after_segundos": segundos
+    }, 429, {"Retry-After": str(segundos)}
+
+def admit_upload(headers, client_info: Dict[str, Any], content_length: Optional[int]):
+    """Aplica o controle de admissão; retorna (ticket, None) ou (None, resposta 429)"""
+    estimated = content_length if content_length is not None else max_content_length_mb * 1024 * 1024
+    ticket, rejection = admission.acquire(client_identity(headers, client_info), estimated)
+    if rejection is None:
+        return ticket, None
+    motivo, retry_after = rejection
+    print(f"🚦 Upload recusado ({motivo}) para {client_info['ip']}: nova tentativa em {retry_after:.1f}s")
+    logger.warning(f"Upload recusado pelo controle de admissão ({motivo}): {client_info['ip']}")
+    metrics.record_rejection(ADMISSION_ERROR_CODES[motivo], 429)
+    return None, admission_rejected_response(motivo, retry_after)
+
+def idempotency_storage_key(headers, client_info: Dict[str, Any], key: str) -> str:
+    """Chave gravada: hash do Idempotency-Key no escopo do cliente (client_identity).
+    
+    Dois clientes que enviam o mesmo valor (ex.: UUID fixo de uma biblioteca) não compartilham
+    a resposta gravada, e cabeçalhos que o próprio cliente envia não mudam o escopo.
+    """
+    escopo = client_identity(headers, client_info)
+    return hashlib.sha256(f"{escopo}\n{key}".encode('utf-8')).hexdigest()
+
+def idempotency_fingerprint(operacao: str, content_length: Optional[int], folder: Optional[str], peek: Optional[Dict[str, Any]] = None, boundary: Optional[str] = None) -> Dict[str, Any]:
+    """Impressão da requisição comparada nas retentativas com a mesma chave.
+    
+    Só usa o que é conhecido antes do corpo: rota, Content-Length (com o tamanho do boundary
+    multipart), diretório e, quando o início da parte 'file' foi lido (MultipartPeek), o
+    nome e o SHA-256 dos primeiros SNIFF_BYTES do arquivo.
+    """
+    impressao: Dict[str, Any] = {
+        "operacao": operacao,
+        "tamanho_requisicao": content_length,
+        "tamanho_boundary": len(boundary) if boundary else None,
+    }
+    if peek is not None and peek["evento"] is not None:
+        folder = peek["campos"].get('folder') or folder
+        impressao["nome"] = peek["evento"].filename
+        # Quanto além de SNIFF_BYTES foi lido depende do tamanho dos pedaços e do boundary
+        impressao["inicio_sha256"] = hashlib.sha256(peek["inicio"][:sniffing.SNIFF_BYTES]).hexdigest()
+    impressao["pasta"] = folder
+    return {campo: valor for campo, valor in impressao.items() if valor is not None}
+
+def idempotency_size_matches(gravada: Dict[str, Any], atual: Dict[str, Any]) -> bool:
+    """Confere o Content-Length mesmo quando a retentativa usa outro boundary multipart.
+    
+    Cada delimitador do corpo (um por parte, mais o final) repete o boundary: com o mesmo
+    conteúdo, o tamanho muda exatamente delimitadores x diferença de tamanho do boundary.
+    """
+    diferenca = atual["tamanho_requisicao"] - gravada["tamanho_requisicao"]
+    diferenca_boundary = atual.get("tamanho_boundary", 0) - gravada.get("tamanho_boundary", 0)
+    if not diferenca_boundary:
+        return diferenca == 0
+    delimitadores, resto = divmod(diferenca, diferenca_boundary)
+    return resto == 0 and 2 <= delimitadores <= IDEMPOTENCY_MAX_DELIMITERS
+
+def idempotency_mismatch(gravada: Dict[str, Any], atual: Dict[str, Any]) -> list:
+    """Campos presentes nas duas impressões com valores diferentes (o tamanho por idempotency_size_matches)"""
+    tamanhos = {"tamanho_requisicao", "tamanho_boundary"}
+    divergentes = {
+        campo for campo, valor in atual.items()
+        if campo in gravada and campo not in tamanhos and gravada[campo] != valor
+    }
+    if "tamanho_requisicao" in gravada and "tamanho_requisicao" in atual and not idempotency_size_matches(gravada, atual):
+        divergentes.add("tamanho_requisicao")
+    return sorted(divergentes)
+
+def idempotency_claim(chave: str, impressao: Dict[str, Any]) -> Tuple[str, Any]:
+    """Tenta reservar a chave para esta requisição.
+    
+    Retorna ("nova", dono), ("concluida", linha), ("em_andamento", linha) ou
+    ("conflito", campos divergentes da impressão gravada).
+    """
+    db = get_state_db()
+    while True:
+        now = time.time()
+        dono = uuid.uuid4().hex
+        # Chaves vencidas (e reservas de workers que morreram) liberam o lugar
+        db.execute("DELETE FROM idempotency_records WHERE expira_em < ?", (now,))
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO idempotency_records (chave, impressao, dono, criado_em, expira_em) VALUES (?, ?, ?, ?, ?)",
+            (chave, json.dumps(impressao, ensure_ascii=False), dono, now, now + IDEMPOTENCY_LOCK_SECONDS)
+        )
+        if cursor.rowcount == 1:
+            return "nova", dono
+        row = db.execute("SELECT * FROM idempotency_records WHERE chave = ?", (chave,)).fetchone()
+        if row is None:
+            # Liberada entre o INSERT e o SELECT: tentar de novo
+            continue
+        divergentes = idempotency_mismatch(json.loads(row["impressao"]), impressao)
+        if divergentes:
+            return "conflito", divergentes
+        return ("em_andamento" if row["resposta"] is None else "concluida"), row
+
+def idempotency_begin(headers, client_info: Dict[str, Any], impressao: Dict[str, Any]):
+    """Aplica o Idempotency-Key antes de ler o corpo (além do trecho inicial da impressão).
+    
+    Retorna (reserva, None) para processar a requisição (reserva None sem o header) ou
+    (None, (payload, status, headers)) com a resposta gravada da primeira tentativa ou um erro.
+    Com a primeira tentativa em andamento espera até IDEMPOTENCY_WAIT_SECONDS e então responde 409.
+    """
+    key = headers.get(IDEMPOTENCY_HEADER)
+    if not IDEMPOTENCY_ENABLED or key is None:
+        return None, None
+    key = key.strip()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH or not key.isprintable() or not key.isascii():
+        return None, ({
+            "success": False,
+            "error": f"{IDEMPOTENCY_HEADER} inválido",
+            "detail": f"Use um identificador ASCII de 1 a {IDEMPOTENCY_KEY_MAX_LENGTH} caracteres (ex.: um UUID) por operação."
+        }, 400, {})
+    chave = idempotency_storage_key(headers, client_info, key)
+    operacao = impressao["operacao"]
+    limite = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    try:
+        while True:
+            estado, valor = idempotency_claim(chave, impressao)
+            if estado == "nova":
+                return {"chave": chave, "dono": valor}, None
+            if estado == "concluida":
+                print(f"🔁 Resposta repetida para {IDEMPOTENCY_HEADER} já concluído ({operacao})")
+                logger.info(f"Idempotency-Key repetido: resposta gravada devolvida ({operacao})")
+                return None, (json.loads(valor["resposta"]), valor["status_http"], {"Idempotent-Replayed": "true"})
+            if estado == "conflito":
+                print(f"❌ {IDEMPOTENCY_HEADER} reutilizado em outra requisição ({', '.join(valor)})")
+                logger.warning(f"Idempotency-Key reutilizado com requisição diferente ({operacao}): {', '.join(valor)}")
+                metrics.record_rejection("IdempotenciaConflito", 422)
+                return None, ({
+                    "success": False,
+                    "error": f"{IDEMPOTENCY_HEADER} já usado em outra requisição",
+                    "detail": f"A chave foi usada com valores diferentes de: {', '.join(valor)}. Gere uma nova chave para cada operação.",
+                    "campos_divergentes": valor
+                }, 422, {})
+            if time.monotonic() >= limite:
+                segundos = max(1, IDEMPOTENCY_WAIT_SECONDS)
+                print(f"⏳ {IDEMPOTENCY_HEADER} com tentativa em andamento ({operacao}): 409")
+                logger.warning(f"Idempotency-Key em uso por outra tentativa ainda em andamento ({operacao})")
+                metrics.record_rejection("IdempotenciaEmAndamento", 409)
+                return None, ({
+                    "success": False,
+                    "error": "Requisição com o mesmo Idempotency-Key em andamento",
+                    "detail": f"A primeira tentativa ainda está sendo processada. Tente novamente em {segundos} segundo(s) para receber a resposta dela.",
+                    "retry_after_segundos": segundos
+                }, 409, {"Retry-After": str(segundos)})
+            time.sleep(IDEMPOTENCY_POLL_SECONDS)
+    except sqlite3.Error as e:
+        # Sem o estado compartilhado o upload segue normalmente, sem garantia de idempotência
+        logger.warning(f"Erro ao consultar chaves de idempotência: {e}")
+        return None, None
+
+def idempotency_finish(reserva: Optional[Dict[str, str]], status_code: int, resposta: Optional[str]) -> None:
+    """Grava a resposta 2xx para as retentativas (até IDEMPOTENCY_TTL_SECONDS) ou libera a chave
+    
+    Erros não ficam gravados: a retentativa processa o upload de novo.
+    """
+    if reserva is None:
+        return
+    try:
+        db = get_state_db()
+        if resposta is not None and 200 <= status_code < 300:
+            db.execute(
+                "UPDATE idempotency_records SET status_http = ?, resposta = ?, expira_em = ? WHERE chave = ? AND dono = ?",
+                (status_code, resposta, time.time() + IDEMPOTENCY_TTL_SECONDS, reserva["chave"], reserva["dono"])
+            )
+        else:
+            db.execute(
+                "DELETE FROM idempotency_records WHERE chave = ? AND dono = ?",
+                (reserva["chave"], reserva["dono"])
+            )
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao gravar chave de idempotência: {e}")
+
+# Rotas que criam objetos a cada chamada: aceitam Idempotency-Key
+IDEMPOTENCY_ENDPOINTS = {
+    'upload_file',
+    'upload_batch',
+}
+
+@app.before_request
+def apply_idempotency_key():
+    """Repete a resposta de uma tentativa concluída com o mesmo Idempotency-Key, antes da admissão e do corpo"""
+    if request.endpoint not in IDEMPOTENCY_ENDPOINTS or IDEMPOTENCY_HEADER not in request.headers:
+        return None
+    impressao = idempotency_fingerprint(
+        f"{request.method} {request.path}",
+        request.content_length,
+        request.args.get('folder'),
+        peek_multipart_file(),
+        request.mimetype_params.get('boundary'),
+    )
+    reserva, resposta = idempotency_begin(request.headers, get_client_info(), impressao)
+    if resposta:
+        payload, status_code, headers = resposta
+        return jsonify(payload), status_code, headers
+    g.idempotency = reserva
+    return None
+
+@app.after_request
+def store_idempotent_response(response):
+    reserva = g.pop('idempotency', None)
+    if reserva is not None:
+        resposta = response.get_data(as_text=True) if response.is_json else None
+        idempotency_finish(reserva, response.status_code, resposta)
+    return response
+
+@app.teardown_request
+def release_idempotency_key(error=None):
+    # Sem passar pelo after_request (exceção não tratada): libera para a retentativa
+    idempotency_finish(g.pop('idempotency', None), 500, None)
+
+# Rotas que recebem o conteúdo dos arquivos no corpo da requisição
+ADMISSION_ENDPOINTS = {
+    'upload_file',
+    'upload_batch',
+    'upload_session_chunk',
+}
+
+@app.before_request
+def apply_admission_control():
+    """Recusa (429 + Retry-After) uploads acima dos limites do cliente ou do worker, antes de ler o corpo"""
+    if request.endpoint not in ADMISSION_ENDPOINTS:
+        return None
+    ticket, rejected = admit_upload(request.headers, get_client_info(), request.content_length)
+    if rejected:
+        payload, status_code, headers = rejected
+        return jsonify(payload), status_code, headers
+    g.admission_ticket = ticket
+    return None
+
+@app.teardown_request
+def release_admission_ticket(error=None):
+    admission.release(g.pop('admission_ticket', None))
+
+# Rotas que transferem dados para o Spaces: recusadas antes de ler o corpo com o circuito aberto
+STORAGE_GUARDED_ENDPOINTS = {
+    'upload_file',
+    'upload_batch',
+    'create_upload_session',
+    'upload_session_chunk',
+    'complete_upload_session',
+    'create_presigned_upload',
+    'finalize_presigned_upload',
+}
+
+@app.before_request
+def reject_when_storage_circuit_open():
+    """Falha rápida (503 + Retry-After) enquanto o circuit breaker do Spaces está aberto"""
+    if request.endpoint not in STORAGE_GUARDED_ENDPOINTS:
+        return None
+    retry_after = storage_breaker.allow()
+    if retry_after is None:
+        return None
+    print(f"🔌 Upload recusado: circuito do Spaces aberto (nova tentativa em {retry_after:.1f}s)")
+    logger.warning(f"Upload recusado com circuito do Spaces aberto: {request.method} {request.path}")
+    payload, status_code, headers = circuit_open_response(retry_after)
+    metrics.record_rejection("CircuitoAberto", status_code)
+    return jsonify(payload), status_code, headers
+
+@app.route('/health', methods=['GET'])
+@app.route('/health/ready', methods=['GET'])
+def health_check():
+    """Prontidão da API: configuração e conectividade com o Spaces (resultado em cache)"""
+    try:
+        payload, status_code = storage_health.readiness()
+        return jsonify(payload), status_code
+    except Exception as e:
+        logger.error(f"Erro no health check: {e}")
+        return jsonify({
+            "status": "unhealthy",
+            "timestamp": datetime.now().isoformat(),
+            "service": "upload-cdn-api",
+            "error": "Erro interno no health check",
+            "detail": str(e)
+        }), 503
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Vida do processo: não consulta o Spaces"""
+    return jsonify(liveness_payload())
+
+def observed_upload(view):
+    """Registra em /metrics o resultado, a duração e os uploads em andamento da rota"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        modo = "streaming" if streaming_requested() else "tradicional"
+        with metrics.observe_upload(modo) as observation:
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except RequestEntityTooLarge:
+                observation.finish(413)
+                raise
+            if not observation.finalizado:
+                observation.finish(response.status_code, response.get_json(silent=True))
+            return response
+    return wrapper
+
+@app.route('/upload', methods=['POST'])
+@observed_upload
+def upload_file():
+    """Endpoint principal para upload de arquivos"""
+    # Timestamp de início da requisição
+    timestamp_inicio = datetime.now()
+    timestamp_inicio_iso = timestamp_inicio.isoformat()
+    timestamp_inicio_unix = time.time()
+    
+    try:
+        print("📤 Recebendo requisição de upload")
+        print(f"🔍 Content-Type: {request.content_type}")
+        logger.info("Recebendo requisição de upload")
+        
+        # Coletar informações da sessão/cliente
+        client_info = get_client_info()
+        
+        error = response_profile_error()
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        # Modo streaming: o corpo ainda não foi lido, então não acessar request.files
+        if streaming_requested():
+            return upload_file_streaming(client_info, timestamp_inicio_iso, timestamp_inicio_unix)
+        
+        # Recusar pelo cabeçalho da parte 'file' antes de receber o corpo inteiro
+        error = preparse_upload_gate()
+        if error:
+            print(f"❌ Upload recusado antes do parsing: {error[0]['error']}")
+            logger.warning(f"Upload recusado antes do parsing: {error[0]['error']}")
+            return jsonify(error[0]), error[1]
+        
+        # Primeiro acesso a request.files: leitura e parsing do corpo multipart
+        with metrics.stage("recebimento_corpo"):
+            request.files
+        print(f"🔍 Files keys: {list(request.files.keys())}")
+        
+        # Verificar se arquivo foi enviado
+        if 'file' not in request.files:
+            print("❌ Nenhum arquivo fornecido")
+            print(f"   Files disponíveis: {list(request.files.keys())}")
+            logger.warning("Tentativa de upload sem arquivo")
+            return jsonify({
+                "success": False,
+                "error": "Nenhum arquivo fornecido",
+                "detail": "É necessário enviar um arquivo no campo 'file' usando multipart/form-data"
+            }), 400
+        
+        file = request.files['file']
+        payload, status_code = process_file_upload(
+            file,
+            client_info,
+            timestamp_inicio_iso,
+            timestamp_inicio_unix,
+            folder_param=request.form.get('folder') or request.args.get('folder'),
+            dedup=dedup_requested(request.form.get('dedup') or request.args.get('dedup')),
+            async_metadata=async_metadata_requested(request.form.get('async_metadata') or request.args.get('async_metadata')),
+        )
+        return upload_json_response(payload, status_code)
+        
+    except RequestEntityTooLarge:
+        # Este erro já é tratado pelo handler específico, mas incluímos aqui como backup
+        raise
+    except Exception as e:
+        print(f"❌ Erro inesperado no upload: {e}")
+        logger.error(f"Erro inesperado no upload: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": "Erro interno do servidor",
+            "detail": "Ocorreu um erro inesperado durante o processamento. Entre em contato com o suporte se o problema persistir."
+        }), 500
+
+def process_file_upload(
+    file,
+    client_info: Dict[str, Any],
+    timestamp_inicio_iso: str,
+    timestamp_inicio_unix: float,
+    folder_param: Optional[str] = None,
+    dedup: bool = True,
+    async_metadata: bool = False,
+    host_root: Optional[str] = None,
+) -> Tuple[Dict[str, Any], int]:
+    """Processa um arquivo já recebido (FileStorage): validação, hash, metadados, upload e callback JSON.
+    
+    Retorna (payload, status HTTP) com a mesma estrutura de POST /upload. Não acessa o contexto
+    da requisição, para poder rodar nas threads do upload em lote; host_root (calculado na thread
+    da requisição) completa as URLs relativas do backend local.
+    """
+    if host_root:
+        # Cada item do lote roda em uma cópia do contexto: o valor não vaza para outras tarefas da thread
+        _host_root.set(host_root)
+    try:
+        # Verificar se arquivo tem nome
+        if not file or file.filename == '':
+            print("❌ Arquivo sem nome ou vazio")
+            logger.warning("Tentativa de upload com arquivo sem nome ou vazio")
+            return {
+                "success": False,
+                "error": "Arquivo sem nome ou vazio",
+                "detail": "O arquivo enviado não possui nome ou está vazio. Verifique se o arquivo foi selecionado corretamente."
+            }, 400
+        
+        # Verificar se tipo de arquivo é permitido
+        if not allowed_file(file.filename):
+            print(f"❌ Tipo de arquivo não permitido: {file.filename}")
+            logger.warning(f"Tentativa de upload com tipo não permitido: {file.filename}")
+            return {
+                "success": False,
+                "error": f"Tipo de arquivo não permitido. Tipos aceitos: {', '.join(sorted(ALLOWED_EXTENSIONS))}",
+                "detail": "O arquivo enviado não está em um formato suportado. Use apenas os tipos listados."
+            }, 400
+        
+        print(f"✅ Arquivo válido: {file.filename}")
+        
+        # Capturar o tamanho real do arquivo
+        file.stream.seek(0, 2)  # Ir até o final do arquivo
+        size = file.stream.tell()
+        file.stream.seek(0)     # Voltar para o começo
+        
+        # Verificar tamanho do arquivo manualmente (backup caso o Flask não capture)
+        max_size_bytes = max_content_length_mb * 1024 * 1024
+        if size > max_size_bytes:
+            print(f"❌ Arquivo muito grande: {size} bytes (limite: {max_size_bytes} bytes)")
+            logger.warning(f"Arquivo excede tamanho máximo: {size} bytes")
+            return {
+                "success": False,
+                "error": "Arquivo muito grande",
+                "detail": f"O tamanho do arquivo excede o limite máximo permitido. Tamanho máximo configurado: {max_content_length_mb}MB. Tamanho do arquivo enviado: {size / 1024 / 1024:.2f}MB"
+            }, 413
+        
+        # Diretório de destino (opcional)
         # Garantir que seja string ou None
         if folder_param is not None:
             folder_param = str(folder_param).strip() if folder_param else None
         target_folder = validate_and_sanitize_folder(folder_param)
         
-        # Gerar nome único para o arquivo
-        original_filename = secure_filename(file.filename)
-        file_extension = original_filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
+        # Gerar nome único para o arquivo
+        original_filename = secure_filename(file.filename)
+        file_extension = original_filename.rsplit('.', 1)[1].lower()
+        unique_filename = f"{uuid.uuid4()}.{file_extension}"
+        
+        # Tipo real pelos primeiros bytes: corrige content type e categoria ou recusa o arquivo
+        head = file.stream.read(sniffing.SNIFF_BYTES)
+        file.stream.seek(0)
+        content_type, detected_category, error = sniff_content_type(head, file.content_type, file_extension)
+        if error:
+            print(f"❌ {error[0]['error']}: {file.filename}")
+            logger.warning(f"{error[0]['error']}: {file.filename}")
+            return error
+        
+        # Categorização do arquivo
+        file_category = get_file_category(content_type, file_extension, detected_category)
+        metrics.set_category(file_category["categoria"])
+        
+        # Limite da categoria antes de gastar CPU com o hash
+        error = category_size_error(file_category["categoria"], size)
+        if error:
+            print(f"❌ Arquivo muito grande para a categoria {file_category['categoria']}: {size} bytes")
+            logger.warning(f"Arquivo excede o limite da categoria {file_category['categoria']}: {size} bytes")
+            return error
+        
+        # Calcular os digests do arquivo antes do upload (uma única leitura)
+        with metrics.stage("hash"):
+            file_digest = calculate_digests(file)
+        file_hash = file_digest.hexdigest('md5')
+        content_hash = content_sha256(file_digest)
+        
+        # Threshold, tamanho de parte e concorrência do multipart para este arquivo
+        transfer_plan = transfer_engine.plan(file_category["categoria"], size)
+        
+        # Montar caminho completo com diretório
+        s3_key = f"{target_folder}/{unique_filename}" if target_folder else unique_filename
+        
+        print(f"📏 Tamanho do arquivo: {size} bytes ({format_size_human(size)['formatted']})")
+        print(f"📁 Diretório destino: {target_folder}")
+        logger.info(f"Tamanho do arquivo: {size} bytes, Diretório: {target_folder}")
+        
+        # Conteúdo idêntico já armazenado: atender sem transferência nem ffprobe
+        if dedup:
+            try:
+                backend = get_storage()
+            except Exception as e:
+                error_payload, status_code = s3_client_error_response(e)
+                return error_payload, status_code
+            try:
+                dedup_response = serve_dedup_hit(
+                    backend,
+                    file_hash,
+                    file_digest.hexdigest('sha256'),
+                    size,
+                    {
+                        "original_filename": original_filename,
+                        "unique_filename": unique_filename,
+                        "file_extension": file_extension,
+                        "content_type": content_type,
+                        "target_folder": target_folder,
+                        "s3_key": s3_key,
+                    },
+                    file_category,
+                    client_info,
+                    timestamp_inicio_iso,
+                    timestamp_inicio_unix,
+                    hashes=extra_hashes(file_digest),
+                )
+            except Exception as e:
+                error_payload, status_code = storage_error_response(e)
+                return error_payload, status_code
+            if dedup_response:
+                return dedup_response, 200
+        
+        # Salvar arquivo temporariamente para extração de metadados
+        temp_file_path = None
+        media_metadata = None
+        
+        # Só vídeos e áudios passam pelo ffprobe; os demais não precisam do arquivo temporário
+        if is_media_content_type(content_type):
+            media_metadata = media_metadata_cache.get(content_hash, size)
+        
+        # Metadados em segundo plano: nada de arquivo temporário nem ffprobe antes do upload
+        run_media_job = async_metadata and not media_metadata and is_media_content_type(content_type)
+        
+        if media_metadata:
+            print(f"✅ Metadados em cache: {media_metadata.get('descricao_humana', 'N/A')}")
+        elif run_media_job:
+            print("🕒 Metadados de mídia serão extraídos em segundo plano")
+        elif is_media_content_type(content_type):
+            def write_temp_file() -> str:
+                # Só o ffprobe precisa do arquivo temporário, copiado em blocos grandes
+                nonlocal temp_file_path
+                with metrics.stage("arquivo_temporario"):
+                    temp_fd, temp_file_path = tempfile.mkstemp(suffix=f".{file_extension}")
+                    with os.fdopen(temp_fd, 'wb') as temp_file:
+                        file.stream.seek(0)
+                        shutil.copyfileobj(file.stream, temp_file, STREAM_READ_CHUNK_BYTES)
+                return temp_file_path
+            
+            try:
+                # Extrair metadados de mídia direto do stream do upload
+                print("🔍 Extraindo metadados de mídia...")
+                media_metadata = extract_media_metadata(file.stream, content_type, ffprobe_source=write_temp_file)
+                media_metadata_cache.put(content_hash, size, media_metadata)
+                
+                if media_metadata:
+                    print(f"✅ Metadados extraídos: {media_metadata.get('descricao_humana', 'N/A')}")
+                else:
+                    print("ℹ️ Metadados não disponíveis para este tipo de arquivo")
+                
+            except Exception as e:
+                logger.warning(f"Erro ao processar arquivo temporário ou extrair metadados: {e}")
+                # Continuar mesmo se falhar a extração de metadados
+            finally:
+                # Resetar stream do arquivo para upload
+                file.stream.seek(0)
+        else:
+            print("ℹ️ Metadados não disponíveis para este tipo de arquivo")
+        
+        print(f"🔄 Iniciando upload: {target_folder}/{unique_filename}")
+        logger.info(f"Iniciando upload: {target_folder}/{unique_filename}")
+        
+        # Timestamp de início do upload
+        timestamp_upload_inicio = time.time()
+        
+        # Obter backend de armazenamento (inicializa o cliente S3 se necessário)
+        try:
+            backend = get_storage()
+        except Exception as e:
+            error_payload, status_code = s3_client_error_response(e)
+            return error_payload, status_code
+        
+        # Upload para o armazenamento
+        try:
+            with metrics.stage("envio_s3"):
+                backend.put_stream(
+                    s3_key,
+                    file,
+                    content_type or 'application/octet-stream',
+                    transfer_config=transfer_engine.transfer_config(transfer_plan),
+                    checksums=storage_checksums(file_digest)
+                )
+        except Exception as e:
+            error_payload, status_code = storage_error_response(e)
+            return error_payload, status_code
+        
+        # Timestamp de fim do upload
+        timestamp_upload_fim = time.time()
+        
+        # Limpar arquivo temporário se existir
+        if temp_file_path and os.path.exists(temp_file_path):
+            try:
+                os.unlink(temp_file_path)
+            except Exception as e:
+                logger.warning(f"Erro ao remover arquivo temporário: {e}")
+        
+        response_data = build_upload_response(
+            unique_filename=unique_filename,
+            original_filename=original_filename,
+            file_hash=file_hash,
+            size=size,
+            content_type=content_type,
+            file_extension=file_extension,
+            file_category=file_category,
+            target_folder=target_folder,
+            s3_key=s3_key,
+            media_metadata=media_metadata,
+            client_info=client_info,
+            timestamp_inicio_iso=timestamp_inicio_iso,
+            timestamp_inicio_unix=timestamp_inicio_unix,
+            timestamp_upload_inicio=timestamp_upload_inicio,
+            timestamp_upload_fim=timestamp_upload_fim,
+            transfer_plan=transfer_plan,
+            hashes=extra_hashes(file_digest),
+        )
+        
+        # Alimentar o ajuste adaptativo com a vazão medida
+        transfer_engine.record_throughput(file_category["categoria"], size, response_data["upload"]["velocidade_bytes_por_segundo"])
+        dedup_register(response_content_hash(response_data), size, s3_key, content_type, media_metadata)
+        
+        media_job_id = None
+        if run_media_job:
+            media_job_id = reserve_media_job(response_data, target_folder, unique_filename, s3_key)
+            if media_job_id is None:
+                # Fila cheia: extrair agora do arquivo recebido (o ffprobe, se preciso, lê o objeto gravado)
+                media_metadata = extract_media_metadata(file.stream, content_type, ffprobe_source=lambda: backend.read_url(s3_key))
+                if media_metadata:
+                    media_metadata_cache.put(content_hash, size, media_metadata)
+                    dedup_update_media(response_content_hash(response_data), size, media_metadata)
+                    response_data["arquivo"]["midia"] = media_metadata
+        
+        print(f"✅ Upload concluído: {response_data['url']}")
+        logger.info(f"Upload concluído: {response_data['url']}")
+        
+        # Salvar callback JSON no mesmo diretório com mesmo nome base
+        save_callback_json(backend, response_data, target_folder, unique_filename)
+        catalog_register(response_data)
+        
+        if media_job_id:
+            try:
+                job_source = local_media_job_source(file.stream, size, file_extension)
+            except Exception as e:
+                # Sem fonte local, o job lê o objeto do armazenamento
+                logger.warning(f"Erro ao preparar fonte local do job de metadados: {e}")
+                job_source = None
+            start_media_job(
+                media_job_id, backend, response_data, target_folder, unique_filename, s3_key, content_type, size,
+                source=job_source
+            )
+        
+        return response_data, 200
+        
+    except Exception as e:
+        print(f"❌ Erro inesperado no upload: {e}")
+        logger.error(f"Erro inesperado no upload: {e}", exc_info=True)
+        return {
+            "success": False,
+            "error": "Erro interno do servidor",
+            "detail": "Ocorreu um erro inesperado durante o processamento. Entre em contato com o suporte se o problema persistir."
+        }, 500
+
+def upload_file_streaming(client_info: Dict[str, Any], timestamp_inicio_iso: str, timestamp_inicio_unix: float):
+    """Upload em passagem única: lê o corpo multipart em blocos sem bufferizar o arquivo inteiro.
+    
+    Campos de formulário (ex.: folder) só são considerados se vierem antes do campo 'file';
+    também podem ser enviados na query string.
+    """
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        print("❌ Nenhum arquivo fornecido")
+        logger.warning("Tentativa de upload em streaming sem multipart/form-data")
+        return jsonify({
+            "success": False,
+            "error": "Nenhum arquivo fornecido",
+            "detail": "É necessário enviar um arquivo no campo 'file' usando multipart/form-data"
+        }), 400
+    
+    # Obter o cliente antes de ler o corpo: sem storage não faz sentido consumir o upload
+    try:
+        backend = get_storage()
+    except Exception as e:
+        error_payload, status_code = s3_client_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    decoder = MultipartDecoder(boundary.encode('latin-1'))
+    form_fields: Dict[str, str] = {}
+    field_name = None
+    field_chunks = []
+    current_part = None
+    # Cabeçalho da parte 'file' e primeiros bytes, retidos até o sniffing do conteúdo
+    file_event = None
+    file_head = bytearray()
+    pipeline = None
+    upload_info: Dict[str, Any] = {}
+    timestamp_upload_inicio = None
+    recebimento_inicio = time.perf_counter()
+    
+    try:
+        while True:
+            chunk = request.stream.read(STREAM_READ_CHUNK_BYTES)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, File):
+                    if event.name == 'file' and file_event is None:
+                        file_event = event
+                        current_part = 'file'
+                    else:
+                        current_part = None
+                elif isinstance(event, Field):
+                    current_part = 'field'
+                    field_name = event.name
+                    field_chunks = []
+                elif isinstance(event, Data):
+                    if current_part == 'file' and pipeline is not None:
+                        pipeline.write(event.data)
+                    elif current_part == 'file':
+                        file_head += event.data
+                        # Pipeline só depois dos primeiros bytes: o sniffing decide tipo, categoria e spool
+                        if len(file_head) >= sniffing.SNIFF_BYTES or not event.more_data:
+                            upload_info = prepare_streaming_file(file_event, form_fields.get('folder') or request.args.get('folder'), request.content_length, bytes(file_head))
+                            needs_probe = streaming_needs_media_probe(upload_info)
+                            pipeline = StreamingUploadPipeline(
+                                backend,
+                                upload_info["s3_key"],
+                                upload_info["content_type"] or 'application/octet-stream',
+                                upload_info["transfer_plan"],
+                                spool_suffix=f".{upload_info['file_extension']}" if needs_probe and MEDIA_PROBE_ENGINE == "ffprobe" else None,
+                                probe_windows=needs_probe and MEDIA_PROBE_ENGINE != "ffprobe",
+                                max_size_bytes=upload_info["max_size_bytes"]
+                            )
+                            timestamp_upload_inicio = time.time()
+                            print(f"🔄 Iniciando upload em streaming: {upload_info['s3_key']}")
+                            logger.info(f"Iniciando upload em streaming: {upload_info['s3_key']}")
+                            pipeline.write(bytes(file_head))
+                    elif current_part == 'field':
+                        field_chunks.append(event.data)
+                        if not event.more_data:
+                            form_fields[field_name] = b''.join(field_chunks).decode('utf-8', 'replace')
+                    if not event.more_data:
+                        current_part = None
+                event = decoder.next_event()
+            
+            if not chunk or isinstance(event, Epilogue):
+                break
+        
+        if pipeline is None:
+            print("❌ Nenhum arquivo fornecido")
+            logger.warning("Tentativa de upload em streaming sem arquivo")
+            return jsonify({
+                "success": False,
+                "error": "Nenhum arquivo fornecido",
+                "detail": "É necessário enviar um arquivo no campo 'file' usando multipart/form-data"
+            }), 400
+        
+        metrics.observe_stage("recebimento_corpo", time.perf_counter() - recebimento_inicio)
+        with metrics.stage("envio_s3"):
+            pipeline.finish()
+        pipeline.record_stage_metrics()
+    except UploadValidationError as e:
+        if pipeline is not None:
+            pipeline.abort()
+        print(f"❌ Upload em streaming recusado: {e.error}")
+        logger.warning(f"Upload em streaming recusado: {e.error}")
+        error_payload, status_code = e.to_response()
+        return jsonify(error_payload), status_code
+    except RequestEntityTooLarge:
+        if pipeline is not None:
+            pipeline.abort()
+        raise
+    except ValueError as e:
+        if pipeline is not None:
+            pipeline.abort()
+        print(f"❌ Corpo multipart inválido: {e}")
+        logger.warning(f"Corpo multipart inválido no upload em streaming: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Requisição multipart inválida",
+            "detail": "Não foi possível interpretar o corpo multipart/form-data enviado."
+        }), 400
+    except Exception as e:
+        if pipeline is not None:
+            pipeline.abort()
+        error_payload, status_code = storage_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    timestamp_upload_fim = time.time()
+    
+    # Metadados de mídia a partir das janelas de cabeçalho (ou do spool), obtidas na mesma passagem
+    file_hash = pipeline.digest.hexdigest('md5')
+    content_hash = content_sha256(pipeline.digest)
+    media_metadata = None
+    job_probe_source = None
+    probe_source = pipeline.probe_source()
+    presigned_object_url = lambda: backend.read_url(upload_info["s3_key"])
+    if is_media_content_type(upload_info["content_type"]):
+        media_metadata = media_metadata_cache.get(content_hash, pipeline.size)
+        if media_metadata is None and probe_source and async_metadata_requested():
+            # O job em segundo plano assume o spool (ou as janelas) desta passagem
+            job_probe_source = probe_source
+            pipeline.spool_path = None
+        elif media_metadata is None and probe_source:
+            print("🔍 Extraindo metadados de mídia...")
+            # Fora das janelas, o ffprobe lê o objeto já gravado no bucket
+            media_metadata = extract_media_metadata(probe_source, upload_info["content_type"], ffprobe_source=presigned_object_url)
+            media_metadata_cache.put(content_hash, pipeline.size, media_metadata)
+    pipeline.cleanup()
+    
+    response_data = build_upload_response(
+        unique_filename=upload_info["unique_filename"],
+        original_filename=upload_info["original_filename"],
+        file_hash=file_hash,
+        size=pipeline.size,
+        content_type=upload_info["content_type"],
+        file_extension=upload_info["file_extension"],
+        file_category=upload_info["file_category"],
+        target_folder=upload_info["target_folder"],
+        s3_key=upload_info["s3_key"],
+        media_metadata=media_metadata,
+        client_info=client_info,
+        timestamp_inicio_iso=timestamp_inicio_iso,
+        timestamp_inicio_unix=timestamp_inicio_unix,
+        timestamp_upload_inicio=timestamp_upload_inicio,
+        timestamp_upload_fim=timestamp_upload_fim,
+        transfer_plan=upload_info["transfer_plan"],
+        hashes=extra_hashes(pipeline.digest),
+    )
+    
+    transfer_engine.record_throughput(upload_info["file_category"]["categoria"], pipeline.size, response_data["upload"]["velocidade_bytes_por_segundo"])
+    dedup_register(response_content_hash(response_data), pipeline.size, upload_info["s3_key"], upload_info["content_type"], media_metadata)
+    
+    media_job_id = None
+    if job_probe_source:
+        media_job_id = reserve_media_job(response_data, upload_info["target_folder"], upload_info["unique_filename"], upload_info["s3_key"])
+        if media_job_id is None:
+            # Fila cheia: extrair agora a partir do spool ou das janelas
+            media_metadata = extract_media_metadata(job_probe_source, upload_info["content_type"], ffprobe_source=presigned_object_url)
+            if isinstance(job_probe_source, str):
+                os.unlink(job_probe_source)
+            if media_metadata:
+                media_metadata_cache.put(content_hash, pipeline.size, media_metadata)
+                dedup_update_media(response_content_hash(response_data), pipeline.size, media_metadata)
+                response_data["arquivo"]["midia"] = media_metadata
+    
+    print(f"✅ Upload em streaming concluído: {response_data['url']} ({len(pipeline.parts) or 1} parte(s))")
+    logger.info(f"Upload em streaming concluído: {response_data['url']}")
+    
+    save_callback_json(backend, response_data, upload_info["target_folder"], upload_info["unique_filename"])
+    catalog_register(response_data)
+    
+    if media_job_id:
+        start_media_job(
+            media_job_id, backend, response_data, upload_info["target_folder"], upload_info["unique_filename"],
+            upload_info["s3_key"], upload_info["content_type"], pipeline.size, source=job_probe_source
+        )
+    
+    return upload_json_response(response_data)
+
+def streaming_needs_media_probe(upload_info: Dict[str, Any]) -> bool:
+    """Spool ou janelas de cabeçalho só são necessários para mídia"""
+    return is_media_content_type(upload_info["content_type"])
+
+def prepare_streaming_file(event: File, folder_param: Optional[str], content_length: Optional[int], head: bytes = b'') -> Dict[str, Any]:
+    """Valida o cabeçalho e os primeiros bytes (head) da parte 'file' e define nome, diretório e chave de destino"""
+    if not event.filename:
+        raise UploadValidationError(
+            400,
+            "Arquivo sem nome ou vazio",
+            "O arquivo enviado não possui nome ou está vazio. Verifique se o arquivo foi selecionado corretamente."
+        )
+    
+    target, error = prepare_upload_target(
+        event.filename,
+        event.headers.get('Content-Type', ''),
+        folder_param
+    )
+    if error:
+        raise UploadValidationError(error[1], error[0]["error"], error[0]["detail"])
+    
+    # Manter o content type como enviado pelo cliente (vazio se ausente), salvo correção pelo conteúdo
+    content_type, detected_category, error = sniff_content_type(head, event.headers.get('Content-Type', ''), target["file_extension"])
+    if error:
+        raise UploadValidationError(error[1], error[0]["error"], error[0]["detail"])
+    target["content_type"] = content_type
+    file_category = get_file_category(target["content_type"], target["file_extension"], detected_category)
+    metrics.set_category(file_category["categoria"])
+    
+    # Content-Length já denuncia um arquivo acima do limite da categoria: recusar antes de transferir
+    if content_length:
+        error = category_size_error(file_category["categoria"], content_length, estimado=True)
+        if error:
+            raise UploadValidationError(error[1], error[0]["error"], error[0]["detail"])
+    
+    return {
+        **target,
+        "file_category": file_category,
+        "max_size_bytes": CATEGORY_MAX_SIZE_MB[file_category["categoria"]] * 1024 * 1024,
+        # Content-Length inclui o envelope multipart, mas serve como estimativa do tamanho
+        "transfer_plan": transfer_engine.plan(file_category["categoria"], content_length),
+    }
+
+def sign_upload_token(payload: Dict[str, Any]) -> str:
+    """Gera um token assinado (HMAC) com os dados de uma sessão de upload"""
+    body = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+    signature = hmac.new(UPLOAD_TOKEN_SECRET.encode('utf-8'), body.encode('ascii'), hashlib.sha256).digest()
+    return f"{body}.{base64.urlsafe_b64encode(signature).decode('ascii').rstrip('=')}"
+
+def verify_upload_token(token: str) -> Optional[Dict[str, Any]]:
+    """Valida a assinatura e a validade de um token de sessão; retorna os dados ou None"""
+    try:
+        body, signature = token.split('.', 1)
+        expected = base64.urlsafe_b64encode(
+            hmac.new(UPLOAD_TOKEN_SECRET.encode('utf-8'), body.encode('ascii'), hashlib.sha256).digest()
+        ).decode('ascii').rstrip('=')
+        if not hmac.compare_digest(signature, expected):
+            return None
+        payload = json.loads(base64.urlsafe_b64decode(body + '=' * (-len(body) % 4)))
+    except Exception:
+        return None
+    if time.time() - payload.get("criado_em", 0) > UPLOAD_SESSION_TTL_HOURS * 3600:
+        return None
+    return payload
+
+def finalization_begin(s3_key: str):
+    """Reserva a finalização de um objeto enviado por URL assinada ou sessão.
+    
+    Retorna (dono, None) para finalizar ou (None, resposta) quando o objeto já foi finalizado
+    (a resposta gravada é devolvida de novo) ou outra chamada está finalizando. Sem o SQLite
+    a finalização segue sem a proteção (dono None).
+    """
+    try:
+        db = get_state_db()
+        while True:
+            now = time.time()
+            dono = uuid.uuid4().hex
+            # Finalizações vencidas (e reservas de workers que morreram) liberam o lugar
+            db.execute("DELETE FROM upload_finalizations WHERE expira_em < ?", (now,))
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO upload_finalizations (s3_key, dono, criado_em, expira_em) VALUES (?, ?, ?, ?)",
+                (s3_key, dono, now, now + IDEMPOTENCY_LOCK_SECONDS)
+            )
+            if cursor.rowcount == 1:
+                return dono, None
+            row = db.execute("SELECT resposta FROM upload_finalizations WHERE s3_key = ?", (s3_key,)).fetchone()
+            if row is not None:
+                break
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao reservar finalização do upload: {e}")
+        return None, None
+    
+    if row["resposta"] is None:
+        response = jsonify({
+            "success": False,
+            "error": "Finalização em andamento",
+            "detail": "Outra chamada está finalizando este upload. Tente novamente em instantes para receber o resultado."
+        })
+        response.headers['Retry-After'] = '1'
+        return None, (response, 409)
+    
+    print(f"🔁 Upload já finalizado, resposta gravada devolvida: {s3_key}")
+    logger.info(f"Upload já finalizado, resposta gravada devolvida: {s3_key}")
+    return None, upload_json_response(json.loads(row["resposta"]))
+
+def finalization_finish(s3_key: str, dono: Optional[str], response_data: Optional[Dict[str, Any]]) -> None:
+    """Grava a resposta da finalização (chamadas repetidas a recebem) ou libera a reserva após um erro"""
+    if dono is None:
+        return
+    try:
+        db = get_state_db()
+        if response_data is None:
+            db.execute("DELETE FROM upload_finalizations WHERE s3_key = ? AND dono = ?", (s3_key, dono))
+        else:
+            db.execute(
+                "UPDATE upload_finalizations SET resposta = ?, expira_em = ? WHERE s3_key = ? AND dono = ?",
+                (dumps_json(response_data).decode('utf-8'), time.time() + UPLOAD_SESSION_TTL_HOURS * 3600, s3_key, dono)
+            )
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao gravar finalização do upload: {e}")
+
+def finalize_stored_object(
+    backend: storage.StorageBackend,
+    upload_data: Dict[str, Any],
+    client_info: Dict[str, Any],
+    timestamp_inicio_iso: str,
+    timestamp_inicio_unix: float,
+    transfer_plan: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Gera a resposta enriquecida e o callback JSON de um objeto já gravado no armazenamento.
+    
+    Usado quando os bytes não passaram pelo worker em uma única requisição: o tamanho vem do
+    HEAD e os metadados de mídia são extraídos direto do armazenamento (URL assinada no S3).
+    """
+    s3_key = upload_data["s3_key"]
+    head = backend.head(s3_key)
+    timestamp_upload_fim = time.time()
+    size = head['size']
+    etag = head['etag'].strip('"')
+    
+    if size > max_content_length_mb * 1024 * 1024:
+        # Objeto gravado direto no armazenamento acima do limite: remover para não ficar publicado
+        backend.delete(s3_key)
+        raise UploadValidationError(
+            413,
+            "Arquivo muito grande",
+            f"O tamanho do arquivo excede o limite máximo permitido. Tamanho máximo configurado: {max_content_length_mb}MB. Tamanho do arquivo enviado: {size / 1024 / 1024:.2f}MB"
+        )
+    content_type = upload_data.get("content_type") or head['content_type']
+    file_category = get_file_category(content_type or '', upload_data["file_extension"])
+    error = category_size_error(file_category["categoria"], size)
+    if error:
+        backend.delete(s3_key)
+        raise UploadValidationError(error[1], error[0]["error"], error[0]["detail"])
+    
+    # ETag de PUT simples é o MD5 do conteúdo; no multipart é um hash das partes
+    file_hash = etag if etag and '-' not in etag else None
+    
+    # Os bytes não passaram pelo worker: sem SHA-256 do conteúdo, o cache de metadados não é usado
+    media_metadata = None
+    if is_media_content_type(content_type):
+        print("🔍 Extraindo metadados de mídia a partir do armazenamento...")
+        media_metadata = extract_media_metadata(backend.read_url(s3_key), content_type)
+    
+    response_data = build_upload_response(
+        unique_filename=upload_data["unique_filename"],
+        original_filename=upload_data["original_filename"],
+        file_hash=file_hash,
+        size=size,
+        content_type=content_type,
+        file_extension=upload_data["file_extension"],
+        file_category=file_category,
+        target_folder=upload_data["target_folder"],
+        s3_key=s3_key,
+        media_metadata=media_metadata,
+        client_info=client_info,
+        timestamp_inicio_iso=timestamp_inicio_iso,
+        timestamp_inicio_unix=timestamp_inicio_unix,
+        timestamp_upload_inicio=timestamp_inicio_unix,
+        timestamp_upload_fim=timestamp_upload_fim,
+        transfer_plan=transfer_plan,
+    )
+    response_data["arquivo"]["etag"] = etag
+    # Sem o SHA-256 do conteúdo (o corpo não passou pela API) o objeto não entra no índice
+    dedup_register(response_content_hash(response_data), size, s3_key, content_type, media_metadata)
+    
+    save_callback_json(backend, response_data, upload_data["target_folder"], upload_data["unique_filename"])
+    catalog_register(response_data)
+    return response_data
+
+def prepare_upload_target(filename: Optional[str], content_type: Optional[str], folder_param: Optional[str]) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[Dict[str, Any], int]]]:
+    """Valida nome e diretório de um upload declarado e define a chave de destino.
+    
+    Retorna (dados do destino, None) ou (None, resposta de erro).
+    """
+    if not filename:
+        return None, ({
+            "success": False,
+            "error": "Arquivo sem nome ou vazio",
+            "detail": "Informe o nome do arquivo no campo 'filename'."
+        }, 400)
+    
+    if not allowed_file(filename):
+        return None, ({
+            "success": False,
+            "error": f"Tipo de arquivo não permitido. Tipos aceitos: {', '.join(sorted(ALLOWED_EXTENSIONS))}",
+            "detail": "O arquivo enviado não está em um formato suportado. Use apenas os tipos listados."
+        }, 400)
+    
+    if folder_param is not None:
+        folder_param = str(folder_param).strip() if folder_param else None
+    target_folder = validate_and_sanitize_folder(folder_param)
+    
+    original_filename = secure_filename(filename)
+    file_extension = original_filename.rsplit('.', 1)[1].lower()
+    unique_filename = f"{uuid.uuid4()}.{file_extension}"
+    
+    return {
+        "original_filename": original_filename,
+        "file_extension": file_extension,
+        "unique_filename": unique_filename,
+        "content_type": content_type or 'application/octet-stream',
+        "target_folder": target_folder,
+        "s3_key": f"{target_folder}/{unique_filename}" if target_folder else unique_filename,
+    }, None
+
+def _read_declared_size(value: Any) -> Tuple[Optional[int], Optional[Tuple[Dict[str, Any], int]]]:
+    """Valida o tamanho declarado pelo cliente contra o limite configurado"""
+    if value in (None, ''):
+        return None, None
+    try:
+        size = int(value)
+        if size < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return None, ({
+            "success": False,
+            "error": "Tamanho inválido",
+            "detail": "O campo 'size' deve ser um número inteiro de bytes."
+        }, 400)
+    if size > max_content_length_mb * 1024 * 1024:
+        return None, ({
+            "success": False,
+            "error": "Arquivo muito grande",
+            "detail": f"O tamanho do arquivo excede o limite máximo permitido. Tamanho máximo configurado: {max_content_length_mb}MB. Tamanho do arquivo enviado: {size / 1024 / 1024:.2f}MB"
+        }, 413)
+    return size, None
+
+def _list_session_parts(backend: storage.StorageBackend, session: Dict[str, Any]) -> list:
+    """Lista as partes já gravadas no multipart da sessão"""
+    return backend.list_parts(session["s3_key"], session["upload_id"])
+
+def _session_not_found_response():
+    return jsonify({
+        "success": False,
+        "error": "Sessão de upload não encontrada",
+        "detail": "O identificador da sessão é inválido, expirou ou a sessão já foi concluída/cancelada."
+    }), 404
+
+def _load_session(session_id: str) -> Optional[Dict[str, Any]]:
+    session = verify_upload_token(session_id)
+    if not session or session.get("tipo") != "sessao":
+        return None
+    return session
+
+def _is_no_such_upload(e: Exception) -> bool:
+    return isinstance(e, storage.NotFoundError)
+
+def limit_batch_file_parts(limit: int) -> None:
+    """Faz o parser multipart da requisição recusar o lote no arquivo limit + 1, antes de
+    ler (e gravar em arquivos temporários) o restante do corpo"""
+    default_factory = request._get_file_stream
+    received = 0
+    
+    def stream_factory(total_content_length, content_type, filename=None, content_length=None):
+        nonlocal received
+        received += 1
+        if received > limit:
+            raise UploadValidationError(
+                400,
+                "Arquivos demais no lote",
+                f"O lote pode ter no máximo {limit} arquivos. Recebidos: mais de {limit}"
+            )
+        return default_factory(total_content_length, content_type, filename, content_length)
+    
+    request._get_file_stream = stream_factory
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """Upload de vários arquivos (campos 'file' repetidos) em uma única requisição.
+    
+    Os arquivos sobem em paralelo em um pool limitado (BATCH_CONCURRENCY); cada item do
+    resultado tem a mesma estrutura de POST /upload, e falhas são reportadas por item.
+    """
+    timestamp_inicio = datetime.now()
+    timestamp_inicio_iso = timestamp_inicio.isoformat()
+    timestamp_inicio_unix = time.time()
+    
+    try:
+        print("📤 Recebendo requisição de upload em lote")
+        logger.info("Recebendo requisição de upload em lote")
+        
+        client_info = get_client_info()
+        error = response_profile_error()
+        if error:
+            return jsonify(error[0]), error[1]
+        fields = response_fields_requested()
         
-        # Calcular hash do arquivo antes do upload
-        file_hash = calculate_hash(file)
+        limit_batch_file_parts(BATCH_MAX_FILES)
+        try:
+            with metrics.stage("recebimento_corpo", modo="lote"):
+                files = request.files.getlist('file')
+        except UploadValidationError as e:
+            print(f"❌ Lote com mais de {BATCH_MAX_FILES} arquivos")
+            logger.warning(f"Lote excede o limite de arquivos: mais de {BATCH_MAX_FILES}")
+            return jsonify({"success": False, "error": e.error, "detail": e.detail}), e.status_code
         
-        # Formatação de tamanho
-        size_info = format_size_human(size)
+        if not files:
+            print("❌ Nenhum arquivo fornecido")
+            logger.warning("Tentativa de upload em lote sem arquivos")
+            return jsonify({
+                "success": False,
+                "error": "Nenhum arquivo fornecido",
+                "detail": "É necessário enviar um ou mais arquivos no campo 'file' usando multipart/form-data"
+            }), 400
         
-        # Categorização do arquivo
-        file_category = get_file_category(file.content_type or '', file_extension)
+        # Manifesto opcional: diretório por arquivo, casado pelo nome original
+        manifest_folders = {}
+        manifest_raw = request.form.get('manifest')
+        if manifest_raw:
+            try:
+                manifest = json.loads(manifest_raw)
+                if not isinstance(manifest, list):
+                    raise ValueError("o manifesto deve ser uma lista")
+                for entry in manifest:
+                    if not isinstance(entry, dict) or not entry.get('filename'):
+                        raise ValueError("cada item do manifesto precisa de 'filename'")
+                    manifest_folders[entry['filename']] = entry.get('folder')
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "error": "Manifesto inválido",
+                    "detail": f"O campo 'manifest' deve ser uma lista JSON de objetos com 'filename' e 'folder': {e}"
+                }), 400
         
-        print(f"📏 Tamanho do arquivo: {size} bytes ({size_info['formatted']})")
-        print(f"📁 Diretório destino: {target_folder}")
-        logger.info(f"Tamanho do arquivo: {size} bytes, Diretório: {target_folder}")
+        default_folder = request.form.get('folder') or request.args.get('folder')
+        dedup = dedup_requested(request.form.get('dedup') or request.args.get('dedup'))
+        async_metadata = async_metadata_requested(request.form.get('async_metadata') or request.args.get('async_metadata'))
+        host_root = request_host_root()
         
-        # Salvar arquivo temporariamente para extração de metadados
-        temp_file_path = None
-        media_metadata = None
+        def process_item(file) -> Tuple[Dict[str, Any], int]:
+            with metrics.observe_upload("lote") as observation, tracing.span("item_lote", arquivo=file.filename or ""):
+                payload, status_code = process_file_upload(
+                    file,
+                    client_info,
+                    timestamp_inicio_iso,
+                    timestamp_inicio_unix,
+                    folder_param=manifest_folders.get(file.filename, default_folder),
+                    dedup=dedup,
+                    async_metadata=async_metadata,
+                    host_root=host_root,
+                )
+                observation.finish(status_code, payload)
+            return payload, status_code
         
-        try:
-            # Criar arquivo temporário
-            temp_fd, temp_file_path = tempfile.mkstemp(suffix=f".{file_extension}")
-            file.stream.seek(0)
-            
-            with os.fdopen(temp_fd, 'wb') as temp_file:
-                file.stream.seek(0)
-                temp_file.write(file.stream.read())
-            
-            # Extrair metadados de mídia
-            print("🔍 Extraindo metadados de mídia...")
-            media_metadata = extract_media_metadata(temp_file_path, file.content_type or '')
-            
-            if media_metadata:
-                print(f"✅ Metadados extraídos: {media_metadata.get('descricao_humana', 'N/A')}")
-            else:
-                print("ℹ️ Metadados não disponíveis para este tipo de arquivo")
-            
-            # Resetar stream do arquivo para upload
-            file.stream.seek(0)
-            
-        except Exception as e:
-            logger.warning(f"Erro ao processar arquivo temporário ou extrair metadados: {e}")
-            # Continuar mesmo se falhar a extração de metadados
+        print(f"🧩 Lote com {len(files)} arquivo(s), {min(BATCH_CONCURRENCY, len(files))} transferência(s) simultânea(s)")
+        with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(files))) as executor:
+            # Um contexto por item (observação de métricas e spans do trace da requisição)
+            contexts = [contextvars.copy_context() for _ in files]
+            outcomes = list(executor.map(lambda context, file: context.run(process_item, file), contexts, files))
         
-        print(f"🔄 Iniciando upload: {target_folder}/{unique_filename}")
-        logger.info(f"Iniciando upload: {target_folder}/{unique_filename}")
+        resultados = []
+        for indice, (file, (payload, status_code)) in enumerate(zip(files, outcomes)):
+            resultados.append({
+                "indice": indice,
+                "nome_enviado": file.filename,
+                "status_http": status_code,
+                **select_response_fields(payload, fields)
+            })
         
-        # Timestamp de início do upload
-        timestamp_upload_inicio = time.time()
+        sucesso = sum(1 for item in resultados if item.get("success"))
+        tempo_total = time.time() - timestamp_inicio_unix
         
-        # Obter cliente S3 (inicializa se necessário)
-        try:
-            s3_client = get_s3_client()
-        except ValueError as e:
-            # Credenciais não configuradas
-            print(f"❌ Erro de configuração: {e}")
-            logger.error(f"Credenciais não configuradas: {e}")
-            return jsonify({
-                "success": False,
-                "error": "Credenciais do Spaces não configuradas",
-                "detail": "As variáveis de ambiente SPACES_KEY e SPACES_SECRET não estão configuradas corretamente."
-            }), 503
-        except Exception as e:
-            # Outros erros de inicialização
-            print(f"❌ Erro ao inicializar cliente S3: {e}")
-            logger.error(f"Erro ao inicializar cliente S3: {e}")
+        print(f"✅ Lote concluído: {sucesso}/{len(resultados)} arquivo(s) em {tempo_total:.2f}s")
+        logger.info(f"Lote concluído: {sucesso}/{len(resultados)} arquivo(s) em {tempo_total:.2f}s")
+        
+        # 207: o lote foi processado, mas ao menos um item falhou
+        return jsonify({
+            "success": sucesso == len(resultados),
+            "total": len(resultados),
+            "sucesso": sucesso,
+            "falhas": len(resultados) - sucesso,
+            "tempo_total_segundos": round(tempo_total, 3),
+            "resultados": resultados
+        }), 200 if sucesso == len(resultados) else 207
+        
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        print(f"❌ Erro inesperado no upload em lote: {e}")
+        logger.error(f"Erro inesperado no upload em lote: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": "Erro interno do servidor",
+            "detail": "Ocorreu um erro inesperado durante o processamento. Entre em contato com o suporte se o problema persistir."
+        }), 500
+
+@app.route('/upload/sessions', methods=['POST'])
+def create_upload_session():
+    """Inicia uma sessão de upload em partes (uma parte = um UploadPart do S3)"""
+    params = request.get_json(silent=True) or request.form
+    
+    size, error = _read_declared_size(params.get('size'))
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    target, error = prepare_upload_target(params.get('filename'), params.get('content_type'), params.get('folder') or request.args.get('folder'))
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    file_category = get_file_category(target["content_type"], target["file_extension"])
+    error = category_size_error(file_category["categoria"], size) if size is not None else None
+    if error:
+        return jsonify(error[0]), error[1]
+    transfer_plan = transfer_engine.plan(file_category["categoria"], size)
+    chunk_size = transfer_plan["tamanho_parte_bytes"]
+    
+    try:
+        backend = get_storage()
+    except Exception as e:
+        error_payload, status_code = s3_client_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    try:
+        upload_id = backend.create_multipart(target["s3_key"], target["content_type"])
+    except Exception as e:
+        error_payload, status_code = storage_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    session = {
+        **target,
+        "tipo": "sessao",
+        "upload_id": upload_id,
+        "tamanho_parte": chunk_size,
+        "tamanho_declarado": size,
+        "criado_em": time.time(),
+    }
+    session_id = sign_upload_token(session)
+    
+    print(f"🧩 Sessão de upload iniciada: {target['s3_key']}")
+    logger.info(f"Sessão de upload iniciada: {target['s3_key']}")
+    
+    return jsonify({
+        "success": True,
+        "session_id": session_id,
+        "chunk_size": chunk_size,
+        "total_chunks": math.ceil(size / chunk_size) if size else None,
+        "expira_em_segundos": UPLOAD_SESSION_TTL_HOURS * 3600,
+        "arquivo": {
+            "nome_original": target["original_filename"],
+            "nome_armazenado": target["unique_filename"],
+            "caminho_completo": target["s3_key"],
+            "url_publica": build_public_url(target["s3_key"]),
+        },
+        "endpoints": {
+            "chunk": f"/upload/sessions/{session_id}/chunks/{{numero}}",
+            "status": f"/upload/sessions/{session_id}",
+            "complete": f"/upload/sessions/{session_id}/complete",
+        },
+        "descricao_humana": f"Envie o arquivo em partes de {format_size_human(chunk_size)['formatted']} (numeradas a partir de 1), em qualquer ordem, e conclua a sessão"
+    }), 201
+
+@app.route('/upload/sessions/<session_id>/chunks/<int:chunk_number>', methods=['PUT'])
+def upload_session_chunk(session_id: str, chunk_number: int):
+    """Recebe uma parte numerada e grava diretamente como parte do multipart no armazenamento"""
+    session = _load_session(session_id)
+    if not session:
+        return _session_not_found_response()
+    
+    if chunk_number < 1 or chunk_number > S3_MAX_PARTS:
+        return jsonify({
+            "success": False,
+            "error": "Número de parte inválido",
+            "detail": f"As partes devem ser numeradas de 1 a {S3_MAX_PARTS}."
+        }), 400
+    
+    too_large = ({
+        "success": False,
+        "error": "Parte muito grande",
+        "detail": f"Cada parte deve ter no máximo {session['tamanho_parte']} bytes."
+    }, 413)
+    if request.content_length is not None and request.content_length > session["tamanho_parte"]:
+        return jsonify(too_large[0]), too_large[1]
+    
+    try:
+        backend = get_storage()
+    except Exception as e:
+        error_payload, status_code = s3_client_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    # A parte passa pelo spool em blocos de STREAM_READ_CHUNK_BYTES (acima disso vai para o
+    # disco), com o MD5 calculado na mesma leitura: a memória não cresce com o tamanho da parte
+    digest = digests.MultiDigest(['md5']) if STORAGE_CHECKSUM != "off" else None
+    size = 0
+    with tempfile.SpooledTemporaryFile(max_size=STREAM_READ_CHUNK_BYTES) as body:
+        while True:
+            chunk = request.stream.read(STREAM_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > session["tamanho_parte"]:
+                return jsonify(too_large[0]), too_large[1]
+            if digest is not None:
+                digest.update(chunk)
+            body.write(chunk)
+        if not size:
             return jsonify({
                 "success": False,
-                "error": "Erro ao conectar ao serviço de armazenamento",
-                "detail": "Não foi possível inicializar a conexão com o DigitalOcean Spaces. Verifique as configurações."
-            }), 503
+                "error": "Parte vazia",
+                "detail": "O corpo da requisição deve conter os bytes da parte."
+            }), 400
+        body.seek(0)
         
-        # Montar caminho completo com diretório
-        s3_key = f"{target_folder}/{unique_filename}" if target_folder else unique_filename
+        try:
+            etag = backend.upload_part(session["s3_key"], session["upload_id"], chunk_number, body, checksums=part_checksums(digest))
+        except Exception as e:
+            if _is_no_such_upload(e):
+                return _session_not_found_response()
+            error_payload, status_code = storage_error_response(e)
+            return jsonify(error_payload), status_code
+    
+    return jsonify({
+        "success": True,
+        "chunk": chunk_number,
+        "tamanho_bytes": size,
+        "etag": etag.strip('"')
+    })
+
+@app.route('/upload/sessions/<session_id>', methods=['GET'])
+def get_upload_session(session_id: str):
+    """Informa quais partes da sessão já estão gravadas, para retomar o envio"""
+    session = _load_session(session_id)
+    if not session:
+        return _session_not_found_response()
+    
+    try:
+        backend = get_storage()
+        parts = _list_session_parts(backend, session)
+    except Exception as e:
+        if _is_no_such_upload(e):
+            return _session_not_found_response()
+        error_payload, status_code = storage_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    received_bytes = sum(part['Size'] for part in parts)
+    declared_size = session.get("tamanho_declarado")
+    total_chunks = math.ceil(declared_size / session["tamanho_parte"]) if declared_size else None
+    received_numbers = {part['PartNumber'] for part in parts}
+    
+    return jsonify({
+        "success": True,
+        "session_id": session_id,
+        "caminho_completo": session["s3_key"],
+        "chunk_size": session["tamanho_parte"],
+        "total_chunks": total_chunks,
+        "chunks_recebidos": [
+            {"chunk": part['PartNumber'], "tamanho_bytes": part['Size'], "etag": part['ETag'].strip('"')}
+            for part in parts
+        ],
+        "chunks_pendentes": [n for n in range(1, total_chunks + 1) if n not in received_numbers] if total_chunks else None,
+        "bytes_recebidos": received_bytes,
+        "descricao_humana": f"{len(parts)} parte(s) recebida(s), {format_size_human(received_bytes)['formatted']}"
+    })
+
+@app.route('/upload/sessions/<session_id>/complete', methods=['POST'])
+def complete_upload_session(session_id: str):
+    """Conclui o multipart da sessão e retorna a mesma resposta enriquecida de /upload"""
+    session = _load_session(session_id)
+    if not session:
+        return _session_not_found_response()
+    
+    timestamp_inicio_unix = session["criado_em"]
+    timestamp_inicio_iso = datetime.fromtimestamp(timestamp_inicio_unix).isoformat()
+    client_info = get_client_info()
+    error = response_profile_error()
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    dono, replay = finalization_begin(session["s3_key"])
+    if replay:
+        return replay
+    response_data = None
+    try:
+        try:
+            backend = get_storage()
+        except Exception as e:
+            error_payload, status_code = s3_client_error_response(e)
+            return jsonify(error_payload), status_code
         
-        # Upload para o Spaces
         try:
-            s3_client.upload_fileobj(
-                Fileobj=file,
-                Bucket=SPACES_BUCKET,
-                Key=s3_key,
-                ExtraArgs={
-                    'ACL': 'public-read', 
-                    'ContentType': file.content_type or 'application/octet-stream'
-                }
-            )
-        except botocore.exceptions.ClientError as e:
-            # Erros específicos do boto3/S3
-            error_code = e.response.get('Error', {}).get('Code', 'Unknown')
-            print(f"❌ Erro no upload para Spaces: {error_code} - {e}")
-            logger.error(f"Erro no upload para Spaces: {error_code} - {e}")
-            
-            if error_code in ['NoSuchBucket', 'AccessDenied', 'InvalidAccessKeyId']:
-                return jsonify({
-                    "success": False,
-                    "error": "Erro de configuração do serviço de armazenamento",
-                    "detail": f"Não foi possível acessar o bucket. Verifique as credenciais e configurações. Código do erro: {error_code}"
-                }), 503
-            else:
-                return jsonify({
-                    "success": False,
-                    "error": "Erro ao fazer upload para o serviço de armazenamento",
-                    "detail": f"Ocorreu um erro ao tentar fazer upload do arquivo. Tente novamente em alguns instantes. Código do erro: {error_code}"
-                }), 503
-        except botocore.exceptions.EndpointConnectionError as e:
-            # Erro de conexão com o endpoint
-            print(f"❌ Erro de conexão com Spaces: {e}")
-            logger.error(f"Erro de conexão com Spaces: {e}")
-            return jsonify({
-                "success": False,
-                "error": "Serviço de armazenamento temporariamente indisponível",
-                "detail": "Não foi possível conectar ao DigitalOcean Spaces. Tente novamente em alguns instantes."
-            }), 503
+            parts = sorted(_list_session_parts(backend, session), key=lambda part: part['PartNumber'])
         except Exception as e:
-            # Outros erros de upload
-            print(f"❌ Erro inesperado no upload: {e}")
-            logger.error(f"Erro inesperado no upload: {e}")
+            if _is_no_such_upload(e):
+                return _session_not_found_response()
+            error_payload, status_code = storage_error_response(e)
+            return jsonify(error_payload), status_code
+        
+        # As partes precisam ser contíguas a partir de 1 e, exceto a última, ter o tamanho mínimo do S3
+        numbers = [part['PartNumber'] for part in parts]
+        missing = sorted(set(range(1, (numbers[-1] if numbers else 0) + 1)) - set(numbers))
+        if not parts or missing:
             return jsonify({
                 "success": False,
-                "error": "Erro ao fazer upload do arquivo",
-                "detail": f"Ocorreu um erro inesperado durante o upload. Tente novamente ou entre em contato com o suporte se o problema persistir."
-            }), 500
+                "error": "Sessão incompleta",
+                "detail": f"Partes ausentes: {missing[:50] if missing else [1]}. Envie as partes faltantes antes de concluir.",
+                "chunks_pendentes": missing or [1]
+            }), 409
         
-        # Timestamp de fim do upload
-        timestamp_upload_fim = time.time()
-        timestamp_fim = datetime.now()
-        timestamp_fim_iso = timestamp_fim.isoformat()
-        
-        # Calcular duração total e do upload
-        duracao_total_segundos = timestamp_upload_fim - timestamp_inicio_unix
-        duracao_upload_segundos = timestamp_upload_fim - timestamp_upload_inicio
-        
-        # Calcular velocidade de upload (bytes por segundo e Mbps)
-        velocidade_bytes_por_segundo = size / duracao_upload_segundos if duracao_upload_segundos > 0 else 0
-        velocidade_mbps = (velocidade_bytes_por_segundo * 8) / (1024 * 1024)  # Converter para Mbps
+        total_size = sum(part['Size'] for part in parts)
+        declared_size = session.get("tamanho_declarado")
+        if declared_size is not None and total_size != declared_size:
+            return jsonify({
+                "success": False,
+                "error": "Sessão incompleta",
+                "detail": f"Foram recebidos {total_size} bytes, mas o tamanho declarado é {declared_size} bytes."
+            }), 409
         
-        # Formatação de durações
-        duracao_total_info = format_duration_human(duracao_total_segundos)
-        duracao_upload_info = format_duration_human(duracao_upload_segundos)
+        small_parts = [part['PartNumber'] for part in parts[:-1] if part['Size'] < TRANSFER_MIN_PART_SIZE_BYTES]
+        if small_parts:
+            return jsonify({
+                "success": False,
+                "error": "Partes menores que o mínimo",
+                "detail": (
+                    f"Todas as partes, exceto a última, devem ter no mínimo {TRANSFER_MIN_PART_SIZE_BYTES} bytes "
+                    f"(tamanho esperado: {session['tamanho_parte']} bytes). Reenvie as partes: {small_parts[:50]}"
+                )
+            }), 409
         
-        # Limpar arquivo temporário se existir
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as e:
-                logger.warning(f"Erro ao remover arquivo temporário: {e}")
+        if total_size > max_content_length_mb * 1024 * 1024:
+            return jsonify({
+                "success": False,
+                "error": "Arquivo muito grande",
+                "detail": f"O tamanho do arquivo excede o limite máximo permitido. Tamanho máximo configurado: {max_content_length_mb}MB"
+            }), 413
         
-        # URL pública do arquivo
-        file_url = f"https://{SPACES_BUCKET}.{SPACES_REGION}.digitaloceanspaces.com/{s3_key}"
-        
-        print(f"✅ Upload concluído: {file_url}")
-        logger.info(f"Upload concluído: {file_url}")
-        
-        # Montar resposta enriquecida
-        arquivo_data = {
-            "id": unique_filename,
-            "nome_original": original_filename,
-            "nome_armazenado": unique_filename,
-            "hash_md5": file_hash,
-            "tamanho": size_info,
-            "tipo_mime": file.content_type or 'application/octet-stream',
-            "extensao": file_extension,
-            "categoria": file_category,
-            "diretorio": target_folder,
-            "caminho_completo": s3_key,
-            "url_publica": file_url,
-            "url_cdn": file_url,
-            "descricao_humana": f"Arquivo {file_category['categoria_descricao'].lower()} '{original_filename}' ({size_info['descricao_humana']})"
-        }
+        try:
+            backend.complete_multipart(session["s3_key"], session["upload_id"], parts)
+            response_data = finalize_stored_object(
+                backend,
+                session,
+                client_info,
+                timestamp_inicio_iso,
+                timestamp_inicio_unix,
+                transfer_plan={
+                    "modo": "sessao",
+                    "multipart": True,
+                    "tamanho_parte_bytes": session["tamanho_parte"],
+                    "partes": len(parts),
+                },
+            )
+        except UploadValidationError as e:
+            error_payload, status_code = e.to_response()
+            return jsonify(error_payload), status_code
+        except Exception as e:
+            if _is_no_such_upload(e):
+                return _session_not_found_response()
+            error_payload, status_code = storage_error_response(e)
+            return jsonify(error_payload), status_code
         
-        # Adicionar metadados de mídia se disponíveis
-        if media_metadata:
-            arquivo_data["midia"] = media_metadata
-        
-        response_data = {
-            "success": True,
-            "arquivo": arquivo_data,
-            "sessao": {
-                "id_sessao": str(uuid.uuid4()),
-                "ip_cliente": client_info["ip"],
-                "ip_original": client_info["ip_original"],
-                "user_agent": client_info["user_agent"],
-                "referer": client_info["referer"],
-                "idioma_preferido": client_info["accept_language"],
-                "headers": client_info["headers"],
-                "descricao_humana": f"Requisição de {client_info['ip']} via {client_info['user_agent'][:50]}..."
-            },
-            "upload": {
-                "timestamp_inicio": timestamp_inicio_iso,
-                "timestamp_inicio_unix": timestamp_inicio_unix,
-                "timestamp_fim": timestamp_fim_iso,
-                "timestamp_fim_unix": timestamp_upload_fim,
-                "duracao_total": duracao_total_info,
-                "duracao_upload": duracao_upload_info,
-                "velocidade_bytes_por_segundo": round(velocidade_bytes_por_segundo, 2),
-                "velocidade_mbps": round(velocidade_mbps, 2),
-                "velocidade_formatted": f"{round(velocidade_mbps, 2)} Mbps",
-                "status": "concluido",
-                "bucket": SPACES_BUCKET,
-                "regiao": SPACES_REGION,
-                "endpoint": SPACES_ENDPOINT,
-                "descricao_humana": f"Upload concluído em {duracao_upload_info['descricao_humana']} com velocidade média de {round(velocidade_mbps, 2)} Mbps"
-            },
-            "analytics": {
-                "id_transacao": str(uuid.uuid4()),
-                "timestamp_processamento": datetime.now().isoformat(),
-                "tamanho_bytes": size,
-                "tamanho_mb": round(size_info["megabytes"], 4),
-                "duracao_segundos": round(duracao_total_segundos, 3),
-                "velocidade_mbps": round(velocidade_mbps, 4),
-                "categoria_arquivo": file_category["categoria"],
-                "tipo_midia": file_category["tipo_midia"],
-                "hash_arquivo": file_hash,
-                "ip_cliente": client_info["ip"],
-                "diretorio": target_folder,
-                "metrica_performance": {
-                    "tempo_processamento_ms": round(duracao_total_segundos * 1000, 2),
-                    "tempo_upload_ms": round(duracao_upload_segundos * 1000, 2),
-                    "throughput_bytes_per_sec": round(velocidade_bytes_por_segundo, 2),
-                    "throughput_mbps": round(velocidade_mbps, 4)
-                }
-            },
-            # Campos legados para compatibilidade
-            "url": file_url,
-            "filename": unique_filename,
-            "original_filename": original_filename,
-            "size": size,
-            "content_type": file.content_type
-        }
+        print(f"✅ Sessão de upload concluída: {response_data['url']} ({len(parts)} parte(s))")
+        logger.info(f"Sessão de upload concluída: {response_data['url']}")
         
-        # Salvar callback JSON no mesmo diretório com mesmo nome base
-        callback_json_key = f"{target_folder}/{unique_filename.rsplit('.', 1)[0]}.json" if target_folder else f"{unique_filename.rsplit('.', 1)[0]}.json"
-        callback_json_url = f"https://{SPACES_BUCKET}.{SPACES_REGION}.digitaloceanspaces.com/{callback_json_key}"
+        return upload_json_response(response_data)
+    finally:
+        # Sem resposta (erro ou upload incompleto) a reserva é liberada para nova tentativa
+        finalization_finish(session["s3_key"], dono, response_data)
+
+@app.route('/upload/sessions/<session_id>', methods=['DELETE'])
+def abort_upload_session(session_id: str):
+    """Cancela a sessão e descarta as partes já enviadas"""
+    session = _load_session(session_id)
+    if not session:
+        return _session_not_found_response()
+    
+    try:
+        backend = get_storage()
+        backend.abort_multipart(session["s3_key"], session["upload_id"])
+    except Exception as e:
+        if _is_no_such_upload(e):
+            return _session_not_found_response()
+        error_payload, status_code = storage_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    print(f"🗑️ Sessão de upload cancelada: {session['s3_key']}")
+    logger.info(f"Sessão de upload cancelada: {session['s3_key']}")
+    return jsonify({"success": True, "session_id": session_id, "status": "cancelada"})
+
+@app.route('/upload/presign', methods=['POST'])
+def create_presigned_upload():
+    """Gera URLs assinadas para o cliente enviar o arquivo direto ao bucket, sem passar pelo worker"""
+    params = request.get_json(silent=True) or request.form
+    
+    size, error = _read_declared_size(params.get('size'))
+    if error:
+        return jsonify(error[0]), error[1]
+    if size is None:
+        return jsonify({
+            "success": False,
+            "error": "Tamanho obrigatório",
+            "detail": "Informe o tamanho do arquivo em bytes no campo 'size' para gerar as URLs de upload."
+        }), 400
+    
+    target, error = prepare_upload_target(params.get('filename'), params.get('content_type'), params.get('folder') or request.args.get('folder'))
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    file_category = get_file_category(target["content_type"], target["file_extension"])
+    error = category_size_error(file_category["categoria"], size) if size is not None else None
+    if error:
+        return jsonify(error[0]), error[1]
+    transfer_plan = transfer_engine.plan(file_category["categoria"], size)
+    
+    try:
+        backend = get_storage()
+    except Exception as e:
+        error_payload, status_code = s3_client_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    upload_data = {
+        **target,
+        "tipo": "presign",
+        "tamanho_declarado": size,
+        "criado_em": time.time(),
+    }
+    try:
+        if not transfer_plan["multipart"]:
+            upload_data["modo"] = "simples"
+            # Cabeçalhos que o cliente precisa repetir no PUT, pois fazem parte da assinatura
+            url, required_headers = backend.presigned_put(target["s3_key"], target["content_type"], PRESIGN_EXPIRES_SECONDS)
+            instructions = {
+                "metodo": "PUT",
+                "url": absolute_url(url),
+                "headers": required_headers,
+            }
+        else:
+            upload_id = backend.create_multipart(target["s3_key"], target["content_type"])
+            upload_data.update({
+                "modo": "multipart",
+                "upload_id": upload_id,
+                "tamanho_parte": transfer_plan["tamanho_parte_bytes"],
+            })
+            total_parts = max(1, math.ceil(size / transfer_plan["tamanho_parte_bytes"]))
+            instructions = {
+                "metodo": "PUT",
+                "tamanho_parte": transfer_plan["tamanho_parte_bytes"],
+                "concorrencia_sugerida": transfer_plan["concorrencia"],
+                "partes": [
+                    {
+                        "chunk": part_number,
+                        "url": absolute_url(backend.presigned_upload_part(target["s3_key"], upload_id, part_number, PRESIGN_EXPIRES_SECONDS)),
+                    }
+                    for part_number in range(1, total_parts + 1)
+                ],
+            }
+    except Exception as e:
+        error_payload, status_code = storage_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    print(f"🔏 URLs assinadas geradas ({upload_data['modo']}): {target['s3_key']}")
+    logger.info(f"URLs assinadas geradas ({upload_data['modo']}): {target['s3_key']}")
+    
+    return jsonify({
+        "success": True,
+        "upload_token": sign_upload_token(upload_data),
+        "modo": upload_data["modo"],
+        "expira_em_segundos": PRESIGN_EXPIRES_SECONDS,
+        "upload": instructions,
+        "arquivo": {
+            "nome_original": target["original_filename"],
+            "nome_armazenado": target["unique_filename"],
+            "caminho_completo": target["s3_key"],
+            "url_publica": build_public_url(target["s3_key"]),
+        },
+        "finalize": "/upload/finalize",
+        "descricao_humana": "Envie o arquivo direto para as URLs assinadas e depois chame POST /upload/finalize com o upload_token"
+    }), 201
+
+@app.route('/upload/finalize', methods=['POST'])
+def finalize_presigned_upload():
+    """Confere o objeto enviado por URL assinada e gera a resposta enriquecida e o callback JSON"""
+    params = request.get_json(silent=True) or request.form
+    upload_data = verify_upload_token(params.get('upload_token') or '')
+    if not upload_data or upload_data.get("tipo") != "presign":
+        return jsonify({
+            "success": False,
+            "error": "Token de upload inválido",
+            "detail": "O upload_token é inválido ou expirou. Gere novas URLs em POST /upload/presign."
+        }), 404
+    
+    timestamp_inicio_unix = upload_data["criado_em"]
+    timestamp_inicio_iso = datetime.fromtimestamp(timestamp_inicio_unix).isoformat()
+    client_info = get_client_info()
+    error = response_profile_error()
+    if error:
+        return jsonify(error[0]), error[1]
+    transfer_plan = {"modo": "presign", "multipart": upload_data["modo"] == "multipart"}
+    
+    dono, replay = finalization_begin(upload_data["s3_key"])
+    if replay:
+        return replay
+    response_data = None
+    try:
+        try:
+            backend = get_storage()
+        except Exception as e:
+            error_payload, status_code = s3_client_error_response(e)
+            return jsonify(error_payload), status_code
         
         try:
-            # Converter response_data para JSON string
-            callback_json_str = json.dumps(response_data, ensure_ascii=False, indent=2)
-            callback_json_bytes = callback_json_str.encode('utf-8')
-            
-            # Criar objeto BytesIO para upload
-            callback_file_obj = BytesIO(callback_json_bytes)
-            
-            # Upload do JSON
-            s3_client.upload_fileobj(
-                Fileobj=callback_file_obj,
-                Bucket=SPACES_BUCKET,
-                Key=callback_json_key,
-                ExtraArgs={
-                    'ACL': 'public-read',
-                    'ContentType': 'application/json'
-                }
+            if upload_data["modo"] == "multipart":
+                parts = sorted(_list_session_parts(backend, upload_data), key=lambda part: part['PartNumber'])
+                expected_parts = max(1, math.ceil(upload_data["tamanho_declarado"] / upload_data["tamanho_parte"]))
+                missing = sorted(set(range(1, expected_parts + 1)) - {part['PartNumber'] for part in parts})
+                if missing:
+                    return jsonify({
+                        "success": False,
+                        "error": "Upload incompleto",
+                        "detail": f"Partes ausentes: {missing[:50]}. Envie as partes faltantes antes de finalizar.",
+                        "chunks_pendentes": missing
+                    }), 409
+                # Partes pequenas demais fariam o S3 recusar a conclusão (EntityTooSmall)
+                small_parts = [part['PartNumber'] for part in parts[:-1] if part['Size'] < TRANSFER_MIN_PART_SIZE_BYTES]
+                if small_parts:
+                    return jsonify({
+                        "success": False,
+                        "error": "Partes menores que o mínimo",
+                        "detail": (
+                            f"Todas as partes, exceto a última, devem ter no mínimo {TRANSFER_MIN_PART_SIZE_BYTES} bytes "
+                            f"(tamanho esperado: {upload_data['tamanho_parte']} bytes). Reenvie as partes: {small_parts[:50]}"
+                        ),
+                        "chunks_pendentes": small_parts
+                    }), 409
+                backend.complete_multipart(upload_data["s3_key"], upload_data["upload_id"], parts)
+                transfer_plan.update({"tamanho_parte_bytes": upload_data["tamanho_parte"], "partes": len(parts)})
+        
+            response_data = finalize_stored_object(
+                backend,
+                upload_data,
+                client_info,
+                timestamp_inicio_iso,
+                timestamp_inicio_unix,
+                transfer_plan=transfer_plan,
             )
-            
-            print(f"✅ Callback JSON salvo: {callback_json_url}")
-            logger.info(f"Callback JSON salvo: {callback_json_url}")
-            
-            # Adicionar URL do callback na resposta
-            response_data["callback_url"] = callback_json_url
-            
+        except UploadValidationError as e:
+            error_payload, status_code = e.to_response()
+            return jsonify(error_payload), status_code
         except Exception as e:
-            logger.warning(f"Erro ao salvar callback JSON: {e}")
-            print(f"⚠️ Aviso: Não foi possível salvar callback JSON: {e}")
-            # Continuar mesmo se falhar o salvamento do JSON
+            if _is_no_such_upload(e):
+                return jsonify({
+                    "success": False,
+                    "error": "Arquivo não encontrado no bucket",
+                    "detail": "O arquivo ainda não foi enviado para a URL assinada ou o upload já foi finalizado."
+                }), 404
+            error_payload, status_code = storage_error_response(e)
+            return jsonify(error_payload), status_code
         
-        return jsonify(response_data)
+        print(f"✅ Upload direto finalizado: {response_data['url']}")
+        logger.info(f"Upload direto finalizado: {response_data['url']}")
         
-    except RequestEntityTooLarge:
-        # Este erro já é tratado pelo handler específico, mas incluímos aqui como backup
-        raise
+        return upload_json_response(response_data)
+    finally:
+        # Sem resposta (erro ou upload incompleto) a reserva é liberada para nova tentativa
+        finalization_finish(upload_data["s3_key"], dono, response_data)
+
+@app.route('/storage/<path:key>', methods=['GET', 'HEAD', 'PUT'])
+def local_storage_object(key: str):
+    """Objetos do backend local: leitura pública e PUT pelas URLs assinadas de /upload/presign"""
+    if not isinstance(storage_backend, storage.LocalStorageBackend):
+        return handle_not_found(None)
+    try:
+        file_path = storage_backend.path_for(key)
+    except storage.NotFoundError:
+        return handle_not_found(None)
+    
+    if request.method != 'PUT':
+        if not os.path.isfile(file_path):
+            return jsonify({
+                "success": False,
+                "error": "Arquivo não encontrado",
+                "detail": f"Não existe arquivo armazenado em '{key}'."
+            }), 404
+        # Respostas condicionais e Range; o Gunicorn envia o corpo com sendfile
+        return send_from_directory(storage_backend.root, key, conditional=True)
+    
+    if not storage_backend.verify_signature(key, request.args):
+        return jsonify({
+            "success": False,
+            "error": "Assinatura inválida",
+            "detail": "A URL assinada é inválida ou expirou. Gere novas URLs em POST /upload/presign."
+        }), 403
+    if request.content_length is None:
+        return jsonify({
+            "success": False,
+            "error": "Tamanho obrigatório",
+            "detail": "Envie o cabeçalho Content-Length com o tamanho do corpo."
+        }), 411
+    
+    try:
+        if request.args.get('uploadId'):
+            etag = storage_backend.upload_part(key, request.args['uploadId'], int(request.args['partNumber']), request.stream)
+        else:
+            storage_backend.put_stream(key, request.stream, request.content_type or 'application/octet-stream')
+            etag = storage_backend.head(key)["etag"]
+    except storage.NotFoundError:
+        return jsonify({
+            "success": False,
+            "error": "Upload não encontrado",
+            "detail": "O upload multipart não existe ou já foi finalizado."
+        }), 404
     except Exception as e:
-        print(f"❌ Erro inesperado no upload: {e}")
-        logger.error(f"Erro inesperado no upload: {e}", exc_info=True)
+        error_payload, status_code = storage_error_response(e)
+        return jsonify(error_payload), status_code
+    
+    # Como no S3, o ETag da parte volta no cabeçalho da resposta
+    response = Response(status=200)
+    response.headers['ETag'] = etag
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métricas Prometheus agregadas entre os workers do Gunicorn"""
+    body, content_type = metrics.render_latest()
+    return Response(body, content_type=content_type)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_media_job(job_id: str):
+    """Status de um job de extração de metadados de mídia"""
+    try:
+        row = get_state_db().execute("SELECT * FROM media_jobs WHERE id = ?", (job_id,)).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao consultar job de metadados: {e}")
         return jsonify({
             "success": False,
             "error": "Erro interno do servidor",
-            "detail": "Ocorreu um erro inesperado durante o processamento. Entre em contato com o suporte se o problema persistir."
+            "detail": "Não foi possível consultar o status do job."
         }), 500
+    
+    if row is None:
+        return jsonify({
+            "success": False,
+            "error": "Job não encontrado",
+            "detail": "O identificador informado não corresponde a nenhum job de metadados."
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "id": row["id"],
+        "status": row["status"],
+        "caminho_completo": row["s3_key"],
+        "callback_url": build_public_url(row["callback_key"]) if row["callback_key"] else None,
+        "midia": json.loads(row["midia"]) if row["midia"] else None,
+        "erro": row["erro"],
+        "criado_em": datetime.fromtimestamp(row["criado_em"]).isoformat(),
+        "atualizado_em": datetime.fromtimestamp(row["atualizado_em"]).isoformat(),
+        "finalizado": row["status"] in ("concluido", "sem_metadados", "erro"),
+    })
 
-@app.route('/', methods=['GET'])
-def index():
-    """Página inicial com informações da API"""
+@app.route('/files', methods=['GET'])
+def list_files():
+    """Catálogo de uploads, do mais recente para o mais antigo, com paginação por cursor.
+    
+    Filtros: folder, hash, categoria, ip, desde e ate (Unix ou ISO 8601). Não consulta o bucket.
+    """
+    if not CATALOG_ENABLED:
+        return handle_not_found(None)
+    
+    args = request.args
+    try:
+        limit = int(args.get('limit') or CATALOG_PAGE_SIZE)
+        cursor = int(args['cursor']) if args.get('cursor') else None
+        desde = _parse_catalog_time(args.get('desde'))
+        ate = _parse_catalog_time(args.get('ate'))
+        if limit < 1 or (cursor is not None and cursor < 1):
+            raise ValueError("limit e cursor devem ser positivos")
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": "Parâmetros inválidos",
+            "detail": f"Use limit e cursor inteiros e desde/ate como timestamp Unix ou data ISO 8601: {e}"
+        }), 400
+    limit = min(limit, CATALOG_PAGE_MAX)
+    
+    filters = {
+        "diretorio": (args.get('folder') or '').strip('/'),
+        "hash_md5": (args.get('hash') or '').strip().lower(),
+        "categoria": (args.get('categoria') or '').strip(),
+        "ip_cliente": (args.get('ip') or '').strip(),
+    }
+    conditions = [f"{column} = ?" for column, value in filters.items() if value]
+    params: list = [value for value in filters.values() if value]
+    if desde is not None:
+        conditions.append("criado_em >= ?")
+        params.append(desde)
+    if ate is not None:
+        conditions.append("criado_em < ?")
+        params.append(ate)
+    if cursor is not None:
+        conditions.append("seq < ?")
+        params.append(cursor)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    try:
+        # Uma linha a mais indica se existe próxima página
+        rows = get_state_db().execute(
+            f"SELECT * FROM upload_catalog {where} ORDER BY seq DESC LIMIT ?", (*params, limit + 1)
+        ).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao consultar catálogo de uploads: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Erro interno do servidor",
+            "detail": "Não foi possível consultar o catálogo de uploads."
+        }), 500
+    
+    page = rows[:limit]
+    return jsonify({
+        "success": True,
+        "total_pagina": len(page),
+        "proximo_cursor": str(page[-1]["seq"]) if len(rows) > limit else None,
+        "arquivos": [catalog_entry(row) for row in page],
+    })
+
+@app.route('/files/<file_id>', methods=['GET'])
+def get_file(file_id: str):
+    """Upload do catálogo pelo id da transação (analytics.id_transacao) ou pelo id do arquivo, com a resposta completa"""
+    if not CATALOG_ENABLED:
+        return handle_not_found(None)
+    try:
+        row = get_state_db().execute(
+            "SELECT * FROM upload_catalog WHERE id = ? OR arquivo_id = ? ORDER BY seq DESC LIMIT 1", (file_id, file_id)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao consultar catálogo de uploads: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Erro interno do servidor",
+            "detail": "Não foi possível consultar o catálogo de uploads."
+        }), 500
+    
+    if row is None:
+        return jsonify({
+            "success": False,
+            "error": "Arquivo não encontrado",
+            "detail": "O identificador informado não corresponde a nenhum upload do catálogo."
+        }), 404
+    
     return jsonify({
+        "success": True,
+        **catalog_entry(row),
+        "resposta": json.loads(row["resposta"]),
+    })
+
+def api_info() -> Dict[str, Any]:
+    """Informações da API (GET /), compartilhadas com o modo ASGI"""
+    return {
         "message": "Upload CDN API",
         "version": "1.0.0",
         "endpoints": {
             "POST /upload": "Upload de arquivos",
-            "GET /health": "Status da API",
+            "POST /upload/batch": "Upload de vários arquivos em uma requisição",
+            "POST /upload/sessions": "Iniciar upload em partes (retomável)",
+            "PUT /upload/sessions/<id>/chunks/<n>": "Enviar parte numerada",
+            "GET /upload/sessions/<id>": "Partes já recebidas",
+            "POST /upload/sessions/<id>/complete": "Concluir upload em partes",
+            "DELETE /upload/sessions/<id>": "Cancelar upload em partes",
+            "POST /upload/presign": "URLs assinadas para upload direto ao bucket",
+            "POST /upload/finalize": "Finalizar upload direto ao bucket",
+            "GET /jobs/<id>": "Status da extração de metadados em segundo plano",
+            "GET /files": "Catálogo de uploads com filtros e paginação por cursor",
+            "GET /files/<id>": "Upload do catálogo com a resposta completa",
+            "GET|PUT /storage/<chave>": "Arquivos do backend local (STORAGE_BACKEND=local)",
+            "GET /metrics": "Métricas Prometheus (latência por etapa, bytes, erros, uploads em andamento)",
+            "GET /health": "Status da API (prontidão, resultado em cache)",
+            "GET /health/ready": "Prontidão: conectividade com o Spaces verificada em segundo plano",
+            "GET /health/live": "Vida do processo, sem consultar o Spaces",
             "GET /": "Informações da API"
         },
         "supported_formats": list(ALLOWED_EXTENSIONS)
-    })
+    }
+
+@app.route('/', methods=['GET'])
+def index():
+    """Página inicial com informações da API"""
+    return jsonify(api_info())
 
 # Logs de inicialização
 print("✅ Flask app configurado com sucesso")
 print("✅ Rotas registradas:")
 print("   - GET  /")
 print("   - GET  /health")
+print("   - GET  /health/live")
+print("   - GET  /health/ready")
 print("   - POST /upload")
+print("   - POST /upload/batch")
+print("   - POST /upload/sessions (+ /chunks/<n>, /complete)")
+print("   - POST /upload/presign, POST /upload/finalize")
+print("   - GET  /jobs/<id>")
+if CATALOG_ENABLED:
+    print("   - GET  /files, GET /files/<id> (catálogo)")
+if STORAGE_BACKEND == "local":
+    print("   - GET  /storage/<chave> (backend local)")
+print("   - GET  /metrics (Prometheus)")
 print("   - GET  /docs (Swagger UI)")
 print("   - GET  /swagger.json (OpenAPI spec)")
 print("🚀 Aplicação pronta para receber requisições!")
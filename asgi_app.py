@@ -0,0 +1,490 @@
+"""
+Ponto de entrada ASGI (asyncio) da Upload CDN API.
+
+Serve POST /upload, GET /health (/live, /ready) e GET / com o corpo da requisição lido em streaming e
+chamadas ao Spaces não bloqueantes (aiobotocore): cada upload em andamento ocupa uma
+corrotina, não uma thread, e um único processo sustenta centenas de uploads lentos.
+Com STORAGE_BACKEND=local as gravações em disco rodam em threads (asyncio.to_thread).
+As demais rotas (sessões, presign, lote, jobs, docs) são repassadas ao app Flask.
+
+Execução:
+    pip install -r requirements-asgi.txt
+    uvicorn asgi_app:application --host 0.0.0.0 --port 80 --workers 2
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+import app as upload_app
+import metrics
+import sniffing
+import storage
+from app import (
+    SPACES_ENDPOINT,
+    SPACES_KEY,
+    SPACES_REGION,
+    SPACES_SECRET,
+    StreamingUploadPipeline,
+    UploadValidationError,
+    max_content_length_mb,
+)
+
+logger = logging.getLogger(__name__)
+
+# Conexões simultâneas com o Spaces por processo (uploads + partes em voo)
+ASGI_MAX_POOL_CONNECTIONS = upload_app._env_int("ASGI_MAX_POOL_CONNECTIONS", 256)
+
+
+class AsyncUploadPipeline(StreamingUploadPipeline):
+    """Mesma contabilidade do pipeline síncrono (hash, tamanho, janelas, buffer), com I/O assíncrono"""
+
+    def __init__(self, backend: storage.StorageBackendAsync, s3_key: str, content_type: str, transfer_plan: Dict[str, Any], probe_windows: bool = False, max_size_bytes: Optional[int] = None):
+        super().__init__(backend, s3_key, content_type, transfer_plan, probe_windows=probe_windows, max_size_bytes=max_size_bytes)
+        self._tasks = set()
+
+    async def write(self, data: bytes) -> None:
+        if not self._consume(data):
+            return
+        while len(self.buffer) >= self.part_size:
+            await self._submit_part(self.part_size)
+
+    async def _submit_part(self, length: int) -> None:
+        if self.upload_id is None:
+            self.upload_id = await self.backend.create_multipart(self.s3_key, self.content_type)
+
+        # Limitar partes em voo da requisição e do processo para manter a memória constante
+        while len(self._tasks) >= self.max_concurrency:
+            await self._collect(asyncio.FIRST_COMPLETED)
+        while not upload_app.stream_memory.acquire(length, blocking=False):
+            if self._tasks:
+                await self._collect(asyncio.FIRST_COMPLETED)
+            else:
+                # Sem partes próprias em voo: aguarda as de outros uploads sem bloquear o event loop
+                await asyncio.sleep(0.05)
+
+        part_number, body, checksums = self._take_part(length)
+        task = asyncio.ensure_future(self._upload_part(part_number, body, checksums))
+        task.add_done_callback(lambda _task: upload_app.stream_memory.release(length))
+        self._tasks.add(task)
+
+    async def _upload_part(self, part_number: int, body: bytes, checksums: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        # MD5 da parte já calculado na passagem do hash; informado, o aiobotocore não o calcula no loop
+        etag = await self.backend.upload_part(self.s3_key, self.upload_id, part_number, body, checksums)
+        return {"ETag": etag, "PartNumber": part_number}
+
+    async def _collect(self, return_when) -> None:
+        done, self._tasks = await asyncio.wait(self._tasks, return_when=return_when)
+        for task in done:
+            # Propaga o erro da primeira parte que falhou
+            self.parts.append(task.result())
+
+    async def finish(self) -> None:
+        """Envia o restante do buffer e conclui o objeto no armazenamento"""
+        if self.upload_id is None:
+            await self.backend.put_object(self.s3_key, bytes(self.buffer), self.content_type, checksums=upload_app.storage_checksums(self.digest))
+        else:
+            while self.buffer:
+                await self._submit_part(min(self.part_size, len(self.buffer)))
+            if self._tasks:
+                await self._collect(asyncio.ALL_COMPLETED)
+            await self.backend.complete_multipart(self.s3_key, self.upload_id, sorted(self.parts, key=lambda part: part["PartNumber"]))
+        self.buffer = bytearray()
+
+    async def abort(self) -> None:
+        """Cancela o multipart pendente para não deixar partes órfãs no armazenamento"""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = set()
+        if self.upload_id is not None:
+            try:
+                await self.backend.abort_multipart(self.s3_key, self.upload_id)
+            except Exception as e:
+                logger.warning(f"Erro ao abortar multipart upload {self.upload_id}: {e}")
+
+
+class UploadCdnAsgi:
+    """Aplicação ASGI: rotas de upload nativas e demais rotas delegadas ao Flask"""
+
+    def __init__(self):
+        self.flask_app = WSGIMiddleware(upload_app.app)
+        self.session = get_session()
+        self.s3_client = None
+        self._client_context = None
+        self._storage: Optional[storage.StorageBackendAsync] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        path, method = scope["path"], scope["method"]
+        headers = None
+        if path == "/upload" and method == "POST":
+            payload, status_code, headers = await self.traced_upload(scope, receive)
+        elif path in ("/health", "/health/ready") and method == "GET":
+            payload, status_code = upload_app.storage_health.readiness()
+        elif path == "/health/live" and method == "GET":
+            payload, status_code = upload_app.liveness_payload(), 200
+        elif path == "/" and method == "GET":
+            payload, status_code = upload_app.api_info(), 200
+        else:
+            await self.flask_app(scope, receive, send)
+            return
+        await self.send_json(send, payload, status_code, headers)
+
+    async def traced_upload(self, scope, receive) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+        """POST /upload com o mesmo trace (X-Trace-Id), Idempotency-Key, controle de admissão e portão do circuit breaker do app Flask"""
+        headers: Dict[str, str] = {}
+        trace = tokens = ticket = reserva = payload = None
+        request_headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope["headers"]])
+        if upload_app.TRACE_ENABLED:
+            trace, tokens = upload_app.tracer.start_trace(
+                f"{scope['method']} {scope['path']}",
+                request_headers,
+                {"http.method": scope["method"], "http.path": scope["path"], "http.endpoint": "upload_file", "servidor": "asgi"},
+            )
+            headers["X-Trace-Id"] = trace.trace_id
+        error = None
+        status_code = None
+        query = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode('latin-1')).items()}
+        try:
+            try:
+                fields = upload_app.response_fields_requested(query.get('fields'), query.get('profile'))
+            except ValueError:
+                payload, status_code = upload_app.response_profile_error(query.get('profile'))
+                return payload, status_code, headers
+            client = scope.get("client")
+            client_info = upload_app.get_client_info(request_headers, client[0] if client else None)
+            content_length = request_headers.get('Content-Length', '')
+            content_length = int(content_length) if content_length.isdigit() else None
+            if upload_app.IDEMPOTENCY_HEADER in request_headers:
+                # Como no WSGI, a impressão inclui o nome e o início da parte 'file' (mensagens lidas
+                # são repassadas ao upload). A espera pela primeira tentativa não bloqueia o event loop
+                boundary = parse_options_header(request_headers.get('Content-Type', ''))[1].get('boundary')
+                peek = None
+                if boundary and (content_length is None or content_length <= max_content_length_mb * 1024 * 1024):
+                    peek, receive = await self.peek_file_part(receive, boundary)
+                impressao = upload_app.idempotency_fingerprint(f"{scope['method']} {scope['path']}", content_length, query.get('folder'), peek, boundary)
+                reserva, resposta = await asyncio.to_thread(upload_app.idempotency_begin, request_headers, client_info, impressao)
+                if resposta:
+                    payload, status_code, replay_headers = resposta
+                    headers.update(replay_headers)
+                    return payload, status_code, headers
+            ticket, rejected = upload_app.admit_upload(request_headers, client_info, content_length)
+            if rejected:
+                payload, status_code, retry_headers = rejected
+                headers.update(retry_headers)
+                return payload, status_code, headers
+            retry_after = upload_app.storage_breaker.allow()
+            if retry_after is None:
+                with metrics.observe_upload("asgi") as observation:
+                    payload, status_code = await self.upload(scope, receive)
+                    observation.finish(status_code, payload)
+                payload = upload_app.select_response_fields(payload, fields)
+            else:
+                logger.warning("Upload recusado com circuito do Spaces aberto (ASGI)")
+                payload, status_code, retry_headers = upload_app.circuit_open_response(retry_after)
+                headers.update(retry_headers)
+                metrics.record_rejection("CircuitoAberto", status_code)
+            return payload, status_code, headers
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            upload_app.admission.release(ticket)
+            if reserva is not None:
+                resposta_json = upload_app.dumps_json(payload).decode('utf-8') if error is None and payload is not None else None
+                upload_app.idempotency_finish(reserva, status_code or 500, resposta_json)
+            if trace is not None:
+                upload_app.tracer.finish_trace(trace, tokens, status_code, error)
+
+    @staticmethod
+    async def peek_file_part(receive, boundary: str):
+        """Lê as mensagens do corpo até o início da parte 'file' (PREPARSE_PEEK_KB no máximo).
+        
+        Retorna o resultado do MultipartPeek e um receive que entrega de novo as mensagens lidas.
+        """
+        peek = upload_app.MultipartPeek(boundary, upload_app.PREPARSE_PEEK_BYTES)
+        messages = []
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request" or peek.feed(message.get("body", b"")) or not message.get("more_body", False):
+                break
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+        return peek.result(), replay
+
+    async def lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.get_storage()
+                # Primeira verificação fora do event loop; depois as sondas só leem a memória
+                await asyncio.to_thread(upload_app.storage_health.snapshot)
+                print("✅ Modo ASGI pronto: POST /upload, GET /health e GET / com I/O assíncrono")
+                logger.info("Modo ASGI pronto")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._client_context is not None:
+                    await self._client_context.__aexit__(None, None, None)
+                    self.s3_client = self._client_context = None
+                    self._storage = None
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def get_s3_client(self):
+        """Cliente aiobotocore compartilhado pelo processo (criado uma vez, conexões reaproveitadas)"""
+        if self.s3_client is None:
+            self._client_context = self.session.create_client(
+                's3',
+                region_name=SPACES_REGION,
+                endpoint_url=SPACES_ENDPOINT,
+                aws_access_key_id=SPACES_KEY,
+                aws_secret_access_key=SPACES_SECRET,
+                config=upload_app.storage_client_config(AioConfig, max_pool_connections=ASGI_MAX_POOL_CONNECTIONS)
+            )
+            self.s3_client = await self._client_context.__aenter__()
+            upload_app.storage_breaker.attach(self.s3_client)
+            upload_app.tracer.attach(self.s3_client)
+        return self.s3_client
+
+    async def get_storage(self) -> storage.StorageBackendAsync:
+        """Backend do upload assíncrono: aiobotocore no S3, thread para o backend local"""
+        if self._storage is None:
+            if upload_app.STORAGE_BACKEND == "s3":
+                self._storage = storage.S3StorageBackendAsync(upload_app.storage_backend, await self.get_s3_client())
+            else:
+                self._storage = storage.StorageBackendAsync(upload_app.storage_backend)
+        return self._storage
+
+    @staticmethod
+    async def send_json(send, payload: Dict[str, Any], status_code: int, headers: Optional[Dict[str, str]] = None) -> None:
+        body = upload_app.dumps_json(payload)
+        response_headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode('ascii')),
+        ]
+        for name, value in (headers or {}).items():
+            response_headers.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": response_headers,
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def upload(self, scope, receive) -> Tuple[Dict[str, Any], int]:
+        """Upload em passagem única, equivalente a POST /upload?stream=true do modo WSGI"""
+        timestamp_inicio_iso = datetime.now().isoformat()
+        timestamp_inicio_unix = time.time()
+
+        headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope["headers"]])
+        query = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode('latin-1')).items()}
+        client = scope.get("client")
+        client_info = upload_app.get_client_info(headers, client[0] if client else None)
+
+        print("📤 Recebendo requisição de upload (ASGI)")
+        logger.info("Recebendo requisição de upload (ASGI)")
+
+        mimetype, options = parse_options_header(headers.get('Content-Type', ''))
+        if mimetype != 'multipart/form-data' or not options.get('boundary'):
+            return {
+                "success": False,
+                "error": "Nenhum arquivo fornecido",
+                "detail": "É necessário enviar um arquivo no campo 'file' usando multipart/form-data"
+            }, 400
+
+        content_length = int(headers['Content-Length']) if headers.get('Content-Length', '').isdigit() else None
+        if content_length and content_length > max_content_length_mb * 1024 * 1024:
+            # Rejeitar antes de ler o corpo
+            return {
+                "success": False,
+                "error": "Arquivo muito grande",
+                "detail": f"O tamanho do arquivo excede o limite máximo permitido. Tamanho máximo configurado: {max_content_length_mb}MB"
+            }, 413
+
+        try:
+            backend = await self.get_storage()
+        except Exception as e:
+            return upload_app.s3_client_error_response(e)
+
+        decoder = MultipartDecoder(options['boundary'].encode('latin-1'))
+        form_fields: Dict[str, str] = {}
+        field_name = None
+        field_buffer = bytearray()
+        current_part = None
+        # Cabeçalho da parte 'file' e primeiros bytes, retidos até o sniffing do conteúdo
+        file_event: Optional[File] = None
+        file_head = bytearray()
+        pipeline: Optional[AsyncUploadPipeline] = None
+        upload_info: Dict[str, Any] = {}
+        timestamp_upload_inicio = None
+        body_done = False
+        recebimento_inicio = time.perf_counter()
+
+        try:
+            while True:
+                event = decoder.next_event()
+                if isinstance(event, NeedData):
+                    if body_done:
+                        break
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        raise UploadValidationError(400, "Upload interrompido", "A conexão foi encerrada antes do fim do corpo da requisição.")
+                    chunk = message.get("body", b"")
+                    body_done = not message.get("more_body", False)
+                    decoder.receive_data(chunk)
+                    if body_done:
+                        decoder.receive_data(None)
+                elif isinstance(event, Epilogue):
+                    break
+                elif isinstance(event, File):
+                    current_part = None
+                    if event.name == 'file' and file_event is None:
+                        file_event = event
+                        current_part = 'file'
+                elif isinstance(event, Field):
+                    current_part = 'field'
+                    field_name = event.name
+                    field_buffer = bytearray()
+                elif isinstance(event, Data):
+                    if current_part == 'file' and pipeline is not None:
+                        await pipeline.write(event.data)
+                    elif current_part == 'file':
+                        file_head += event.data
+                        # Pipeline só depois dos primeiros bytes: o sniffing decide tipo, categoria e janelas
+                        if len(file_head) >= sniffing.SNIFF_BYTES or not event.more_data:
+                            upload_info = upload_app.prepare_streaming_file(file_event, form_fields.get('folder') or query.get('folder'), content_length, bytes(file_head))
+                            pipeline = AsyncUploadPipeline(
+                                backend,
+                                upload_info["s3_key"],
+                                upload_info["content_type"] or 'application/octet-stream',
+                                upload_info["transfer_plan"],
+                                probe_windows=upload_app.streaming_needs_media_probe(upload_info),
+                                max_size_bytes=upload_info["max_size_bytes"]
+                            )
+                            timestamp_upload_inicio = time.time()
+                            print(f"🔄 Iniciando upload em streaming (ASGI): {upload_info['s3_key']}")
+                            logger.info(f"Iniciando upload em streaming (ASGI): {upload_info['s3_key']}")
+                            await pipeline.write(bytes(file_head))
+                    elif current_part == 'field':
+                        field_buffer += event.data
+                        if not event.more_data:
+                            form_fields[field_name] = field_buffer.decode('utf-8', 'replace')
+
+            if pipeline is None:
+                return {
+                    "success": False,
+                    "error": "Nenhum arquivo fornecido",
+                    "detail": "É necessário enviar um arquivo no campo 'file' usando multipart/form-data"
+                }, 400
+
+            metrics.observe_stage("recebimento_corpo", time.perf_counter() - recebimento_inicio)
+            with metrics.stage("envio_s3"):
+                await pipeline.finish()
+            pipeline.record_stage_metrics()
+        except UploadValidationError as e:
+            if pipeline is not None:
+                await pipeline.abort()
+            return e.to_response()
+        except ValueError as e:
+            if pipeline is not None:
+                await pipeline.abort()
+            return {
+                "success": False,
+                "error": "Requisição multipart inválida",
+                "detail": str(e)
+            }, 400
+        except Exception as e:
+            if pipeline is not None:
+                await pipeline.abort()
+            return upload_app.storage_error_response(e)
+
+        timestamp_upload_fim = time.time()
+        file_hash = pipeline.digest.hexdigest('md5')
+        media_metadata = await self.media_metadata(backend, upload_info, pipeline, upload_app.content_sha256(pipeline.digest))
+
+        response_data = upload_app.build_upload_response(
+            unique_filename=upload_info["unique_filename"],
+            original_filename=upload_info["original_filename"],
+            file_hash=file_hash,
+            size=pipeline.size,
+            content_type=upload_info["content_type"],
+            file_extension=upload_info["file_extension"],
+            file_category=upload_info["file_category"],
+            target_folder=upload_info["target_folder"],
+            s3_key=upload_info["s3_key"],
+            media_metadata=media_metadata,
+            client_info=client_info,
+            timestamp_inicio_iso=timestamp_inicio_iso,
+            timestamp_inicio_unix=timestamp_inicio_unix,
+            timestamp_upload_inicio=timestamp_upload_inicio,
+            timestamp_upload_fim=timestamp_upload_fim,
+            transfer_plan=upload_info["transfer_plan"],
+            hashes=upload_app.extra_hashes(pipeline.digest),
+        )
+
+        upload_app.transfer_engine.record_throughput(upload_info["file_category"]["categoria"], pipeline.size, response_data["upload"]["velocidade_bytes_por_segundo"])
+        upload_app.dedup_register(upload_app.response_content_hash(response_data), pipeline.size, upload_info["s3_key"], upload_info["content_type"], media_metadata)
+
+        print(f"✅ Upload em streaming concluído (ASGI): {response_data['url']} ({len(pipeline.parts) or 1} parte(s))")
+        logger.info(f"Upload em streaming concluído (ASGI): {response_data['url']}")
+
+        await self.save_callback_json(backend, response_data, upload_info["target_folder"], upload_info["unique_filename"])
+        upload_app.catalog_register(response_data)
+        return response_data, 200
+
+    async def media_metadata(self, backend: storage.StorageBackendAsync, upload_info: Dict[str, Any], pipeline: AsyncUploadPipeline, content_hash: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Cache, leitura nativa das janelas e, se preciso, ffprobe em thread sobre o objeto gravado"""
+        if not upload_app.is_media_content_type(upload_info["content_type"]):
+            return None
+        media_metadata = upload_app.media_metadata_cache.get(content_hash, pipeline.size)
+        if media_metadata is not None or not pipeline.probe_windows:
+            return media_metadata
+
+        object_url = await backend.read_url(upload_info["s3_key"])
+        # Leitura das janelas em memória é rápida; só o fallback (ffprobe) bloquearia o loop
+        media_metadata = await asyncio.to_thread(
+            upload_app.extract_media_metadata, pipeline.probe_source(), upload_info["content_type"], object_url
+        )
+        upload_app.media_metadata_cache.put(content_hash, pipeline.size, media_metadata)
+        return media_metadata
+
+    @staticmethod
+    async def save_callback_json(backend: storage.StorageBackendAsync, response_data: Dict[str, Any], target_folder: str, unique_filename: str) -> None:
+        """Versão assíncrona de save_callback_json (no modo async usa o mesmo writer em segundo plano)"""
+        if upload_app.CALLBACK_JSON_MODE != 'sync':
+            # Em thread: com a fila cheia a gravação vira síncrona e não pode travar o event loop
+            await asyncio.to_thread(upload_app.save_callback_json, upload_app.storage_backend, response_data, target_folder, unique_filename)
+            return
+        callback_json_key = upload_app.callback_json_key_for(target_folder, unique_filename)
+        callback_json_url = upload_app.build_public_url(callback_json_key)
+        try:
+            with metrics.stage("callback_json"):
+                await backend.put_object(callback_json_key, upload_app.serialize_callback_json(response_data), 'application/json')
+            print(f"✅ Callback JSON salvo: {callback_json_url}")
+            logger.info(f"Callback JSON salvo: {callback_json_url}")
+            response_data["callback_url"] = callback_json_url
+        except Exception as e:
+            logger.warning(f"Erro ao salvar callback JSON: {e}")
+            print(f"⚠️ Aviso: Não foi possível salvar callback JSON: {e}")
+
+
+application = UploadCdnAsgi()
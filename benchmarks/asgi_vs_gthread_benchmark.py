@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark: modo ASGI (uvicorn + asgi_app) vs gunicorn gthread (app:app).
+
+Sobe os dois servidores com o mesmo número de processos e dispara N uploads
+simultâneos de clientes lentos (corpo enviado a uma taxa limitada), medindo
+latência (p50/p95/p99), vazão e erros para cada nível de concorrência.
+
+Por padrão o Spaces é substituído por um servidor S3 local (moto), para medir só
+o servidor de aplicação; use --endpoint para apontar para outro S3 compatível.
+
+Uso:
+    pip install -r requirements-asgi.txt "moto[server]<5"
+    python benchmarks/asgi_vs_gthread_benchmark.py
+    python benchmarks/asgi_vs_gthread_benchmark.py --concorrencias 8,64,256 --tamanho-kb 512 --taxa-kbps 256
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from comum import ambiente_servidor, iniciar_s3_local, parar_servidor, percentil, porta_livre
+from comum import iniciar_servidor as iniciar_processo
+
+
+def comando_servidor(modo: str, porta: int, workers: int, threads: int) -> list:
+    if modo == "gthread":
+        return [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{porta}", "--workers", str(workers),
+                "--threads", str(threads), "--timeout", "300", "--log-level", "warning", "app:app"]
+    return [sys.executable, "-m", "uvicorn", "asgi_app:application", "--host", "127.0.0.1", "--port", str(porta),
+            "--workers", str(workers), "--log-level", "warning"]
+
+
+def iniciar_servidor(modo: str, porta: int, args, env: dict):
+    return iniciar_processo(comando_servidor(modo, porta, args.workers, args.threads), porta, env, modo)
+
+
+def corpo_multipart(tamanho: int):
+    boundary = uuid.uuid4().hex
+    cabecalho = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench.pdf\"\r\n"
+                 f"Content-Type: application/pdf\r\n\r\n").encode()
+    return boundary, cabecalho + os.urandom(tamanho) + f"\r\n--{boundary}--\r\n".encode()
+
+
+async def upload_lento(porta: int, caminho: str, tamanho: int, taxa_bps: int, bloco: int = 16384):
+    """Envia um upload a uma taxa limitada e retorna (status, latência em segundos)"""
+    boundary, corpo = corpo_multipart(tamanho)
+    inicio = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", porta)
+        writer.write((f"POST {caminho} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+                      f"Content-Type: multipart/form-data; boundary={boundary}\r\n"
+                      f"Content-Length: {len(corpo)}\r\n\r\n").encode())
+        for i in range(0, len(corpo), bloco):
+            writer.write(corpo[i:i + bloco])
+            await writer.drain()
+            if taxa_bps:
+                await asyncio.sleep(bloco / taxa_bps)
+        linha = await reader.readline()
+        await reader.read()
+        writer.close()
+        status = int(linha.split()[1]) if linha else 0
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - inicio
+
+
+async def rodada(porta: int, caminho: str, concorrencia: int, args) -> dict:
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*[
+        upload_lento(porta, caminho, args.tamanho_kb * 1024, args.taxa_kbps * 1024)
+        for _ in range(concorrencia)
+    ])
+    duracao = time.perf_counter() - inicio
+    latencias = [lat for status, lat in resultados if status == 200]
+    return {
+        "concorrencia": concorrencia,
+        "sucesso": len(latencias),
+        "erros": concorrencia - len(latencias),
+        "duracao_s": round(duracao, 3),
+        "uploads_por_s": round(len(latencias) / duracao, 2) if duracao else 0,
+        "p50_s": round(percentil(latencias, 50), 3),
+        "p95_s": round(percentil(latencias, 95), 3),
+        "p99_s": round(percentil(latencias, 99), 3),
+        "media_s": round(statistics.fmean(latencias), 3) if latencias else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ASGI vs gunicorn gthread")
+    parser.add_argument("--concorrencias", default="8,32,128", help="níveis de uploads simultâneos")
+    parser.add_argument("--tamanho-kb", type=int, default=256, help="tamanho de cada arquivo")
+    parser.add_argument("--taxa-kbps", type=int, default=512, help="taxa de envio por cliente (0 = sem limite)")
+    parser.add_argument("--workers", type=int, default=2, help="processos em cada servidor")
+    parser.add_argument("--threads", type=int, default=4, help="threads por worker no gthread")
+    parser.add_argument("--modos", default="gthread,asgi", help="servidores a medir")
+    parser.add_argument("--endpoint", help="endpoint S3 já existente (padrão: moto local)")
+    parser.add_argument("--bucket", default="bench")
+    parser.add_argument("--json", help="gravar resultados neste arquivo")
+    args = parser.parse_args()
+
+    s3_local = None
+    endpoint = args.endpoint
+    if not endpoint:
+        s3_local, endpoint = iniciar_s3_local(args.bucket)
+
+    env = ambiente_servidor(endpoint, args.bucket)
+
+    concorrencias = [int(c) for c in args.concorrencias.split(",") if c]
+    resultados = {}
+    try:
+        for modo in [m.strip() for m in args.modos.split(",") if m.strip()]:
+            porta = porta_livre()
+            print(f"🚀 Iniciando {modo} ({args.workers} worker(s){f' x {args.threads} threads' if modo == 'gthread' else ''})...")
+            processo = iniciar_servidor(modo, porta, args, env)
+            # No gthread o modo streaming é o equivalente direto do ASGI (passagem única)
+            caminho = "/upload?stream=true" if modo == "gthread" else "/upload"
+            try:
+                resultados[modo] = [asyncio.run(rodada(porta, caminho, c, args)) for c in concorrencias]
+            finally:
+                parar_servidor(processo)
+    finally:
+        if s3_local is not None:
+            s3_local.stop()
+
+    print()
+    print(f"Arquivo: {args.tamanho_kb} KB, taxa por cliente: {args.taxa_kbps or 'ilimitada'} KB/s")
+    print(f"{'modo':8s} {'conc':>5s} {'ok':>5s} {'erros':>6s} {'uploads/s':>10s} {'p50':>8s} {'p95':>8s} {'p99':>8s}")
+    for modo, linhas in resultados.items():
+        for linha in linhas:
+            print(f"{modo:8s} {linha['concorrencia']:>5d} {linha['sucesso']:>5d} {linha['erros']:>6d} "
+                  f"{linha['uploads_por_s']:>10.2f} {linha['p50_s']:>7.2f}s {linha['p95_s']:>7.2f}s {linha['p99_s']:>7.2f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"parametros": vars(args), "resultados": resultados}, f, ensure_ascii=False, indent=2)
+        print(f"💾 Resultados gravados em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
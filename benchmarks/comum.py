@@ -0,0 +1,96 @@
+"""
+Funções compartilhadas pelos benchmarks que sobem a API contra um S3 local.
+"""
+
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_s3_local(bucket: str = "bench"):
+    """Servidor S3 local (moto) com o bucket de teste"""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        sys.exit("❌ moto não instalado: pip install \"moto[server]<5\" ou informe --endpoint")
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    porta = porta_livre()
+    servidor = ThreadedMotoServer(ip_address="127.0.0.1", port=porta, verbose=False)
+    servidor.start()
+    endpoint = f"http://127.0.0.1:{porta}"
+    cliente_s3(endpoint).create_bucket(Bucket=bucket)
+    return servidor, endpoint
+
+
+def cliente_s3(endpoint: str):
+    import boto3
+
+    return boto3.client("s3", endpoint_url=endpoint, region_name=os.environ.get("SPACES_REGION", "us-east-1"),
+                        aws_access_key_id=os.environ.get("SPACES_KEY", "bench"),
+                        aws_secret_access_key=os.environ.get("SPACES_SECRET", "bench"))
+
+
+def ambiente_servidor(endpoint: str, bucket: str, **extra) -> dict:
+    """Variáveis de ambiente da API apontando para o S3 do benchmark"""
+    env = dict(os.environ)
+    env.update({
+        "SPACES_KEY": env.get("SPACES_KEY", "bench"),
+        "SPACES_SECRET": env.get("SPACES_SECRET", "bench"),
+        "SPACES_BUCKET": bucket,
+        "SPACES_REGION": env.get("SPACES_REGION", "us-east-1"),
+        "SPACES_ENDPOINT": endpoint,
+        "DEFAULT_UPLOAD_DIR": "bench",
+        "DEDUP_MODE": "off",
+        # Toda a carga vem de um único cliente (localhost): limites por cliente distorceriam a medição
+        "ADMISSION_ENABLED": "false",
+        "STATE_DB_PATH": os.path.join(tempfile.gettempdir(), f"bench_state_{os.getpid()}.db"),
+    })
+    env.update({chave: str(valor) for chave, valor in extra.items()})
+    return env
+
+
+def iniciar_servidor(comando: list, porta: int, env: dict, nome: str) -> subprocess.Popen:
+    """Sobe o servidor em um novo grupo de processos e espera /health responder 200"""
+    processo = subprocess.Popen(
+        comando, cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    limite = time.time() + 60
+    while time.time() < limite:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{porta}/health", timeout=2) as resposta:
+                if resposta.status == 200:
+                    return processo
+        except Exception:
+            time.sleep(0.3)
+    parar_servidor(processo)
+    sys.exit(f"❌ Servidor {nome} não respondeu em /health")
+
+
+def parar_servidor(processo: subprocess.Popen) -> None:
+    try:
+        os.killpg(processo.pid, signal.SIGTERM)
+        processo.wait(timeout=15)
+    except Exception:
+        os.killpg(processo.pid, signal.SIGKILL)
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark: leitura nativa de cabeçalhos (media_probe) vs ffprobe.
+
+Mede, por arquivo, a latência da extração de metadados em três caminhos:
+  - nativo:           media_probe.probe sobre o arquivo (caminho atual do upload)
+  - ffprobe:          subprocesso ffprobe sobre o arquivo
+  - temp + ffprobe:   cópia para arquivo temporário + ffprobe (caminho antigo do upload)
+
+Também compara os campos extraídos (duração, resolução, codecs, fps, áudio) entre os
+dois motores.
+
+Uso:
+    python benchmarks/media_probe_benchmark.py video1.mp4 video2.webm ...
+    python benchmarks/media_probe_benchmark.py --gerar      # gera amostras com ffmpeg
+    python benchmarks/media_probe_benchmark.py --gerar --json resultado.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media_probe  # noqa: E402
+
+AMOSTRAS = {
+    "h264_aac.mp4": ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac"],
+    "h264_aac_faststart.mp4": ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-movflags", "+faststart"],
+    "h264_aac.mov": ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-f", "mov"],
+    "vp9_opus.webm": ["-c:v", "libvpx-vp9", "-b:v", "500k", "-deadline", "realtime", "-c:a", "libopus"],
+    "h264_mp3.mkv": ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "libmp3lame"],
+    "mpeg4_mp3.avi": ["-c:v", "mpeg4", "-vtag", "XVID", "-c:a", "libmp3lame"],
+}
+
+
+def gerar_amostras(destino: str, duracao: int) -> list:
+    """Gera vídeos sintéticos com ffmpeg para cada contêiner suportado"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        sys.exit("❌ ffmpeg não encontrado; informe os arquivos de teste como argumentos")
+
+    arquivos = []
+    for nome, codecs in AMOSTRAS.items():
+        caminho = os.path.join(destino, nome)
+        cmd = [
+            ffmpeg, "-v", "error", "-y",
+            "-f", "lavfi", "-i", "testsrc=size=1280x720:rate=30",
+            "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+            "-t", str(duracao), *codecs, caminho,
+        ]
+        if subprocess.run(cmd).returncode == 0:
+            arquivos.append(caminho)
+        else:
+            print(f"⚠️ Não foi possível gerar {nome} (codec ausente no ffmpeg?)")
+    return arquivos
+
+
+def ffprobe(caminho: str) -> dict:
+    result = subprocess.run(
+        ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", caminho],
+        capture_output=True, text=True, timeout=30,
+    )
+    return json.loads(result.stdout) if result.returncode == 0 else {}
+
+
+def temp_ffprobe(caminho: str) -> dict:
+    fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(caminho)[1])
+    try:
+        with os.fdopen(fd, "wb") as temp_file, open(caminho, "rb") as origem:
+            shutil.copyfileobj(origem, temp_file, 1024 * 1024)
+        return ffprobe(temp_path)
+    finally:
+        os.unlink(temp_path)
+
+
+def medir(funcao, caminho: str, repeticoes: int) -> dict:
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(caminho)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        "p50_ms": round(statistics.median(tempos), 3),
+        "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+        "media_ms": round(statistics.fmean(tempos), 3),
+        "resultado": resultado,
+    }
+
+
+def resumo(data: dict) -> dict:
+    """Campos que a API expõe, para comparar os dois motores"""
+    if not data:
+        return {}
+    saida = {"duracao": round(float(data.get("format", {}).get("duration", 0) or 0), 2)}
+    for stream in data.get("streams", []):
+        tipo = stream.get("codec_type")
+        if tipo == "video" and "video" not in saida:
+            saida["video"] = (stream.get("codec_name"), int(stream.get("width", 0)), int(stream.get("height", 0)), stream.get("r_frame_rate"))
+        elif tipo == "audio" and "audio" not in saida:
+            saida["audio"] = (stream.get("codec_name"), int(stream.get("sample_rate", 0)), int(stream.get("channels", 0)))
+    return saida
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark media_probe vs ffprobe")
+    parser.add_argument("arquivos", nargs="*", help="arquivos de mídia a medir")
+    parser.add_argument("--gerar", action="store_true", help="gerar amostras sintéticas com ffmpeg")
+    parser.add_argument("--duracao", type=int, default=30, help="duração das amostras geradas (s)")
+    parser.add_argument("--repeticoes", type=int, default=20, help="execuções por arquivo e motor")
+    parser.add_argument("--json", help="gravar resultados neste arquivo")
+    args = parser.parse_args()
+
+    temp_dir = None
+    arquivos = list(args.arquivos)
+    if args.gerar:
+        temp_dir = tempfile.mkdtemp(prefix="media_probe_bench_")
+        arquivos += gerar_amostras(temp_dir, args.duracao)
+    if not arquivos:
+        parser.error("informe arquivos ou use --gerar")
+
+    tem_ffprobe = shutil.which("ffprobe") is not None
+    if not tem_ffprobe:
+        print("ℹ️ ffprobe não encontrado: medindo apenas o motor nativo")
+
+    resultados = []
+    print(f"{'arquivo':28s} {'tamanho':>10s} {'nativo p50':>11s} {'ffprobe p50':>12s} {'temp+ffprobe':>13s} {'ganho':>7s}  campos")
+    try:
+        for caminho in arquivos:
+            nativo = medir(media_probe.probe, caminho, args.repeticoes)
+            linha = {
+                "arquivo": os.path.basename(caminho),
+                "tamanho_bytes": os.path.getsize(caminho),
+                "nativo": {k: v for k, v in nativo.items() if k != "resultado"},
+                "suportado": nativo["resultado"] is not None,
+            }
+            texto_ffprobe = texto_temp = texto_ganho = "-"
+            texto_campos = "ok" if linha["suportado"] else "fallback"
+
+            if tem_ffprobe:
+                externo = medir(ffprobe, caminho, args.repeticoes)
+                temp = medir(temp_ffprobe, caminho, args.repeticoes)
+                linha["ffprobe"] = {k: v for k, v in externo.items() if k != "resultado"}
+                linha["temp_ffprobe"] = {k: v for k, v in temp.items() if k != "resultado"}
+                linha["campos_iguais"] = resumo(nativo["resultado"]) == resumo(externo["resultado"])
+                if not linha["campos_iguais"] and linha["suportado"]:
+                    linha["diferencas"] = {"nativo": resumo(nativo["resultado"]), "ffprobe": resumo(externo["resultado"])}
+                texto_ffprobe = f"{externo['p50_ms']:.2f} ms"
+                texto_temp = f"{temp['p50_ms']:.2f} ms"
+                texto_ganho = f"{temp['p50_ms'] / max(nativo['p50_ms'], 0.001):.0f}x"
+                if linha["suportado"]:
+                    texto_campos = "iguais" if linha["campos_iguais"] else "DIFERENTES"
+
+            resultados.append(linha)
+            print(f"{linha['arquivo']:28s} {linha['tamanho_bytes']:>10d} {nativo['p50_ms']:>8.2f} ms {texto_ffprobe:>12s} {texto_temp:>13s} {texto_ganho:>7s}  {texto_campos}")
+            for lado, campos in linha.get("diferencas", {}).items():
+                print(f"    {lado}: {campos}")
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"ffprobe_disponivel": tem_ffprobe, "repeticoes": args.repeticoes, "resultados": resultados}, f, ensure_ascii=False, indent=2)
+        print(f"💾 Resultados gravados em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
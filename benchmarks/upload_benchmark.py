@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Benchmark de upload: varredura de tamanho de arquivo, categoria e concorrência.
+
+Sobe a API com o Gunicorn (mesmo gunicorn.conf.py da produção) contra um S3 local (moto,
+ou --endpoint para outro S3 compatível, ex.: MinIO) e, para cada combinação de
+modo x categoria x tamanho x concorrência, mede:
+  - vazão (uploads/s e MB/s)
+  - latência p50/p95/p99
+  - pico de RSS por worker do Gunicorn (amostrado em /proc)
+  - CPU dos processos do servidor por MB enviado
+
+Categorias:
+    imagem         JPEG sintético (sem extração de metadados)
+    video          MP4 com leitura nativa de metadados (MEDIA_PROBE_ENGINE=native)
+    video_ffprobe  MP4 com ffprobe (MEDIA_PROBE_ENGINE=ffprobe)
+O MP4 base (--amostra-video ou gerado com ffmpeg) é completado até o tamanho pedido com
+uma caixa 'free', mantendo o contêiner válido.
+
+Os resultados vão para JSON (--json) com o commit e o ambiente; --comparar aponta outro
+JSON e mostra a variação de cada célula, marcando regressões acima de --tolerancia.
+
+Uso (Linux):
+    pip install "moto[server]<5"
+    python benchmarks/upload_benchmark.py --json resultados/$(git rev-parse --short HEAD).json
+    python benchmarks/upload_benchmark.py --tamanhos 10KB,1MB,100MB --concorrencias 1,8 --categorias imagem
+    python benchmarks/upload_benchmark.py --json novo.json --comparar base.json --falhar-em-regressao
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from comum import RAIZ, ambiente_servidor, cliente_s3, iniciar_s3_local, iniciar_servidor, parar_servidor, percentil, porta_livre
+
+CATEGORIAS = {
+    # categoria: (extensão, content type, MEDIA_PROBE_ENGINE do servidor)
+    "imagem": ("jpg", "image/jpeg", "native"),
+    "video": ("mp4", "video/mp4", "native"),
+    "video_ffprobe": ("mp4", "video/mp4", "ffprobe"),
+}
+UNIDADES = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+BLOCO = 1024 * 1024
+
+
+def parse_tamanho(texto: str) -> int:
+    match = re.fullmatch(r"\s*(\d+)\s*([KMG]?B)?\s*", texto.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"tamanho inválido: {texto}")
+    return int(match.group(1)) * UNIDADES[match.group(2) or "B"]
+
+
+def formatar_tamanho(tamanho: int) -> str:
+    for unidade in ("GB", "MB", "KB"):
+        if tamanho >= UNIDADES[unidade] and tamanho % UNIDADES[unidade] == 0:
+            return f"{tamanho // UNIDADES[unidade]}{unidade}"
+    return f"{tamanho}B"
+
+
+def gerar_video_base(destino: str) -> str:
+    """MP4 curto com moov no início (faststart), gerado com ffmpeg"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return ""
+    caminho = os.path.join(destino, "base.mp4")
+    cmd = [
+        ffmpeg, "-v", "error", "-y",
+        "-f", "lavfi", "-i", "testsrc=size=1280x720:rate=30",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", "2", "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-movflags", "+faststart", caminho,
+    ]
+    return caminho if subprocess.run(cmd).returncode == 0 else ""
+
+
+def escrever_preenchimento(arquivo, quantidade: int, bloco_aleatorio: bytes) -> None:
+    while quantidade > 0:
+        parte = bloco_aleatorio[:min(quantidade, len(bloco_aleatorio))]
+        arquivo.write(parte)
+        quantidade -= len(parte)
+
+
+def gerar_arquivo(destino: str, categoria: str, tamanho: int, video_base: str, bloco_aleatorio: bytes) -> str:
+    """Arquivo de teste da categoria com `tamanho` bytes (vídeo: no mínimo o tamanho do vídeo base)"""
+    extensao = CATEGORIAS[categoria][0]
+    caminho = os.path.join(destino, f"{categoria}_{formatar_tamanho(tamanho)}.{extensao}")
+    with open(caminho, "wb") as arquivo:
+        if extensao == "jpg":
+            # Cabeçalho JFIF + dados aleatórios (a API não decodifica imagens)
+            cabecalho = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+            arquivo.write(cabecalho)
+            escrever_preenchimento(arquivo, max(tamanho - len(cabecalho) - 2, 0), bloco_aleatorio)
+            arquivo.write(b"\xff\xd9")
+        else:
+            with open(video_base, "rb") as base:
+                dados = base.read()
+            restante = tamanho - len(dados)
+            arquivo.write(dados)
+            # Menor que o vídeo base: o arquivo é o próprio vídeo (tamanho_bytes registra o real)
+            if restante >= 8:
+                if restante < 2 ** 32:
+                    arquivo.write(struct.pack(">I4s", restante, b"free"))
+                    escrever_preenchimento(arquivo, restante - 8, bloco_aleatorio)
+                else:
+                    arquivo.write(struct.pack(">I4sQ", 1, b"free", restante))
+                    escrever_preenchimento(arquivo, restante - 16, bloco_aleatorio)
+    return caminho
+
+
+def enviar_arquivo(porta: int, caminho_url: str, arquivo: str, content_type: str, timeout: float):
+    """Upload multipart lido do disco em blocos; retorna (status, latência em segundos)"""
+    boundary = uuid.uuid4().hex
+    nome = os.path.basename(arquivo)
+    inicio_corpo = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{nome}\"\r\n"
+                    f"Content-Type: {content_type}\r\n\r\n").encode()
+    fim_corpo = f"\r\n--{boundary}--\r\n".encode()
+    tamanho = len(inicio_corpo) + os.path.getsize(arquivo) + len(fim_corpo)
+
+    inicio = time.perf_counter()
+    conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=timeout)
+    try:
+        conexao.putrequest("POST", caminho_url)
+        conexao.putheader("Content-Type", f"multipart/form-data; boundary={boundary}")
+        conexao.putheader("Content-Length", str(tamanho))
+        conexao.endheaders()
+        conexao.send(inicio_corpo)
+        with open(arquivo, "rb") as origem:
+            while True:
+                bloco = origem.read(BLOCO)
+                if not bloco:
+                    break
+                conexao.send(bloco)
+        conexao.send(fim_corpo)
+        resposta = conexao.getresponse()
+        resposta.read()
+        status = resposta.status
+    except Exception:
+        status = 0
+    finally:
+        conexao.close()
+    return status, time.perf_counter() - inicio
+
+
+class MonitorProcessos:
+    """Amostra RSS e CPU do master do Gunicorn e de seus workers via /proc (Linux)"""
+
+    TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def __init__(self, master_pid: int, intervalo: float = 0.05):
+        self.master_pid = master_pid
+        self.intervalo = intervalo
+        self.disponivel = os.path.isdir(f"/proc/{master_pid}")
+        self._parar = threading.Event()
+        self._thread = None
+        self.rss_pico = {}
+        self.cpu_inicial = {}
+        self.cpu_final = {}
+
+    def _filhos(self) -> list:
+        filhos = []
+        for entrada in os.listdir("/proc"):
+            if not entrada.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entrada}/stat") as stat:
+                    campos = stat.read().rsplit(")", 1)[1].split()
+                if int(campos[1]) == self.master_pid:
+                    filhos.append(int(entrada))
+            except (OSError, IndexError, ValueError):
+                continue
+        return filhos
+
+    @staticmethod
+    def _ler(pid: int):
+        """(RSS em bytes, CPU em ticks) do processo"""
+        with open(f"/proc/{pid}/stat") as stat:
+            campos = stat.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as status:
+            rss = next(int(linha.split()[1]) * 1024 for linha in status if linha.startswith("VmRSS:"))
+        # utime e stime (campos 14 e 15 do stat; o split começa no campo 3)
+        return rss, int(campos[11]) + int(campos[12])
+
+    def _amostrar(self) -> None:
+        for pid in [self.master_pid, *self._filhos()]:
+            try:
+                rss, cpu = self._ler(pid)
+            except (OSError, StopIteration, IndexError, ValueError):
+                continue
+            self.rss_pico[pid] = max(self.rss_pico.get(pid, 0), rss)
+            self.cpu_inicial.setdefault(pid, cpu)
+            self.cpu_final[pid] = cpu
+
+    def _loop(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            self._amostrar()
+
+    def iniciar(self) -> None:
+        if not self.disponivel:
+            return
+        self._amostrar()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def parar(self) -> dict:
+        if not self.disponivel:
+            return {"rss_pico_mb_por_worker": {}, "rss_pico_mb_max": None, "cpu_segundos": None}
+        self._parar.set()
+        self._thread.join()
+        self._amostrar()
+        workers = {pid: rss for pid, rss in self.rss_pico.items() if pid != self.master_pid}
+        cpu = sum(self.cpu_final[pid] - self.cpu_inicial[pid] for pid in self.cpu_final) / self.TICKS
+        return {
+            "rss_pico_mb_por_worker": {str(pid): round(rss / UNIDADES["MB"], 1) for pid, rss in sorted(workers.items())},
+            "rss_pico_mb_max": round(max(workers.values()) / UNIDADES["MB"], 1) if workers else None,
+            "cpu_segundos": round(cpu, 3),
+        }
+
+
+def limpar_bucket(s3, bucket: str) -> None:
+    """Remove os objetos enviados para não acumular memória/disco no S3 local"""
+    for pagina in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket):
+        chaves = [{"Key": objeto["Key"]} for objeto in pagina.get("Contents", [])]
+        if chaves:
+            s3.delete_objects(Bucket=bucket, Delete={"Objects": chaves, "Quiet": True})
+
+
+def celula(porta: int, master_pid: int, modo: str, categoria: str, rotulo: str, arquivo: str, concorrencia: int, args) -> dict:
+    tamanho = os.path.getsize(arquivo)
+    requisicoes = min(args.requisicoes or concorrencia * 3, max(1, args.orcamento_mb * UNIDADES["MB"] // tamanho))
+    requisicoes = max(requisicoes, 1)
+    efetiva = min(concorrencia, requisicoes)
+    caminho_url = "/upload?stream=true" if modo == "streaming" else "/upload"
+    content_type = CATEGORIAS[categoria][1]
+
+    monitor = MonitorProcessos(master_pid)
+    monitor.iniciar()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=efetiva) as executor:
+        resultados = list(executor.map(
+            lambda _: enviar_arquivo(porta, caminho_url, arquivo, content_type, args.timeout), range(requisicoes)
+        ))
+    duracao = time.perf_counter() - inicio
+    processos = monitor.parar()
+
+    latencias = [latencia for status, latencia in resultados if status == 200]
+    mb_enviados = len(latencias) * tamanho / UNIDADES["MB"]
+    cpu = processos["cpu_segundos"]
+    return {
+        "modo": modo,
+        "categoria": categoria,
+        "tamanho": rotulo,
+        "tamanho_bytes": tamanho,
+        "concorrencia": concorrencia,
+        "concorrencia_efetiva": efetiva,
+        "requisicoes": requisicoes,
+        "sucesso": len(latencias),
+        "erros": requisicoes - len(latencias),
+        "status_erros": sorted({status for status, _ in resultados if status != 200}),
+        "duracao_s": round(duracao, 3),
+        "uploads_por_s": round(len(latencias) / duracao, 3) if duracao else 0,
+        "mb_por_s": round(mb_enviados / duracao, 2) if duracao else 0,
+        "p50_s": round(percentil(latencias, 50), 4),
+        "p95_s": round(percentil(latencias, 95), 4),
+        "p99_s": round(percentil(latencias, 99), 4),
+        **processos,
+        "cpu_ms_por_mb": round(cpu * 1000 / mb_enviados, 2) if cpu is not None and mb_enviados else None,
+    }
+
+
+def chave_celula(linha: dict) -> tuple:
+    return linha["modo"], linha["categoria"], linha["tamanho"], linha["concorrencia"]
+
+
+# Métricas comparadas: (campo, maior é melhor)
+COMPARACAO = [
+    ("uploads_por_s", True),
+    ("p50_s", False),
+    ("p95_s", False),
+    ("p99_s", False),
+    ("rss_pico_mb_max", False),
+    ("cpu_ms_por_mb", False),
+]
+
+
+def comparar(resultados: list, caminho_base: str, tolerancia: float) -> int:
+    """Mostra a variação em relação a um JSON anterior; retorna o número de regressões"""
+    with open(caminho_base, encoding="utf-8") as f:
+        base = json.load(f)
+    anteriores = {chave_celula(linha): linha for linha in base["resultados"]}
+    print()
+    print(f"Comparação com {caminho_base} (commit {base.get('ambiente', {}).get('commit') or '?'}), tolerância {tolerancia:.0f}%")
+    regressoes = 0
+    for linha in resultados:
+        anterior = anteriores.get(chave_celula(linha))
+        if anterior is None:
+            continue
+        variacoes = []
+        for campo, maior_melhor in COMPARACAO:
+            novo, antigo = linha.get(campo), anterior.get(campo)
+            if not novo or not antigo:
+                continue
+            delta = (novo - antigo) / antigo * 100
+            piora = -delta if maior_melhor else delta
+            marcador = ""
+            if piora > tolerancia:
+                marcador = " ⚠️"
+                regressoes += 1
+            variacoes.append(f"{campo} {delta:+.1f}%{marcador}")
+        print(f"  {'/'.join(map(str, chave_celula(linha)))}: {', '.join(variacoes)}")
+    print(f"{'❌' if regressoes else '✅'} {regressoes} regressão(ões) acima de {tolerancia:.0f}%")
+    return regressoes
+
+
+def commit_atual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de upload (tamanho x categoria x concorrência)")
+    parser.add_argument("--tamanhos", default="10KB,1MB,10MB,100MB,1GB", help="tamanhos de arquivo (B, KB, MB, GB)")
+    parser.add_argument("--categorias", default="imagem,video,video_ffprobe", help=f"categorias ({', '.join(CATEGORIAS)})")
+    parser.add_argument("--concorrencias", default="1,8,32", help="uploads simultâneos")
+    parser.add_argument("--modos", default="tradicional", help="tradicional e/ou streaming (?stream=true)")
+    parser.add_argument("--requisicoes", type=int, default=0, help="uploads por célula (padrão: 3x a concorrência)")
+    parser.add_argument("--orcamento-mb", type=int, default=2048, help="limite de MB enviados por célula (reduz as requisições de arquivos grandes)")
+    parser.add_argument("--workers", type=int, default=2, help="workers do Gunicorn")
+    parser.add_argument("--threads", type=int, default=4, help="threads por worker")
+    parser.add_argument("--timeout", type=float, default=600, help="timeout de cada upload (s)")
+    parser.add_argument("--amostra-video", help="MP4/MOV base para as categorias de vídeo (padrão: gerado com ffmpeg)")
+    parser.add_argument("--endpoint", help="endpoint S3 já existente (padrão: moto local)")
+    parser.add_argument("--bucket", default="bench")
+    parser.add_argument("--json", help="gravar resultados neste arquivo")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--tolerancia", type=float, default=10, help="piora percentual tolerada na comparação")
+    parser.add_argument("--falhar-em-regressao", action="store_true", help="código de saída 1 se houver regressão")
+    args = parser.parse_args()
+
+    tamanhos = [parse_tamanho(t) for t in args.tamanhos.split(",") if t.strip()]
+    concorrencias = [int(c) for c in args.concorrencias.split(",") if c.strip()]
+    modos = [m.strip() for m in args.modos.split(",") if m.strip()]
+    categorias = [c.strip() for c in args.categorias.split(",") if c.strip()]
+    for categoria in categorias:
+        if categoria not in CATEGORIAS:
+            sys.exit(f"❌ Categoria desconhecida: {categoria} (use {', '.join(CATEGORIAS)})")
+
+    trabalho = tempfile.mkdtemp(prefix="upload_bench_")
+    video_base = args.amostra_video
+    if any(CATEGORIAS[c][0] == "mp4" for c in categorias) and not video_base:
+        video_base = gerar_video_base(trabalho)
+        if not video_base:
+            print("⚠️ ffmpeg não encontrado e --amostra-video não informado: categorias de vídeo ignoradas")
+            categorias = [c for c in categorias if CATEGORIAS[c][0] != "mp4"]
+    if "video_ffprobe" in categorias and not shutil.which("ffprobe"):
+        print("⚠️ ffprobe não encontrado: categoria video_ffprobe ignorada")
+        categorias.remove("video_ffprobe")
+
+    s3_local = None
+    endpoint = args.endpoint
+    if not endpoint:
+        s3_local, endpoint = iniciar_s3_local(args.bucket)
+    s3 = cliente_s3(endpoint)
+
+    bloco_aleatorio = os.urandom(BLOCO)
+    resultados = []
+    try:
+        # Um servidor por motor de metadados; imagem e vídeo nativo compartilham o mesmo
+        for engine in dict.fromkeys(CATEGORIAS[c][2] for c in categorias):
+            porta = porta_livre()
+            env = ambiente_servidor(
+                endpoint, args.bucket,
+                MEDIA_PROBE_ENGINE=engine,
+                MAX_CONTENT_LENGTH_MB=max(tamanhos) // UNIDADES["MB"] + 16,
+                THREADS=args.threads,
+                PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix="bench_prom_", dir=trabalho),
+            )
+            comando = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py",
+                       "--bind", f"127.0.0.1:{porta}", "--workers", str(args.workers),
+                       "--threads", str(args.threads), "--timeout", str(int(args.timeout)),
+                       "--log-level", "warning", "app:app"]
+            print(f"🚀 Gunicorn {args.workers} worker(s) x {args.threads} threads, MEDIA_PROBE_ENGINE={engine}")
+            processo = iniciar_servidor(comando, porta, env, f"gunicorn ({engine})")
+            try:
+                for modo in modos:
+                    for categoria in [c for c in categorias if CATEGORIAS[c][2] == engine]:
+                        for tamanho in tamanhos:
+                            arquivo = gerar_arquivo(trabalho, categoria, tamanho, video_base, bloco_aleatorio)
+                            for concorrencia in concorrencias:
+                                linha = celula(porta, processo.pid, modo, categoria, formatar_tamanho(tamanho),
+                                               arquivo, concorrencia, args)
+                                resultados.append(linha)
+                                aviso = f" ⚠️ {linha['erros']} erro(s) {linha['status_erros']}" if linha["erros"] else ""
+                                print(f"   {modo:11s} {categoria:13s} {linha['tamanho']:>6s} x{concorrencia:<3d} "
+                                      f"{linha['uploads_por_s']:>8.2f} up/s {linha['mb_por_s']:>8.2f} MB/s "
+                                      f"p50 {linha['p50_s']:.3f}s p99 {linha['p99_s']:.3f}s "
+                                      f"RSS {linha['rss_pico_mb_max'] or 0:.0f} MB "
+                                      f"CPU/MB {linha['cpu_ms_por_mb'] or 0:.1f} ms{aviso}")
+                                limpar_bucket(s3, args.bucket)
+                            os.unlink(arquivo)
+            finally:
+                parar_servidor(processo)
+    finally:
+        if s3_local is not None:
+            s3_local.stop()
+        shutil.rmtree(trabalho, ignore_errors=True)
+
+    saida = {
+        "parametros": vars(args),
+        "ambiente": {
+            "commit": commit_atual(),
+            "data": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "s3": "moto" if s3_local is not None else endpoint,
+        },
+        "resultados": resultados,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(saida, f, ensure_ascii=False, indent=2)
+        print(f"💾 Resultados gravados em {args.json}")
+
+    if args.comparar:
+        regressoes = comparar(resultados, args.comparar, args.tolerancia)
+        if regressoes and args.falhar_em_regressao:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Motor de hashing da Upload CDN API: vários digests (MD5, SHA-256, CRC32C) na mesma passagem.
+
+Cada bloco do arquivo alimenta todos os algoritmos configurados (HASH_ALGORITHMS no app). O
+hashlib libera o GIL ao processar blocos grandes, então com mais de um algoritmo as
+atualizações de um bloco rodam em paralelo num pool de threads compartilhado, e as threads das
+outras requisições continuam executando enquanto o hash é calculado.
+
+O CRC32C depende do pacote opcional google-crc32c; sem ele o algoritmo fica indisponível.
+Os digests em base64 (`b64digest`) são os valores dos cabeçalhos Content-MD5 e
+x-amz-checksum-* enviados ao armazenamento.
+"""
+
+import base64
+import hashlib
+from concurrent.futures import Executor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import google_crc32c
+except ImportError:  # opcional: sem ele o CRC32C fica indisponível
+    google_crc32c = None
+
+# Abaixo disso os algoritmos são atualizados em sequência: despachar para o pool custaria mais
+PARALLEL_MIN_BYTES = 256 * 1024
+
+
+class _Crc32c:
+    """google_crc32c com a interface do hashlib (update, digest, hexdigest)"""
+
+    def __init__(self):
+        self._checksum = google_crc32c.Checksum()
+
+    def update(self, data) -> None:
+        self._checksum.update(data)
+
+    def digest(self) -> bytes:
+        return self._checksum.digest()
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+
+def _new_hasher(name: str):
+    if name == 'crc32c':
+        return _Crc32c()
+    return hashlib.new(name)
+
+
+def available() -> List[str]:
+    """Algoritmos suportados neste ambiente"""
+    names = ['md5', 'sha256']
+    if google_crc32c is not None:
+        names.append('crc32c')
+    return names
+
+
+def parse_algorithms(value: str, required: Iterable[str] = ('md5',)) -> Tuple[List[str], List[str]]:
+    """Lê uma lista separada por vírgulas; retorna (algoritmos válidos, ignorados).
+
+    Os algoritmos de `required` entram sempre, na frente dos demais.
+    """
+    suportados = available()
+    algoritmos: List[str] = list(required)
+    ignorados: List[str] = []
+    for name in (value or '').split(','):
+        name = name.strip().lower().replace('-', '')
+        if not name or name in algoritmos:
+            continue
+        if name in suportados:
+            algoritmos.append(name)
+        else:
+            ignorados.append(name)
+    return algoritmos, ignorados
+
+
+class MultiDigest:
+    """Conjunto de digests atualizados juntos a cada bloco"""
+
+    def __init__(self, algorithms: Iterable[str], executor: Optional[Executor] = None):
+        self.hashers = {name: _new_hasher(name) for name in algorithms}
+        self.executor = executor
+
+    def update(self, data) -> None:
+        hashers = list(self.hashers.values())
+        if self.executor is None or len(hashers) == 1 or len(data) < PARALLEL_MIN_BYTES:
+            for hasher in hashers:
+                hasher.update(data)
+            return
+        # Um algoritmo na thread atual e os demais no pool, sobre o mesmo bloco
+        futures = [self.executor.submit(hasher.update, data) for hasher in hashers[1:]]
+        hashers[0].update(data)
+        for future in futures:
+            future.result()
+
+    def hexdigest(self, name: str = 'md5') -> str:
+        return self.hashers[name].hexdigest()
+
+    def b64digest(self, name: str = 'md5') -> str:
+        return base64.b64encode(self.hashers[name].digest()).decode('ascii')
+
+    def hexdigests(self) -> Dict[str, str]:
+        return {name: hasher.hexdigest() for name, hasher in self.hashers.items()}
+
+
+def hash_fileobj(fileobj, algorithms: Iterable[str], chunk_size: int, executor: Optional[Executor] = None) -> MultiDigest:
+    """Calcula todos os digests em uma única leitura do arquivo (posição volta ao início)"""
+    digest = MultiDigest(algorithms, executor)
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest
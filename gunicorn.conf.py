@@ -0,0 +1,27 @@
+"""
+Hooks do Gunicorn para a Upload CDN API.
+
+As opções de execução (bind, workers, threads, timeout...) continuam em start.sh;
+aqui ficam apenas os ganchos do ciclo de vida dos workers.
+"""
+
+
+def post_fork(server, worker):
+    """Cria o cliente S3 do worker e abre conexões keep-alive antes da primeira requisição"""
+    import app
+
+    app.warm_up_worker()
+
+
+def worker_exit(server, worker):
+    """Conclui os callbacks JSON ainda na fila antes de o worker sair (reciclagem ou deploy)"""
+    import app
+
+    app.callback_json_writer.flush()
+
+
+def child_exit(server, worker):
+    """Descarta as métricas 'live' (uploads em andamento) do worker encerrado"""
+    import metrics
+
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,682 @@
+"""
+Leitura nativa de metadados de mídia a partir dos cabeçalhos do contêiner.
+
+Cobre MP4/MOV (átomo moov), Matroska/WebM (Segment Info + Tracks) e AVI (RIFF hdrl)
+lendo apenas os trechos necessários do arquivo, sem gravar arquivo temporário nem
+executar o ffprobe. O resultado segue o formato do `ffprobe -show_format -show_streams`
+(chaves "format" e "streams") para reaproveitar a mesma normalização do app.
+
+Quando o contêiner não é reconhecido ou os cabeçalhos não estão acessíveis, `probe`
+retorna None e o chamador decide se recorre ao ffprobe.
+"""
+
+import io
+import logging
+import math
+import os
+import struct
+import urllib.request
+from array import array
+from fractions import Fraction
+from typing import Any, BinaryIO, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Limite de leitura de um único bloco de cabeçalho (protege contra tamanhos forjados)
+MAX_HEADER_READ_BYTES = 32 * 1024 * 1024
+
+
+class DataUnavailable(Exception):
+    """O trecho pedido não está disponível na fonte (ex.: fora das janelas do streaming)"""
+
+
+# ============================================
+# FONTES DE DADOS
+# ============================================
+
+class ProbeSource:
+    """Acesso aleatório somente leitura: read(offset, length) e size"""
+
+    size: int = 0
+
+    def read(self, offset: int, length: int) -> bytes:
+        raise NotImplementedError
+
+
+class FileSource(ProbeSource):
+    """Objeto de arquivo com seek (ex.: stream do upload); a posição original é restaurada"""
+
+    def __init__(self, fileobj: BinaryIO, size: Optional[int] = None):
+        self.fileobj = fileobj
+        if size is None:
+            position = fileobj.tell()
+            size = fileobj.seek(0, io.SEEK_END)
+            fileobj.seek(position)
+        self.size = size
+
+    def read(self, offset: int, length: int) -> bytes:
+        position = self.fileobj.tell()
+        try:
+            self.fileobj.seek(offset)
+            return self.fileobj.read(length)
+        finally:
+            self.fileobj.seek(position)
+
+
+class WindowSource(ProbeSource):
+    """Início e fim de um arquivo recebido em streaming, guardados em memória"""
+
+    def __init__(self, head: bytes, tail: bytes, size: int):
+        self.head = bytes(head)
+        self.tail = bytes(tail)
+        self.size = size
+        self.tail_offset = size - len(self.tail)
+
+    def read(self, offset: int, length: int) -> bytes:
+        end = min(offset + length, self.size)
+        if end <= len(self.head):
+            return self.head[offset:end]
+        if offset >= self.tail_offset:
+            return self.tail[offset - self.tail_offset:end - self.tail_offset]
+        raise DataUnavailable(f"bytes {offset}-{end} fora das janelas")
+
+
+class HttpRangeSource(ProbeSource):
+    """URL HTTP(S) lida com requisições Range em blocos (ex.: URL assinada do bucket)"""
+
+    def __init__(self, url: str, block_size: int = 256 * 1024, max_blocks: int = 64, timeout: int = 10):
+        self.url = url
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.timeout = timeout
+        self.blocks: Dict[int, bytes] = {}
+        self.size = 0
+        # A primeira leitura descobre o tamanho total pelo Content-Range
+        self._fetch(0, 1)
+
+    def _fetch(self, first_block: int, count: int) -> None:
+        start = first_block * self.block_size
+        end = start + count * self.block_size - 1
+        req = urllib.request.Request(self.url, headers={'Range': f'bytes={start}-{end}'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            content_range = response.headers.get('Content-Range', '')
+            if response.status == 206 and '/' in content_range:
+                self.size = int(content_range.rsplit('/', 1)[1])
+                data = response.read()
+            else:
+                # Servidor ignorou o Range: aproveitar só o trecho pedido
+                self.size = int(response.headers.get('Content-Length') or 0)
+                data = response.read(end + 1)[start:]
+
+        if len(self.blocks) + count > self.max_blocks:
+            self.blocks.clear()
+        for i in range(count):
+            chunk = data[i * self.block_size:(i + 1) * self.block_size]
+            if chunk:
+                self.blocks[first_block + i] = chunk
+
+    def read(self, offset: int, length: int) -> bytes:
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        first, last = offset // self.block_size, (end - 1) // self.block_size
+        missing = [b for b in range(first, last + 1) if b not in self.blocks]
+        if missing:
+            self._fetch(missing[0], missing[-1] - missing[0] + 1)
+        data = b''.join(self.blocks.get(b, b'') for b in range(first, last + 1))
+        return data[offset - first * self.block_size:end - first * self.block_size]
+
+
+def open_source(source: Union[str, BinaryIO, ProbeSource]) -> ProbeSource:
+    if isinstance(source, ProbeSource):
+        return source
+    if isinstance(source, str):
+        if source.startswith(('http://', 'https://')):
+            return HttpRangeSource(source)
+        return FileSource(open(source, 'rb'), os.path.getsize(source))
+    return FileSource(source)
+
+
+# ============================================
+# AUXILIARES
+# ============================================
+
+def _read_exact(src: ProbeSource, offset: int, length: int) -> bytes:
+    if length > MAX_HEADER_READ_BYTES:
+        raise DataUnavailable(f"cabeçalho de {length} bytes excede o limite de leitura")
+    data = src.read(offset, length)
+    if len(data) != length:
+        raise DataUnavailable(f"leitura curta em {offset}")
+    return data
+
+
+def _frame_rate(fps: Fraction) -> str:
+    fps = fps.limit_denominator(1001)
+    return f"{fps.numerator}/{fps.denominator}"
+
+
+def _aspect_ratio(width: int, height: int, h_spacing: int = 1, v_spacing: int = 1) -> str:
+    if width <= 0 or height <= 0 or h_spacing <= 0 or v_spacing <= 0:
+        return ''
+    ratio = Fraction(width * h_spacing, height * v_spacing)
+    return f"{ratio.numerator}:{ratio.denominator}"
+
+
+def _fourcc(value: bytes) -> str:
+    return value.decode('latin-1').strip().strip('\x00').lower()
+
+
+# Perfis H.264 com amostragem 4:2:0 fixa pela especificação
+H264_PIX_FMT = {66: 'yuv420p', 77: 'yuv420p', 88: 'yuv420p', 100: 'yuv420p', 110: 'yuv420p10le'}
+
+
+# ============================================
+# MP4 / MOV (ISO BMFF)
+# ============================================
+
+MP4_TOP_LEVEL = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot', b'uuid', b'styp', b'sidx', b'moof'}
+
+MP4_CODECS = {
+    'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc', 'mp4v': 'mpeg4',
+    'av01': 'av1', 'vp08': 'vp8', 'vp09': 'vp9', 's263': 'h263', 'h263': 'h263', 'jpeg': 'mjpeg',
+    'apch': 'prores', 'apcn': 'prores', 'apcs': 'prores', 'apco': 'prores', 'ap4h': 'prores', 'ap4x': 'prores',
+    'mp4a': 'aac', 'ac-3': 'ac3', 'ec-3': 'eac3', 'opus': 'opus', 'flac': 'flac', '.mp3': 'mp3',
+    'alac': 'alac', 'sowt': 'pcm_s16le', 'twos': 'pcm_s16be', 'ulaw': 'pcm_mulaw', 'alaw': 'pcm_alaw',
+}
+
+# objectTypeIndication do esds
+MP4_OBJECT_TYPES = {0x40: 'aac', 0x66: 'aac', 0x67: 'aac', 0x68: 'aac', 0x69: 'mp3', 0x6B: 'mp3', 0x20: 'mpeg4', 0x21: 'h264', 0xA5: 'ac3', 0xA6: 'eac3'}
+
+
+def _mp4_boxes(src: ProbeSource, start: int, end: int, strict: bool = False):
+    """Itera (tipo, início do conteúdo, fim) das caixas entre start e end.
+
+    strict: caixa que passa de end (arquivo truncado) é erro em vez de ser cortada em end.
+    """
+    offset = start
+    while offset + 8 <= end:
+        header = _read_exact(src, offset, 8)
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', _read_exact(src, offset + 8, 8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        if strict and offset + size > end:
+            raise DataUnavailable(f"caixa {box_type!r} truncada em {end}")
+        yield box_type, offset + header_size, min(offset + size, end)
+        offset += size
+
+
+def _mp4_child(src: ProbeSource, start: int, end: int, box_type: bytes):
+    for child_type, child_start, child_end in _mp4_boxes(src, start, end):
+        if child_type == box_type:
+            return child_start, child_end
+    return None
+
+
+def _mp4_payload(src: ProbeSource, box) -> bytes:
+    return _read_exact(src, box[0], box[1] - box[0])
+
+
+def _mp4_time(payload: bytes):
+    """(timescale, duration) de mvhd/mdhd, versões 0 e 1"""
+    if payload[0] == 1:
+        return struct.unpack('>IQ', payload[20:32])
+    return struct.unpack('>II', payload[12:20])
+
+
+def _mp4_esds(payload: bytes):
+    """objectTypeIndication e avgBitrate do DecoderConfigDescriptor"""
+    data, pos = payload[4:], 0
+
+    def descriptor(pos):
+        tag = data[pos]
+        pos += 1
+        length = 0
+        for _ in range(4):
+            byte = data[pos]
+            pos += 1
+            length = (length << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                break
+        return tag, pos, length
+
+    tag, pos, _ = descriptor(pos)
+    if tag == 0x03:
+        flags = data[pos + 2]
+        pos += 3
+        if flags & 0x80:
+            pos += 2
+        if flags & 0x40:
+            pos += 1 + data[pos]
+        if flags & 0x20:
+            pos += 2
+        tag, pos, _ = descriptor(pos)
+    if tag != 0x04:
+        return None, 0
+    object_type = data[pos]
+    avg_bitrate = struct.unpack('>I', data[pos + 9:pos + 13])[0]
+    return object_type, avg_bitrate
+
+
+def _mp4_sample_entry(src: ProbeSource, stsd, handler: bytes) -> Dict[str, Any]:
+    entry = next(_mp4_boxes(src, stsd[0] + 8, stsd[1]), None)
+    if entry is None:
+        return {}
+    entry_type, start, end = entry
+    fourcc = _fourcc(entry_type)
+    info: Dict[str, Any] = {"codec_name": MP4_CODECS.get(fourcc, fourcc)}
+
+    if handler == b'vide':
+        fields = _read_exact(src, start, 78)
+        width, height = struct.unpack('>HH', fields[24:28])
+        info.update(width=width, height=height, pix_fmt='')
+        h_spacing = v_spacing = 1
+        for child_type, child_start, child_end in _mp4_boxes(src, start + 78, end):
+            if child_type == b'pasp':
+                h_spacing, v_spacing = struct.unpack('>II', _read_exact(src, child_start, 8))
+            elif child_type == b'avcC':
+                profile = _read_exact(src, child_start, 2)[1]
+                info["pix_fmt"] = H264_PIX_FMT.get(profile, '')
+        info["display_aspect_ratio"] = _aspect_ratio(width, height, h_spacing, v_spacing)
+    elif handler == b'soun':
+        fields = _read_exact(src, start, 28)
+        version = struct.unpack('>H', fields[8:10])[0]
+        channels = struct.unpack('>H', fields[16:18])[0]
+        sample_rate = struct.unpack('>I', fields[24:28])[0] >> 16
+        info.update(channels=channels, sample_rate=sample_rate if version < 2 else 0)
+        children_start = start + {0: 28, 1: 44, 2: 64}.get(version, 28)
+        for child_type, child_start, child_end in _mp4_boxes(src, children_start, end):
+            if child_type == b'esds':
+                object_type, avg_bitrate = _mp4_esds(_read_exact(src, child_start, child_end - child_start))
+                if object_type in MP4_OBJECT_TYPES:
+                    info["codec_name"] = MP4_OBJECT_TYPES[object_type]
+                info["_avg_bitrate"] = avg_bitrate
+    return info
+
+
+def _mp4_stream_bytes(src: ProbeSource, stbl) -> int:
+    stsz = _mp4_child(src, stbl[0], stbl[1], b'stsz')
+    if stsz is None:
+        return 0
+    sample_size, sample_count = struct.unpack('>II', _read_exact(src, stsz[0] + 4, 8))
+    if sample_size:
+        return sample_size * sample_count
+    sizes = array('I')
+    sizes.frombytes(_read_exact(src, stsz[0] + 12, sample_count * 4))
+    if sizes.itemsize != 4:
+        return 0
+    if struct.pack('=I', 1) != struct.pack('>I', 1):
+        sizes.byteswap()
+    return sum(sizes)
+
+
+def _mp4_frame_rate(src: ProbeSource, stbl, timescale: int) -> str:
+    stts = _mp4_child(src, stbl[0], stbl[1], b'stts')
+    if stts is None or not timescale:
+        return '0/1'
+    payload = _mp4_payload(src, stts)
+    count = struct.unpack('>I', payload[4:8])[0]
+    entries = [struct.unpack('>II', payload[8 + i * 8:16 + i * 8]) for i in range(min(count, (len(payload) - 8) // 8))]
+    entries = [(n, delta) for n, delta in entries if delta]
+    if not entries:
+        return '0/1'
+    # Delta mais frequente, como o r_frame_rate do ffprobe
+    _, delta = max(entries, key=lambda e: e[0])
+    return _frame_rate(Fraction(timescale, delta))
+
+
+def _probe_mp4(src: ProbeSource) -> Optional[Dict[str, Any]]:
+    moov = None
+    for box_type, start, end in _mp4_boxes(src, 0, src.size, strict=True):
+        if box_type == b'moov':
+            moov = (start, end)
+            break
+        if box_type not in MP4_TOP_LEVEL:
+            return None
+    if moov is None:
+        return None
+
+    mvhd = _mp4_child(src, moov[0], moov[1], b'mvhd')
+    if mvhd is None:
+        return None
+    timescale, duration_units = _mp4_time(_mp4_payload(src, mvhd))
+    duration = duration_units / timescale if timescale else 0
+
+    streams: List[Dict[str, Any]] = []
+    for box_type, start, end in _mp4_boxes(src, moov[0], moov[1]):
+        if box_type != b'trak':
+            continue
+        mdia = _mp4_child(src, start, end, b'mdia')
+        if mdia is None:
+            continue
+        mdhd = _mp4_child(src, mdia[0], mdia[1], b'mdhd')
+        hdlr = _mp4_child(src, mdia[0], mdia[1], b'hdlr')
+        minf = _mp4_child(src, mdia[0], mdia[1], b'minf')
+        if not (mdhd and hdlr and minf):
+            continue
+        handler = _read_exact(src, hdlr[0] + 8, 4)
+        if handler not in (b'vide', b'soun'):
+            continue
+        stbl = _mp4_child(src, minf[0], minf[1], b'stbl')
+        stsd = stbl and _mp4_child(src, stbl[0], stbl[1], b'stsd')
+        if not stsd:
+            continue
+
+        track_timescale, track_units = _mp4_time(_mp4_payload(src, mdhd))
+        track_duration = track_units / track_timescale if track_timescale else 0
+        stream = _mp4_sample_entry(src, stsd, handler)
+        avg_bitrate = stream.pop("_avg_bitrate", 0)
+
+        try:
+            stream_bytes = _mp4_stream_bytes(src, stbl)
+        except DataUnavailable:
+            stream_bytes = 0
+        stream["bit_rate"] = int(stream_bytes * 8 / track_duration) if stream_bytes and track_duration else avg_bitrate
+
+        if handler == b'vide':
+            stream["codec_type"] = "video"
+            stream["r_frame_rate"] = _mp4_frame_rate(src, stbl, track_timescale)
+        else:
+            stream["codec_type"] = "audio"
+            stream["sample_rate"] = stream.get("sample_rate") or track_timescale
+        streams.append(stream)
+        duration = duration or track_duration
+
+    # MP4 fragmentado sem duração no moov: deixar para o ffprobe
+    if not duration and _mp4_child(src, moov[0], moov[1], b'mvex'):
+        return None
+
+    return {"format": {"format_name": "mov,mp4", "duration": duration, "size": src.size}, "streams": streams}
+
+
+# ============================================
+# MATROSKA / WEBM (EBML)
+# ============================================
+
+EBML_HEADER = 0x1A45DFA3
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TRACKS = 0x1654AE6B
+MKV_CLUSTER = 0x1F43B675
+
+MKV_CODECS = {
+    'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc', 'V_VP8': 'vp8', 'V_VP9': 'vp9', 'V_AV1': 'av1',
+    'V_MPEG2': 'mpeg2video', 'V_MPEG1': 'mpeg1video', 'V_THEORA': 'theora', 'V_PRORES': 'prores', 'V_MJPEG': 'mjpeg',
+    'A_OPUS': 'opus', 'A_VORBIS': 'vorbis', 'A_AAC': 'aac', 'A_MPEG/L3': 'mp3', 'A_MPEG/L2': 'mp2',
+    'A_AC3': 'ac3', 'A_EAC3': 'eac3', 'A_DTS': 'dts', 'A_FLAC': 'flac', 'A_TRUEHD': 'truehd', 'A_ALAC': 'alac',
+}
+
+
+def _ebml_vint(data: bytes, pos: int, keep_marker: bool):
+    first = data[pos]
+    length = 8 - first.bit_length() + 1
+    if length > 8:
+        raise ValueError("vint inválido")
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, pos + length, unknown
+
+
+def _ebml_header(src: ProbeSource, offset: int):
+    """(id, início do conteúdo, tamanho ou None se desconhecido)"""
+    data = src.read(offset, 12)
+    if len(data) < 2:
+        raise DataUnavailable("fim do arquivo")
+    element_id, pos, _ = _ebml_vint(data, 0, keep_marker=True)
+    size, pos, unknown = _ebml_vint(data, pos, keep_marker=False)
+    return element_id, offset + pos, None if unknown else size
+
+
+def _ebml_children(data: bytes):
+    """Itera (id, conteúdo) dos elementos de um mestre já lido em memória"""
+    pos = 0
+    while pos < len(data):
+        element_id, pos, _ = _ebml_vint(data, pos, keep_marker=True)
+        size, pos, _ = _ebml_vint(data, pos, keep_marker=False)
+        yield element_id, data[pos:pos + size]
+        pos += size
+
+
+def _ebml_uint(data: bytes) -> int:
+    return int.from_bytes(data, 'big') if data else 0
+
+
+def _ebml_float(data: bytes) -> float:
+    if len(data) == 4:
+        return struct.unpack('>f', data)[0]
+    if len(data) == 8:
+        return struct.unpack('>d', data)[0]
+    return 0.0
+
+
+def _mkv_track(data: bytes) -> Optional[Dict[str, Any]]:
+    fields = dict(_ebml_children(data))
+    track_type = _ebml_uint(fields.get(0x83, b''))
+    codec_id = fields.get(0x86, b'').decode('ascii', 'ignore').rstrip('\x00')
+    codec = MKV_CODECS.get(codec_id) or MKV_CODECS.get(codec_id.split('/')[0]) or codec_id.lower()
+
+    if track_type == 1:
+        video = dict(_ebml_children(fields.get(0xE0, b'')))
+        width = _ebml_uint(video.get(0xB0, b''))
+        height = _ebml_uint(video.get(0xBA, b''))
+        display_width = _ebml_uint(video.get(0x54B0, b'')) or width
+        display_height = _ebml_uint(video.get(0x54BA, b'')) or height
+        default_duration = _ebml_uint(fields.get(0x23E383, b''))
+        private = fields.get(0x63A2, b'')
+        return {
+            "codec_type": "video",
+            "codec_name": codec,
+            "width": width,
+            "height": height,
+            "r_frame_rate": _frame_rate(Fraction(10 ** 9, default_duration)) if default_duration else '0/1',
+            "display_aspect_ratio": _aspect_ratio(display_width, display_height),
+            "pix_fmt": H264_PIX_FMT.get(private[1], '') if codec == 'h264' and len(private) > 1 else '',
+        }
+    if track_type == 2:
+        audio = dict(_ebml_children(fields.get(0xE1, b'')))
+        bit_depth = _ebml_uint(audio.get(0x6264, b''))
+        if codec_id == 'A_PCM/INT/LIT' and bit_depth:
+            codec = f"pcm_s{bit_depth}le"
+        return {
+            "codec_type": "audio",
+            "codec_name": codec,
+            "sample_rate": int(_ebml_float(audio.get(0xB5, b'')) or 8000),
+            "channels": _ebml_uint(audio.get(0x9F, b'')) or 1,
+            "bit_rate": 0,
+        }
+    return None
+
+
+def _probe_mkv(src: ProbeSource) -> Optional[Dict[str, Any]]:
+    element_id, start, size = _ebml_header(src, 0)
+    if element_id != EBML_HEADER or size is None:
+        return None
+    doc_type = dict(_ebml_children(_read_exact(src, start, size))).get(0x4282, b'matroska').decode('ascii', 'ignore')
+
+    element_id, segment_start, segment_size = _ebml_header(src, start + size)
+    if element_id != MKV_SEGMENT:
+        return None
+    segment_end = src.size if segment_size is None else min(segment_start + segment_size, src.size)
+
+    info = tracks = None
+    offset = segment_start
+    while offset < segment_end and (info is None or tracks is None):
+        try:
+            element_id, data_start, data_size = _ebml_header(src, offset)
+        except DataUnavailable:
+            break
+        if element_id == MKV_CLUSTER or data_size is None:
+            break
+        if element_id == MKV_INFO:
+            info = dict(_ebml_children(_read_exact(src, data_start, data_size)))
+        elif element_id == MKV_TRACKS:
+            tracks = _read_exact(src, data_start, data_size)
+        offset = data_start + data_size
+
+    if tracks is None:
+        return None
+
+    duration = 0.0
+    if info:
+        timecode_scale = _ebml_uint(info.get(0x2AD7B1, b'')) or 1000000
+        duration = _ebml_float(info.get(0x4489, b'')) * timecode_scale / 1e9
+
+    streams = []
+    for element_id, data in _ebml_children(tracks):
+        if element_id == 0xAE:
+            stream = _mkv_track(data)
+            if stream:
+                streams.append(stream)
+
+    return {"format": {"format_name": doc_type, "duration": duration, "size": src.size}, "streams": streams}
+
+
+# ============================================
+# AVI (RIFF)
+# ============================================
+
+AVI_VIDEO_CODECS = {
+    'h264': 'h264', 'x264': 'h264', 'avc1': 'h264', 'davc': 'h264', 'hevc': 'hevc', 'h265': 'hevc', 'hvc1': 'hevc',
+    'xvid': 'mpeg4', 'divx': 'mpeg4', 'dx50': 'mpeg4', 'fmp4': 'mpeg4', 'mp4v': 'mpeg4',
+    'mjpg': 'mjpeg', 'div3': 'msmpeg4v3', 'mp43': 'msmpeg4v3', 'wmv3': 'wmv3', 'vp80': 'vp8', 'mpg2': 'mpeg2video',
+}
+
+AVI_AUDIO_CODECS = {
+    0x0003: 'pcm_f32le', 0x0006: 'pcm_alaw', 0x0007: 'pcm_mulaw', 0x0011: 'adpcm_ima_wav', 0x0050: 'mp2',
+    0x0055: 'mp3', 0x00FF: 'aac', 0x1610: 'aac', 0x706D: 'aac', 0x0161: 'wmav2', 0x2000: 'ac3', 0x2001: 'dts',
+}
+
+
+def _riff_chunks(data: bytes, pos: int = 0):
+    while pos + 8 <= len(data):
+        chunk_id, size = struct.unpack('<4sI', data[pos:pos + 8])
+        yield chunk_id, data[pos + 8:pos + 8 + size]
+        pos += 8 + size + (size & 1)
+
+
+def _avi_stream(strh: bytes, strf: bytes) -> Optional[Dict[str, Any]]:
+    stream_type = strh[0:4]
+    scale, rate = struct.unpack('<II', strh[20:28])
+    length = struct.unpack('<I', strh[32:36])[0]
+
+    if stream_type == b'vids' and len(strf) >= 20:
+        width, height = struct.unpack('<ii', strf[4:12])
+        compression = _fourcc(strf[16:20]) or _fourcc(strh[4:8])
+        width, height = abs(width), abs(height)
+        return {
+            "codec_type": "video",
+            "codec_name": AVI_VIDEO_CODECS.get(compression, compression),
+            "width": width,
+            "height": height,
+            "r_frame_rate": _frame_rate(Fraction(rate, scale)) if scale and rate else '0/1',
+            "display_aspect_ratio": _aspect_ratio(width, height),
+            "pix_fmt": '',
+            "_duration": length * scale / rate if rate else 0,
+        }
+    if stream_type == b'auds' and len(strf) >= 16:
+        format_tag, channels, sample_rate, avg_bytes = struct.unpack('<HHII', strf[0:12])
+        bits = struct.unpack('<H', strf[14:16])[0]
+        codec = AVI_AUDIO_CODECS.get(format_tag, f"0x{format_tag:04x}")
+        if format_tag == 0x0001:
+            codec = 'pcm_u8' if bits == 8 else f"pcm_s{bits}le"
+        return {
+            "codec_type": "audio",
+            "codec_name": codec,
+            "sample_rate": sample_rate,
+            "channels": channels,
+            "bit_rate": avg_bytes * 8,
+        }
+    return None
+
+
+def _probe_avi(src: ProbeSource) -> Optional[Dict[str, Any]]:
+    header = _read_exact(src, 12, 12)
+    chunk_id, size, list_type = struct.unpack('<4sI4s', header)
+    if chunk_id != b'LIST' or list_type != b'hdrl':
+        return None
+    hdrl = _read_exact(src, 24, size - 4)
+
+    duration = 0.0
+    total_frames = 0
+    streams = []
+    for chunk_id, data in _riff_chunks(hdrl):
+        if chunk_id == b'avih' and len(data) >= 20:
+            us_per_frame = struct.unpack('<I', data[0:4])[0]
+            total_frames = struct.unpack('<I', data[16:20])[0]
+            duration = total_frames * us_per_frame / 1e6
+        elif chunk_id == b'LIST' and data[:4] == b'strl':
+            parts = dict(_riff_chunks(data, 4))
+            if b'strh' in parts and len(parts[b'strh']) >= 36:
+                stream = _avi_stream(parts[b'strh'], parts.get(b'strf', b''))
+                if stream:
+                    streams.append(stream)
+        elif chunk_id == b'LIST' and data[:4] == b'odml':
+            # OpenDML (> 1 GB): total real de quadros no dmlh
+            dmlh = dict(_riff_chunks(data, 4)).get(b'dmlh', b'')
+            if len(dmlh) >= 4 and total_frames:
+                duration = duration * struct.unpack('<I', dmlh[:4])[0] / total_frames
+
+    for stream in streams:
+        stream_duration = stream.pop("_duration", 0)
+        duration = max(duration, stream_duration)
+
+    return {"format": {"format_name": "avi", "duration": duration, "size": src.size}, "streams": streams}
+
+
+# ============================================
+# ENTRADA PRINCIPAL
+# ============================================
+
+def detect_container(src: ProbeSource) -> Optional[str]:
+    head = src.read(0, 12)
+    if len(head) < 12:
+        return None
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'matroska'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'avi'
+    if head[4:8] in MP4_TOP_LEVEL:
+        return 'mp4'
+    return None
+
+
+PARSERS = {'mp4': _probe_mp4, 'matroska': _probe_mkv, 'avi': _probe_avi}
+
+
+def probe(source: Union[str, BinaryIO, ProbeSource]) -> Optional[Dict[str, Any]]:
+    """Lê formato e streams dos cabeçalhos do contêiner, no formato do ffprobe.
+
+    source pode ser caminho local, URL HTTP(S) com suporte a Range, objeto de arquivo
+    com seek ou uma ProbeSource. Retorna None se o contêiner não for suportado ou os
+    cabeçalhos não puderem ser lidos.
+    """
+    opened = None
+    try:
+        src = open_source(source)
+        if isinstance(source, str) and isinstance(src, FileSource):
+            opened = src.fileobj
+
+        parser = PARSERS.get(detect_container(src))
+        if parser is None:
+            return None
+        data = parser(src)
+        if not data or not data["streams"]:
+            return None
+
+        # Bitrate total como o ffprobe: tamanho / duração
+        duration = data["format"]["duration"]
+        data["format"]["bit_rate"] = int(src.size * 8 / duration) if duration and math.isfinite(duration) else 0
+        return data
+    except (DataUnavailable, ValueError, IndexError, struct.error, OSError, ZeroDivisionError) as e:
+        logger.debug(f"Leitura nativa de cabeçalhos indisponível: {e}")
+        return None
+    finally:
+        if opened is not None:
+            opened.close()
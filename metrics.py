@@ -0,0 +1,201 @@
+"""
+Métricas Prometheus da Upload CDN API.
+
+Com o Gunicorn (vários workers) as métricas usam o modo multiprocesso do prometheus_client:
+cada worker grava seus valores em PROMETHEUS_MULTIPROC_DIR e o GET /metrics de qualquer
+worker agrega todos. start.sh cria o diretório limpo a cada inicialização e o hook
+child_exit de gunicorn.conf.py descarta os gauges dos workers encerrados. Sem a variável
+(ex.: python app.py) o registro padrão, de processo único, é usado.
+
+Etapas do upload (label etapa de upload_cdn_upload_stage_seconds):
+    recebimento_corpo  leitura e parsing do corpo multipart
+    hash               cálculo do MD5
+    arquivo_temporario cópia para disco para o ffprobe (dentro de "metadados" no modo tradicional)
+    metadados          extração de metadados de mídia (nativa ou ffprobe)
+    envio_s3           envio do objeto ao Spaces
+    callback_json      gravação do callback JSON
+No modo streaming o corpo é recebido, hasheado e enviado na mesma passagem: recebimento_corpo
+inclui a espera pelas partes em voo e envio_s3 mede só a conclusão do objeto.
+
+Cada etapa também vira um span do trace da requisição (tracing.py).
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import tracing
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+UPLOAD_STAGE_SECONDS = Histogram(
+    "upload_cdn_upload_stage_seconds",
+    "Duração de cada etapa do upload",
+    ["etapa", "modo"],
+    buckets=STAGE_BUCKETS,
+)
+UPLOAD_DURATION_SECONDS = Histogram(
+    "upload_cdn_upload_duration_seconds",
+    "Duração total da requisição de upload",
+    ["modo", "categoria", "resultado"],
+    buckets=STAGE_BUCKETS,
+)
+UPLOADS_TOTAL = Counter(
+    "upload_cdn_uploads_total",
+    "Uploads processados por resultado (sucesso, deduplicado, erro)",
+    ["modo", "categoria", "resultado"],
+)
+UPLOAD_BYTES_TOTAL = Counter(
+    "upload_cdn_upload_bytes_total",
+    "Bytes de arquivos recebidos com sucesso",
+    ["modo", "categoria", "resultado"],
+)
+UPLOAD_ERRORS_TOTAL = Counter(
+    "upload_cdn_upload_errors_total",
+    "Uploads com erro por código (código do Spaces ou http_<status>) e categoria",
+    ["error_code", "categoria", "status"],
+)
+UPLOADS_IN_FLIGHT = Gauge(
+    "upload_cdn_uploads_in_flight",
+    "Uploads em andamento",
+    ["modo"],
+    multiprocess_mode="livesum",
+)
+
+CALLBACK_JSON_WRITES_TOTAL = Counter(
+    "upload_cdn_callback_json_writes_total",
+    "Gravações do callback JSON por resultado (sucesso, erro, agrupado, sincrono_fila_cheia)",
+    ["resultado"],
+)
+CALLBACK_JSON_PENDING = Gauge(
+    "upload_cdn_callback_json_pending",
+    "Callbacks JSON aguardando gravação em segundo plano",
+    multiprocess_mode="livesum",
+)
+
+CATEGORIA_DESCONHECIDA = "desconhecida"
+
+
+class UploadObservation:
+    """Dados de um upload em andamento, preenchidos pelas funções chamadas durante o processamento"""
+
+    def __init__(self, modo: str):
+        self.modo = modo
+        self.categoria = CATEGORIA_DESCONHECIDA
+        self.error_code: Optional[str] = None
+        self.inicio = time.perf_counter()
+        self.finalizado = False
+
+    def finish(self, status_code: int, payload: Optional[Dict[str, Any]] = None) -> None:
+        """Registra resultado, duração, bytes e erros (uma única vez por upload)"""
+        if self.finalizado:
+            return
+        self.finalizado = True
+
+        analytics = (payload or {}).get("analytics") or {}
+        categoria = analytics.get("categoria_arquivo") or self.categoria
+        if status_code < 400:
+            resultado = "deduplicado" if ((payload or {}).get("upload") or {}).get("deduplicacao") else "sucesso"
+            UPLOAD_BYTES_TOTAL.labels(self.modo, categoria, resultado).inc(analytics.get("tamanho_bytes") or 0)
+        else:
+            resultado = "erro"
+            UPLOAD_ERRORS_TOTAL.labels(self.error_code or f"http_{status_code}", categoria, str(status_code)).inc()
+        UPLOADS_TOTAL.labels(self.modo, categoria, resultado).inc()
+        UPLOAD_DURATION_SECONDS.labels(self.modo, categoria, resultado).observe(time.perf_counter() - self.inicio)
+
+
+_current_upload: ContextVar[Optional[UploadObservation]] = ContextVar("upload_cdn_current_upload", default=None)
+
+
+@contextmanager
+def observe_upload(modo: str):
+    """Acompanha um upload: gauge de uploads em andamento e observação acessível às etapas"""
+    observation = UploadObservation(modo)
+    token = _current_upload.set(observation)
+    gauge = UPLOADS_IN_FLIGHT.labels(modo)
+    gauge.inc()
+    try:
+        yield observation
+    finally:
+        gauge.dec()
+        _current_upload.reset(token)
+
+
+def current_upload() -> Optional[UploadObservation]:
+    return _current_upload.get()
+
+
+def _modo_atual() -> str:
+    observation = _current_upload.get()
+    # Fora de uma requisição de upload (ex.: jobs de metadados em segundo plano)
+    return observation.modo if observation is not None else "segundo_plano"
+
+
+def observe_stage(etapa: str, segundos: float, modo: Optional[str] = None) -> None:
+    """Registra uma etapa medida fora de stage() (histograma e span já concluído)"""
+    UPLOAD_STAGE_SECONDS.labels(etapa, modo or _modo_atual()).observe(segundos)
+    tracing.record_span(etapa, segundos)
+
+
+@contextmanager
+def stage(etapa: str, modo: Optional[str] = None):
+    """Mede a duração de uma etapa do upload (inclusive quando ela falha)"""
+    inicio = time.perf_counter()
+    with tracing.span(etapa):
+        try:
+            yield
+        finally:
+            UPLOAD_STAGE_SECONDS.labels(etapa, modo or _modo_atual()).observe(time.perf_counter() - inicio)
+
+
+def set_category(categoria: Optional[str]) -> None:
+    observation = _current_upload.get()
+    if observation is not None and categoria:
+        observation.categoria = categoria
+
+
+def set_error_code(error_code: Optional[str]) -> None:
+    observation = _current_upload.get()
+    if observation is not None and error_code:
+        observation.error_code = error_code
+
+
+def record_rejection(error_code: str, status_code: int) -> None:
+    """Upload recusado antes do processamento (ex.: circuito do Spaces aberto)"""
+    UPLOAD_ERRORS_TOTAL.labels(error_code, CATEGORIA_DESCONHECIDA, str(status_code)).inc()
+
+
+def record_callback_write(resultado: str) -> None:
+    CALLBACK_JSON_WRITES_TOTAL.labels(resultado).inc()
+
+
+def render_latest():
+    """Conteúdo de GET /metrics (agregado entre workers no modo multiprocesso)"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Descarta os gauges 'live' de um worker encerrado (hook child_exit do Gunicorn)"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
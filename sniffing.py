@@ -0,0 +1,84 @@
+"""
+Identificação do tipo real de um arquivo pelos primeiros bytes (assinaturas / magic bytes).
+
+O app chama `sniff` com o início do arquivo (até SNIFF_BYTES), antes do hash e da extração
+de metadados, para corrigir o content type e a categoria declarados pelo cliente (ex.: vídeo
+enviado como application/octet-stream) e para recusar conteúdo que nunca é aceito (ex.:
+executável renomeado para .png). Só esse trecho inicial é necessário: no modo streaming o
+restante do corpo segue direto para o armazenamento, sem spool em disco.
+"""
+
+from typing import Any, Dict, Optional
+
+# Bytes do início do arquivo consultados; cobre o DocType do EBML e o brand do ftyp
+SNIFF_BYTES = 4096
+
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Tipos reconhecidos: MIME, categoria (get_file_category) e extensões compatíveis.
+# Categoria None marca conteúdo sempre recusado.
+TYPES: Dict[str, Dict[str, Any]] = {
+    'png': {"mime": 'image/png', "categoria": 'imagem', "extensoes": {'png'}},
+    'jpeg': {"mime": 'image/jpeg', "categoria": 'imagem', "extensoes": {'jpg', 'jpeg'}},
+    'gif': {"mime": 'image/gif', "categoria": 'imagem', "extensoes": {'gif'}},
+    'pdf': {"mime": 'application/pdf', "categoria": 'documento', "extensoes": {'pdf'}},
+    'doc': {"mime": 'application/msword', "categoria": 'documento', "extensoes": {'doc'}},
+    'docx': {"mime": DOCX_MIME, "categoria": 'documento', "extensoes": {'docx'}},
+    # ZIP sem as entradas do Word no início: pode ser um .docx gerado por outra ferramenta
+    'zip': {"mime": 'application/zip', "categoria": 'documento', "extensoes": {'docx'}},
+    'mp4': {"mime": 'video/mp4', "categoria": 'video', "extensoes": {'mp4', 'mov'}},
+    'quicktime': {"mime": 'video/quicktime', "categoria": 'video', "extensoes": {'mov', 'mp4'}},
+    'matroska': {"mime": 'video/x-matroska', "categoria": 'video', "extensoes": {'mkv', 'webm'}},
+    'webm': {"mime": 'video/webm', "categoria": 'video', "extensoes": {'webm', 'mkv'}},
+    'avi': {"mime": 'video/x-msvideo', "categoria": 'video', "extensoes": {'avi'}},
+    'executavel': {"mime": 'application/x-executable', "categoria": None, "extensoes": set()},
+}
+
+# Assinaturas em ordem de verificação: (tipo, ((deslocamento, bytes), ...)); todas precisam casar
+SIGNATURES = (
+    ('png', ((0, b'\x89PNG\r\n\x1a\n'),)),
+    ('jpeg', ((0, b'\xff\xd8\xff'),)),
+    ('gif', ((0, b'GIF87a'),)),
+    ('gif', ((0, b'GIF89a'),)),
+    ('pdf', ((0, b'%PDF-'),)),
+    ('doc', ((0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'),)),
+    ('zip', ((0, b'PK\x03\x04'),)),
+    ('matroska', ((0, b'\x1a\x45\xdf\xa3'),)),
+    ('avi', ((0, b'RIFF'), (8, b'AVI '))),
+    ('mp4', ((4, b'ftyp'),)),
+    # MOV antigo, sem ftyp: o primeiro átomo já é de nível superior
+    ('quicktime', ((4, b'moov'),)),
+    ('quicktime', ((4, b'mdat'),)),
+    ('quicktime', ((4, b'wide'),)),
+    ('quicktime', ((4, b'free'),)),
+    ('quicktime', ((4, b'skip'),)),
+    ('executavel', ((0, b'MZ'),)),
+    ('executavel', ((0, b'\x7fELF'),)),
+    ('executavel', ((0, b'\xcf\xfa\xed\xfe'),)),
+    ('executavel', ((0, b'\xce\xfa\xed\xfe'),)),
+    ('executavel', ((0, b'\xca\xfe\xba\xbe'),)),
+    ('executavel', ((0, b'#!'),)),
+)
+
+
+def _refine(tipo: str, head: bytes) -> str:
+    """Distingue variantes que compartilham a assinatura (brand do ftyp, DocType do EBML, ZIP)"""
+    if tipo == 'mp4' and head[8:12] == b'qt  ':
+        return 'quicktime'
+    if tipo == 'matroska' and b'webm' in head[:64]:
+        return 'webm'
+    if tipo == 'zip' and (b'[Content_Types].xml' in head or b'word/' in head):
+        return 'docx'
+    return tipo
+
+
+def sniff(head: bytes) -> Optional[Dict[str, Any]]:
+    """Tipo reconhecido pelo início do arquivo ou None se nenhuma assinatura casar.
+
+    Retorna {"tipo", "mime", "categoria", "extensoes"} (ver TYPES).
+    """
+    for tipo, marcas in SIGNATURES:
+        if all(head[offset:offset + len(magic)] == magic for offset, magic in marcas):
+            tipo = _refine(tipo, head)
+            return {"tipo": tipo, **TYPES[tipo]}
+    return None
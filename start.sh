@@ -18,8 +18,9 @@ fi
 echo "✅ Credenciais verificadas"
 echo "🔧 Configurações do ambiente:"
 echo "   - PORT: ${PORT:-80}"
+echo "   - SERVER_MODE: ${SERVER_MODE:-gthread}"
 echo "   - WORKERS: ${WORKERS:-2}"
-echo "   - THREADS: 4"
+echo "   - THREADS: ${THREADS:-4}"
 echo "   - TIMEOUT: ${TIMEOUT:-180}"
 
 # Calcular o tamanho máximo do upload (padrão: 100MB)
@@ -33,16 +34,34 @@ fi
 
 echo "   - MAX_FILE_SIZE: ${MAX_SIZE_MB}MB (${MAX_SIZE_BYTES} bytes)"
 
+# Métricas Prometheus agregadas entre workers: diretório limpo a cada inicialização
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+echo "   - PROMETHEUS_MULTIPROC_DIR: ${PROMETHEUS_MULTIPROC_DIR}"
+
 # Esperar um pouco para garantir que dependências estejam prontas
 sleep 2
 
+# Modo ASGI (asgi_app.py): /upload, /health e / servidos em asyncio, demais rotas via WSGI
+if [ "${SERVER_MODE:-gthread}" = "asgi" ]; then
+    echo "🚀 Iniciando Uvicorn (ASGI) na porta 80..."
+    exec uvicorn asgi_app:application \
+        --host "0.0.0.0" \
+        --port 80 \
+        --workers "${WORKERS:-2}" \
+        --timeout-keep-alive 2 \
+        --log-level info
+fi
+
 echo "🚀 Iniciando Gunicorn na porta 80..."
 
 # Executar Gunicorn com configurações otimizadas
 exec gunicorn \
+    --config gunicorn.conf.py \
     --bind "0.0.0.0:80" \
     --workers "${WORKERS:-2}" \
-    --threads 4 \
+    --threads "${THREADS:-4}" \
     --timeout "${TIMEOUT:-180}" \
     --keep-alive 2 \
     --max-requests 1000 \
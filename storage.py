@@ -0,0 +1,598 @@
+"""
+Backends de armazenamento da Upload CDN API.
+
+O caminho das requisições usa apenas a interface StorageBackend (PUT de bytes ou stream,
+multipart, HEAD, cópia, remoção, URL pública e URLs assinadas), escolhida por STORAGE_BACKEND:
+
+    s3     DigitalOcean Spaces ou outro serviço compatível com S3 (boto3)
+    local  diretório local (LOCAL_STORAGE_DIR), servido pela própria API em /storage/<chave>
+
+O backend local grava em arquivo temporário e publica com os.replace (leitores nunca veem um
+objeto pela metade), copia com os.sendfile quando a origem é um arquivo em disco e cópias
+dentro do armazenamento viram hard links. URLs assinadas apontam para PUT /storage/<chave>
+com assinatura HMAC, no mesmo formato de uso das URLs do S3.
+
+StorageBackendAsync adapta o backend para o modo ASGI: aiobotocore no S3 e thread para os demais.
+"""
+
+import asyncio
+import errno
+import hashlib
+import hmac
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+import tracing
+
+NOT_FOUND_CODES = ('404', 'NoSuchKey', 'NotFound', 'NoSuchUpload')
+
+# Digests em base64 aceitos em put_object/put_stream e o parâmetro do S3 que os envia
+CHECKSUM_PARAMS = {'md5': 'ContentMD5', 'sha256': 'ChecksumSHA256', 'crc32c': 'ChecksumCRC32C'}
+# multipart_threshold padrão do TransferConfig (upload_fileobj sem transfer_config)
+DEFAULT_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+
+class StorageError(Exception):
+    """Falha do backend de armazenamento, com código no estilo dos erros do S3"""
+
+    def __init__(self, message: str, code: str = "StorageError"):
+        super().__init__(message)
+        self.code = code
+
+
+class NotFoundError(StorageError):
+    """Objeto ou upload multipart inexistente"""
+
+    def __init__(self, message: str, code: str = "NoSuchKey"):
+        super().__init__(message, code)
+
+
+class StorageBackend:
+    """Operações de armazenamento usadas pela API; ETags seguem o formato do S3 (entre aspas)"""
+
+    name = ""
+
+    def put_object(self, key: str, body: bytes, content_type: str, checksums: Optional[Dict[str, str]] = None) -> None:
+        """checksums: digests em base64 ({"md5": ...}, ver CHECKSUM_PARAMS) verificados pelo armazenamento"""
+        raise NotImplementedError
+
+    def put_stream(self, key: str, fileobj, content_type: str, transfer_config=None, checksums: Optional[Dict[str, str]] = None) -> None:
+        """Grava o conteúdo de um objeto de arquivo (a partir da posição atual)"""
+        raise NotImplementedError
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        raise NotImplementedError
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body, checksums: Optional[Dict[str, str]] = None) -> str:
+        """body: bytes ou objeto de arquivo; checksums: digests em base64 da parte (ver CHECKSUM_PARAMS)"""
+        raise NotImplementedError
+
+    def list_parts(self, key: str, upload_id: str) -> List[Dict[str, Any]]:
+        """Partes gravadas: [{"PartNumber", "Size", "ETag"}]"""
+        raise NotImplementedError
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        raise NotImplementedError
+
+    def head(self, key: str) -> Dict[str, Any]:
+        """{"size", "content_type", "etag"}; NotFoundError se o objeto não existe"""
+        raise NotImplementedError
+
+    def copy(self, source_key: str, key: str, content_type: str) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def public_url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def read_url(self, key: str, expires: int = 300) -> str:
+        """URL (ou caminho local) de leitura do objeto para o ffprobe e a leitura nativa"""
+        raise NotImplementedError
+
+    def presigned_put(self, key: str, content_type: str, expires: int) -> Tuple[str, Dict[str, str]]:
+        """URL para PUT direto pelo cliente e cabeçalhos que ele precisa repetir"""
+        raise NotImplementedError
+
+    def presigned_upload_part(self, key: str, upload_id: str, part_number: int, expires: int) -> str:
+        raise NotImplementedError
+
+    def check(self) -> None:
+        """Verificação de prontidão; levanta exceção se o armazenamento não está acessível"""
+        raise NotImplementedError
+
+
+def _checksum_args(checksums: Optional[Dict[str, str]]) -> Dict[str, str]:
+    return {CHECKSUM_PARAMS[name]: value for name, value in (checksums or {}).items()}
+
+
+def _remaining_size(stream) -> int:
+    """Bytes entre a posição atual e o fim de um stream com seek"""
+    position = stream.tell()
+    end = stream.seek(0, os.SEEK_END)
+    stream.seek(position)
+    return end - position
+
+
+@contextmanager
+def _translate_not_found():
+    """Converte os erros 404/NoSuchKey/NoSuchUpload do botocore em NotFoundError"""
+    import botocore.exceptions
+
+    try:
+        yield
+    except botocore.exceptions.ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code in NOT_FOUND_CODES:
+            raise NotFoundError(str(e), code) from e
+        raise
+
+
+class S3StorageBackend(StorageBackend):
+    """Spaces/S3 via boto3; o cliente (com circuit breaker e spans) vem de get_client"""
+
+    name = "s3"
+
+    def __init__(self, bucket: str, get_client: Callable, health_client_factory: Callable, public_base_url: str, acl: str = 'public-read'):
+        self.bucket = bucket
+        self.get_client = get_client
+        self.health_client_factory = health_client_factory
+        self.public_base_url = public_base_url.rstrip('/')
+        self.acl = acl
+        self._health_client = None
+        self._health_pid = None
+
+    def put_object(self, key: str, body: bytes, content_type: str, checksums: Optional[Dict[str, str]] = None) -> None:
+        # Com o Content-MD5 informado o botocore não relê o corpo para calculá-lo
+        self.get_client().put_object(Bucket=self.bucket, Key=key, Body=body, ACL=self.acl, ContentType=content_type, **_checksum_args(checksums))
+
+    def put_stream(self, key: str, fileobj, content_type: str, transfer_config=None, checksums: Optional[Dict[str, str]] = None) -> None:
+        stream = getattr(fileobj, "stream", fileobj)
+        threshold = transfer_config.multipart_threshold if transfer_config is not None else DEFAULT_MULTIPART_THRESHOLD
+        if checksums and _remaining_size(stream) < threshold:
+            # PUT único, como o upload_fileobj faria, mas com o digest já calculado: o Spaces
+            # verifica a integridade e o corpo não é lido de novo. Acima do threshold o
+            # upload_fileobj não aceita digests por parte, e o botocore calcula o Content-MD5
+            # de cada parte sobre o corpo já lido.
+            self.put_object(key, stream, content_type, checksums)
+            return
+        kwargs = {"Config": transfer_config} if transfer_config is not None else {}
+        self.get_client().upload_fileobj(
+            Fileobj=fileobj,
+            Bucket=self.bucket,
+            Key=key,
+            ExtraArgs={'ACL': self.acl, 'ContentType': content_type},
+            **kwargs
+        )
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        response = self.get_client().create_multipart_upload(Bucket=self.bucket, Key=key, ACL=self.acl, ContentType=content_type)
+        return response['UploadId']
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body, checksums: Optional[Dict[str, str]] = None) -> str:
+        # Com o Content-MD5 da parte informado o botocore não calcula o digest de novo
+        with _translate_not_found():
+            response = self.get_client().upload_part(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body, **_checksum_args(checksums)
+            )
+        return response['ETag']
+
+    def list_parts(self, key: str, upload_id: str) -> List[Dict[str, Any]]:
+        parts = []
+        with _translate_not_found():
+            paginator = self.get_client().get_paginator('list_parts')
+            for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+                parts.extend(page.get('Parts', []))
+        return parts
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
+        with _translate_not_found():
+            self.get_client().complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [{"ETag": part["ETag"], "PartNumber": part["PartNumber"]} for part in parts]}
+            )
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        with _translate_not_found():
+            self.get_client().abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+
+    def head(self, key: str) -> Dict[str, Any]:
+        with _translate_not_found():
+            head = self.get_client().head_object(Bucket=self.bucket, Key=key)
+        return {"size": head['ContentLength'], "content_type": head.get('ContentType'), "etag": head.get('ETag', '')}
+
+    def copy(self, source_key: str, key: str, content_type: str) -> None:
+        # Cópia feita dentro do bucket: nenhum byte passa pelo worker
+        with _translate_not_found():
+            self.get_client().copy(
+                {'Bucket': self.bucket, 'Key': source_key},
+                self.bucket,
+                key,
+                ExtraArgs={'ACL': self.acl, 'ContentType': content_type}
+            )
+
+    def delete(self, key: str) -> None:
+        self.get_client().delete_object(Bucket=self.bucket, Key=key)
+
+    def public_url(self, key: str) -> str:
+        return f"{self.public_base_url}/{key}"
+
+    def read_url(self, key: str, expires: int = 300) -> str:
+        return self.get_client().generate_presigned_url('get_object', Params={'Bucket': self.bucket, 'Key': key}, ExpiresIn=expires)
+
+    def presigned_put(self, key: str, content_type: str, expires: int) -> Tuple[str, Dict[str, str]]:
+        url = self.get_client().generate_presigned_url(
+            'put_object',
+            Params={'Bucket': self.bucket, 'Key': key, 'ACL': self.acl, 'ContentType': content_type},
+            ExpiresIn=expires
+        )
+        # Cabeçalhos que fazem parte da assinatura
+        return url, {"Content-Type": content_type, "x-amz-acl": self.acl}
+
+    def presigned_upload_part(self, key: str, upload_id: str, part_number: int, expires: int) -> str:
+        return self.get_client().generate_presigned_url(
+            'upload_part',
+            Params={'Bucket': self.bucket, 'Key': key, 'UploadId': upload_id, 'PartNumber': part_number},
+            ExpiresIn=expires
+        )
+
+    def check(self) -> None:
+        # Cliente dedicado (timeouts curtos, sem retentativas), recriado após o fork
+        if self._health_client is None or self._health_pid != os.getpid():
+            self._health_client = self.health_client_factory()
+            self._health_pid = os.getpid()
+        self._health_client.head_bucket(Bucket=self.bucket)
+
+
+class LocalStorageBackend(StorageBackend):
+    """Objetos em um diretório local, publicados de forma atômica e servidos em /storage/<chave>.
+
+    checksums é ignorado: os bytes não saem do worker que calculou os digests.
+    """
+
+    name = "local"
+    TMP_DIR = ".tmp"
+    MULTIPART_DIR = ".multipart"
+    UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+    PART_RE = re.compile(r"^(\d{5})\.([0-9a-f]{32})$")
+
+    def __init__(self, root: str, public_base_url: str = "", signing_secret: str = "", fsync: bool = False, buffer_size: int = 8 * 1024 * 1024):
+        self.root = os.path.abspath(root)
+        self.public_base_url = public_base_url.rstrip('/')
+        self.signing_secret = signing_secret
+        self.fsync = fsync
+        self.buffer_size = buffer_size
+        os.makedirs(os.path.join(self.root, self.TMP_DIR), exist_ok=True)
+        os.makedirs(os.path.join(self.root, self.MULTIPART_DIR), exist_ok=True)
+
+    # Caminhos
+
+    def path_for(self, key: str) -> str:
+        """Caminho do objeto; recusa chaves fora da raiz e os diretórios internos"""
+        parts = key.split('/')
+        if not key or any(part in ('', '.', '..') or '\\' in part for part in parts) or parts[0].startswith('.'):
+            raise NotFoundError(f"Chave inválida: {key}")
+        return os.path.join(self.root, *parts)
+
+    def _temp_path(self) -> str:
+        return os.path.join(self.root, self.TMP_DIR, uuid.uuid4().hex)
+
+    def _upload_dir(self, key: str, upload_id: str) -> str:
+        directory = os.path.join(self.root, self.MULTIPART_DIR, upload_id)
+        if not self.UPLOAD_ID_RE.match(upload_id or ''):
+            raise NotFoundError(f"Upload multipart inexistente: {upload_id}", "NoSuchUpload")
+        try:
+            with open(os.path.join(directory, "key"), encoding="utf-8") as f:
+                stored_key = f.read()
+        except FileNotFoundError:
+            raise NotFoundError(f"Upload multipart inexistente: {upload_id}", "NoSuchUpload")
+        if stored_key != key:
+            raise NotFoundError(f"Upload multipart {upload_id} não pertence a {key}", "NoSuchUpload")
+        return directory
+
+    # Escrita
+
+    @staticmethod
+    def _source_fd(fileobj) -> Optional[int]:
+        """Descritor do arquivo de origem, se estiver em disco (werkzeug: SpooledTemporaryFile)"""
+        stream = getattr(fileobj, "stream", fileobj)
+        if isinstance(stream, tempfile.SpooledTemporaryFile) and not getattr(stream, "_rolled", False):
+            # Ainda em memória: fileno() forçaria a escrita em disco
+            return None
+        try:
+            return stream.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    def _copy_fd(self, in_fd: int, out_fd: int, offset: int, count: int) -> None:
+        """Cópia no kernel (os.sendfile), com leitura/escrita em blocos grandes como alternativa"""
+        end = offset + count
+        if hasattr(os, "sendfile"):
+            try:
+                while offset < end:
+                    sent = os.sendfile(out_fd, in_fd, offset, min(end - offset, 1 << 30))
+                    if sent == 0:
+                        return
+                    offset += sent
+                return
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP):
+                    raise
+        while offset < end:
+            chunk = os.pread(in_fd, min(self.buffer_size, end - offset), offset)
+            if not chunk:
+                return
+            os.write(out_fd, chunk)
+            offset += len(chunk)
+
+    def _write(self, key: str, writer: Callable[[Any], None]) -> None:
+        """Grava em arquivo temporário e publica com os.replace"""
+        final_path = self.path_for(key)
+        temp_path = self._temp_path()
+        try:
+            with open(temp_path, 'wb', buffering=self.buffer_size) as f:
+                writer(f)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(temp_path, final_path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def put_object(self, key: str, body: bytes, content_type: str, checksums: Optional[Dict[str, str]] = None) -> None:
+        with tracing.span("local.put_object", chave=key):
+            self._write(key, lambda f: f.write(body))
+
+    def put_stream(self, key: str, fileobj, content_type: str, transfer_config=None, checksums: Optional[Dict[str, str]] = None) -> None:
+        def writer(f) -> None:
+            in_fd = self._source_fd(fileobj)
+            stream = getattr(fileobj, "stream", fileobj)
+            if in_fd is None:
+                shutil.copyfileobj(stream, f, self.buffer_size)
+                return
+            f.flush()
+            offset = stream.tell()
+            self._copy_fd(in_fd, f.fileno(), offset, os.fstat(in_fd).st_size - offset)
+
+        with tracing.span("local.put_stream", chave=key):
+            self._write(key, writer)
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        self.path_for(key)
+        upload_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, self.MULTIPART_DIR, upload_id)
+        os.makedirs(directory)
+        with open(os.path.join(directory, "key"), "w", encoding="utf-8") as f:
+            f.write(key)
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body, checksums: Optional[Dict[str, str]] = None) -> str:
+        """body pode ser bytes ou um stream (PUT assinado em /storage, parte de sessão)"""
+        with tracing.span("local.upload_part", chave=key, parte=part_number):
+            directory = self._upload_dir(key, upload_id)
+            md5 = hashlib.md5()
+            temp_path = self._temp_path()
+            try:
+                with open(temp_path, 'wb', buffering=self.buffer_size) as f:
+                    if isinstance(body, (bytes, bytearray, memoryview)):
+                        md5.update(body)
+                        f.write(body)
+                    else:
+                        while True:
+                            chunk = body.read(self.buffer_size)
+                            if not chunk:
+                                break
+                            md5.update(chunk)
+                            f.write(chunk)
+                etag = md5.hexdigest()
+                prefix = f"{part_number:05d}."
+                os.replace(temp_path, os.path.join(directory, prefix + etag))
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            # Parte reenviada com outro conteúdo: descartar a versão anterior
+            for name in os.listdir(directory):
+                if name.startswith(prefix) and name != prefix + etag:
+                    os.unlink(os.path.join(directory, name))
+            return f'"{etag}"'
+
+    def _parts(self, directory: str) -> Dict[int, Tuple[str, str]]:
+        parts = {}
+        for name in os.listdir(directory):
+            match = self.PART_RE.match(name)
+            if match:
+                parts[int(match.group(1))] = (os.path.join(directory, name), match.group(2))
+        return parts
+
+    def list_parts(self, key: str, upload_id: str) -> List[Dict[str, Any]]:
+        directory = self._upload_dir(key, upload_id)
+        return [
+            {"PartNumber": number, "Size": os.path.getsize(path), "ETag": f'"{etag}"'}
+            for number, (path, etag) in sorted(self._parts(directory).items())
+        ]
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
+        with tracing.span("local.complete_multipart", chave=key, partes=len(parts)):
+            directory = self._upload_dir(key, upload_id)
+            stored = self._parts(directory)
+            ordered = []
+            for part in sorted(parts, key=lambda p: p["PartNumber"]):
+                path, etag = stored.get(part["PartNumber"], (None, None))
+                if path is None or etag != str(part["ETag"]).strip('"'):
+                    raise StorageError(f"Parte {part['PartNumber']} inexistente ou com ETag diferente", "InvalidPart")
+                ordered.append(path)
+
+            def writer(f) -> None:
+                f.flush()
+                for path in ordered:
+                    with open(path, 'rb') as part_file:
+                        self._copy_fd(part_file.fileno(), f.fileno(), 0, os.fstat(part_file.fileno()).st_size)
+
+            self._write(key, writer)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        shutil.rmtree(self._upload_dir(key, upload_id), ignore_errors=True)
+
+    # Leitura e metadados
+
+    def head(self, key: str) -> Dict[str, Any]:
+        try:
+            stat = os.stat(self.path_for(key))
+        except FileNotFoundError:
+            raise NotFoundError(f"Objeto inexistente: {key}")
+        return {
+            "size": stat.st_size,
+            "content_type": mimetypes.guess_type(key)[0] or 'application/octet-stream',
+            # Como no multipart do S3, o ETag local não é o MD5 do conteúdo
+            "etag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+        }
+
+    def copy(self, source_key: str, key: str, content_type: str) -> None:
+        source_path = self.path_for(source_key)
+        if not os.path.isfile(source_path):
+            raise NotFoundError(f"Objeto inexistente: {source_key}")
+        with tracing.span("local.copy", origem=source_key, chave=key):
+            final_path = self.path_for(key)
+            temp_path = self._temp_path()
+            try:
+                # Objetos nunca são alterados no lugar (os.replace), então um hard link basta
+                os.link(source_path, temp_path)
+            except OSError:
+                shutil.copyfile(source_path, temp_path)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(temp_path, final_path)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def public_url(self, key: str) -> str:
+        # Sem STORAGE_PUBLIC_BASE_URL a URL é relativa; a API completa com o host da requisição
+        return f"{self.public_base_url}/storage/{quote(key)}"
+
+    def read_url(self, key: str, expires: int = 300) -> str:
+        return self.path_for(key)
+
+    # URLs assinadas (PUT /storage/<chave>)
+
+    def _signature(self, key: str, expires: int, upload_id: str = "", part_number: Optional[int] = None) -> str:
+        message = f"PUT\n{key}\n{expires}\n{upload_id}\n{part_number or ''}"
+        return hmac.new(self.signing_secret.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def _signed_url(self, key: str, expires: int, upload_id: str = "", part_number: Optional[int] = None) -> str:
+        expires_at = int(time.time()) + expires
+        params = {"expires": expires_at}
+        if upload_id:
+            params.update({"uploadId": upload_id, "partNumber": part_number})
+        params["signature"] = self._signature(key, expires_at, upload_id, part_number)
+        return f"{self.public_url(key)}?{urlencode(params)}"
+
+    def presigned_put(self, key: str, content_type: str, expires: int) -> Tuple[str, Dict[str, str]]:
+        return self._signed_url(key, expires), {"Content-Type": content_type}
+
+    def presigned_upload_part(self, key: str, upload_id: str, part_number: int, expires: int) -> str:
+        return self._signed_url(key, expires, upload_id, part_number)
+
+    def verify_signature(self, key: str, params) -> bool:
+        """Confere assinatura e validade de uma URL gerada por presigned_put/presigned_upload_part"""
+        if not self.signing_secret:
+            return False
+        try:
+            expires_at = int(params.get("expires", ""))
+            part_number = int(params["partNumber"]) if params.get("partNumber") else None
+        except ValueError:
+            return False
+        if expires_at < time.time():
+            return False
+        expected = self._signature(key, expires_at, params.get("uploadId", ""), part_number)
+        return hmac.compare_digest(expected, params.get("signature", ""))
+
+    def check(self) -> None:
+        if not os.path.isdir(self.root) or not os.access(self.root, os.W_OK):
+            raise StorageError(f"Diretório de armazenamento sem permissão de escrita: {self.root}", "AccessDenied")
+        stat = os.statvfs(self.root)
+        if stat.f_bavail * stat.f_frsize == 0:
+            raise StorageError(f"Sem espaço livre em {self.root}", "NoSpace")
+
+
+class StorageBackendAsync:
+    """Operações do upload ASGI em corrotinas: backend síncrono executado em thread"""
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+
+    async def put_object(self, key: str, body: bytes, content_type: str, checksums: Optional[Dict[str, str]] = None) -> None:
+        await asyncio.to_thread(self.backend.put_object, key, body, content_type, checksums)
+
+    async def create_multipart(self, key: str, content_type: str) -> str:
+        return await asyncio.to_thread(self.backend.create_multipart, key, content_type)
+
+    async def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes, checksums: Optional[Dict[str, str]] = None) -> str:
+        return await asyncio.to_thread(self.backend.upload_part, key, upload_id, part_number, body, checksums)
+
+    async def complete_multipart(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self.backend.complete_multipart, key, upload_id, parts)
+
+    async def abort_multipart(self, key: str, upload_id: str) -> None:
+        await asyncio.to_thread(self.backend.abort_multipart, key, upload_id)
+
+    async def read_url(self, key: str, expires: int = 300) -> str:
+        return await asyncio.to_thread(self.backend.read_url, key, expires)
+
+
+class S3StorageBackendAsync(StorageBackendAsync):
+    """Mesmas operações com o cliente aiobotocore (I/O não bloqueante)"""
+
+    def __init__(self, backend: S3StorageBackend, client):
+        super().__init__(backend)
+        self.client = client
+        self.bucket = backend.bucket
+        self.acl = backend.acl
+
+    async def put_object(self, key: str, body: bytes, content_type: str, checksums: Optional[Dict[str, str]] = None) -> None:
+        await self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ACL=self.acl, ContentType=content_type, **_checksum_args(checksums))
+
+    async def create_multipart(self, key: str, content_type: str) -> str:
+        response = await self.client.create_multipart_upload(Bucket=self.bucket, Key=key, ACL=self.acl, ContentType=content_type)
+        return response['UploadId']
+
+    async def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes, checksums: Optional[Dict[str, str]] = None) -> str:
+        response = await self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body, **_checksum_args(checksums))
+        return response['ETag']
+
+    async def complete_multipart(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
+        await self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [{"ETag": part["ETag"], "PartNumber": part["PartNumber"]} for part in parts]}
+        )
+
+    async def abort_multipart(self, key: str, upload_id: str) -> None:
+        await self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+
+    async def read_url(self, key: str, expires: int = 300) -> str:
+        return await self.client.generate_presigned_url('get_object', Params={'Bucket': self.bucket, 'Key': key}, ExpiresIn=expires)
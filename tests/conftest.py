@@ -0,0 +1,57 @@
+"""
+Configuração compartilhada dos testes: o app é importado uma única vez com o backend local
+(diretório temporário), estado SQLite próprio e deduplicação ligada, sem depender do Spaces.
+
+As variáveis de ambiente só valem durante a importação e são restauradas em seguida, para não
+afetar os scripts de teste da raiz que sobem o Gunicorn.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+TEST_DIR = tempfile.mkdtemp(prefix="upload_cdn_tests_")
+
+TEST_ENV = {
+    "STORAGE_BACKEND": "local",
+    "LOCAL_STORAGE_DIR": os.path.join(TEST_DIR, "storage"),
+    "STATE_DB_PATH": os.path.join(TEST_DIR, "state.db"),
+    "MEDIA_CACHE_DISK": "false",
+    "UPLOAD_TOKEN_SECRET": "segredo-de-teste",
+    "DEFAULT_UPLOAD_DIR": "uploads",
+    "DEDUP_MODE": "copy",
+    "CALLBACK_JSON_MODE": "sync",
+    "CONTENT_SNIFFING": "on",
+    "HEALTH_CHECK_INTERVAL_SECONDS": "3600",
+}
+
+_original_env = os.environ.copy()
+os.environ.update(TEST_ENV)
+try:
+    import app as upload_app
+finally:
+    os.environ.clear()
+    os.environ.update(_original_env)
+
+
+def pdf_bytes(size: int = 2048) -> bytes:
+    """PDF mínimo com conteúdo aleatório (cada chamada gera um arquivo diferente)"""
+    return b"%PDF-1.4\n" + os.urandom(size)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    yield upload_app
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
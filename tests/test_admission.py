@@ -0,0 +1,114 @@
+"""
+Testes do controle de admissão dos uploads: 429 com Retry-After antes de ler o corpo
+"""
+
+import io
+
+import pytest
+
+from conftest import pdf_bytes
+
+
+def upload(client, headers=None, remote_addr='127.0.0.1'):
+    return client.post(
+        '/upload',
+        data={'file': (io.BytesIO(pdf_bytes()), 'doc.pdf', 'application/pdf')},
+        query_string={'dedup': 'false'},
+        content_type='multipart/form-data',
+        headers=headers or {},
+        environ_base={'REMOTE_ADDR': remote_addr},
+    )
+
+
+@pytest.fixture
+def use_admission(app_module, monkeypatch):
+    def configure(**limites):
+        controller = app_module.AdmissionController(
+            True,
+            limites.get("max_concurrent_per_client", 0),
+            limites.get("rate_per_minute", 0),
+            limites.get("burst", 1),
+            limites.get("max_inflight_bytes", 0),
+        )
+        monkeypatch.setattr(app_module, "admission", controller)
+        return controller
+    return configure
+
+
+def test_rate_limit_returns_429_with_retry_after(client, use_admission):
+    controller = use_admission(rate_per_minute=6, burst=1)
+
+    assert upload(client).status_code == 200
+    response = upload(client)
+
+    assert response.status_code == 429
+    payload = response.get_json()
+    assert payload["motivo"] == "taxa"
+    retry_after = int(response.headers["Retry-After"])
+    assert 1 <= retry_after <= 10
+    assert payload["retry_after_segundos"] == retry_after
+    assert controller.stats()["rejeitadas"]["taxa"] == 1
+
+
+def test_rate_limit_is_per_peer_address(client, use_admission):
+    use_admission(rate_per_minute=6, burst=1)
+
+    assert upload(client, remote_addr='10.0.0.1').status_code == 200
+    assert upload(client, remote_addr='10.0.0.2').status_code == 200
+    assert upload(client, remote_addr='10.0.0.1').status_code == 429
+
+
+def test_client_headers_do_not_bypass_limits(client, use_admission):
+    use_admission(rate_per_minute=6, burst=1)
+
+    assert upload(client).status_code == 200
+    # Chave de API e X-Forwarded-For enviados pelo cliente não criam um novo balde
+    assert upload(client, {'X-API-Key': 'outra', 'X-Forwarded-For': '198.51.100.9'}).status_code == 429
+
+
+def test_gateway_identity_header(client, app_module, use_admission, monkeypatch):
+    monkeypatch.setattr(app_module, "CLIENT_ID_HEADER", "X-Client-Id")
+    use_admission(rate_per_minute=6, burst=1)
+
+    assert upload(client, {'X-Client-Id': 'cliente-a'}).status_code == 200
+    assert upload(client, {'X-Client-Id': 'cliente-b'}).status_code == 200
+    assert upload(client, {'X-Client-Id': 'cliente-a'}).status_code == 429
+
+
+def test_concurrency_limit(client, use_admission):
+    controller = use_admission(max_concurrent_per_client=1)
+    ticket, rejection = controller.acquire("ip:127.0.0.1", 1024)
+    assert rejection is None
+
+    response = upload(client)
+    assert response.status_code == 429
+    assert response.get_json()["motivo"] == "concorrencia"
+    assert response.headers["Retry-After"] == "1"
+
+    controller.release(ticket)
+    assert upload(client).status_code == 200
+    # O ticket do upload é liberado ao fim da requisição
+    assert controller.stats()["uploads_em_andamento"] == 0
+
+
+def test_inflight_bytes_budget(client, use_admission):
+    controller = use_admission(max_inflight_bytes=61 * 1024)
+    ticket, _ = controller.acquire("ip:10.0.0.1", 60 * 1024)
+
+    response = upload(client)
+    assert response.status_code == 429
+    assert response.get_json()["motivo"] == "bytes_em_andamento"
+
+    controller.release(ticket)
+    assert upload(client).status_code == 200
+
+
+def test_disabled_by_default(app_module):
+    assert app_module.admission.enabled is False
+    assert app_module.ADMISSION_MAX_CONCURRENT_PER_CLIENT == 0
+
+
+def test_disabled_admission_accepts_everything(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "admission", app_module.AdmissionController(False, 1, 1, 1, 1))
+    for _ in range(3):
+        assert upload(client).status_code == 200
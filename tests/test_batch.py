@@ -0,0 +1,52 @@
+"""
+Testes do upload em lote (POST /upload/batch)
+"""
+
+import contextvars
+import io
+import time
+
+import flask
+from werkzeug.datastructures import FileStorage
+
+from conftest import pdf_bytes
+
+
+def upload_batch(client, count: int, **kwargs):
+    files = [(io.BytesIO(pdf_bytes(4096)), f'doc{i}.pdf', 'application/pdf') for i in range(count)]
+    return client.post('/upload/batch', data={'file': files}, content_type='multipart/form-data', **kwargs)
+
+
+def test_batch_over_limit_is_rejected_while_parsing(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "BATCH_MAX_FILES", 2)
+    streams = []
+    original = flask.Request._get_file_stream
+
+    def counting(self, *args, **kwargs):
+        streams.append(args)
+        return original(self, *args, **kwargs)
+    monkeypatch.setattr(flask.Request, "_get_file_stream", counting)
+
+    response = upload_batch(client, 5)
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Arquivos demais no lote"
+    # O parser parou no terceiro arquivo, sem abrir destino para os demais
+    assert len(streams) == 2
+
+
+def test_batch_within_limit(client):
+    response = upload_batch(client, 2)
+    assert response.status_code == 200
+    assert [item["status_http"] for item in response.get_json()["resultados"]] == [200, 200]
+
+
+def test_item_urls_are_absolute_without_request_context(app_module):
+    # Itens processados fora do contexto da requisição recebem o host calculado na thread dela
+    file = FileStorage(io.BytesIO(pdf_bytes(4096)), 'doc.pdf', content_type='application/pdf')
+    payload, status_code = contextvars.Context().run(
+        app_module.process_file_upload, file, app_module.get_client_info({}, '127.0.0.1'), '', time.time(),
+        host_root='http://cdn.local'
+    )
+    assert status_code == 200
+    assert payload["arquivo"]["url_publica"].startswith('http://cdn.local/')
+    assert payload["callback_url"].startswith('http://cdn.local/')
@@ -0,0 +1,113 @@
+"""
+Testes da deduplicação por conteúdo (DEDUP_MODE), com o SHA-256 calculado pela API
+"""
+
+import hashlib
+import io
+import json
+import os
+from urllib.parse import urlsplit
+
+from conftest import pdf_bytes
+
+
+def upload(client, data: bytes, query=None, headers=None):
+    return client.post(
+        '/upload',
+        data={'file': (io.BytesIO(data), 'doc.pdf', 'application/pdf')},
+        query_string=query or {},
+        content_type='multipart/form-data',
+        headers=headers or {},
+    )
+
+
+def stored_bytes(app_module, key: str) -> bytes:
+    with open(app_module.storage_backend.path_for(key), 'rb') as f:
+        return f.read()
+
+
+def test_repeated_content_is_copied_without_transfer(client, app_module):
+    data = pdf_bytes()
+    first = upload(client, data).get_json()
+    second = upload(client, data).get_json()
+
+    dedup = second["upload"]["deduplicacao"]
+    assert dedup["hit"] is True
+    assert dedup["modo"] == "copy"
+    assert dedup["objeto_original"] == first["arquivo"]["caminho_completo"]
+    assert second["arquivo"]["caminho_completo"] != first["arquivo"]["caminho_completo"]
+    assert second["arquivo"]["hash_md5"] == first["arquivo"]["hash_md5"]
+    assert stored_bytes(app_module, second["arquivo"]["caminho_completo"]) == data
+
+
+def test_opt_out_per_request(client):
+    data = pdf_bytes()
+    upload(client, data)
+    response = upload(client, data, query={'dedup': 'false'}).get_json()
+    assert not response["upload"].get("deduplicacao")
+
+
+def test_dedup_off(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "DEDUP_MODE", "off")
+    data = pdf_bytes()
+    upload(client, data)
+    response = upload(client, data).get_json()
+    assert not response["upload"].get("deduplicacao")
+
+
+def test_reuse_mode_returns_original_object(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "DEDUP_MODE", "reuse")
+    data = pdf_bytes()
+    first = upload(client, data).get_json()
+    second = upload(client, data).get_json()
+    assert second["upload"]["deduplicacao"]["modo"] == "reuse"
+    assert second["arquivo"]["caminho_completo"] == first["arquivo"]["caminho_completo"]
+    # O callback do hit é próprio, não o do upload original (com os dados de outro cliente)
+    assert second["callback_url"] != first["callback_url"]
+    callback = json.loads(client.get(urlsplit(second["callback_url"]).path).data)
+    assert callback["upload"]["deduplicacao"]["hit"] is True
+
+
+def test_declared_hash_headers_do_not_produce_hits(client):
+    # Conhecer MD5 e tamanho de um arquivo alheio não pode devolver o objeto dele
+    original = pdf_bytes()
+    upload(client, original)
+    other = pdf_bytes(len(original) - 9)
+    response = upload(client, other, headers={
+        'X-File-MD5': hashlib.md5(original).hexdigest(),
+        'X-File-Size': str(len(original)),
+    }).get_json()
+    assert not response["upload"].get("deduplicacao")
+    assert response["arquivo"]["hash_md5"] == hashlib.md5(other).hexdigest()
+
+
+def test_missing_original_object_is_forgotten(client, app_module):
+    data = pdf_bytes()
+    first = upload(client, data).get_json()
+    os.unlink(app_module.storage_backend.path_for(first["arquivo"]["caminho_completo"]))
+
+    response = upload(client, data).get_json()
+    assert not response["upload"].get("deduplicacao")
+    assert stored_bytes(app_module, response["arquivo"]["caminho_completo"]) == data
+    # O novo objeto passa a ser o original das próximas repetições
+    again = upload(client, data).get_json()
+    assert again["upload"]["deduplicacao"]["objeto_original"] == response["arquivo"]["caminho_completo"]
+
+
+def test_streaming_upload_registers_content(client):
+    data = pdf_bytes()
+    first = upload(client, data, query={'stream': 'true'}).get_json()
+    second = upload(client, data).get_json()
+    assert second["upload"]["deduplicacao"]["objeto_original"] == first["arquivo"]["caminho_completo"]
+
+
+def test_hit_counter(client, app_module):
+    data = pdf_bytes()
+    upload(client, data)
+    upload(client, data)
+    upload(client, data)
+    row = app_module.get_state_db().execute(
+        "SELECT hits FROM dedup_content WHERE hash_sha256 = ? AND tamanho = ?",
+        (hashlib.sha256(data).hexdigest(), len(data))
+    ).fetchone()
+    assert row["hits"] == 2
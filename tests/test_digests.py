@@ -0,0 +1,151 @@
+"""
+Testes do motor de hashing (digests.py) e dos digests enviados ao armazenamento
+"""
+
+import base64
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+import digests
+import storage
+
+
+def b64(digest: bytes) -> str:
+    return base64.b64encode(digest).decode('ascii')
+
+
+def test_parse_algorithms_normalizes_and_keeps_required_first():
+    algoritmos, ignorados = digests.parse_algorithms('SHA-256, md5,sha256,,whirlpool')
+    assert algoritmos == ['md5', 'sha256']
+    assert ignorados == ['whirlpool']
+
+
+def test_parse_algorithms_empty_value():
+    assert digests.parse_algorithms('') == (['md5'], [])
+    assert digests.parse_algorithms(None, required=()) == ([], [])
+
+
+def test_parse_algorithms_crc32c_depends_on_optional_package():
+    algoritmos, ignorados = digests.parse_algorithms('crc32c')
+    if digests.google_crc32c is None:
+        assert ignorados == ['crc32c']
+    else:
+        assert algoritmos == ['md5', 'crc32c']
+
+
+def test_multidigest_parallel_matches_sequential():
+    algoritmos = digests.available()
+    blocos = [os.urandom(digests.PARALLEL_MIN_BYTES * 2), os.urandom(1024), os.urandom(digests.PARALLEL_MIN_BYTES + 7)]
+    sequencial = digests.MultiDigest(algoritmos)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        paralelo = digests.MultiDigest(algoritmos, executor)
+        for bloco in blocos:
+            sequencial.update(bloco)
+            paralelo.update(bloco)
+    assert paralelo.hexdigests() == sequencial.hexdigests()
+    conteudo = b''.join(blocos)
+    assert paralelo.hexdigest('md5') == hashlib.md5(conteudo).hexdigest()
+    assert paralelo.hexdigest('sha256') == hashlib.sha256(conteudo).hexdigest()
+    assert paralelo.b64digest('md5') == b64(hashlib.md5(conteudo).digest())
+
+
+def test_hash_fileobj_rewinds():
+    conteudo = os.urandom(300 * 1024)
+    arquivo = io.BytesIO(conteudo)
+    digest = digests.hash_fileobj(arquivo, ['md5', 'sha256'], 64 * 1024)
+    assert arquivo.tell() == 0
+    assert digest.hexdigest('sha256') == hashlib.sha256(conteudo).hexdigest()
+
+
+def test_part_checksums(app_module, monkeypatch):
+    parte = os.urandom(4096)
+    esperado = {"md5": b64(hashlib.md5(parte).digest())}
+    assert app_module.part_checksums(parte) == esperado
+    digest = digests.MultiDigest(['md5'])
+    digest.update(parte)
+    assert app_module.part_checksums(digest) == esperado
+    monkeypatch.setattr(app_module, "STORAGE_CHECKSUM", "off")
+    assert app_module.part_checksums(parte) is None
+
+
+class RecordingBackend:
+    """Backend falso que guarda as partes e os checksums recebidos"""
+
+    def __init__(self):
+        self.parts = {}
+        self.completed = None
+
+    def create_multipart(self, key, content_type):
+        return "upload-1"
+
+    def upload_part(self, key, upload_id, part_number, body, checksums=None):
+        self.parts[part_number] = (bytes(body), checksums)
+        return f'"etag-{part_number}"'
+
+    def complete_multipart(self, key, upload_id, parts):
+        self.completed = parts
+
+
+@pytest.mark.parametrize("threshold_mb", [5, 12])
+def test_streaming_pipeline_sends_md5_of_each_part(app_module, threshold_mb):
+    # Threshold acima da parte: o MD5 das partes já no buffer é calculado ao decidir o multipart
+    backend = RecordingBackend()
+    plan = {"tamanho_parte_bytes": 5 * 1024 * 1024, "multipart_threshold": threshold_mb * 1024 * 1024, "concorrencia": 2}
+    pipeline = app_module.StreamingUploadPipeline(backend, "uploads/x.bin", "application/octet-stream", plan)
+    conteudo = os.urandom(12 * 1024 * 1024 + 333)
+    for inicio in range(0, len(conteudo), 700 * 1024):
+        pipeline.write(conteudo[inicio:inicio + 700 * 1024])
+    pipeline.finish()
+
+    assert sorted(backend.parts) == [1, 2, 3]
+    assert b''.join(backend.parts[n][0] for n in (1, 2, 3)) == conteudo
+    for body, checksums in backend.parts.values():
+        assert checksums == {"md5": b64(hashlib.md5(body).digest())}
+    assert [part["PartNumber"] for part in backend.completed] == [1, 2, 3]
+    assert pipeline.digest.hexdigest('md5') == hashlib.md5(conteudo).hexdigest()
+
+
+@pytest.fixture
+def stubbed_s3():
+    client = boto3.client('s3', region_name='us-east-1', aws_access_key_id='k', aws_secret_access_key='s')
+    backend = storage.S3StorageBackend('bkt', lambda: client, lambda: client, 'https://cdn.exemplo.com')
+    with Stubber(client) as stubber:
+        yield backend, stubber
+
+
+def test_s3_upload_part_passes_content_md5(stubbed_s3):
+    backend, stubber = stubbed_s3
+    corpo = os.urandom(1024)
+    md5 = b64(hashlib.md5(corpo).digest())
+    stubber.add_response(
+        'upload_part', {'ETag': '"abc"'},
+        {'Bucket': 'bkt', 'Key': 'k', 'UploadId': 'u', 'PartNumber': 1, 'Body': corpo, 'ContentMD5': md5},
+    )
+    assert backend.upload_part('k', 'u', 1, corpo, checksums={'md5': md5}) == '"abc"'
+    stubber.assert_no_pending_responses()
+
+
+def test_s3_put_object_passes_flexible_checksum(stubbed_s3):
+    backend, stubber = stubbed_s3
+    corpo = b'conteudo'
+    sha256 = b64(hashlib.sha256(corpo).digest())
+    stubber.add_response(
+        'put_object', {},
+        {'Bucket': 'bkt', 'Key': 'k', 'Body': corpo, 'ACL': 'public-read', 'ContentType': 'text/plain', 'ChecksumSHA256': sha256},
+    )
+    backend.put_object('k', corpo, 'text/plain', checksums={'sha256': sha256})
+    stubber.assert_no_pending_responses()
+
+
+def test_storage_digest_mismatch_maps_to_503(app_module):
+    import botocore.exceptions
+    erro = botocore.exceptions.ClientError({'Error': {'Code': 'BadDigest', 'Message': 'x'}}, 'PutObject')
+    payload, status_code = app_module.storage_error_response(erro)
+    assert status_code == 503
+    assert payload["error"] == "Falha na verificação de integridade do armazenamento"
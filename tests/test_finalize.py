@@ -0,0 +1,128 @@
+"""
+Testes da finalização idempotente: /upload/finalize e POST /upload/sessions/<id>/complete
+"""
+
+import time
+from urllib.parse import urlsplit
+
+from conftest import pdf_bytes
+
+MB = 1024 * 1024
+
+
+def presign(client, size):
+    response = client.post('/upload/presign', json={'filename': 'direto.pdf', 'size': size})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def put_signed(client, url, body, headers=None):
+    parts = urlsplit(url)
+    return client.put(f'{parts.path}?{parts.query}', data=body, headers=headers or {})
+
+
+def finalize(client, token):
+    return client.post('/upload/finalize', json={'upload_token': token})
+
+
+def catalog_rows(app_module, key):
+    return app_module.get_state_db().execute(
+        "SELECT count(*) FROM upload_catalog WHERE s3_key = ?", (key,)
+    ).fetchone()[0]
+
+
+def test_repeated_finalize_returns_stored_response(client, app_module):
+    data = pdf_bytes()
+    presigned = presign(client, len(data))
+    assert presigned["modo"] == "simples"
+    assert put_signed(client, presigned["upload"]["url"], data, presigned["upload"]["headers"]).status_code == 200
+
+    first = finalize(client, presigned["upload_token"])
+    second = finalize(client, presigned["upload_token"])
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert catalog_rows(app_module, presigned["arquivo"]["caminho_completo"]) == 1
+
+
+def test_repeated_multipart_finalize(client):
+    data = pdf_bytes(17 * MB)
+    presigned = presign(client, len(data))
+    assert presigned["modo"] == "multipart"
+    part_size = presigned["upload"]["tamanho_parte"]
+    for part in presigned["upload"]["partes"]:
+        start = (part["chunk"] - 1) * part_size
+        assert put_signed(client, part["url"], data[start:start + part_size]).status_code == 200
+
+    first = finalize(client, presigned["upload_token"])
+    assert first.status_code == 200
+    # O multipart já foi concluído: a segunda chamada recebe a resposta gravada
+    second = finalize(client, presigned["upload_token"])
+    assert second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert first.get_json()["arquivo"]["tamanho"]["bytes"] == len(data)
+
+
+def test_repeated_session_complete(client, app_module):
+    data = pdf_bytes()
+    session = client.post('/upload/sessions', json={'filename': 'sessao.pdf', 'size': len(data)}).get_json()
+    session_id = session["session_id"]
+    assert client.put(f'/upload/sessions/{session_id}/chunks/1', data=data).status_code == 200
+
+    first = client.post(f'/upload/sessions/{session_id}/complete')
+    second = client.post(f'/upload/sessions/{session_id}/complete')
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert catalog_rows(app_module, session["arquivo"]["caminho_completo"]) == 1
+
+
+def test_finalize_in_progress_returns_409(client, app_module):
+    data = pdf_bytes()
+    presigned = presign(client, len(data))
+    put_signed(client, presigned["upload"]["url"], data, presigned["upload"]["headers"])
+
+    # Simula outra chamada finalizando o mesmo objeto
+    now = time.time()
+    app_module.get_state_db().execute(
+        "INSERT INTO upload_finalizations (s3_key, dono, criado_em, expira_em) VALUES (?, ?, ?, ?)",
+        (presigned["arquivo"]["caminho_completo"], "outro", now, now + 60)
+    )
+    response = finalize(client, presigned["upload_token"])
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()["error"] == "Finalização em andamento"
+
+
+def test_failed_finalize_releases_claim(client, app_module):
+    data = pdf_bytes()
+    presigned = presign(client, len(data))
+
+    # Objeto ainda não enviado: erro sem gravar resposta
+    assert finalize(client, presigned["upload_token"]).status_code == 404
+    assert app_module.get_state_db().execute(
+        "SELECT count(*) FROM upload_finalizations WHERE s3_key = ?", (presigned["arquivo"]["caminho_completo"],)
+    ).fetchone()[0] == 0
+
+    put_signed(client, presigned["upload"]["url"], data, presigned["upload"]["headers"])
+    assert finalize(client, presigned["upload_token"]).status_code == 200
+
+
+def test_invalid_token(client):
+    response = finalize(client, 'token-invalido')
+    assert response.status_code == 404
+    assert response.get_json()["error"] == "Token de upload inválido"
+
+
+def test_multipart_finalize_rejects_small_parts(client):
+    data = pdf_bytes(17 * MB)
+    presigned = presign(client, len(data))
+    part_size = presigned["upload"]["tamanho_parte"]
+    for part in presigned["upload"]["partes"]:
+        start = (part["chunk"] - 1) * part_size
+        body = data[start:start + part_size]
+        # A parte 2 chega truncada: o S3 recusaria a conclusão com EntityTooSmall
+        put_signed(client, part["url"], body[:MB] if part["chunk"] == 2 else body)
+
+    response = finalize(client, presigned["upload_token"])
+    assert response.status_code == 409
+    assert response.get_json()["error"] == "Partes menores que o mínimo"
+    assert response.get_json()["chunks_pendentes"] == [2]
@@ -0,0 +1,168 @@
+"""
+Testes do Idempotency-Key em POST /upload e POST /upload/batch
+"""
+
+import io
+import uuid
+
+from conftest import pdf_bytes
+
+
+def upload(client, data: bytes, key: str, filename: str = 'doc.pdf', headers=None, path='/upload'):
+    return client.post(
+        path,
+        data={'file': (io.BytesIO(data), filename, 'application/pdf')},
+        content_type='multipart/form-data',
+        headers={'Idempotency-Key': key, **(headers or {})},
+    )
+
+
+def new_key() -> str:
+    return str(uuid.uuid4())
+
+
+def test_replay_returns_stored_response(client, app_module):
+    data, key = pdf_bytes(), new_key()
+    first = upload(client, data, key)
+    second = upload(client, data, key)
+
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert second.headers.get('Idempotent-Replayed') == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert app_module.get_state_db().execute(
+        "SELECT count(*) FROM upload_catalog WHERE arquivo_id = ?", (first.get_json()["arquivo"]["id"],)
+    ).fetchone()[0] == 1
+
+
+def test_batch_replay(client):
+    data, key = pdf_bytes(), new_key()
+    first = upload(client, data, key, path='/upload/batch')
+    second = upload(client, data, key, path='/upload/batch')
+    assert first.status_code == second.status_code
+    assert second.get_json() == first.get_json()
+    assert second.headers.get('Idempotent-Replayed') == 'true'
+
+
+def test_same_key_with_different_request_is_rejected(client):
+    key = new_key()
+    assert upload(client, pdf_bytes(), key).status_code == 200
+
+    response = upload(client, pdf_bytes(), key, filename='outro.pdf')
+    assert response.status_code == 422
+    assert 'nome' in response.get_json()["campos_divergentes"]
+
+
+def test_key_in_progress_returns_409(client, app_module, monkeypatch):
+    data, key = pdf_bytes(), new_key()
+    assert upload(client, data, key).status_code == 200
+
+    # Simula a primeira tentativa ainda em andamento
+    chave = app_module.idempotency_storage_key({}, app_module.get_client_info({}, "127.0.0.1"), key)
+    app_module.get_state_db().execute(
+        "UPDATE idempotency_records SET resposta = NULL, status_http = NULL WHERE chave = ?", (chave,)
+    )
+    monkeypatch.setattr(app_module, "IDEMPOTENCY_WAIT_SECONDS", 0)
+
+    response = upload(client, data, key)
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()["error"] == "Requisição com o mesmo Idempotency-Key em andamento"
+
+
+def test_keys_are_scoped_per_peer_address(client):
+    data, key = pdf_bytes(), new_key()
+    first = upload(client, data, key)
+    other = client.post(
+        '/upload',
+        data={'file': (io.BytesIO(data), 'doc.pdf', 'application/pdf')},
+        content_type='multipart/form-data',
+        headers={'Idempotency-Key': key},
+        environ_base={'REMOTE_ADDR': '203.0.113.7'},
+    )
+    assert other.status_code == 200
+    assert 'Idempotent-Replayed' not in other.headers
+    assert other.get_json()["arquivo"]["id"] != first.get_json()["arquivo"]["id"]
+
+    # Cabeçalhos enviados pelo próprio cliente não mudam o escopo
+    spoofed = upload(client, data, key, headers={'X-Forwarded-For': '198.51.100.9', 'X-API-Key': 'outro'})
+    assert spoofed.headers.get('Idempotent-Replayed') == 'true'
+    assert spoofed.get_json() == first.get_json()
+
+
+def test_keys_are_scoped_per_gateway_identity(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "CLIENT_ID_HEADER", "X-Client-Id")
+    data, key = pdf_bytes(), new_key()
+    first = upload(client, data, key, headers={'X-Client-Id': 'cliente-a'})
+    other = upload(client, data, key, headers={'X-Client-Id': 'cliente-b'})
+    assert 'Idempotent-Replayed' not in other.headers
+    assert other.get_json()["arquivo"]["id"] != first.get_json()["arquivo"]["id"]
+    replay = upload(client, data, key, headers={'X-Client-Id': 'cliente-a'})
+    assert replay.get_json() == first.get_json()
+
+
+def test_trusted_client_ip(app_module, monkeypatch):
+    info = app_module.get_client_info({'X-Forwarded-For': '198.51.100.9, 203.0.113.7'}, '10.0.0.2')
+    assert app_module.trusted_client_ip(info) == '10.0.0.2'
+    monkeypatch.setattr(app_module, "TRUSTED_PROXY_COUNT", 1)
+    # Só a última entrada foi escrita pelo proxy; a primeira veio do cliente
+    assert app_module.trusted_client_ip(info) == '203.0.113.7'
+    monkeypatch.setattr(app_module, "TRUSTED_PROXY_COUNT", 3)
+    assert app_module.trusted_client_ip(info) == '10.0.0.2'
+
+
+def test_failed_request_is_not_stored(client):
+    key = new_key()
+    response = upload(client, b'MZ\x90\x00' + b'\x00' * 256, key, filename='doc.pdf')
+    assert response.status_code == 400
+
+    # Erro não fica gravado: a retentativa com a mesma chave é processada de novo
+    retry = upload(client, b'MZ\x90\x00' + b'\x00' * 256, key, filename='doc.pdf')
+    assert retry.status_code == 400
+    assert 'Idempotent-Replayed' not in retry.headers
+
+
+def test_invalid_key(client):
+    response = upload(client, pdf_bytes(), 'x' * 300)
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Idempotency-Key inválido"
+
+
+def raw_upload(client, data: bytes, key: str, boundary: str):
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="doc.pdf"\r\n'
+        f'Content-Type: application/pdf\r\n\r\n'
+    ).encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return client.post(
+        '/upload',
+        data=body,
+        content_type=f'multipart/form-data; boundary={boundary}',
+        headers={'Idempotency-Key': key},
+    )
+
+
+def test_replay_with_longer_boundary(client):
+    data, key = pdf_bytes(), new_key()
+    first = raw_upload(client, data, key, 'a' * 20)
+    second = raw_upload(client, data, key, 'b' * 31)
+    assert second.headers.get('Idempotent-Replayed') == 'true'
+    assert second.get_json() == first.get_json()
+
+
+def test_other_size_with_longer_boundary_is_rejected(client):
+    # Mesmo nome e mesmo início, arquivo maior: o boundary não explica a diferença de tamanho
+    data, key = pdf_bytes(64 * 1024), new_key()
+    assert raw_upload(client, data, key, 'a' * 20).status_code == 200
+    response = raw_upload(client, data + b'x' * 5, key, 'b' * 31)
+    assert response.status_code == 422
+    assert response.get_json()["campos_divergentes"] == ["tamanho_requisicao"]
+
+
+def test_size_matches_only_by_whole_delimiters(app_module):
+    gravada = {"tamanho_requisicao": 1000, "tamanho_boundary": 20}
+    assert app_module.idempotency_size_matches(gravada, {"tamanho_requisicao": 1000, "tamanho_boundary": 20})
+    assert not app_module.idempotency_size_matches(gravada, {"tamanho_requisicao": 1001, "tamanho_boundary": 20})
+    # Três delimitadores (duas partes e o final) com boundary 4 bytes maior
+    assert app_module.idempotency_size_matches(gravada, {"tamanho_requisicao": 1012, "tamanho_boundary": 24})
+    assert not app_module.idempotency_size_matches(gravada, {"tamanho_requisicao": 1013, "tamanho_boundary": 24})
+    assert not app_module.idempotency_size_matches(gravada, {"tamanho_requisicao": 1004, "tamanho_boundary": 24})
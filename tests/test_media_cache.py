@@ -0,0 +1,61 @@
+"""
+Testes do cache de metadados de mídia, indexado pelo SHA-256 calculado pela API
+"""
+
+import hashlib
+import io
+
+from test_media_probe import build_mp4
+
+
+def upload_mp4(client, data: bytes):
+    return client.post(
+        '/upload',
+        data={'file': (io.BytesIO(data), 'video.mp4', 'video/mp4')},
+        query_string={'dedup': 'false'},
+        content_type='multipart/form-data',
+    )
+
+
+def test_repeated_media_hits_cache_by_sha256(client, app_module, monkeypatch):
+    cache = app_module.MediaMetadataCache(16, False, 0)
+    monkeypatch.setattr(app_module, "media_metadata_cache", cache)
+    data = build_mp4()
+
+    first = upload_mp4(client, data)
+    assert first.status_code == 200
+    arquivo = first.get_json()["arquivo"]
+    assert arquivo["hash_sha256"] == hashlib.sha256(data).hexdigest()
+    assert cache.get(arquivo["hash_sha256"], len(data)) is not None
+
+    second = upload_mp4(client, data)
+    assert second.status_code == 200
+    assert second.get_json()["arquivo"].get("midia") == arquivo.get("midia")
+    assert cache.stats()["hits_memoria"] >= 2
+
+
+def test_md5_is_not_a_cache_key(app_module):
+    cache = app_module.MediaMetadataCache(16, False, 0)
+    data = build_mp4()
+    cache.put(hashlib.sha256(data).hexdigest(), len(data), {"duracao": 5.0})
+    # Outro conteúdo com o mesmo MD5 (colisão fabricada) não encontra a entrada
+    assert cache.get(hashlib.md5(data).hexdigest(), len(data)) is None
+
+
+def test_disk_eviction_runs_in_batches(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.MediaMetadataCache, "DISK_EVICT_EVERY", 5)
+    cache = app_module.MediaMetadataCache(16, True, 3)
+    db = app_module.get_state_db()
+    db.execute("DELETE FROM media_cache")
+
+    def disk_entries():
+        return db.execute("SELECT count(*) FROM media_cache").fetchone()[0]
+
+    for i in range(4):
+        cache.put(f"{i:064x}", 1, {"duracao": i})
+    # Sem descarte entre os lotes
+    assert disk_entries() == 4
+    cache.put(f"{4:064x}", 1, {"duracao": 4})
+    assert disk_entries() == 3
+    # As mais recentes ficam
+    assert cache.get(f"{4:064x}", 1) == {"duracao": 4}
@@ -0,0 +1,47 @@
+"""
+Testes dos jobs de metadados de mídia em segundo plano (?async_metadata=true)
+"""
+
+import io
+import os
+import time
+
+from test_media_probe import build_mp4
+
+
+def test_executor_is_recreated_after_fork(app_module, monkeypatch):
+    parent = app_module._get_media_job_executor()
+    assert app_module._get_media_job_executor() is parent
+
+    # Pool criado antes do fork (--preload): o worker filho não reaproveita as threads do mestre
+    child_pid = os.getpid() + 1
+    monkeypatch.setattr(app_module.os, "getpid", lambda: child_pid)
+    child = app_module._get_media_job_executor()
+    assert child is not parent
+    assert app_module._get_media_job_executor() is child
+
+
+def test_traditional_upload_job_probes_local_data(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "MEDIA_PROBE_ENGINE", "native")
+    monkeypatch.setattr(app_module, "media_metadata_cache", app_module.MediaMetadataCache(16, False, 0))
+    reads = []
+    original = type(app_module.storage_backend).read_url
+    monkeypatch.setattr(type(app_module.storage_backend), "read_url", lambda self, key: reads.append(key) or original(self, key))
+    data = build_mp4()
+
+    response = client.post(
+        '/upload',
+        data={'file': (io.BytesIO(data), 'video.mp4', 'video/mp4')},
+        query_string={'async_metadata': 'true', 'dedup': 'false'},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200
+    job_url = response.get_json()["midia_job"]["status_url"]
+    for _ in range(100):
+        job = client.get(job_url).get_json()
+        if job["status"] not in ("pendente", "processando"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "concluido"
+    # Os cabeçalhos vieram do arquivo recebido, sem baixar o objeto de volta
+    assert reads == []
@@ -0,0 +1,169 @@
+"""
+Testes da leitura nativa de cabeçalhos de mídia (media_probe.py) com arquivos montados byte a byte
+"""
+
+import io
+import struct
+
+import media_probe
+
+
+# ============================================
+# MP4 (moov no fim, depois do mdat)
+# ============================================
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I', 8 + len(payload)) + box_type + payload
+
+
+def build_mp4(mdat_size: int = 200 * 1024) -> bytes:
+    mvhd = box(b'mvhd', b'\x00' * 12 + struct.pack('>II', 1000, 5000) + b'\x00' * 80)
+    mdhd = box(b'mdhd', b'\x00' * 12 + struct.pack('>II', 90000, 450000) + b'\x00' * 4)
+    hdlr = box(b'hdlr', b'\x00' * 8 + b'vide' + b'\x00' * 13)
+    avc1 = box(b'avc1', b'\x00' * 24 + struct.pack('>HH', 1280, 720) + b'\x00' * 50 + box(b'avcC', b'\x01\x64\x00\x1f'))
+    stsd = box(b'stsd', b'\x00' * 4 + struct.pack('>I', 1) + avc1)
+    stts = box(b'stts', b'\x00' * 4 + struct.pack('>III', 1, 150, 3000))
+    stsz = box(b'stsz', b'\x00' * 4 + struct.pack('>II', 1000, 150))
+    minf = box(b'minf', box(b'stbl', stsd + stts + stsz))
+    trak = box(b'trak', box(b'mdia', mdhd + hdlr + minf))
+    return (
+        box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2avc1mp41')
+        + box(b'mdat', b'\x00' * mdat_size)
+        + box(b'moov', mvhd + trak)
+    )
+
+
+def test_probe_mp4_with_moov_at_end():
+    data = build_mp4()
+    result = media_probe.probe(io.BytesIO(data))
+    assert result["format"]["format_name"] == "mov,mp4"
+    assert result["format"]["duration"] == 5.0
+    assert result["format"]["size"] == len(data)
+    video = result["streams"][0]
+    assert video["codec_type"] == "video"
+    assert video["codec_name"] == "h264"
+    assert (video["width"], video["height"]) == (1280, 720)
+    assert video["r_frame_rate"] == "30/1"
+    assert video["display_aspect_ratio"] == "16:9"
+    assert video["pix_fmt"] == "yuv420p"
+    assert video["bit_rate"] == 150 * 1000 * 8 // 5
+
+
+def test_probe_mp4_from_stream_windows():
+    # Só o início e o fim ficam em memória no streaming; o moov está na janela final
+    data = build_mp4()
+    source = media_probe.WindowSource(data[:4096], data[-64 * 1024:], len(data))
+    assert media_probe.probe(source) == media_probe.probe(io.BytesIO(data))
+
+
+def test_probe_mp4_returns_none_when_moov_is_outside_windows():
+    data = build_mp4()
+    moov_offset = data.rindex(b'moov') - 4
+    source = media_probe.WindowSource(data[:4096], data[-16:], len(data))
+    assert moov_offset < len(data) - 16
+    assert media_probe.probe(source) is None
+
+
+def test_probe_mp4_truncated():
+    data = build_mp4()
+    assert media_probe.probe(io.BytesIO(data[:-40])) is None
+    assert media_probe.probe(io.BytesIO(data[:30])) is None
+
+
+# ============================================
+# MATROSKA
+# ============================================
+
+def element(element_id: bytes, payload: bytes) -> bytes:
+    size = len(payload)
+    header = bytes([0x80 | size]) if size < 0x7F else struct.pack('>H', 0x4000 | size)
+    return element_id + header + payload
+
+
+def build_mkv() -> bytes:
+    ebml = element(b'\x1a\x45\xdf\xa3', element(b'\x42\x82', b'matroska'))
+    info = element(b'\x15\x49\xa9\x66', element(b'\x2a\xd7\xb1', b'\x0f\x42\x40') + element(b'\x44\x89', struct.pack('>d', 4000.0)))
+    video = element(b'\xae', (
+        element(b'\x83', b'\x01')
+        + element(b'\x86', b'V_VP9')
+        + element(b'\x23\xe3\x83', struct.pack('>I', 40000000))
+        + element(b'\xe0', element(b'\xb0', struct.pack('>H', 640)) + element(b'\xba', struct.pack('>H', 360)))
+    ))
+    audio = element(b'\xae', (
+        element(b'\x83', b'\x02')
+        + element(b'\x86', b'A_OPUS')
+        + element(b'\xe1', element(b'\xb5', struct.pack('>f', 48000.0)) + element(b'\x9f', b'\x02'))
+    ))
+    tracks = element(b'\x16\x54\xae\x6b', video + audio)
+    cluster = element(b'\x1f\x43\xb6\x75', b'\x00' * 64)
+    return ebml + element(b'\x18\x53\x80\x67', info + tracks + cluster)
+
+
+def test_probe_mkv():
+    result = media_probe.probe(io.BytesIO(build_mkv()))
+    assert result["format"]["format_name"] == "matroska"
+    assert result["format"]["duration"] == 4.0
+    video, audio = result["streams"]
+    assert video["codec_name"] == "vp9"
+    assert (video["width"], video["height"]) == (640, 360)
+    assert video["r_frame_rate"] == "25/1"
+    assert audio["codec_name"] == "opus"
+    assert (audio["sample_rate"], audio["channels"]) == (48000, 2)
+
+
+def test_probe_mkv_truncated():
+    data = build_mkv()
+    # Cortado no meio das Tracks: sem streams não há resultado
+    assert media_probe.probe(io.BytesIO(data[:data.index(b'\x16\x54\xae\x6b') + 10])) is None
+
+
+# ============================================
+# AVI
+# ============================================
+
+def chunk(chunk_id: bytes, payload: bytes) -> bytes:
+    return chunk_id + struct.pack('<I', len(payload)) + payload + (b'\x00' if len(payload) % 2 else b'')
+
+
+def build_avi() -> bytes:
+    avih = chunk(b'avih', struct.pack('<IIIIII', 40000, 0, 0, 0, 100, 0) + b'\x00' * 32)
+    strh_video = b'vidsH264' + b'\x00' * 12 + struct.pack('<II', 1, 25) + b'\x00' * 4 + struct.pack('<I', 100) + b'\x00' * 20
+    strf_video = struct.pack('<IiiHH4s', 40, 320, 240, 1, 24, b'H264') + b'\x00' * 20
+    strh_audio = b'auds' + b'\x00' * 16 + struct.pack('<II', 1, 44100) + b'\x00' * 4 + struct.pack('<I', 176400) + b'\x00' * 20
+    strf_audio = struct.pack('<HHIIHH', 0x0055, 2, 44100, 16000, 1, 0)
+    strl_video = chunk(b'LIST', b'strl' + chunk(b'strh', strh_video) + chunk(b'strf', strf_video))
+    strl_audio = chunk(b'LIST', b'strl' + chunk(b'strh', strh_audio) + chunk(b'strf', strf_audio))
+    hdrl = chunk(b'LIST', b'hdrl' + avih + strl_video + strl_audio)
+    movi = chunk(b'LIST', b'movi' + b'\x00' * 64)
+    body = b'AVI ' + hdrl + movi
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+def test_probe_avi():
+    result = media_probe.probe(io.BytesIO(build_avi()))
+    assert result["format"]["format_name"] == "avi"
+    assert result["format"]["duration"] == 4.0
+    video, audio = result["streams"]
+    assert video["codec_name"] == "h264"
+    assert (video["width"], video["height"]) == (320, 240)
+    assert video["r_frame_rate"] == "25/1"
+    assert audio["codec_name"] == "mp3"
+    assert (audio["sample_rate"], audio["channels"], audio["bit_rate"]) == (44100, 2, 128000)
+
+
+def test_probe_avi_truncated():
+    assert media_probe.probe(io.BytesIO(build_avi()[:40])) is None
+
+
+# ============================================
+# ENTRADAS INVÁLIDAS
+# ============================================
+
+def test_probe_unrecognized_or_malformed_input():
+    assert media_probe.probe(io.BytesIO(b'')) is None
+    assert media_probe.probe(io.BytesIO(b'%PDF-1.4\n' + b'\x00' * 64)) is None
+    # Tamanho de caixa forjado (maior que o limite de leitura de cabeçalho)
+    forged = box(b'ftyp', b'isom') + struct.pack('>I', 0xFFFFFFF0) + b'moov' + b'\x00' * 32
+    assert media_probe.probe(io.BytesIO(forged)) is None
+    # EBML com vint inválido
+    assert media_probe.probe(io.BytesIO(b'\x1a\x45\xdf\xa3\x00' + b'\x00' * 16)) is None
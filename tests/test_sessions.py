@@ -0,0 +1,115 @@
+"""
+Testes do upload em partes retomável (/upload/sessions)
+"""
+
+import hashlib
+import io
+
+import pytest
+
+from conftest import pdf_bytes
+
+MB = 1024 * 1024
+
+
+def create_session(client, size=None, filename='grande.pdf'):
+    payload = {'filename': filename}
+    if size is not None:
+        payload['size'] = size
+    response = client.post('/upload/sessions', json=payload)
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def put_chunk(client, session_id, number, body, **kwargs):
+    return client.put(f'/upload/sessions/{session_id}/chunks/{number}', data=body, **kwargs)
+
+
+@pytest.fixture
+def small_read_blocks(app_module, monkeypatch):
+    # Blocos pequenos: cada parte passa por várias leituras e o spool vai para o disco
+    monkeypatch.setattr(app_module, "STREAM_READ_CHUNK_BYTES", 64 * 1024)
+
+
+def test_session_flow(client, app_module, small_read_blocks):
+    data = pdf_bytes(6 * MB)
+    session = create_session(client, len(data))
+    session_id, chunk_size = session["session_id"], session["chunk_size"]
+    assert session["total_chunks"] == 2
+
+    # Partes em qualquer ordem
+    second = put_chunk(client, session_id, 2, data[chunk_size:])
+    first = put_chunk(client, session_id, 1, data[:chunk_size])
+    assert first.status_code == second.status_code == 200
+    assert first.get_json()["tamanho_bytes"] == chunk_size
+    assert second.get_json()["tamanho_bytes"] == len(data) - chunk_size
+
+    status = client.get(f'/upload/sessions/{session_id}').get_json()
+    assert [chunk["chunk"] for chunk in status["chunks_recebidos"]] == [1, 2]
+
+    response = client.post(f'/upload/sessions/{session_id}/complete')
+    assert response.status_code == 200
+    arquivo = response.get_json()["arquivo"]
+    assert arquivo["caminho_completo"] == session["arquivo"]["caminho_completo"]
+    assert arquivo["tamanho"]["bytes"] == len(data)
+    with open(app_module.storage_backend.path_for(arquivo["caminho_completo"]), 'rb') as f:
+        assert hashlib.md5(f.read()).hexdigest() == hashlib.md5(data).hexdigest()
+
+
+def test_chunk_larger_than_session_part(client, small_read_blocks):
+    session = create_session(client)
+    session_id, chunk_size = session["session_id"], session["chunk_size"]
+    body = b'0' * (chunk_size + 1)
+
+    # Content-Length declarado: recusado antes de ler o corpo
+    response = put_chunk(client, session_id, 1, body)
+    assert response.status_code == 413
+
+    # Sem Content-Length (chunked): recusado durante a leitura
+    response = client.put(
+        f'/upload/sessions/{session_id}/chunks/1',
+        input_stream=io.BytesIO(body),
+        environ_overrides={'wsgi.input_terminated': True},
+    )
+    assert response.status_code == 413
+    assert response.get_json()["error"] == "Parte muito grande"
+
+
+def test_invalid_chunks(client):
+    session_id = create_session(client)["session_id"]
+    assert put_chunk(client, session_id, 1, b'').status_code == 400
+    assert put_chunk(client, session_id, 0, b'abc').status_code == 400
+    assert put_chunk(client, session_id, 10001, b'abc').status_code == 400
+    assert put_chunk(client, 'sessao-invalida', 1, b'abc').status_code == 404
+
+
+def test_complete_with_missing_chunks(client):
+    data = pdf_bytes(6 * MB)
+    session = create_session(client, len(data))
+    session_id, chunk_size = session["session_id"], session["chunk_size"]
+    put_chunk(client, session_id, 2, data[chunk_size:])
+
+    response = client.post(f'/upload/sessions/{session_id}/complete')
+    assert response.status_code == 409
+    assert response.get_json()["chunks_pendentes"] == [1]
+
+
+def test_abort_session(client):
+    session_id = create_session(client)["session_id"]
+    assert put_chunk(client, session_id, 1, pdf_bytes()).status_code == 200
+    assert client.delete(f'/upload/sessions/{session_id}').status_code == 200
+    assert client.get(f'/upload/sessions/{session_id}').status_code == 404
+
+
+def test_complete_with_small_part(client, app_module):
+    data = pdf_bytes(6 * MB)
+    session = create_session(client)
+    session_id = session["session_id"]
+    put_chunk(client, session_id, 1, data[:MB])
+    put_chunk(client, session_id, 2, data[MB:])
+
+    response = client.post(f'/upload/sessions/{session_id}/complete')
+    assert response.status_code == 409
+    body = response.get_json()
+    assert body["error"] == "Partes menores que o mínimo"
+    assert f"no mínimo {app_module.TRANSFER_MIN_PART_SIZE_BYTES} bytes" in body["detail"]
@@ -0,0 +1,73 @@
+"""
+Testes da identificação do tipo real pelo início do arquivo (sniffing.py e CONTENT_SNIFFING)
+"""
+
+import io
+
+import sniffing
+from conftest import pdf_bytes
+
+PNG_HEAD = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+MP4_HEAD = b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2" + b"\x00" * 32
+
+
+def upload(client, data: bytes, filename: str, content_type: str):
+    return client.post(
+        '/upload',
+        data={'file': (io.BytesIO(data), filename, content_type)},
+        query_string={'dedup': 'false'},
+        content_type='multipart/form-data',
+    )
+
+
+def test_sniff_known_signatures():
+    assert sniffing.sniff(PNG_HEAD)["mime"] == 'image/png'
+    assert sniffing.sniff(b"%PDF-1.7\n")["categoria"] == 'documento'
+    assert sniffing.sniff(MP4_HEAD)["tipo"] == 'mp4'
+    assert sniffing.sniff(b"\x00\x00\x00\x14ftypqt  \x00\x00\x00\x00qt  ")["tipo"] == 'quicktime'
+    assert sniffing.sniff(b"RIFF\x00\x00\x00\x00AVI LIST")["tipo"] == 'avi'
+    assert sniffing.sniff(b"\x1a\x45\xdf\xa3\x9f\x42\x82\x84webm")["tipo"] == 'webm'
+    assert sniffing.sniff(b"texto qualquer") is None
+
+
+def test_sniff_marks_executables_as_refused():
+    for head in (b"MZ\x90\x00", b"\x7fELF\x02\x01", b"#!/bin/sh\n"):
+        assert sniffing.sniff(head)["categoria"] is None
+
+
+def test_upload_rejects_executable_renamed_as_image(client):
+    response = upload(client, b"MZ\x90\x00" + b"\x00" * 512, 'foto.png', 'image/png')
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Conteúdo do arquivo não corresponde ao tipo declarado"
+
+
+def test_upload_corrects_octet_stream(client):
+    response = upload(client, pdf_bytes(), 'relatorio.pdf', 'application/octet-stream')
+    assert response.status_code == 200
+    arquivo = response.get_json()["arquivo"]
+    assert arquivo["tipo_mime"] == 'application/pdf'
+    assert arquivo["categoria"]["categoria"] == 'documento'
+
+
+def test_upload_keeps_declared_type_of_same_category(client):
+    response = upload(client, MP4_HEAD + b"\x00" * 512, 'clipe.mov', 'video/quicktime')
+    assert response.status_code == 200
+    assert response.get_json()["arquivo"]["tipo_mime"] == 'video/quicktime'
+
+
+def test_strict_mode_rejects_extension_mismatch(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "CONTENT_SNIFFING", "strict")
+    response = upload(client, pdf_bytes(), 'imagem.png', 'image/png')
+    assert response.status_code == 400
+    assert "application/pdf" in response.get_json()["detail"]
+
+    response = upload(client, b"conteudo sem assinatura" * 10, 'nota.pdf', 'application/pdf')
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Conteúdo do arquivo não reconhecido"
+
+
+def test_on_mode_accepts_extension_mismatch_with_detected_type(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "CONTENT_SNIFFING", "on")
+    response = upload(client, pdf_bytes(), 'imagem.png', 'image/png')
+    assert response.status_code == 200
+    assert response.get_json()["arquivo"]["tipo_mime"] == 'application/pdf'
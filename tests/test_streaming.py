@@ -0,0 +1,98 @@
+"""
+Testes do pipeline de upload em streaming: memória das partes em voo
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+
+class SlowBackend:
+    """Backend falso que registra o máximo de bytes de partes enviados ao mesmo tempo"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.max_inflight = 0
+        self.parts = {}
+
+    def create_multipart(self, key, content_type):
+        return "upload-1"
+
+    def upload_part(self, key, upload_id, part_number, body, checksums=None):
+        with self.lock:
+            self.inflight += len(body)
+            self.max_inflight = max(self.max_inflight, self.inflight)
+        time.sleep(0.2)
+        with self.lock:
+            self.inflight -= len(body)
+        self.parts[part_number] = bytes(body)
+        return f'"etag-{part_number}"'
+
+    def complete_multipart(self, key, upload_id, parts):
+        self.completed = parts
+
+    def abort_multipart(self, key, upload_id):
+        self.aborted = True
+
+
+PART = 5 * 1024 * 1024
+
+
+def run_pipeline(app_module, backend, size, concurrency=8):
+    plan = {"tamanho_parte_bytes": PART, "multipart_threshold": PART, "concorrencia": concurrency}
+    pipeline = app_module.StreamingUploadPipeline(backend, "uploads/x.bin", "application/octet-stream", plan)
+    conteudo = os.urandom(size)
+    for inicio in range(0, len(conteudo), 1024 * 1024):
+        pipeline.write(conteudo[inicio:inicio + 1024 * 1024])
+    pipeline.finish()
+    return conteudo
+
+
+def test_memory_budget_limits_parts_in_flight(app_module, monkeypatch):
+    budget = app_module.MemoryBudget(2 * PART)
+    monkeypatch.setattr(app_module, "stream_memory", budget)
+    backend = SlowBackend()
+    conteudo = run_pipeline(app_module, backend, 6 * PART)
+
+    assert backend.max_inflight <= 2 * PART
+    assert b''.join(backend.parts[n] for n in sorted(backend.parts)) == conteudo
+    assert budget.in_use == 0
+
+
+def test_part_larger_than_budget_still_uploads(app_module, monkeypatch):
+    budget = app_module.MemoryBudget(1024)
+    monkeypatch.setattr(app_module, "stream_memory", budget)
+    backend = SlowBackend()
+    run_pipeline(app_module, backend, 3 * PART)
+    assert backend.max_inflight <= PART
+    assert len(backend.parts) == 3
+    assert budget.in_use == 0
+
+
+def test_budget_is_released_on_abort(app_module, monkeypatch):
+    budget = app_module.MemoryBudget(4 * PART)
+    monkeypatch.setattr(app_module, "stream_memory", budget)
+
+    class FailingBackend(SlowBackend):
+        def upload_part(self, *args, **kwargs):
+            raise RuntimeError("falha no envio")
+
+    backend = FailingBackend()
+    plan = {"tamanho_parte_bytes": PART, "multipart_threshold": PART, "concorrencia": 2}
+    pipeline = app_module.StreamingUploadPipeline(backend, "uploads/x.bin", "application/octet-stream", plan)
+    with pytest.raises(RuntimeError):
+        for _ in range(6):
+            pipeline.write(os.urandom(PART))
+        pipeline.finish()
+    pipeline.abort()
+    assert budget.in_use == 0
+
+
+def test_zero_budget_disables_the_limit(app_module):
+    budget = app_module.MemoryBudget(0)
+    assert budget.acquire(10 ** 12, blocking=False)
+    budget.release(10 ** 12)
+    assert budget.in_use == 0
@@ -0,0 +1,379 @@
+"""
+Rastreamento (tracing) leve das requisições da Upload CDN API.
+
+Cada requisição ganha um trace (ID devolvido no header X-Trace-Id; aceita X-Trace-Id ou
+traceparent W3C recebidos) com spans para as etapas do upload (metrics.stage), a extração
+de metadados e cada chamada ao Spaces (eventos before-call/after-call do botocore).
+
+Os spans ficam em memória durante a requisição. Ao final:
+  - traces amostrados (TRACE_SAMPLE_PERCENT) vão para o exportador configurado: arquivo
+    JSONL local (um trace por linha) ou coletor OTLP/HTTP (JSON), em thread de fundo;
+  - requisições acima de TRACE_SLOW_UPLOAD_MS têm a árvore completa de spans registrada
+    no log, amostradas ou não.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """Intervalo de tempo nomeado dentro de um trace"""
+
+    __slots__ = ("name", "span_id", "parent_id", "kind", "start", "_t0", "duration_ms", "attributes", "status")
+
+    def __init__(self, name: str, parent_id: Optional[str], kind: str = "interno", attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+
+    def end(self, duration_seconds: Optional[float] = None) -> None:
+        if self.duration_ms is None:
+            segundos = duration_seconds if duration_seconds is not None else time.perf_counter() - self._t0
+            self.duration_ms = round(segundos * 1000, 3)
+
+    def fail(self, erro: Any) -> None:
+        self.status = "erro"
+        self.attributes["erro"] = str(erro)[:500]
+
+    def to_dict(self, trace_id: str) -> Dict[str, Any]:
+        return {
+            "trace_id": trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "nome": self.name,
+            "tipo": self.kind,
+            "inicio": datetime.fromtimestamp(self.start).isoformat(),
+            "inicio_unix": self.start,
+            "duracao_ms": self.duration_ms,
+            "status": self.status,
+            "atributos": self.attributes,
+        }
+
+
+class Trace:
+    """Spans de uma requisição (compartilhado pelas threads que atendem a requisição)"""
+
+    def __init__(self, trace_id: str, sampled: bool, root_name: str, remote_parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self._lock = threading.Lock()
+        self.root = Span(root_name, remote_parent_id, "servidor", attributes)
+        self.spans: List[Span] = [self.root]
+
+    def start_span(self, name: str, parent: Optional[Span], kind: str = "interno", attributes: Optional[Dict[str, Any]] = None) -> Span:
+        span = Span(name, (parent or self.root).span_id, kind, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def finish(self) -> None:
+        self.root.end()
+        with self._lock:
+            for span in self.spans:
+                if span.duration_ms is None:
+                    # Span sem fim registrado (ex.: chamada ao Spaces interrompida por exceção)
+                    span.end()
+                    span.status = "erro"
+                    span.attributes.setdefault("erro", "span não finalizado")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [span.to_dict(self.trace_id) for span in self.spans]
+        return {
+            "trace_id": self.trace_id,
+            "nome": self.root.name,
+            "inicio": datetime.fromtimestamp(self.root.start).isoformat(),
+            "duracao_ms": self.root.duration_ms,
+            "status": self.root.status,
+            "spans": spans,
+        }
+
+    def render_tree(self) -> str:
+        """Árvore de spans indentada, para o log de requisições lentas"""
+        with self._lock:
+            spans = list(self.spans)
+        filhos: Dict[Optional[str], List[Span]] = {}
+        for span in spans:
+            if span is not self.root:
+                filhos.setdefault(span.parent_id, []).append(span)
+        linhas = []
+
+        def visitar(span: Span, nivel: int) -> None:
+            deslocamento = (span.start - self.root.start) * 1000
+            marcador = " ❌" if span.status == "erro" else ""
+            linhas.append(f"{'  ' * nivel}- {span.name}: {span.duration_ms:.1f} ms (+{deslocamento:.1f} ms){marcador}")
+            for filho in sorted(filhos.get(span.span_id, []), key=lambda s: s.start):
+                visitar(filho, nivel + 1)
+
+        visitar(self.root, 0)
+        return "\n".join(linhas)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("upload_cdn_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("upload_cdn_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Span filho do span atual; sem trace ativo não faz nada"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    current = trace.start_span(name, _current_span.get(), attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        current.end()
+        _current_span.reset(token)
+
+
+def record_span(name: str, duration_seconds: float, **attributes) -> None:
+    """Registra um span já concluído (terminando agora), medido fora de um bloco with"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    recorded = trace.start_span(name, _current_span.get(), attributes=attributes)
+    recorded.start = time.time() - duration_seconds
+    recorded.end(duration_seconds)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Atributo no span atual (ou na raiz do trace)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        (_current_span.get() or trace.root).attributes[key] = value
+
+
+class BackgroundExporter:
+    """Exporta traces em thread de fundo, com fila limitada (traces excedentes são descartados)"""
+
+    def __init__(self, max_queue: int = 1000, batch_size: int = 100):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.descartados = 0
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_started(self) -> None:
+        # Uma thread por processo (após o fork do Gunicorn com --preload)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(self.max_queue)
+            threading.Thread(target=self._loop, name="trace-export", daemon=True).start()
+
+    def submit(self, trace: Dict[str, Any]) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.descartados += 1
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.export(batch)
+            except Exception as e:
+                logger.warning(f"Erro ao exportar {len(batch)} trace(s): {e}")
+
+    def export(self, traces: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+
+class JsonlExporter(BackgroundExporter):
+    """Um trace por linha em arquivo JSONL local (append; seguro entre workers)"""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def export(self, traces: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(trace, ensure_ascii=False, separators=(",", ":")) + "\n" for trace in traces).encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+class OtlpHttpExporter(BackgroundExporter):
+    """Envia traces a um coletor OTLP/HTTP com codificação JSON (ex.: http://collector:4318/v1/traces)"""
+
+    KINDS = {"interno": 1, "servidor": 2, "cliente": 3}
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def _span(self, span: Dict[str, Any]) -> Dict[str, Any]:
+        inicio_ns = int(span["inicio_unix"] * 1e9)
+        otlp = {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "name": span["nome"],
+            "kind": self.KINDS.get(span["tipo"], 1),
+            "startTimeUnixNano": str(inicio_ns),
+            "endTimeUnixNano": str(inicio_ns + int((span["duracao_ms"] or 0) * 1e6)),
+            "attributes": [self._attribute(k, v) for k, v in span["atributos"].items()],
+            "status": {"code": 2 if span["status"] == "erro" else 1},
+        }
+        if span["parent_id"]:
+            otlp["parentSpanId"] = span["parent_id"]
+        return otlp
+
+    def export(self, traces: List[Dict[str, Any]]) -> None:
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": self.service_name},
+                    "spans": [self._span(span) for trace in traces for span in trace["spans"]],
+                }],
+            }]
+        }
+        req = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            response.read()
+
+
+class Tracer:
+    """Início e fim dos traces das requisições, amostragem, exportação e log de lentidão"""
+
+    def __init__(self, sample_percent: int, exporter: Optional[BackgroundExporter], slow_threshold_ms: int):
+        self.sample_percent = sample_percent
+        self.exporter = exporter
+        self.slow_threshold_ms = slow_threshold_ms
+
+    def start_trace(self, name: str, headers, attributes: Optional[Dict[str, Any]] = None):
+        """Cria o trace da requisição e o torna atual; retorna o token para finish_trace"""
+        trace_id, remote_parent_id, sampled = None, None, None
+        traceparent = TRACEPARENT_RE.match((headers.get("traceparent") or "").strip().lower())
+        if traceparent:
+            trace_id, remote_parent_id = traceparent.group(1), traceparent.group(2)
+            sampled = bool(int(traceparent.group(3), 16) & 1)
+        else:
+            candidate = (headers.get("X-Trace-Id") or "").strip().lower().replace("-", "")
+            if TRACE_ID_RE.match(candidate):
+                trace_id = candidate
+        if sampled is None:
+            sampled = random.random() * 100 < self.sample_percent
+
+        trace = Trace(trace_id or uuid.uuid4().hex, sampled, name, remote_parent_id, attributes)
+        return trace, (_current_trace.set(trace), _current_span.set(None))
+
+    def finish_trace(self, trace: Trace, tokens, status_code: Optional[int] = None, error: Optional[BaseException] = None) -> None:
+        if status_code is not None:
+            trace.root.attributes["http.status_code"] = status_code
+            if status_code >= 500:
+                trace.root.status = "erro"
+        if error is not None:
+            trace.root.fail(error)
+        trace.finish()
+        try:
+            _current_trace.reset(tokens[0])
+            _current_span.reset(tokens[1])
+        except ValueError:
+            # Finalizado em outro contexto (ex.: hook executado fora do contexto que abriu o trace)
+            _current_trace.set(None)
+            _current_span.set(None)
+
+        if self.slow_threshold_ms and trace.root.duration_ms >= self.slow_threshold_ms:
+            print(f"🐢 Requisição lenta ({trace.root.duration_ms:.0f} ms) trace={trace.trace_id}")
+            logger.warning(f"Requisição lenta: {trace.root.name} em {trace.root.duration_ms:.0f} ms (trace {trace.trace_id})\n{trace.render_tree()}")
+        if trace.sampled and self.exporter is not None:
+            self.exporter.submit(trace.to_dict())
+
+    # Spans das chamadas ao Spaces (eventos do botocore/aiobotocore)
+    CONTEXT_KEY = "_upload_cdn_span"
+
+    def _before_call(self, model=None, context=None, **kwargs) -> None:
+        trace = _current_trace.get()
+        if trace is None or context is None:
+            return None
+        context[self.CONTEXT_KEY] = trace.start_span(
+            f"s3.{model.name}", _current_span.get(), "cliente", {"s3.operacao": model.name}
+        )
+        # before-call aceita um retorno que substitui a chamada: nunca retornar valor
+        return None
+
+    def _needs_retry(self, attempts=None, caught_exception=None, request_dict=None, **kwargs) -> None:
+        current = ((request_dict or {}).get("context") or {}).get(self.CONTEXT_KEY)
+        if current is not None:
+            current.attributes["tentativas"] = attempts
+            if caught_exception is not None:
+                current.fail(f"{type(caught_exception).__name__}: {caught_exception}")
+
+    def _after_call(self, http_response=None, context=None, **kwargs) -> None:
+        current = (context or {}).pop(self.CONTEXT_KEY, None)
+        if current is None:
+            return
+        status_code = getattr(http_response, "status_code", None)
+        current.attributes["http.status_code"] = status_code
+        if status_code is not None and status_code >= 400:
+            current.status = "erro"
+        current.end()
+
+    def attach(self, client) -> None:
+        """Registra os spans de chamadas ao Spaces em um cliente S3"""
+        client.meta.events.register("before-call.s3", self._before_call)
+        client.meta.events.register("needs-retry.s3", self._needs_retry)
+        client.meta.events.register("after-call.s3", self._after_call)